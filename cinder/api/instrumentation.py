@@ -0,0 +1,162 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Request timing middleware.
+
+Times each request through the rest of the pipeline and splits its wall
+time into phases: auth (the middleware ahead of the API, mostly token
+validation), deserialize, controller, db, rpc and serialize.  Time spent
+in SQL statements and rpc calls made by a controller is counted as db
+and rpc only.
+
+The timings are added to per route statistics, which the os-api-timing
+extension shows to admins.  With debug on, each response also gets an
+X-Cinder-Timing header such as:
+
+    total=12.51ms auth=1.02ms controller=4.30ms db=6.88ms/3 serialize=0.31ms
+
+Collections that are streamed are serialized after the response leaves
+this middleware, so that time is not included.
+"""
+
+import bisect
+
+import webob.dec
+
+from cinder import flags
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import timing
+from cinder import wsgi
+
+
+FLAGS = flags.FLAGS
+LOG = logging.getLogger(__name__)
+
+PHASES = ('auth', 'deserialize', 'controller', 'db', 'rpc', 'serialize')
+
+# Phases whose number of entries is worth reporting
+COUNTED_PHASES = ('db', 'rpc')
+
+# Upper bounds in milliseconds of the request time histogram buckets
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+UNROUTED = '(unrouted)'
+
+
+class RouteStats(object):
+    """Timings of the requests served by one route."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.times = {}
+        self.counts = {}
+
+    def add(self, timer):
+        total = timer.total()
+        self.count += 1
+        self.time += total
+        self.buckets[bisect.bisect_left(BUCKETS, total * 1000)] += 1
+        for phase, seconds in timer.times.items():
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+        for phase in COUNTED_PHASES:
+            self.counts[phase] = (self.counts.get(phase, 0) +
+                                  timer.counts.get(phase, 0))
+
+    def to_dict(self):
+        buckets = []
+        for i, count in enumerate(self.buckets):
+            if i < len(BUCKETS):
+                buckets.append({'le': BUCKETS[i], 'count': count})
+            else:
+                buckets.append({'le': None, 'count': count})
+
+        phases = []
+        for phase in PHASES:
+            if phase in self.times:
+                phases.append({'name': phase,
+                               'time': self.times[phase],
+                               'count': self.counts.get(phase)})
+
+        return {'count': self.count,
+                'time': self.time,
+                'buckets': buckets,
+                'phases': phases}
+
+
+_STATS = {}
+
+
+def route_name(req):
+    """Return the method and path template of the route req took."""
+    route = req.environ.get('routes.route')
+    if route is None:
+        return '%s %s' % (req.method, UNROUTED)
+    return '%s %s' % (req.method, route.routepath)
+
+
+def record(route, timer):
+    """Add the timings of a request to the statistics of its route."""
+    stats = _STATS.get(route)
+    if stats is None:
+        stats = _STATS[route] = RouteStats()
+    stats.add(timer)
+
+
+def get_stats():
+    """Return the statistics of this process as a list of route dicts."""
+    result = []
+    for route in sorted(_STATS.keys()):
+        stats = _STATS[route].to_dict()
+        stats['route'] = route
+        result.append(stats)
+    return result
+
+
+def reset_stats():
+    _STATS.clear()
+
+
+def format_timer(timer):
+    """Format a stopped timer for the X-Cinder-Timing header."""
+    parts = ['total=%.2fms' % (timer.total() * 1000)]
+    for phase in PHASES:
+        if phase not in timer.times:
+            continue
+        part = '%s=%.2fms' % (phase, timer.times[phase] * 1000)
+        if phase in COUNTED_PHASES:
+            part += '/%d' % timer.counts.get(phase, 0)
+        parts.append(part)
+    return ' '.join(parts)
+
+
+class RequestTimingMiddleware(wsgi.Middleware):
+    """Time requests and record the timings per route."""
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def __call__(self, req):
+        timing.start('auth')
+        try:
+            response = req.get_response(self.application)
+        finally:
+            timer = timing.stop()
+
+        record(route_name(req), timer)
+        if FLAGS.debug:
+            response.headers['X-Cinder-Timing'] = format_timer(timer)
+        return response
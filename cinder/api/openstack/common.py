@@ -15,20 +15,35 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import hashlib
 import os
 import re
 import urlparse
 
 import webob
+from webob import datetime_utils
 
 from cinder import flags
 from cinder.api.openstack import wsgi
 from cinder.api.openstack import xmlutil
+from cinder.openstack.common import cfg
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
+from cinder import version
 
 
 LOG = logging.getLogger(__name__)
+
+cache_opts = [
+    cfg.IntOpt('osapi_cache_max_age',
+               default=0,
+               help='Seconds clients may cache volume type and extension '
+                    'lists without revalidating them'),
+]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(cache_opts)
 
 
 XML_NS_V1 = 'http://docs.openstack.org/volume/api/v1'
@@ -72,6 +87,68 @@ def _get_marker_param(request):
     return request.GET['marker']
 
 
+def make_etag(request, changed_at, *parts):
+    """Return an ETag for a response built from the data parts identify.
+
+    The tag also covers the request URL, media type and credentials, as
+    the response depends on them too.  Returns None when the data changed
+    less than a second ago: database timestamps may not tell apart two
+    changes made within the same second.
+
+    :param changed_at: When the data last changed, or None if unknown.
+    :param parts: Values that change whenever the data does.
+    """
+    if (changed_at is not None and
+            timeutils.utcnow() - changed_at < datetime.timedelta(seconds=1)):
+        return None
+
+    key = [version.version_string(), request.path_qs,
+           request.environ.get('cinder.best_content_type')]
+    context = request.environ.get('cinder.context')
+    if context:
+        key.extend([context.project_id, context.is_admin,
+                    sorted(context.roles)])
+    key.extend(parts)
+    return hashlib.md5(repr(key)).hexdigest()
+
+
+def check_not_modified(request, etag=None, last_modified=None,
+                       max_age=None):
+    """Answer a conditional GET.
+
+    Returns a 304 response if the If-None-Match or If-Modified-Since
+    header of the request shows the client has the current response
+    already.  Otherwise, the caching headers are sent with the response
+    and None is returned.
+
+    :param etag: ETag of the response, see make_etag().
+    :param last_modified: When the data of the response last changed.
+    :param max_age: Seconds the response may be cached for, if the
+                    response should have a Cache-Control header.
+    """
+    headers = {}
+    if etag is not None:
+        headers['ETag'] = '"%s"' % etag
+    if last_modified is not None:
+        headers['Last-Modified'] = datetime_utils.serialize_date(
+            last_modified)
+    if max_age is not None:
+        headers['Cache-Control'] = 'private, max-age=%d' % max_age
+
+    not_modified = False
+    if request.if_none_match:
+        not_modified = etag is not None and etag in request.if_none_match
+    elif last_modified is not None and request.if_modified_since:
+        since = request.if_modified_since.astimezone(datetime_utils.UTC)
+        not_modified = (last_modified.replace(microsecond=0) <=
+                        since.replace(tzinfo=None))
+
+    if not_modified:
+        return webob.Response(status_int=304, headers=headers)
+    request.environ.setdefault('cinder.response_headers', {}).update(headers)
+    return None
+
+
 def limited(items, request, max_limit=FLAGS.osapi_max_limit):
     """Return a slice of items according to requested offset and limit.
 
@@ -22,6 +22,7 @@ import webob.dec
 import webob.exc
 
 import cinder.api.openstack
+from cinder.api.openstack import common
 from cinder.api.openstack import wsgi
 from cinder.api.openstack import xmlutil
 from cinder import exception
@@ -29,6 +30,7 @@ from cinder import flags
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import exception as common_exception
 from cinder.openstack.common import importutils
+from cinder.openstack.common import timeutils
 import cinder.policy
 
 
@@ -136,8 +138,15 @@ class ExtensionsResource(wsgi.Resource):
 
     def __init__(self, extension_manager):
         self.extension_manager = extension_manager
+        self.loaded_at = timeutils.utcnow()
+        self._responses = {}
         super(ExtensionsResource, self).__init__(None)
 
+    def _check_not_modified(self, req, *parts):
+        etag = common.make_etag(req, None, *parts)
+        return common.check_not_modified(req, etag, self.loaded_at,
+                                         max_age=FLAGS.osapi_cache_max_age)
+
     def _translate(self, ext):
         ext_data = {}
         ext_data['name'] = ext.name
@@ -150,6 +159,15 @@ class ExtensionsResource(wsgi.Resource):
 
     @wsgi.serializers(xml=ExtensionsTemplate)
     def index(self, req):
+        not_modified = self._check_not_modified(
+            req, sorted(self.extension_manager.extensions.keys()))
+        if not_modified:
+            return not_modified
+
+        return wsgi.CachedResponseObject(self._responses, 'index',
+                                         self._build_index)
+
+    def _build_index(self):
         extensions = []
         for _alias, ext in self.extension_manager.extensions.iteritems():
             extensions.append(self._translate(ext))
@@ -163,7 +181,13 @@ class ExtensionsResource(wsgi.Resource):
         except KeyError:
             raise webob.exc.HTTPNotFound()
 
-        return dict(extension=self._translate(ext))
+        not_modified = self._check_not_modified(req, id)
+        if not_modified:
+            return not_modified
+
+        return wsgi.CachedResponseObject(
+            self._responses, ('show', id),
+            lambda: dict(extension=self._translate(ext)))
 
     def delete(self, req, id):
         raise webob.exc.HTTPNotFound()
@@ -0,0 +1,73 @@
+#   Copyright 2012 OpenStack, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+from cinder.api import instrumentation
+from cinder.api.openstack import extensions
+from cinder.api.openstack import wsgi
+from cinder.api.openstack import xmlutil
+
+
+authorize = extensions.extension_authorizer('volume', 'api_timing')
+
+
+class ApiTimingTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('api_timing')
+        elem = xmlutil.SubTemplateElement(root, 'route',
+                                          selector='api_timing')
+        elem.set('route')
+        elem.set('count')
+        elem.set('time')
+
+        bucket = xmlutil.SubTemplateElement(elem, 'bucket',
+                                            selector='buckets')
+        bucket.set('le')
+        bucket.set('count')
+
+        phase = xmlutil.SubTemplateElement(elem, 'phase', selector='phases')
+        phase.set('name')
+        phase.set('time')
+        phase.set('count')
+
+        return xmlutil.MasterTemplate(root, 1)
+
+
+class ApiTimingController(object):
+    """Request timings per route, as recorded by the timing middleware."""
+
+    @wsgi.serializers(xml=ApiTimingTemplate)
+    def index(self, req):
+        """Return the timings recorded by this API process.
+
+        Each worker of a multi-process API records its own timings.
+        """
+        context = req.environ['cinder.context']
+        authorize(context)
+        return {'api_timing': instrumentation.get_stats()}
+
+
+class Api_timing(extensions.ExtensionDescriptor):
+    """Request timing statistics per API route"""
+
+    name = "ApiTiming"
+    alias = "os-api-timing"
+    namespace = "http://docs.openstack.org/volume/ext/api-timing/api/v1"
+    updated = "2012-12-01T00:00:00+00:00"
+
+    def get_resources(self):
+        resources = []
+        res = extensions.ResourceExtension('os-api-timing',
+                                           ApiTimingController())
+        resources.append(res)
+        return resources
@@ -0,0 +1,165 @@
+#   Copyright 2012 OpenStack, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+from webob import exc
+
+from cinder.api.openstack import extensions
+from cinder.api.openstack.volume.contrib import admin_actions
+from cinder.api.openstack import wsgi
+from cinder.api.openstack import xmlutil
+from cinder import db
+from cinder import exception
+from cinder import flags
+from cinder.openstack.common import cfg
+from cinder.openstack.common import log as logging
+from cinder import volume
+
+
+bulk_opts = [
+    cfg.IntOpt('osapi_bulk_max_items',
+               default=1000,
+               help='Maximum number of volumes in one bulk action'),
+]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(bulk_opts)
+LOG = logging.getLogger(__name__)
+
+
+class BulkResultsTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('results')
+        elem = xmlutil.SubTemplateElement(root, 'result', selector='results')
+        elem.set('id')
+        elem.set('code')
+        elem.set('message')
+        return xmlutil.MasterTemplate(root, 1)
+
+
+def _format_results(results):
+    """Convert a dict of id to None or exception into result dicts."""
+    formatted = []
+    for volume_id in sorted(results.keys()):
+        error = results[volume_id]
+        if error is None:
+            formatted.append({'id': volume_id, 'code': 202})
+        else:
+            formatted.append({'id': volume_id,
+                              'code': getattr(error, 'code', 500),
+                              'message': unicode(error)})
+    return {'results': formatted}
+
+
+class VolumeBulkActionsController(wsgi.Controller):
+    """Actions on many volumes per request.
+
+    Each action takes a list of volume_ids and returns one result per
+    volume, with the HTTP code the single volume action would have
+    returned.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(VolumeBulkActionsController, self).__init__(*args, **kwargs)
+        self.volume_api = volume.API()
+
+    def _get_volume_ids(self, body):
+        try:
+            volume_ids = body['volume_ids']
+        except (TypeError, KeyError):
+            raise exc.HTTPBadRequest(explanation=_("Must specify "
+                                                   "'volume_ids'"))
+        if not isinstance(volume_ids, list):
+            msg = _("'volume_ids' must be a list")
+            raise exc.HTTPBadRequest(explanation=msg)
+        if len(volume_ids) > FLAGS.osapi_bulk_max_items:
+            msg = (_("At most %d volumes can be given") %
+                   FLAGS.osapi_bulk_max_items)
+            raise exc.HTTPBadRequest(explanation=msg)
+        if not all(isinstance(volume_id, basestring)
+                   for volume_id in volume_ids):
+            msg = _("'volume_ids' must be a list of strings")
+            raise exc.HTTPBadRequest(explanation=msg)
+        # Drop duplicates, keeping one result per volume
+        return list(set(volume_ids))
+
+    @wsgi.action('os-delete')
+    @wsgi.serializers(xml=BulkResultsTemplate)
+    def _delete(self, req, body):
+        """Delete many volumes."""
+        context = req.environ['cinder.context']
+        volume_ids = self._get_volume_ids(body['os-delete'])
+        force = body['os-delete'].get('force', False)
+        if force:
+            extensions.extension_authorizer(
+                'volume', 'volume_admin_actions:force_delete')(context)
+        LOG.audit(_("Delete %d volumes"), len(volume_ids), context=context)
+        results = self.volume_api.delete_all(context, volume_ids, force=force)
+        return _format_results(results)
+
+    @wsgi.action('os-set_metadata')
+    @wsgi.serializers(xml=BulkResultsTemplate)
+    def _set_metadata(self, req, body):
+        """Add or update metadata items on many volumes."""
+        context = req.environ['cinder.context']
+        volume_ids = self._get_volume_ids(body['os-set_metadata'])
+        metadata = body['os-set_metadata'].get('metadata')
+        if not isinstance(metadata, dict):
+            msg = _("Must specify 'metadata' as a dict")
+            raise exc.HTTPBadRequest(explanation=msg)
+        results = self.volume_api.update_volume_metadata_all(context,
+                                                            volume_ids,
+                                                            metadata)
+        return _format_results(results)
+
+    @wsgi.action('os-reset_status')
+    @wsgi.serializers(xml=BulkResultsTemplate)
+    def _reset_status(self, req, body):
+        """Reset the status of many volumes."""
+        context = req.environ['cinder.context']
+        extensions.extension_authorizer(
+            'volume', 'volume_admin_actions:reset_status')(context)
+        volume_ids = self._get_volume_ids(body['os-reset_status'])
+        status = body['os-reset_status'].get('status')
+        if status not in admin_actions.VolumeAdminController.valid_status:
+            raise exc.HTTPBadRequest(explanation=_("Must specify a valid "
+                                                   "status"))
+
+        found = [v['id'] for v in db.volume_get_all_by_ids(context,
+                                                           volume_ids)]
+        LOG.debug(_("Updating %(count)d volumes with status '%(status)s'"),
+                  {'count': len(found), 'status': status})
+        db.volume_update_all(context, found, {'status': status})
+
+        results = dict.fromkeys(found)
+        for volume_id in set(volume_ids) - set(found):
+            results[volume_id] = exception.VolumeNotFound(volume_id=volume_id)
+        return _format_results(results)
+
+
+class Volume_bulk_actions(extensions.ExtensionDescriptor):
+    """Delete, set metadata on or reset the status of many volumes at once"""
+
+    name = "VolumeBulkActions"
+    alias = "os-volume-bulk-actions"
+    namespace = ("http://docs.openstack.org/volume/ext/"
+                 "volume-bulk-actions/api/v1")
+    updated = "2012-12-01T00:00:00+00:00"
+
+    def get_resources(self):
+        resources = []
+        res = extensions.ResourceExtension(
+            'os-volume-bulk-actions', VolumeBulkActionsController(),
+            collection_actions={'action': 'POST'})
+        resources.append(res)
+        return resources
@@ -17,11 +17,15 @@
 Module dedicated functions/classes dealing with rate limiting requests.
 """
 
-import collections
-import copy
+import hashlib
+import heapq
 import httplib
 import math
+import mmap
+import multiprocessing
 import re
+import socket
+import struct
 import time
 
 import webob.dec
@@ -30,11 +34,34 @@ import webob.exc
 from cinder.api.openstack.volume.views import limits as limits_views
 from cinder.api.openstack import wsgi
 from cinder.api.openstack import xmlutil
+from cinder import flags
+from cinder.openstack.common import cfg
 from cinder.openstack.common import importutils
 from cinder.openstack.common import jsonutils
 from cinder import quota
 from cinder import wsgi as base_wsgi
 
+limits_opts = [
+    cfg.StrOpt('rate_limit_store',
+               default='cinder.api.openstack.volume.limits.MemoryLimitStore',
+               help='Class keeping the rate limit state. '
+                    'SharedMemoryLimitStore shares it between the API '
+                    'worker processes of a node, so they enforce a single '
+                    'budget per user'),
+    cfg.IntOpt('rate_limit_buckets',
+               default=10000,
+               help='Maximum number of rate limit buckets (one per user and '
+                    'limit) to keep. The least recently used are forgotten '
+                    'first'),
+    cfg.IntOpt('rate_limit_proxy_connections',
+               default=10,
+               help='Maximum number of idle connections WsgiLimiterProxy '
+                    'keeps open to the limiter'),
+]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(limits_opts)
+
 QUOTAS = quota.QUOTAS
 
 
@@ -127,6 +154,7 @@ class Limit(object):
         self.verb = verb
         self.uri = uri
         self.regex = regex
+        self._regex = None
         self.value = int(value)
         self.unit = unit
         self.unit_string = self.display_unit().lower()
@@ -152,35 +180,59 @@ class Limit(object):
         @param verb: string http verb (POST, GET, etc.)
         @param url: string URL
         """
-        if self.verb != verb or not re.match(self.regex, url):
+        if self.verb != verb or not self.match(url):
             return
 
-        now = self._get_time()
+        state = None
+        if self.last_request is not None:
+            state = (self.water_level, self.last_request, self.next_request,
+                     self.remaining)
+
+        state, delay = self.consume(state, self._get_time())
+        (self.water_level, self.last_request, self.next_request,
+         self.remaining) = state
+        return delay
 
-        if self.last_request is None:
-            self.last_request = now
+    def match(self, url):
+        """Check whether url is one this limit applies to."""
+        if self._regex is None:
+            self._regex = re.compile(self.regex)
+        return self._regex.match(url) is not None
 
-        leak_value = now - self.last_request
+    def consume(self, state, now):
+        """
+        Pour a request into a leaky bucket for this limit.
+
+        @param state: Tuple of water level, time of the last request, time
+                      of the next allowed request and remaining requests of
+                      the bucket, or None for a new bucket
+        @param now: Time of the request
+        @return: Tuple of the new state of the bucket and the delay before
+                 the request can be made, or None if it can be made now
+        """
+        if state is None:
+            water_level, last_request, next_request, remaining = \
+                0, now, None, self.value
+        else:
+            water_level, last_request, next_request, remaining = state
 
-        self.water_level -= leak_value
-        self.water_level = max(self.water_level, 0)
-        self.water_level += self.request_value
+        leak_value = now - last_request
 
-        difference = self.water_level - self.capacity
+        water_level -= leak_value
+        water_level = max(water_level, 0)
+        water_level += self.request_value
 
-        self.last_request = now
+        difference = water_level - self.capacity
 
         if difference > 0:
-            self.water_level -= self.request_value
-            self.next_request = now + difference
-            return difference
+            water_level -= self.request_value
+            return (water_level, now, now + difference, remaining), difference
 
         cap = self.capacity
-        water = self.water_level
         val = self.value
 
-        self.remaining = math.floor(((cap - water) / cap) * val)
-        self.next_request = now
+        remaining = math.floor(((cap - water_level) / cap) * val)
+        return (water_level, now, now, remaining), None
 
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
@@ -190,16 +242,24 @@ class Limit(object):
         """Display the string name of the unit."""
         return self.UNITS.get(self.unit, "UNKNOWN")
 
-    def display(self):
-        """Return a useful representation of this class."""
+    def display(self, state=None):
+        """
+        Return a useful representation of this class.
+
+        @param state: State of the bucket to report on, as returned by
+                      consume(), instead of the state of this limit
+        """
+        remaining, next_request = self.remaining, self.next_request
+        if state is not None:
+            remaining, next_request = state[3], state[2]
         return {
             "verb": self.verb,
             "URI": self.uri,
             "regex": self.regex,
             "value": self.value,
-            "remaining": int(self.remaining),
+            "remaining": int(remaining),
             "unit": self.display_unit(),
-            "resetTime": int(self.next_request or self._get_time()),
+            "resetTime": int(next_request or self._get_time()),
         }
 
 # "Limit" format is a dictionary with the HTTP verb, human-readable URI,
@@ -276,9 +336,118 @@ class RateLimitingMiddleware(base_wsgi.Middleware):
         return self.application
 
 
+class MemoryLimitStore(object):
+    """
+    Keeps the leaky buckets of the most recently seen users in memory.
+    """
+
+    def __init__(self, max_buckets):
+        """
+        Initialize the new `MemoryLimitStore`.
+
+        @param max_buckets: Number of buckets kept before the least recently
+                            used ones are forgotten
+        """
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._clock = 0
+
+    def get(self, key):
+        """Return the state of a bucket, or None if there is none."""
+        bucket = self._buckets.get(key)
+        return bucket and bucket[0]
+
+    def update(self, key, func):
+        """
+        Replace the state of a bucket with the first item returned by
+        func(state), and return the second.
+        """
+        bucket = self._buckets.get(key)
+        state, result = func(bucket and bucket[0])
+        self._clock += 1
+        self._buckets[key] = (state, self._clock)
+        if len(self._buckets) > self.max_buckets:
+            self._evict()
+        return result
+
+    def _evict(self):
+        # Forget a tenth of the buckets at a time so the cost of finding
+        # the least recently used ones is spread over many updates.
+        count = max(len(self._buckets) - self.max_buckets,
+                    self.max_buckets / 10)
+        for key, _bucket in heapq.nsmallest(count, self._buckets.iteritems(),
+                                            key=lambda item: item[1][1]):
+            del self._buckets[key]
+
+
+class SharedMemoryLimitStore(object):
+    """
+    Keeps leaky buckets in memory shared by the API worker processes.
+
+    The buckets live in an anonymous shared mapping created when the
+    middleware is loaded, which happens before cinder-api forks its workers
+    (see osapi_volume_workers), so every worker updates the same buckets.
+    A key can only go in one of a few slots of the table. When they are all
+    taken, the one used least recently is reused.
+    """
+
+    _slot = struct.Struct('=Q4d')
+    _probes = 8
+
+    def __init__(self, max_buckets):
+        """
+        Initialize the new `SharedMemoryLimitStore`.
+
+        @param max_buckets: Number of slots of the table
+        """
+        self.max_buckets = max_buckets
+        self._map = mmap.mmap(-1, self._slot.size * max_buckets)
+        self._lock = multiprocessing.Lock()
+
+    def _hash(self, key):
+        digest = hashlib.md5(repr(key)).digest()
+        return struct.unpack('=Q', digest[:8])[0] or 1
+
+    def _find(self, key_hash):
+        """Return the offset of the slot for key_hash and its state."""
+        oldest = None
+        start = key_hash % self.max_buckets
+        for probe in xrange(min(self._probes, self.max_buckets)):
+            offset = ((start + probe) % self.max_buckets) * self._slot.size
+            slot = self._slot.unpack_from(self._map, offset)
+            if slot[0] == key_hash:
+                return offset, slot[1:]
+            if slot[0] == 0:
+                return offset, None
+            if oldest is None or slot[2] < oldest[1]:
+                oldest = (offset, slot[2])
+        return oldest[0], None
+
+    def get(self, key):
+        """Return the state of a bucket, or None if there is none."""
+        with self._lock:
+            return self._find(self._hash(key))[1]
+
+    def update(self, key, func):
+        """
+        Replace the state of a bucket with the first item returned by
+        func(state), and return the second.
+        """
+        key_hash = self._hash(key)
+        with self._lock:
+            offset, state = self._find(key_hash)
+            state, result = func(state)
+            water_level, last_request, next_request, remaining = state
+            self._slot.pack_into(self._map, offset, key_hash, water_level,
+                                 last_request, next_request or 0, remaining)
+        return result
+
+
 class Limiter(object):
     """
     Rate-limit checking class which handles limits in memory.
+
+    The state of the limits is kept per user in FLAGS.rate_limit_store.
     """
 
     def __init__(self, limits, **kwargs):
@@ -287,8 +456,8 @@ class Limiter(object):
 
         @param limits: List of `Limit` objects
         """
-        self.limits = copy.deepcopy(limits)
-        self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self.limits = list(limits)
+        self.levels = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
@@ -296,11 +465,29 @@ class Limiter(object):
                 username = key[5:]
                 self.levels[username] = self.parse_limits(value)
 
+        # Index the limits by verb, so a request is only matched against
+        # the limits for its verb.
+        self._routes = {None: self._index(self.limits)}
+        for username, user_limits in self.levels.items():
+            self._routes[username] = self._index(user_limits)
+
+        self.store = importutils.import_object(FLAGS.rate_limit_store,
+                                               FLAGS.rate_limit_buckets)
+
+    @staticmethod
+    def _index(limits):
+        routes = {}
+        for index, limit in enumerate(limits):
+            routes.setdefault(limit.verb, []).append((index, limit))
+        return routes
+
     def get_limits(self, username=None):
         """
         Return the limits for a given user.
         """
-        return [limit.display() for limit in self.levels[username]]
+        limits = self.levels.get(username, self.limits)
+        return [limit.display(self.store.get((username, index)))
+                for index, limit in enumerate(limits)]
 
     def check_for_delay(self, verb, url, username=None):
         """
@@ -310,8 +497,17 @@ class Limiter(object):
         """
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        if username in self._routes:
+            routes = self._routes[username]
+        else:
+            routes = self._routes[None]
+
+        for index, limit in routes.get(verb, []):
+            if not limit.match(url):
+                continue
+            now = limit._get_time()
+            delay = self.store.update((username, index),
+                                      lambda state: limit.consume(state, now))
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -446,24 +642,47 @@ class WsgiLimiterProxy(object):
         @param limiter_address: IP/port combination of where to request limit
         """
         self.limiter_address = limiter_address
+        self._connections = []
+
+    def _request(self, conn, path, body, headers):
+        conn.request("POST", path, body, headers)
+        resp = conn.getresponse()
+        # Read the whole response, so the connection can be reused.
+        return resp, resp.read()
 
     def check_for_delay(self, verb, path, username=None):
         body = jsonutils.dumps({"verb": verb, "path": path})
         headers = {"Content-Type": "application/json"}
-
-        conn = httplib.HTTPConnection(self.limiter_address)
-
-        if username:
-            conn.request("POST", "/%s" % (username), body, headers)
+        path = "/%s" % (username or "")
+
+        # Connections are kept open between requests. One that has been
+        # idle may have been closed by the limiter, so retry once on a new
+        # connection when a pooled one fails.
+        pooled = bool(self._connections)
+        if pooled:
+            conn = self._connections.pop()
         else:
-            conn.request("POST", "/", body, headers)
+            conn = httplib.HTTPConnection(self.limiter_address)
 
-        resp = conn.getresponse()
+        try:
+            resp, content = self._request(conn, path, body, headers)
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            if not pooled:
+                raise
+            conn = httplib.HTTPConnection(self.limiter_address)
+            resp, content = self._request(conn, path, body, headers)
+
+        if (resp.will_close or
+                len(self._connections) >= FLAGS.rate_limit_proxy_connections):
+            conn.close()
+        else:
+            self._connections.append(conn)
 
-        if 200 >= resp.status < 300:
+        if 200 <= resp.status < 300:
             return None, None
 
-        return resp.getheader("X-Wait-Seconds"), resp.read() or None
+        return resp.getheader("X-Wait-Seconds"), content or None
 
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
@@ -59,6 +59,17 @@ def _translate_snapshot_summary_view(context, snapshot):
     return d
 
 
+def _snapshot_etag(req, snapshot):
+    """Return the ETag of the views of snapshot."""
+    parts = [snapshot.get(key) for key in ('id', 'status', 'volume_size',
+                                           'created_at', 'updated_at',
+                                           'display_name',
+                                           'display_description',
+                                           'volume_id', 'project_id',
+                                           'progress')]
+    return common.make_etag(req, snapshot.get('updated_at'), *parts)
+
+
 def make_snapshot(elem):
     elem.set('id')
     elem.set('status')
@@ -103,6 +114,11 @@ class SnapshotsController(wsgi.Controller):
         except exception.NotFound:
             raise exc.HTTPNotFound()
 
+        not_modified = common.check_not_modified(req,
+                                                 _snapshot_etag(req, vol))
+        if not_modified:
+            return not_modified
+
         return {'snapshot': _translate_snapshot_detail_view(context, vol)}
 
     def delete(self, req, id):
@@ -138,6 +154,13 @@ class SnapshotsController(wsgi.Controller):
         volumes.remove_invalid_options(context, search_opts,
                                        allowed_search_options)
 
+        count, changed_at = self.volume_api.get_snapshot_changes(context,
+                                                                 search_opts)
+        etag = common.make_etag(req, changed_at, count, changed_at)
+        not_modified = common.check_not_modified(req, etag)
+        if not_modified:
+            return not_modified
+
         snapshots = self.volume_api.get_all_snapshots(context,
                                                       search_opts=search_opts)
         limited_list = common.limited(snapshots, req)
@@ -19,13 +19,18 @@
 
 from webob import exc
 
+from cinder.api.openstack import common
 from cinder.api.openstack import wsgi
 from cinder.api.openstack import xmlutil
 from cinder.api.openstack.volume.views import types as views_types
 from cinder import exception
+from cinder import flags
 from cinder.volume import volume_types
 
 
+FLAGS = flags.FLAGS
+
+
 def make_voltype(elem):
     elem.set('id')
     elem.set('name')
@@ -58,6 +63,15 @@ class VolumeTypesController(wsgi.Controller):
     def index(self, req):
         """ Returns the list of volume types """
         context = req.environ['cinder.context']
+
+        count, changed_at = volume_types.get_all_types_changes(context)
+        etag = common.make_etag(req, changed_at, count, changed_at)
+        not_modified = common.check_not_modified(
+            req, etag, changed_at if etag else None,
+            max_age=FLAGS.osapi_cache_max_age)
+        if not_modified:
+            return not_modified
+
         vol_types = volume_types.get_all_types(context).values()
         return self._view_builder.index(req, vol_types)
 
@@ -71,6 +85,15 @@ class VolumeTypesController(wsgi.Controller):
         except exception.NotFound:
             raise exc.HTTPNotFound()
 
+        changed_at = vol_type.get('updated_at') or vol_type.get('created_at')
+        etag = common.make_etag(req, changed_at, vol_type['id'],
+                                vol_type['name'], changed_at,
+                                sorted(vol_type['extra_specs'].items()))
+        not_modified = common.check_not_modified(
+            req, etag, max_age=FLAGS.osapi_cache_max_age)
+        if not_modified:
+            return not_modified
+
         # TODO(bcwaldon): remove str cast once we use uuids
         vol_type['id'] = str(vol_type['id'])
         return self._view_builder.show(req, vol_type)
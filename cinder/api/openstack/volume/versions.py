@@ -200,20 +200,26 @@ class Versions(wsgi.Resource):
 
     def __init__(self):
         super(Versions, self).__init__(None)
+        # Serialized responses, by the URL they were built for
+        self._responses = {}
 
     @wsgi.serializers(xml=VersionsTemplate,
                       atom=VersionsAtomSerializer)
     def index(self, req):
         """Return all versions."""
         builder = views_versions.get_view_builder(req)
-        return builder.build_versions(VERSIONS)
+        return wsgi.CachedResponseObject(
+            self._responses, ('index', req.application_url),
+            lambda: builder.build_versions(VERSIONS))
 
     @wsgi.serializers(xml=ChoicesTemplate)
     @wsgi.response(300)
     def multi(self, req):
         """Return multiple choices."""
         builder = views_versions.get_view_builder(req)
-        return builder.build_choices(VERSIONS, req)
+        return wsgi.CachedResponseObject(
+            self._responses, ('multi', req.application_url, req.path),
+            lambda: builder.build_choices(VERSIONS, req))
 
     def get_action_args(self, request_environment):
         """Parse dictionary created by routes library."""
@@ -227,11 +233,16 @@ class Versions(wsgi.Resource):
 
 
 class VolumeVersionV1(object):
+    def __init__(self):
+        self._responses = {}
+
     @wsgi.serializers(xml=VersionTemplate,
                       atom=VersionAtomSerializer)
     def show(self, req):
         builder = views_versions.get_view_builder(req)
-        return builder.build_version(VERSIONS['v1.0'])
+        return wsgi.CachedResponseObject(
+            self._responses, req.application_url,
+            lambda: builder.build_version(VERSIONS['v1.0']))
 
 
 def create_resource():
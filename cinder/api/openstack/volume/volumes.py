@@ -113,6 +113,19 @@ def _translate_volume_summary_view(context, vol, image_id=None):
     return d
 
 
+def _volume_etag(req, vol):
+    """Return the ETag of the views of vol."""
+    metadata = sorted([(item['key'], item['value'])
+                       for item in vol.get('volume_metadata') or []])
+    parts = [vol.get(key) for key in ('id', 'status', 'size',
+                                      'availability_zone', 'created_at',
+                                      'updated_at', 'attach_status',
+                                      'instance_uuid', 'mountpoint',
+                                      'display_name', 'display_description',
+                                      'volume_type_id', 'snapshot_id')]
+    return common.make_etag(req, vol.get('updated_at'), metadata, *parts)
+
+
 def make_attachment(elem):
     elem.set('id')
     elem.set('server_id')
@@ -217,6 +230,10 @@ class VolumeController(wsgi.Controller):
         except exception.NotFound:
             raise exc.HTTPNotFound()
 
+        not_modified = common.check_not_modified(req, _volume_etag(req, vol))
+        if not_modified:
+            return not_modified
+
         return {'volume': _translate_volume_detail_view(context, vol)}
 
     def delete(self, req, id):
@@ -252,6 +269,12 @@ class VolumeController(wsgi.Controller):
         remove_invalid_options(context,
                                search_opts, self._get_volume_search_options())
 
+        count, changed_at = self.volume_api.get_changes(context, search_opts)
+        etag = common.make_etag(req, changed_at, count, changed_at)
+        not_modified = common.check_not_modified(req, etag)
+        if not_modified:
+            return not_modified
+
         volumes = self.volume_api.get_all(context, search_opts=search_opts)
         limited_list = common.limited(volumes, req)
         res = [entity_maker(context, vol) for vol in limited_list]
@@ -21,9 +21,12 @@ import time
 import webob
 
 from cinder import exception
+from cinder import flags
 from cinder import wsgi
+from cinder.openstack.common import cfg
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import jsonutils
+from cinder.openstack.common import timing
 
 from lxml import etree
 from xml.dom import minidom
@@ -35,6 +38,16 @@ XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
 LOG = logging.getLogger(__name__)
 
+wsgi_opts = [
+    cfg.IntOpt('osapi_stream_chunk_size',
+               default=100,
+               help='Collections with more items than this are serialized '
+                    'and sent this many items at a time, 0 to disable'),
+]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(wsgi_opts)
+
 # The vendor content types should serialize identically to the non-vendor
 # content types. So to avoid littering the code with both options, we
 # map the vendor to the other when looking up the type
@@ -58,6 +71,10 @@ _MEDIA_TYPE_MAP = {
     'application/atom+xml': 'atom',
 }
 
+# Bound on the bodies a CachedResponseObject cache holds, as keys may
+# include the Host the client asked for
+MAX_CACHED_BODIES = 64
+
 
 class Request(webob.Request):
     """Add some OpenStack API-specific logic to the base webob.Request."""
@@ -235,6 +252,14 @@ class DictSerializer(ActionDispatcher):
     def default(self, data):
         return ""
 
+    def stream(self, data, key, chunk_size):
+        """Serialize data into an iterator of strings.
+
+        Serializers able to do so serialize the list in data[key]
+        chunk_size items at a time; this one serializes it all at once.
+        """
+        yield self.serialize(data)
+
 
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization"""
@@ -242,6 +267,29 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def stream(self, data, key, chunk_size):
+        """Serialize data as JSON, chunk_size items of data[key] at a time.
+
+        The output is the same as serialize() would return.
+        """
+        before = []
+        after = []
+        parts = before
+        for name, value in data.items():
+            if name == key:
+                parts = after
+                continue
+            parts.append('%s: %s' % (jsonutils.dumps(name),
+                                     jsonutils.dumps(value)))
+
+        yield '{' + ', '.join(before + ['%s: [' % jsonutils.dumps(key)])
+        items = data[key]
+        for start in xrange(0, len(items), chunk_size):
+            chunk = ', '.join([jsonutils.dumps(item)
+                               for item in items[start:start + chunk_size]])
+            yield chunk if start == 0 else ', ' + chunk
+        yield ']' + ''.join([', ' + part for part in after]) + '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -490,11 +538,23 @@ class ResponseObject(object):
         if self.media_type in kwargs:
             self.serializer.attach(kwargs[self.media_type])
 
+    def _stream_key(self):
+        """Return the key of a collection large enough to be streamed."""
+
+        chunk_size = FLAGS.osapi_stream_chunk_size
+        if chunk_size <= 0 or not isinstance(self.obj, dict):
+            return None
+        for key, value in self.obj.items():
+            if isinstance(value, list) and len(value) > chunk_size:
+                return key
+        return None
+
     def serialize(self, request, content_type, default_serializers=None):
         """Serializes the wrapped object.
 
         Utility method for serializing the wrapped object.  Returns a
-        webob.Response object.
+        webob.Response object.  Large collections are serialized while
+        the body is sent, if the serializer supports it.
         """
 
         if self.serializer:
@@ -504,14 +564,25 @@ class ResponseObject(object):
                                                       default_serializers)
             serializer = _serializer()
 
+        response = self._make_response(content_type)
+        if self.obj is not None:
+            key = self._stream_key()
+            if key is not None and hasattr(serializer, 'stream'):
+                response.app_iter = serializer.stream(
+                    self.obj, key, FLAGS.osapi_stream_chunk_size)
+            else:
+                response.body = serializer.serialize(self.obj)
+
+        return response
+
+    def _make_response(self, content_type):
+        """Return a webob.Response with the status and headers set."""
+
         response = webob.Response()
         response.status_int = self.code
         for hdr, value in self._headers.items():
             response.headers[hdr] = value
         response.headers['Content-Type'] = content_type
-        if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
-
         return response
 
     @property
@@ -527,6 +598,51 @@ class ResponseObject(object):
         return self._headers.copy()
 
 
+class CachedResponseObject(ResponseObject):
+    """A response object whose serialized bodies are kept in a cache.
+
+    Meant for documents that only change with the process, such as the
+    version and extension listings.  The first time one is served in a
+    content type, builder() is called and the result serialized into
+    cache under (key, content type); after that the body is sent from
+    the cache and builder is not called at all.  key must capture
+    whatever else the response depends on.
+    """
+
+    def __init__(self, cache, key, builder, code=None, **serializers):
+        self._cache = cache
+        self._key = key
+        self._builder = builder
+        super(CachedResponseObject, self).__init__(None, code, **serializers)
+
+    def _get_obj(self):
+        if self._obj is None:
+            self._obj = self._builder()
+        return self._obj
+
+    def _set_obj(self, obj):
+        self._obj = obj
+
+    obj = property(_get_obj, _set_obj)
+
+    def serialize(self, request, content_type, default_serializers=None):
+        """Serializes the wrapped object, or reuses a cached body."""
+
+        cache_key = (self._key, content_type)
+        body = self._cache.get(cache_key)
+        if body is not None:
+            response = self._make_response(content_type)
+            response.body = body
+            return response
+
+        response = super(CachedResponseObject, self).serialize(
+            request, content_type, default_serializers)
+        if len(self._cache) >= MAX_CACHED_BODIES:
+            self._cache.clear()
+        self._cache[cache_key] = response.body
+        return response
+
+
 def action_peek_json(body):
     """Determine action to invoke."""
 
@@ -820,7 +936,8 @@ class Resource(wsgi.Application):
         # Now, deserialize the request body...
         try:
             if content_type:
-                contents = self.deserialize(meth, content_type, body)
+                with timing.phase('deserialize'):
+                    contents = self.deserialize(meth, content_type, body)
             else:
                 contents = {}
         except exception.InvalidContentType:
@@ -839,6 +956,33 @@ class Resource(wsgi.Application):
             msg = _("Malformed request url")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
+        with timing.phase('controller'):
+            response, resp_obj = self._run_action(meth, extensions, request,
+                                                  action_args, accept)
+
+        if resp_obj is not None:
+            with timing.phase('serialize'):
+                response = resp_obj.serialize(request, accept,
+                                              self.default_serializers)
+
+        try:
+            msg_dict = dict(url=request.url, status=response.status_int)
+            msg = _("%(url)s returned with HTTP %(status)d") % msg_dict
+        except AttributeError, e:
+            msg_dict = dict(url=request.url, e=e)
+            msg = _("%(url)s returned a fault: %(e)s") % msg_dict
+
+        LOG.info(msg)
+
+        return response
+
+    def _run_action(self, meth, extensions, request, action_args, accept):
+        """Run the action and its extensions.
+
+        Returns a (response, resp_obj) tuple, where resp_obj is a
+        ResponseObject that still needs serializing if response is None.
+        """
+
         # Run pre-processing extensions
         response, post = self.pre_process_extensions(extensions,
                                                      request, action_args)
@@ -864,6 +1008,9 @@ class Resource(wsgi.Application):
             # Run post-processing extensions
             if resp_obj:
                 _set_request_id_header(request, resp_obj)
+                headers = request.environ.get('cinder.response_headers', {})
+                for hdr, value in headers.items():
+                    resp_obj[hdr] = value
                 # Do a preserialize to set up the response object
                 serializers = getattr(meth, 'wsgi_serializers', {})
                 resp_obj._bind_method_serializers(serializers)
@@ -876,19 +1023,9 @@ class Resource(wsgi.Application):
                                                         request, action_args)
 
             if resp_obj and not response:
-                response = resp_obj.serialize(request, accept,
-                                              self.default_serializers)
-
-        try:
-            msg_dict = dict(url=request.url, status=response.status_int)
-            msg = _("%(url)s returned with HTTP %(status)d") % msg_dict
-        except AttributeError, e:
-            msg_dict = dict(url=request.url, e=e)
-            msg = _("%(url)s returned a fault: %(e)s") % msg_dict
-
-        LOG.info(msg)
+                return None, resp_obj
 
-        return response
+        return response, None
 
     def get_method(self, request, action, content_type, body):
         """Look up the action-specific method and its extensions."""
@@ -28,6 +28,14 @@ XMLNS_COMMON_V10 = 'http://docs.openstack.org/common/api/v1.0'
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 XMLNS_VOLUME_V1 = 'http://docs.openstack.org/volume/api/v1'
 
+# Bumped whenever a template element changes, to invalidate compiled
+# templates.
+_GENERATION = [0]
+
+
+def _template_changed():
+    _GENERATION[0] += 1
+
 
 def validate_schema(xml, schema_name):
     if isinstance(xml, str):
@@ -220,6 +228,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _template_changed()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -241,6 +250,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _template_changed()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -254,6 +264,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _template_changed()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -267,6 +278,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _template_changed()
 
     def get(self, key):
         """Get an attribute.
@@ -297,6 +309,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        _template_changed()
 
     def keys(self):
         """Return the attribute names."""
@@ -454,9 +467,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        _template_changed()
 
     def _text_del(self):
         self._text = None
+        _template_changed()
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -593,6 +608,50 @@ class Template(object):
         # Serialize it into XML
         return etree.tostring(elem, *args, **kwargs)
 
+    def stream(self, obj, key, chunk_size):
+        """Serialize an object into an iterator of strings.
+
+        The list in obj[key] is rendered and serialized chunk_size
+        items at a time, instead of building the whole tree at once.
+        The output is the same as serialize() would return.  Only
+        objects holding nothing but that list are streamed; anything
+        else is serialized at once.
+
+        :param obj: The object to serialize.
+        :param key: The key of the list to serialize incrementally.
+        :param chunk_size: The number of items to serialize at a time.
+        """
+
+        # Render the root element without any items, so we get the
+        # start and end tags to put the items between
+        empty = None
+        if len(obj) == 1 and obj[key]:
+            empty = self.make_tree({key: []})
+        if empty is None or len(empty) or empty.text:
+            yield self.serialize(obj)
+            return
+
+        empty.text = ''
+        encoding = self.serialize_options.get('encoding')
+        head = etree.tostring(empty, **self.serialize_options)
+        start_tag = etree.tostring(empty, encoding=encoding)
+        end = start_tag.rindex('</')
+        start_tag, end_tag = start_tag[:end], start_tag[end:]
+        yield head[:head.rindex('</')]
+
+        items = obj[key]
+        for start in xrange(0, len(items), chunk_size):
+            elem = self.make_tree({key: items[start:start + chunk_size]})
+            chunk = etree.tostring(elem, encoding=encoding)
+            if chunk.startswith(start_tag) and chunk.endswith(end_tag):
+                yield chunk[len(start_tag):-len(end_tag)]
+            else:
+                # The items declare namespaces of their own
+                for child in elem:
+                    yield etree.tostring(child, encoding=encoding)
+
+        yield end_tag
+
     def make_tree(self, obj):
         """Create a tree.
 
@@ -606,12 +665,29 @@ class Template(object):
         if self.root is None:
             return None
 
-        # Get the siblings and nsmap of the root element
+        # Render the tree with the compiled template
+        return self.compile().render(None, obj)
+
+    def compile(self):
+        """Compile the template into a CompiledElement.
+
+        Compiled templates are cached with the root element, for
+        this template and its siblings.
+        """
+
         siblings = self._siblings()
-        nsmap = self._nsmap()
+        key = tuple(siblings)
+        cache = self.root.__dict__.setdefault('_compiled', {})
+        try:
+            generation, compiled = cache[key]
+            if generation == _GENERATION[0]:
+                return compiled
+        except KeyError:
+            pass
 
-        # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        compiled = CompiledElement(siblings, self._nsmap())
+        cache[key] = (_GENERATION[0], compiled)
+        return compiled
 
     def _siblings(self):
         """Hook method for computing root siblings.
@@ -663,6 +739,133 @@ class Template(object):
         return "%r: %s" % (self, self.root.tree())
 
 
+def _compile_selector(selector):
+    """Return a faster equivalent of a plain single key Selector."""
+
+    if (type(selector) is not Selector or len(selector.chain) != 1 or
+            callable(selector.chain[0])):
+        return selector
+
+    key = selector.chain[0]
+
+    def select(obj, do_raise=False):
+        try:
+            return obj[key]
+        except (KeyError, IndexError):
+            if do_raise:
+                raise KeyError(key)
+            return None
+    return select
+
+
+class CompiledElement(object):
+    """A template element compiled together with its siblings.
+
+    Renders the same tree as Template._serialize() does for the
+    sibling template elements, with the children, selectors, text and
+    attributes of all the siblings resolved once at compile time.
+    """
+
+    def __init__(self, siblings, nsmap=None):
+        """Compile the template elements.
+
+        :param siblings: The TemplateElement instances to compile; the
+                         first one is rendered, the others are applied
+                         to it.
+        :param nsmap: An optional namespace dictionary to be
+                      associated with the etree.Element instances.
+        """
+
+        elem = siblings[0]
+        self.tag = elem.tag
+        self.nsmap = nsmap
+        self.selector = _compile_selector(elem.selector)
+        self.subselector = None
+        if elem.subselector is not None:
+            self.subselector = _compile_selector(elem.subselector)
+        self.will_render = None
+        if (getattr(elem.will_render, 'im_func', None) is not
+                TemplateElement.will_render.im_func):
+            self.will_render = elem.will_render
+
+        self.text = None
+        self.attrib = []
+        for sibling in siblings:
+            if sibling.text is not None:
+                self.text = _compile_selector(sibling.text)
+            self.attrib.extend([(key, _compile_selector(value))
+                                for key, value in sibling.attrib.items()])
+
+        # Pair up the children the way Template._serialize() does
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(CompiledElement(nieces))
+
+    def render(self, parent, obj):
+        """Render an object.
+
+        Returns the first etree.Element instance rendered, or None.
+
+        :param parent: The parent etree.Element instance.  Can be
+                       None.
+        :param obj: The object to render.
+        """
+
+        data = None if obj is None else self.selector(obj)
+
+        if self.will_render is None:
+            if data is None:
+                return None
+        elif not self.will_render(data):
+            return None
+
+        subselector = self.subselector
+        if data is None:
+            data = [None]
+            subselector = None
+        elif not isinstance(data, list):
+            data = [data]
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+
+        first = None
+        for datum in data:
+            if subselector is not None:
+                datum = subselector(datum)
+
+            tagname = self.tag(datum) if callable(self.tag) else self.tag
+            if parent is None:
+                elem = etree.Element(tagname, nsmap=self.nsmap)
+            else:
+                elem = etree.SubElement(parent, tagname, nsmap=self.nsmap)
+            if first is None:
+                first = elem
+
+            if datum is not None:
+                if self.text is not None:
+                    elem.text = unicode(self.text(datum))
+                for key, value in self.attrib:
+                    try:
+                        elem.set(key, unicode(value(datum, True)))
+                    except KeyError:
+                        # Attribute has no value, so don't include it
+                        pass
+
+            for child in self.children:
+                child.render(elem, datum)
+
+        return first
+
+
 class MasterTemplate(Template):
     """Represent a master template.
 
@@ -81,6 +81,8 @@ class RequestContext(object):
         self.request_id = request_id
         self.auth_token = auth_token
         self.quota_class = quota_class
+        # Policy decisions made for this context, see policy.enforce().
+        self.policy_decisions = {}
         if overwrite or not hasattr(local.store, 'context'):
             self.update_store()
 
@@ -79,6 +79,14 @@ class NoMoreTargets(exception.CinderException):
 ###################
 
 
+def dispose_engine():
+    """Close all database connections of this process."""
+    return IMPL.dispose_engine()
+
+
+###################
+
+
 def service_destroy(context, service_id):
     """Destroy the service or raise if it does not exist."""
     return IMPL.service_destroy(context, service_id)
@@ -227,6 +235,11 @@ def volume_get_all(context):
     return IMPL.volume_get_all(context)
 
 
+def volume_data_get_for_host(context, host):
+    """Get (volume_count, gigabytes) for host."""
+    return IMPL.volume_data_get_for_host(context, host)
+
+
 def volume_get_all_by_host(context, host):
     """Get all volumes belonging to a host."""
     return IMPL.volume_get_all_by_host(context, host)
@@ -242,6 +255,20 @@ def volume_get_all_by_project(context, project_id):
     return IMPL.volume_get_all_by_project(context, project_id)
 
 
+def volume_get_all_by_ids(context, volume_ids):
+    """Get the volumes among volume_ids that the context can see."""
+    return IMPL.volume_get_all_by_ids(context, volume_ids)
+
+
+def volume_get_changes(context, project_id=None):
+    """Get (row_count, changed_at) for the volumes of a project, or all.
+
+    Either value changes whenever a volume or its metadata is created,
+    updated or deleted, so they tell whether a listing may have changed.
+    """
+    return IMPL.volume_get_changes(context, project_id)
+
+
 def volume_get_iscsi_target_num(context, volume_id):
     """Get the target num (tid) allocated to the volume."""
     return IMPL.volume_get_iscsi_target_num(context, volume_id)
@@ -256,6 +283,16 @@ def volume_update(context, volume_id, values):
     return IMPL.volume_update(context, volume_id, values)
 
 
+def volume_update_all(context, volume_ids, values):
+    """Set the given properties on many volumes in one statement.
+
+    Volumes the context can not see are skipped.  Returns the number of
+    volumes updated.
+
+    """
+    return IMPL.volume_update_all(context, volume_ids, values)
+
+
 ####################
 
 
@@ -284,11 +321,21 @@ def snapshot_get_all_by_project(context, project_id):
     return IMPL.snapshot_get_all_by_project(context, project_id)
 
 
+def snapshot_get_changes(context, project_id=None):
+    """Get (row_count, changed_at) for the snapshots of a project, or all."""
+    return IMPL.snapshot_get_changes(context, project_id)
+
+
 def snapshot_get_all_for_volume(context, volume_id):
     """Get all snapshots for a volume."""
     return IMPL.snapshot_get_all_for_volume(context, volume_id)
 
 
+def snapshot_count_by_volumes(context, volume_ids):
+    """Get a dict of volume id to snapshot count, for volumes with any."""
+    return IMPL.snapshot_count_by_volumes(context, volume_ids)
+
+
 def snapshot_update(context, snapshot_id, values):
     """Set the given properties on an snapshot and update it.
 
@@ -329,6 +376,11 @@ def volume_type_get_all(context, inactive=False):
     return IMPL.volume_type_get_all(context, inactive)
 
 
+def volume_type_get_changes(context):
+    """Get (row_count, changed_at) for volume types and their extra specs."""
+    return IMPL.volume_type_get_changes(context)
+
+
 def volume_type_get(context, id):
     """Get volume type by id."""
     return IMPL.volume_type_get(context, id)
@@ -29,6 +29,7 @@ from cinder import flags
 from cinder import utils
 from cinder.openstack.common import log as logging
 from cinder.db.sqlalchemy import models
+from cinder.db.sqlalchemy import session as db_session
 from cinder.db.sqlalchemy.session import get_session
 from cinder.openstack.common import timeutils
 from sqlalchemy.exc import IntegrityError
@@ -170,6 +171,34 @@ def model_query(context, *args, **kwargs):
     return query
 
 
+def _changes_query(context, model, session=None):
+    """Query aggregates telling whether any row of model has changed.
+
+    Deleted rows are included, so that deleting a row changes the result
+    too.  See _changes_summary().
+    """
+    return model_query(context,
+                       func.count(model.id),
+                       func.max(model.created_at),
+                       func.max(model.updated_at),
+                       func.max(model.deleted_at),
+                       read_deleted="yes",
+                       session=session)
+
+
+def _changes_summary(*results):
+    """Combine _changes_query() results into a (count, changed_at) tuple."""
+    count = 0
+    changed_at = None
+    for result in results:
+        count += result[0] or 0
+        for timestamp in result[1:]:
+            if timestamp is not None and (changed_at is None or
+                                          timestamp > changed_at):
+                changed_at = timestamp
+    return count, changed_at
+
+
 def exact_filter(query, model, filters, legal_keys):
     """Applies exact match filtering to a query.
 
@@ -215,6 +244,13 @@ def exact_filter(query, model, filters, legal_keys):
 ###################
 
 
+def dispose_engine():
+    db_session.dispose_engine()
+
+
+###################
+
+
 @require_admin_context
 def service_destroy(context, service_id):
     session = get_session()
@@ -951,6 +987,27 @@ def volume_create(context, values):
     return volume_get(context, values['id'], session=session)
 
 
+@require_context
+def volume_get_changes(context, project_id=None):
+    if project_id is None:
+        if not is_admin_context(context):
+            raise exception.AdminRequired()
+    else:
+        authorize_project_context(context, project_id)
+
+    session = get_session()
+    volumes = _changes_query(context, models.Volume, session=session)
+    metadata = _changes_query(context, models.VolumeMetadata,
+                              session=session).\
+                   join(models.Volume,
+                        models.VolumeMetadata.volume_id == models.Volume.id)
+    if project_id is not None:
+        volumes = volumes.filter_by(project_id=project_id)
+        metadata = metadata.filter(models.Volume.project_id == project_id)
+
+    return _changes_summary(volumes.first(), metadata.first())
+
+
 @require_admin_context
 def volume_data_get_for_project(context, project_id, session=None):
     result = model_query(context,
@@ -965,6 +1022,19 @@ def volume_data_get_for_project(context, project_id, session=None):
     return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_data_get_for_host(context, host):
+    result = model_query(context,
+                         func.count(models.Volume.id),
+                         func.sum(models.Volume.size),
+                         read_deleted="no").\
+                     filter_by(host=host).\
+                     first()
+
+    # NOTE(vish): convert None to 0
+    return (result[0] or 0, result[1] or 0)
+
+
 @require_admin_context
 def volume_destroy(context, volume_id):
     session = get_session()
@@ -1046,6 +1116,15 @@ def volume_get_all_by_project(context, project_id):
     return _volume_get_query(context).filter_by(project_id=project_id).all()
 
 
+@require_context
+def volume_get_all_by_ids(context, volume_ids):
+    if not volume_ids:
+        return []
+    return _volume_get_query(context, project_only=True).\
+                    filter(models.Volume.id.in_(volume_ids)).\
+                    all()
+
+
 @require_admin_context
 def volume_get_iscsi_target_num(context, volume_id):
     result = model_query(context, models.IscsiTarget, read_deleted="yes").\
@@ -1073,6 +1152,19 @@ def volume_update(context, volume_id, values):
         volume_ref.save(session=session)
 
 
+@require_context
+def volume_update_all(context, volume_ids, values):
+    if not volume_ids:
+        return 0
+    session = get_session()
+    with session.begin():
+        values = dict(values, updated_at=timeutils.utcnow())
+        return model_query(context, models.Volume, session=session,
+                           project_only=True).\
+                    filter(models.Volume.id.in_(volume_ids)).\
+                    update(values, synchronize_session=False)
+
+
 ####################
 
 def _volume_metadata_get_query(context, volume_id, session=None):
@@ -1203,6 +1295,33 @@ def snapshot_get_all_for_volume(context, volume_id):
               filter_by(volume_id=volume_id).all()
 
 
+@require_context
+def snapshot_count_by_volumes(context, volume_ids):
+    if not volume_ids:
+        return {}
+    rows = model_query(context, models.Snapshot.volume_id,
+                       func.count(models.Snapshot.id),
+                       read_deleted='no', project_only=True).\
+                filter(models.Snapshot.volume_id.in_(volume_ids)).\
+                group_by(models.Snapshot.volume_id).\
+                all()
+    return dict(rows)
+
+
+@require_context
+def snapshot_get_changes(context, project_id=None):
+    if project_id is None:
+        if not is_admin_context(context):
+            raise exception.AdminRequired()
+    else:
+        authorize_project_context(context, project_id)
+
+    query = _changes_query(context, models.Snapshot)
+    if project_id is not None:
+        query = query.filter_by(project_id=project_id)
+    return _changes_summary(query.first())
+
+
 @require_context
 def snapshot_get_all_by_project(context, project_id):
     authorize_project_context(context, project_id)
@@ -1309,6 +1428,15 @@ def volume_type_create(context, values):
         return volume_type_ref
 
 
+@require_context
+def volume_type_get_changes(context):
+    session = get_session()
+    types = _changes_query(context, models.VolumeTypes, session=session)
+    specs = _changes_query(context, models.VolumeTypeExtraSpecs,
+                           session=session)
+    return _changes_summary(types.first(), specs.first())
+
+
 @require_context
 def volume_type_get_all(context, inactive=False, filters=None):
     """
@@ -20,6 +20,7 @@
 
 import time
 
+import sqlalchemy.events
 import sqlalchemy.interfaces
 import sqlalchemy.orm
 from sqlalchemy.exc import DisconnectionError, OperationalError
@@ -28,6 +29,7 @@ from sqlalchemy.pool import NullPool, StaticPool
 import cinder.exception
 import cinder.flags as flags
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timing
 
 
 FLAGS = flags.FLAGS
@@ -56,6 +58,22 @@ def synchronous_switch_listener(dbapi_conn, connection_rec):
     dbapi_conn.execute("PRAGMA synchronous = OFF")
 
 
+def timing_before_listener(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Account the statement to the db phase of the request timer."""
+    conn.info['timing_phase'] = timing.switch('db')
+
+
+def timing_after_listener(conn, cursor, statement, *args):
+    """Return the request timer to the phase that ran the statement.
+
+    Listens to both after_cursor_execute and dbapi_error.
+    """
+    previous = conn.info.pop('timing_phase', None)
+    if previous is not None:
+        timing.switch(previous)
+
+
 def ping_listener(dbapi_conn, connection_rec, connection_proxy):
     """
     Ensures that MySQL connections checked out of the
@@ -119,6 +137,17 @@ def get_engine():
                 sqlalchemy.event.listen(_ENGINE, 'connect',
                                         synchronous_switch_listener)
 
+        sqlalchemy.event.listen(_ENGINE, 'before_cursor_execute',
+                                timing_before_listener)
+        sqlalchemy.event.listen(_ENGINE, 'after_cursor_execute',
+                                timing_after_listener)
+        # dbapi_error only exists from SQLAlchemy 0.7.7 on; older
+        # releases leave the timer in the db phase until the next
+        # statement after a failed one.
+        if hasattr(sqlalchemy.events.ConnectionEvents, 'dbapi_error'):
+            sqlalchemy.event.listen(_ENGINE, 'dbapi_error',
+                                    timing_after_listener)
+
         try:
             _ENGINE.connect()
         except OperationalError, e:
@@ -144,6 +173,19 @@ def get_engine():
     return _ENGINE
 
 
+def dispose_engine():
+    """Close the pooled connections and drop the engine and session maker.
+
+    The next get_session() creates a new engine, so a process that forks
+    calls this first to keep the children from sharing its connections.
+    """
+    global _ENGINE, _MAKER
+    if _ENGINE is not None:
+        _ENGINE.dispose()
+    _ENGINE = None
+    _MAKER = None
+
+
 def get_maker(engine, autocommit=True, expire_on_commit=False):
     """Return a SQLAlchemy sessionmaker using the given engine."""
     return sqlalchemy.orm.sessionmaker(bind=engine,
@@ -53,15 +53,35 @@ This module provides Manager, a base class for managers.
 
 """
 
+import random
+
+import eventlet
+
 from cinder.db import base
 from cinder import flags
+from cinder.openstack.common import cfg
 from cinder.openstack.common import log as logging
 from cinder.openstack.common.rpc import dispatcher as rpc_dispatcher
+from cinder.openstack.common import timeutils
 from cinder.scheduler import rpcapi as scheduler_rpcapi
 from cinder import version
 
 
+manager_opts = [
+    cfg.IntOpt('capabilities_full_update_interval',
+               default=600,
+               help='Seconds between the full capability updates a service '
+                    'sends to the schedulers. In between only the changed '
+                    'capabilities are sent. 0 always sends them all'),
+    cfg.FloatOpt('capabilities_publish_jitter',
+                 default=5.0,
+                 help='Maximum random delay, in seconds, before a service '
+                      'sends its capabilities to the schedulers, so the '
+                      'services do not all send them at once'),
+    ]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(manager_opts)
 
 
 LOG = logging.getLogger(__name__)
@@ -134,10 +154,14 @@ class Manager(base.Base):
     # Set RPC API version to 1.0 by default.
     RPC_API_VERSION = '1.0'
 
+    # Map of rpc method name to dispatch lane, see rpc.dispatcher.
+    RPC_METHOD_LANES = {}
+
     def __init__(self, host=None, db_driver=None):
         if not host:
             host = FLAGS.host
         self.host = host
+        self._rpc_dispatcher = None
         super(Manager, self).__init__(db_driver)
 
     def create_rpc_dispatcher(self):
@@ -146,7 +170,8 @@ class Manager(base.Base):
         If a manager would like to set an rpc API version, or support more than
         one class as the target of rpc messages, override this method.
         '''
-        return rpc_dispatcher.RpcDispatcher([self])
+        self._rpc_dispatcher = rpc_dispatcher.RpcDispatcher([self])
+        return self._rpc_dispatcher
 
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
@@ -182,6 +207,12 @@ class Manager(base.Base):
     def service_version(self, context):
         return version.version_string()
 
+    def service_rpc_stats(self, context):
+        """Return per method rpc queue wait and run time histograms."""
+        if not self._rpc_dispatcher:
+            return {}
+        return self._rpc_dispatcher.stats.to_dict()
+
     def service_config(self, context):
         config = {}
         for key in FLAGS:
@@ -197,22 +228,98 @@ class SchedulerDependentManager(Manager):
     manager.Manager directly. Updates are only sent after
     update_service_capabilities is called with non-None values.
 
+    Only the capabilities that changed since the last update are sent,
+    and all of them every capabilities_full_update_interval seconds.
+    Updates are numbered, so a scheduler that missed one ignores the
+    following ones until the next full update.
+
     """
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        # Latest capabilities, kept while update_service_capabilities is
+        # called with None because they did not change
+        self._service_capabilities = None
+        # Capabilities last sent, their sequence number, and when they
+        # were last all sent
+        self._published_capabilities = None
+        self._capabilities_sequence = 0
+        self._capabilities_full_at = None
+        self._capabilities_pending = False
         super(SchedulerDependentManager, self).__init__(host, db_driver)
 
     def update_service_capabilities(self, capabilities):
-        """Remember these capabilities to send on next periodic update."""
+        """Remember these capabilities to send on next periodic update.
+
+        None means they did not change; the last ones are still sent with
+        each full update.
+        """
         self.last_capabilities = capabilities
+        if capabilities:
+            self._service_capabilities = capabilities
+
+    def _get_capabilities_update(self, capabilities):
+        """Return the capabilities to send, the names of the removed ones
+        and whether they are all sent, or None if there is nothing to
+        send."""
+        if not capabilities:
+            return None
+        published = self._published_capabilities
+        interval = FLAGS.capabilities_full_update_interval
+        if (published is None or interval <= 0 or
+            timeutils.utcnow_ts() - self._capabilities_full_at >= interval):
+            return capabilities, [], True
+
+        changed = {}
+        for key, value in capabilities.iteritems():
+            if key not in published or published[key] != value:
+                changed[key] = value
+        removed = [key for key in published if key not in capabilities]
+        if not changed and not removed:
+            return None
+        return changed, removed, False
+
+    def _send_service_capabilities(self, context):
+        # update_service_capabilities may store newer ones while the cast
+        # yields; only the ones sent here count as published
+        snapshot = self._service_capabilities
+        update = self._get_capabilities_update(snapshot)
+        if update is None:
+            return
+        capabilities, removed, full = update
+        self._capabilities_sequence += 1
+        LOG.debug(_('Notifying Schedulers of capabilities ...'))
+        self.scheduler_rpcapi.update_service_capabilities(context,
+                self.service_name, self.host, capabilities,
+                sequence=self._capabilities_sequence, full=full,
+                removed=removed)
+        self._published_capabilities = dict(snapshot)
+        if full:
+            self._capabilities_full_at = timeutils.utcnow_ts()
+
+    def _send_service_capabilities_later(self, context):
+        try:
+            self._send_service_capabilities(context)
+        except Exception:
+            LOG.exception(_('Error notifying Schedulers of capabilities'))
+        finally:
+            self._capabilities_pending = False
 
     @periodic_task
     def _publish_service_capabilities(self, context):
         """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
-            LOG.debug(_('Notifying Schedulers of capabilities ...'))
-            self.scheduler_rpcapi.update_service_capabilities(context,
-                    self.service_name, self.host, self.last_capabilities)
+        # An update waiting for its delay sends the latest capabilities
+        if (self._capabilities_pending or
+            self._get_capabilities_update(self._service_capabilities) is
+            None):
+            return
+        delay = random.uniform(0, FLAGS.capabilities_publish_jitter)
+        if delay > 0:
+            self._capabilities_pending = True
+            eventlet.spawn_after(delay,
+                                 self._send_service_capabilities_later,
+                                 context)
+        else:
+            self._send_service_capabilities(context)
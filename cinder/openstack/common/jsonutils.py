@@ -42,6 +42,32 @@ import xmlrpclib
 from cinder.openstack.common import timeutils
 
 
+_simple_types = frozenset([str, unicode, int, long, float, bool,
+                           type(None)])
+
+
+def is_primitive(value):
+    """Return True if value only holds types JSON encodes natively.
+
+    This is much cheaper than to_primitive(), so callers can use it to skip
+    the conversion for payloads that are already primitive.
+    """
+    value_type = type(value)
+    if value_type in _simple_types:
+        return True
+    if value_type is dict:
+        for k, v in value.iteritems():
+            if type(k) not in _simple_types or not is_primitive(v):
+                return False
+        return True
+    if value_type is list or value_type is tuple:
+        for v in value:
+            if not is_primitive(v):
+                return False
+        return True
+    return False
+
+
 def to_primitive(value, convert_instances=False, level=0):
     """Convert a complex object into primitives.
 
@@ -56,6 +82,10 @@ def to_primitive(value, convert_instances=False, level=0):
     Therefore, convert_instances=True is lossy ... be aware.
 
     """
+    # Skip the inspection below for the common scalar types.
+    if type(value) in _simple_types and level <= 3:
+        return value
+
     nasty = [inspect.ismodule, inspect.isclass, inspect.ismethod,
              inspect.isfunction, inspect.isgeneratorfunction,
              inspect.isgenerator, inspect.istraceback, inspect.isframe,
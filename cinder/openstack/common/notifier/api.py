@@ -13,8 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import uuid
 
+import eventlet
+from eventlet import queue
+
 from cinder.openstack.common import cfg
 from cinder.openstack.common import context
 from cinder.openstack.common.gettextutils import _
@@ -37,6 +41,26 @@ notifier_opts = [
     cfg.StrOpt('default_publisher_id',
                default='$host',
                help='Default publisher_id for outgoing notifications'),
+    cfg.BoolOpt('notification_async',
+                default=False,
+                help='Queue notifications in process and send them in '
+                     'batches from a background greenthread'),
+    cfg.IntOpt('notification_queue_size',
+               default=1000,
+               help='Maximum number of queued notifications when '
+                    'notification_async is enabled'),
+    cfg.IntOpt('notification_batch_size',
+               default=50,
+               help='Maximum number of notifications sent in one batch'),
+    cfg.StrOpt('notification_overflow_policy',
+               default='block',
+               help='What to do with a notification when the queue is full: '
+                    'block, drop_oldest or spill'),
+    cfg.StrOpt('notification_spill_file',
+               default=None,
+               help='File that notifications are appended to when the '
+                    'queue is full and the overflow policy is spill. They '
+                    'are sent once the queue has drained'),
 ]
 
 CONF = cfg.CONF
@@ -125,7 +149,8 @@ def notify(context, publisher_id, event_type, priority, payload):
             _('%s not in valid priorities') % priority)
 
     # Ensure everything is JSON serializable.
-    payload = jsonutils.to_primitive(payload, convert_instances=True)
+    if not jsonutils.is_primitive(payload):
+        payload = jsonutils.to_primitive(payload, convert_instances=True)
 
     msg = dict(message_id=str(uuid.uuid4()),
                publisher_id=publisher_id,
@@ -134,13 +159,187 @@ def notify(context, publisher_id, event_type, priority, payload):
                payload=payload,
                timestamp=str(timeutils.utcnow()))
 
+    if CONF.notification_async:
+        _get_pipeline().put(context, msg)
+        return
+
     for driver in _get_drivers():
+        _notify_driver(driver, context, msg)
+
+
+def _notify_driver(driver, context, msg):
+    try:
+        driver.notify(context, msg)
+    except Exception, e:
+        payload = msg['payload']
+        LOG.exception(_("Problem '%(e)s' attempting to "
+                        "send to notification system. "
+                        "Payload=%(payload)s") % locals())
+
+
+def _notify_batch(notifications):
+    """Send a list of (context, msg) tuples to every driver.
+
+    Drivers may provide a notify_batch() function taking the whole list,
+    otherwise notify() is called once per notification.
+    """
+    for driver in _get_drivers():
+        if not hasattr(driver, 'notify_batch'):
+            for context, msg in notifications:
+                _notify_driver(driver, context, msg)
+            continue
         try:
-            driver.notify(context, msg)
+            driver.notify_batch(notifications)
         except Exception, e:
-            LOG.exception(_("Problem '%(e)s' attempting to "
-                            "send to notification system. "
-                            "Payload=%(payload)s") % locals())
+            count = len(notifications)
+            LOG.exception(_("Problem '%(e)s' attempting to send a batch of "
+                            "%(count)d notifications") % locals())
+
+
+class _SpilledContext(object):
+    """Stands in for the request context of a spilled notification."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def to_dict(self):
+        return self.values
+
+
+class NotificationPipeline(object):
+    """Bounded queue of notifications drained by a background greenthread.
+
+    When the queue is full, notification_overflow_policy decides whether
+    the caller blocks until there is room, the oldest queued notification is
+    dropped, or the new notification is appended to notification_spill_file
+    to be sent once the queue has drained.
+    """
+
+    def __init__(self):
+        self.queue = queue.LightQueue(CONF.notification_queue_size)
+        self.dropped = 0
+        self.spilled = 0
+        self.sent = 0
+        self._spill_pending = False
+        self._thread = None
+
+    def put(self, context, msg):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._drain)
+        item = (context, msg)
+        policy = CONF.notification_overflow_policy
+        if policy not in ('drop_oldest', 'spill'):
+            self.queue.put(item)
+            return
+        try:
+            self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if policy == 'spill' and CONF.notification_spill_file:
+            self._spill(item)
+            return
+        if policy == 'drop_oldest':
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self.queue.put_nowait(item)
+        self.dropped += 1
+
+    def _spill(self, item):
+        context, msg = item
+        record = {'context': context.to_dict() if context else None,
+                  'message': msg}
+        try:
+            with open(CONF.notification_spill_file, 'a') as spill_file:
+                spill_file.write(jsonutils.dumps(record) + '\n')
+        except IOError, e:
+            LOG.error(_("Could not spill notification: %s") % e)
+            self.dropped += 1
+            return
+        self.spilled += 1
+        self._spill_pending = True
+
+    def _replay_spilled(self):
+        """Send notifications spilled to disk while the queue was full."""
+        self._spill_pending = False
+        path = CONF.notification_spill_file
+        replay_path = path + '.replay'
+        try:
+            os.rename(path, replay_path)
+        except OSError:
+            return
+        batch = []
+        with open(replay_path) as replay_file:
+            for line in replay_file:
+                record = jsonutils.loads(line)
+                context = record['context']
+                if context is not None:
+                    context = _SpilledContext(context)
+                batch.append((context, record['message']))
+                if len(batch) >= CONF.notification_batch_size:
+                    self._send(batch)
+                    batch = []
+        if batch:
+            self._send(batch)
+        os.unlink(replay_path)
+
+    def _send(self, batch):
+        _notify_batch(batch)
+        self.sent += len(batch)
+
+    def _drain(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < CONF.notification_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+                if self._spill_pending and not self.queue.qsize():
+                    self._replay_spilled()
+            except Exception:
+                LOG.exception(_("Failed to send queued notifications"))
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+
+    def get_stats(self):
+        return {'queued': self.queue.qsize(),
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'sent': self.sent}
+
+
+_pipeline = None
+
+
+def _get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = NotificationPipeline()
+    return _pipeline
+
+
+def get_pipeline_stats():
+    """Return queued, dropped, spilled and sent notification counts."""
+    if _pipeline is None:
+        return {'queued': 0, 'dropped': 0, 'spilled': 0, 'sent': 0}
+    return _pipeline.get_stats()
+
+
+def _reset_pipeline():
+    """Used by unit tests to reset the notification pipeline."""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.stop()
+    _pipeline = None
 
 
 _drivers = None
@@ -44,3 +44,22 @@ def notify(context, message):
         except Exception, e:
             LOG.exception(_("Could not send notification to %(topic)s. "
                             "Payload=%(message)s"), locals())
+
+
+def notify_batch(notifications):
+    """Sends a batch of (context, message) notifications to the RabbitMQ"""
+    batch = []
+    for context, message in notifications:
+        if not context:
+            context = req_context.get_admin_context()
+        priority = message.get('priority',
+                               CONF.default_notification_level)
+        priority = priority.lower()
+        for topic in CONF.notification_topics:
+            batch.append((context, '%s.%s' % (topic, priority), message))
+    try:
+        rpc.notify_many(batch)
+    except Exception, e:
+        count = len(notifications)
+        LOG.exception(_("Could not send a batch of %(count)d "
+                        "notifications: %(e)s"), locals())
@@ -18,6 +18,7 @@
 """Common Policy Engine Implementation"""
 
 import logging
+import re
 import urllib
 import urllib2
 
@@ -119,16 +120,100 @@ def enforce(match_list, target_dict, credentials_dict, exc=None,
     :return: True if the policy allows the action
     :return: False if the policy does not allow the action and exc is not set
     """
-    global _BRAIN
-    if not _BRAIN:
-        _BRAIN = Brain()
-    if not _BRAIN.check(match_list, target_dict, credentials_dict):
+    if not check(match_list, target_dict, credentials_dict):
         if exc:
             raise exc(*args, **kwargs)
         return False
     return True
 
 
+_MISSING = object()
+
+
+def _freeze(value):
+    """Return a hashable version of a credentials or target value."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.iteritems()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def check(match_list, target_dict, credentials_dict, cache=None):
+    """Checks authorization of some rules against credentials.
+
+    Like enforce(), without raising.
+
+    :param cache: optional dict in which to memoize decisions, e.g. for the
+                  duration of a request. A decision is keyed by the match
+                  list and the target and credentials entries it depends on,
+                  and is only cached when those are known.
+
+    :return: True if the policy allows the action
+    """
+    global _BRAIN
+    if not _BRAIN:
+        _BRAIN = Brain()
+    compiled = _BRAIN.compile(match_list)
+
+    key = None
+    if (cache is not None and compiled.target_keys is not None and
+            compiled.cred_keys is not None):
+        key = (_BRAIN, compiled,
+               tuple([_freeze(target_dict.get(k, _MISSING))
+                      for k in compiled.target_keys]),
+               tuple([_freeze(credentials_dict.get(k, _MISSING))
+                      for k in compiled.cred_keys]))
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Something unhashable, don't cache this one.
+            key = None
+
+    result = compiled(target_dict, credentials_dict)
+    if key is not None:
+        cache[key] = result
+    return result
+
+
+class CompiledCheck(object):
+    """A match list compiled by Brain.compile().
+
+    Calling it with a target and credentials dict checks them as
+    Brain.check() would.  target_keys and cred_keys name the entries of
+    the target and credentials dicts the result depends on, or are None
+    when it may depend on any of them.
+    """
+
+    def __init__(self, func, target_keys=(), cred_keys=()):
+        self.func = func
+        self.target_keys = target_keys
+        self.cred_keys = cred_keys
+
+    def __call__(self, target_dict, cred_dict):
+        return self.func(target_dict, cred_dict)
+
+    @staticmethod
+    def _union(first, second):
+        if first is None or second is None:
+            return None
+        return tuple(sorted(set(first) | set(second)))
+
+    @classmethod
+    def combine(cls, func, checks):
+        """Build a check calling func, depending on all of checks."""
+        target_keys = cred_keys = ()
+        for check in checks:
+            target_keys = cls._union(target_keys, check.target_keys)
+            cred_keys = cls._union(cred_keys, check.cred_keys)
+        return cls(func, target_keys, cred_keys)
+
+
+_TARGET_KEY_RE = re.compile(r'%\(([^)]+)\)')
+
+
 class Brain(object):
     """Implements policy checking."""
 
@@ -152,9 +237,15 @@ class Brain(object):
 
         self.rules = rules or {}
         self.default_rule = default_rule
+        self._compiled = {}
+        self._compiled_rules = {}
+        for name in self.rules:
+            self._compile_rule(name)
 
     def add_rule(self, key, match):
         self.rules[key] = match
+        self._compiled = {}
+        self._compiled_rules = {}
 
     def _check(self, match, target_dict, cred_dict):
         try:
@@ -195,15 +286,135 @@ class Brain(object):
         :returns: True if the check passes
 
         """
+        return self.compile(match_list)(target_dict, cred_dict)
+
+    def compile(self, match_list):
+        """Compile a match list into a CompiledCheck.
+
+        Rules and roles are resolved and the target keys of generic matches
+        are extracted once, instead of on every check.  Compiled match lists
+        are cached, so they should not be modified afterwards.
+        """
+        try:
+            return self._compiled[match_list]
+        except (KeyError, TypeError):
+            pass
+
+        key = _freeze(match_list)
+        try:
+            return self._compiled[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return self._compile_list(match_list, set())
+
+        compiled = self._compile_list(match_list, set())
+        self._compiled[key] = compiled
+        return compiled
+
+    def _compile_list(self, match_list, seen):
         if not match_list:
-            return True
+            return CompiledCheck(lambda target, cred: True)
+
+        or_checks = []
         for and_list in match_list:
             if isinstance(and_list, basestring):
                 and_list = (and_list,)
-            if all([self._check(item, target_dict, cred_dict)
-                    for item in and_list]):
+            and_checks = [self._compile_match(item, seen)
+                          for item in and_list]
+            or_checks.append(CompiledCheck.combine(
+                _all_of([c.func for c in and_checks]), and_checks))
+
+        return CompiledCheck.combine(_any_of([c.func for c in or_checks]),
+                                     or_checks)
+
+    def _compile_rule(self, name, seen=None):
+        try:
+            return self._compiled_rules[name]
+        except KeyError:
+            pass
+
+        seen = seen or set()
+        if name in seen:
+            # A rule referencing itself; leave it to _check_rule to fail
+            # the way it always has.
+            match = 'rule:%s' % name
+            return CompiledCheck(
+                lambda target, cred: self._check(match, target, cred),
+                None, None)
+
+        if name in self.rules:
+            compiled = self._compile_list(self.rules[name], seen | set([name]))
+        elif self.default_rule and name != self.default_rule:
+            compiled = self._compile_rule(self.default_rule,
+                                          seen | set([name]))
+        else:
+            compiled = CompiledCheck(lambda target, cred: False)
+
+        self._compiled_rules[name] = compiled
+        return compiled
+
+    def _compile_match(self, match, seen):
+        try:
+            match_kind, match_value = match.split(':', 1)
+        except Exception:
+            LOG.exception(_("Failed to understand rule %(match)r") % locals())
+            # If the rule is invalid, fail closed
+            return CompiledCheck(lambda target, cred: False)
+
+        func = None
+        if not hasattr(self, '_check_%s' % match_kind):
+            func = self._checks.get(match_kind, self._checks.get(None, None))
+
+        if func is _check_rule:
+            return self._compile_rule(match_value, seen)
+
+        if func is _check_role:
+            role = match_value.lower()
+
+            def check_role(target, cred):
+                return role in [x.lower() for x in cred['roles']]
+            return CompiledCheck(check_role, (), ('roles',))
+
+        if func is _check_generic:
+            target_keys = tuple(set(_TARGET_KEY_RE.findall(match_value)))
+
+            def check_generic(target, cred):
+                value = match_value % target
+                if match_kind not in cred:
+                    return False
+                return value == unicode(cred[match_kind])
+            return CompiledCheck(check_generic, target_keys, (match_kind,))
+
+        # Anything else, e.g. http: or inheritance-based checks, may depend
+        # on the whole target and credentials, and is checked as is.
+        return CompiledCheck(
+            lambda target, cred: self._check(match, target, cred),
+            None, None)
+
+
+def _all_of(funcs):
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def check_all(target, cred):
+        for func in funcs:
+            if not func(target, cred):
+                return False
+        return True
+    return check_all
+
+
+def _any_of(funcs):
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def check_any(target, cred):
+        for func in funcs:
+            if func(target, cred):
                 return True
         return False
+    return check_any
 
 
 class HttpBrain(Brain):
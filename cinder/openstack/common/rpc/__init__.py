@@ -27,6 +27,7 @@ For some wrappers that add message versioning to rpc, see:
 
 from cinder.openstack.common import cfg
 from cinder.openstack.common import importutils
+from cinder.openstack.common import timing
 
 
 rpc_opts = [
@@ -36,6 +37,15 @@ rpc_opts = [
     cfg.IntOpt('rpc_thread_pool_size',
                default=64,
                help='Size of RPC thread pool'),
+    cfg.ListOpt('rpc_thread_pool_lanes',
+                default=[],
+                help='Additional bounded RPC thread pools as lane:size '
+                     'pairs, e.g. control:16,data:8. Methods assigned to a '
+                     'lane run in its pool instead of the default one'),
+    cfg.ListOpt('rpc_method_lanes',
+                default=[],
+                help='method:lane pairs overriding the dispatch lane that '
+                     'the RPC_METHOD_LANES of a manager assigns a method to'),
     cfg.IntOpt('rpc_conn_pool_size',
                default=30,
                help='Size of RPC connection pool'),
@@ -105,7 +115,8 @@ def call(context, topic, msg, timeout=None):
     :raises: openstack.common.rpc.common.Timeout if a complete response
              is not received before the timeout is reached.
     """
-    return _get_impl().call(cfg.CONF, context, topic, msg, timeout)
+    with timing.phase('rpc'):
+        return _get_impl().call(cfg.CONF, context, topic, msg, timeout)
 
 
 def cast(context, topic, msg):
@@ -123,7 +134,8 @@ def cast(context, topic, msg):
 
     :returns: None
     """
-    return _get_impl().cast(cfg.CONF, context, topic, msg)
+    with timing.phase('rpc'):
+        return _get_impl().cast(cfg.CONF, context, topic, msg)
 
 
 def fanout_cast(context, topic, msg):
@@ -144,7 +156,8 @@ def fanout_cast(context, topic, msg):
 
     :returns: None
     """
-    return _get_impl().fanout_cast(cfg.CONF, context, topic, msg)
+    with timing.phase('rpc'):
+        return _get_impl().fanout_cast(cfg.CONF, context, topic, msg)
 
 
 def multicall(context, topic, msg, timeout=None):
@@ -190,6 +203,23 @@ def notify(context, topic, msg):
     return _get_impl().notify(cfg.CONF, context, topic, msg)
 
 
+def notify_many(notifications):
+    """Send a batch of notification events.
+
+    Implementations may send the whole batch over one long lived connection.
+
+    :param notifications: A list of (context, topic, msg) tuples, with the
+                          same meaning as the arguments of notify().
+
+    :returns: None
+    """
+    impl = _get_impl()
+    if hasattr(impl, 'notify_many'):
+        return impl.notify_many(cfg.CONF, notifications)
+    for context, topic, msg in notifications:
+        impl.notify(cfg.CONF, context, topic, msg)
+
+
 def cleanup():
     """Clean up resoruces in use by implementation.
 
@@ -215,8 +245,9 @@ def cast_to_server(context, server_params, topic, msg):
 
     :returns: None
     """
-    return _get_impl().cast_to_server(cfg.CONF, context, server_params, topic,
-                                      msg)
+    with timing.phase('rpc'):
+        return _get_impl().cast_to_server(cfg.CONF, context, server_params,
+                                          topic, msg)
 
 
 def fanout_cast_to_server(context, server_params, topic, msg):
@@ -231,8 +262,9 @@ def fanout_cast_to_server(context, server_params, topic, msg):
 
     :returns: None
     """
-    return _get_impl().fanout_cast_to_server(cfg.CONF, context, server_params,
-                                             topic, msg)
+    with timing.phase('rpc'):
+        return _get_impl().fanout_cast_to_server(cfg.CONF, context,
+                                                 server_params, topic, msg)
 
 
 def queue_get_for(context, topic, host):
@@ -28,10 +28,12 @@ AMQP, but is deprecated and predates this code.
 import inspect
 import logging
 import sys
+import time
 import uuid
 
 from eventlet import greenpool
 from eventlet import pools
+from eventlet import queue
 from eventlet import semaphore
 
 from cinder.openstack.common import cfg
@@ -41,6 +43,16 @@ from cinder.openstack.common import local
 from cinder.openstack.common.rpc import common as rpc_common
 
 
+amqp_opts = [
+    cfg.BoolOpt('amqp_rpc_single_reply_queue',
+                default=False,
+                help='Receive the replies of all rpc calls made by a process '
+                     'on a single long lived queue instead of declaring a '
+                     'new reply queue for every call'),
+]
+
+cfg.CONF.register_opts(amqp_opts)
+
 LOG = logging.getLogger(__name__)
 
 
@@ -52,6 +64,8 @@ class Pool(pools.Pool):
         kwargs.setdefault("max_size", self.conf.rpc_conn_pool_size)
         kwargs.setdefault("order_as_stack", True)
         super(Pool, self).__init__(*args, **kwargs)
+        self.reply_proxy = None
+        self.notify_connection = None
 
     # TODO(comstud): Timeout connections not used in a while
     def create(self):
@@ -61,9 +75,17 @@ class Pool(pools.Pool):
     def empty(self):
         while self.free_items:
             self.get().close()
+        if self.reply_proxy:
+            self.reply_proxy.close()
+            self.reply_proxy = None
+        if self.notify_connection:
+            self.notify_connection.close()
+            self.notify_connection = None
 
 
 _pool_create_sem = semaphore.Semaphore()
+_reply_proxy_create_sem = semaphore.Semaphore()
+_notify_sem = semaphore.Semaphore()
 
 
 def get_connection_pool(conf, connection_cls):
@@ -149,12 +171,56 @@ class ConnectionContext(rpc_common.Connection):
             raise rpc_common.InvalidRPCConnectionReuse()
 
 
+class ReplyProxy(ConnectionContext):
+    """A long lived reply queue shared by all rpc calls of a process.
+
+    Replies carry the msg_id of the call they answer, which is used to hand
+    them to the greenthread waiting on that call.
+    """
+
+    def __init__(self, conf, connection_pool):
+        self._call_waiters = {}
+        self._reply_q = 'reply_' + uuid.uuid4().hex
+        super(ReplyProxy, self).__init__(conf, connection_pool, pooled=False)
+        self.declare_direct_consumer(self._reply_q, self._process_data)
+        self.consume_in_thread()
+
+    def _process_data(self, message_data):
+        msg_id = message_data.pop('_msg_id', None)
+        waiter = self._call_waiters.get(msg_id)
+        if not waiter:
+            LOG.warn(_('No calling threads waiting for msg_id %s'), msg_id)
+        else:
+            waiter.put(message_data)
+
+    def add_call_waiter(self, waiter, msg_id):
+        self._call_waiters[msg_id] = waiter
+
+    def del_call_waiter(self, msg_id):
+        self._call_waiters.pop(msg_id, None)
+
+    def get_reply_q(self):
+        return self._reply_q
+
+
+def get_reply_proxy(conf, connection_pool):
+    with _reply_proxy_create_sem:
+        # Make sure only one thread tries to create the reply proxy.
+        if not connection_pool.reply_proxy:
+            connection_pool.reply_proxy = ReplyProxy(conf, connection_pool)
+    return connection_pool.reply_proxy
+
+
 def msg_reply(conf, msg_id, connection_pool, reply=None, failure=None,
-              ending=False):
+              ending=False, reply_q=None, serializer=None):
     """Sends a reply or an error on the channel signified by msg_id.
 
     Failure should be a sys.exc_info() tuple.
 
+    If the caller asked for replies on a shared reply queue, the reply is
+    sent there and tagged with the msg_id instead.  serializer names the
+    wire format of the request, which the reply is sent in.
+
     """
     with ConnectionContext(conf, connection_pool) as conn:
         if failure:
@@ -168,13 +234,19 @@ def msg_reply(conf, msg_id, connection_pool, reply=None, failure=None,
                    'failure': failure}
         if ending:
             msg['ending'] = True
-        conn.direct_send(msg_id, msg)
+        if reply_q:
+            msg['_msg_id'] = msg_id
+            conn.direct_send(reply_q, msg, serializer)
+        else:
+            conn.direct_send(msg_id, msg, serializer)
 
 
 class RpcContext(rpc_common.CommonRpcContext):
     """Context that supports replying to a rpc.call"""
     def __init__(self, **kwargs):
         self.msg_id = kwargs.pop('msg_id', None)
+        self.reply_q = kwargs.pop('reply_q', None)
+        self.serializer = kwargs.pop('serializer', None)
         self.conf = kwargs.pop('conf')
         super(RpcContext, self).__init__(**kwargs)
 
@@ -182,13 +254,15 @@ class RpcContext(rpc_common.CommonRpcContext):
         values = self.to_dict()
         values['conf'] = self.conf
         values['msg_id'] = self.msg_id
+        values['reply_q'] = self.reply_q
+        values['serializer'] = self.serializer
         return self.__class__(**values)
 
     def reply(self, reply=None, failure=None, ending=False,
               connection_pool=None):
         if self.msg_id:
             msg_reply(self.conf, self.msg_id, connection_pool, reply, failure,
-                      ending)
+                      ending, self.reply_q, self.serializer)
             if ending:
                 self.msg_id = None
 
@@ -204,6 +278,8 @@ def unpack_context(conf, msg):
             value = msg.pop(key)
             context_dict[key[9:]] = value
     context_dict['msg_id'] = msg.pop('_msg_id', None)
+    context_dict['reply_q'] = msg.pop('_reply_q', None)
+    context_dict['serializer'] = msg.pop('_serializer', None)
     context_dict['conf'] = conf
     ctx = RpcContext.from_dict(context_dict)
     rpc_common._safe_log(LOG.debug, _('unpacked context: %s'), ctx.to_dict())
@@ -224,15 +300,61 @@ def pack_context(msg, context):
     msg.update(context_d)
 
 
+def _parse_pairs(conf, name, convert=None):
+    """Parse a list option of key:value pairs into a dict.
+
+    If convert is given, it is applied to each value and a ValueError or
+    TypeError it raises is reported as a cfg.ConfigFileValueError naming
+    the option.
+    """
+    pairs = {}
+    for item in getattr(conf, name, None) or []:
+        key, sep, value = item.partition(':')
+        if not sep or not key or not value:
+            LOG.warn(_('Ignoring malformed %(name)s entry: %(item)s') %
+                     locals())
+            continue
+        value = value.strip()
+        if convert is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                msg = (_('Invalid value in %(name)s entry: %(item)s') %
+                       locals())
+                raise cfg.ConfigFileValueError(msg)
+        pairs[key.strip()] = value
+    return pairs
+
+
+def _pool_size(value):
+    """Convert a thread pool size, which must be a positive integer."""
+    size = int(value)
+    if size < 1:
+        raise ValueError(value)
+    return size
+
+
 class ProxyCallback(object):
     """Calls methods on a proxy object based on method and args."""
 
     def __init__(self, conf, proxy, connection_pool):
         self.proxy = proxy
         self.pool = greenpool.GreenPool(conf.rpc_thread_pool_size)
+        self.lane_pools = {}
+        lanes = _parse_pairs(conf, 'rpc_thread_pool_lanes', _pool_size)
+        for lane, size in lanes.items():
+            self.lane_pools[lane] = greenpool.GreenPool(size)
+        self.method_lanes = _parse_pairs(conf, 'rpc_method_lanes')
         self.connection_pool = connection_pool
         self.conf = conf
 
+    def _get_pool(self, method):
+        """Return the thread pool of the dispatch lane for a method."""
+        lane = self.method_lanes.get(method)
+        if lane is None and hasattr(self.proxy, 'get_lane'):
+            lane = self.proxy.get_lane(method)
+        return self.lane_pools.get(lane, self.pool)
+
     def __call__(self, message_data):
         """Consumer callback to call a method on a proxy object.
 
@@ -260,9 +382,10 @@ class ProxyCallback(object):
             ctxt.reply(_('No method for message: %s') % message_data,
                        connection_pool=self.connection_pool)
             return
-        self.pool.spawn_n(self._process_data, ctxt, version, method, args)
+        self._get_pool(method).spawn_n(self._process_data, ctxt, version,
+                                       method, args, time.time())
 
-    def _process_data(self, ctxt, version, method, args):
+    def _process_data(self, ctxt, version, method, args, received_at=None):
         """Process a message in a new thread.
 
         If the proxy object we have has a dispatch method
@@ -272,6 +395,7 @@ class ProxyCallback(object):
         proxy we have here.
         """
         ctxt.update_store()
+        started_at = time.time()
         try:
             rval = self.proxy.dispatch(ctxt, version, method, **args)
             # Check if the result was a generator
@@ -286,6 +410,71 @@ class ProxyCallback(object):
             LOG.exception('Exception during message handling')
             ctxt.reply(None, sys.exc_info(),
                        connection_pool=self.connection_pool)
+        finally:
+            stats = getattr(self.proxy, 'stats', None)
+            if stats is not None:
+                stats.record(method, started_at - (received_at or started_at),
+                             time.time() - started_at)
+
+
+class MulticallProxyWaiter(object):
+    """Waits for the replies of one call on the shared ReplyProxy queue."""
+
+    def __init__(self, conf, msg_id, timeout, connection_pool):
+        self._msg_id = msg_id
+        self._timeout = timeout or conf.rpc_response_timeout
+        self._reply_proxy = connection_pool.reply_proxy
+        self._done = False
+        self._got_ending = False
+        self._conf = conf
+        self._dataqueue = queue.LightQueue()
+        # Add this caller to the reply proxy's call_waiters
+        self._reply_proxy.add_call_waiter(self, self._msg_id)
+
+    def put(self, data):
+        self._dataqueue.put(data)
+
+    def done(self):
+        if self._done:
+            return
+        self._done = True
+        # Remove this caller from reply proxy's call_waiters
+        self._reply_proxy.del_call_waiter(self._msg_id)
+
+    def _process_data(self, data):
+        result = None
+        if data['failure']:
+            failure = data['failure']
+            result = rpc_common.deserialize_remote_exception(self._conf,
+                                                             failure)
+        elif data.get('ending', False):
+            self._got_ending = True
+        else:
+            result = data['result']
+        return result
+
+    def __iter__(self):
+        """Return a result until we get a reply with an 'ending' flag"""
+        if self._done:
+            raise StopIteration
+        while True:
+            try:
+                data = self._dataqueue.get(timeout=self._timeout)
+                result = self._process_data(data)
+            except queue.Empty:
+                LOG.exception(_('Timed out waiting for RPC response.'))
+                self.done()
+                raise rpc_common.Timeout()
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self.done()
+            if self._got_ending:
+                self.done()
+                raise StopIteration
+            if isinstance(result, Exception):
+                self.done()
+                raise result
+            yield result
 
 
 class MulticallWaiter(object):
@@ -355,6 +544,15 @@ def multicall(conf, context, topic, msg, timeout, connection_pool):
     LOG.debug(_('MSG_ID is %s') % (msg_id))
     pack_context(msg, context)
 
+    if conf.amqp_rpc_single_reply_queue:
+        reply_proxy = get_reply_proxy(conf, connection_pool)
+        msg.update({'_reply_q': reply_proxy.get_reply_q()})
+        wait_msg = MulticallProxyWaiter(conf, msg_id, timeout,
+                                        connection_pool)
+        with ConnectionContext(conf, connection_pool) as conn:
+            conn.topic_send(topic, msg)
+        return wait_msg
+
     conn = ConnectionContext(conf, connection_pool)
     wait_msg = MulticallWaiter(conf, conn, timeout)
     conn.declare_direct_consumer(msg_id, wait_msg)
@@ -414,6 +612,24 @@ def notify(conf, context, topic, msg, connection_pool):
         conn.notify_send(topic, msg)
 
 
+def notify_many(conf, notifications, connection_pool):
+    """Sends a batch of notification events on a long lived connection.
+
+    The connection, and the publishers it caches for each topic, are kept
+    across batches, so the notification exchange and queue are only
+    declared again after a reconnect.
+    """
+    LOG.debug(_('Sending a batch of %d notifications'), len(notifications))
+    with _notify_sem:
+        if not connection_pool.notify_connection:
+            connection_pool.notify_connection = ConnectionContext(
+                conf, connection_pool, pooled=False)
+        conn = connection_pool.notify_connection
+        for context, topic, msg in notifications:
+            pack_context(msg, context)
+            conn.notify_send(topic, msg)
+
+
 def cleanup(connection_pool):
     if connection_pool:
         connection_pool.empty()
@@ -79,11 +79,81 @@ The implementation of the method must not expect the parameter to be present.
 
 On the client side, the same changes should be made as in example 1.  The
 minimum version that supports the new parameter should be specified.
+
+
+Dispatch lanes:
+
+A callback may assign its methods to named dispatch lanes with an
+RPC_METHOD_LANES attribute, for example:
+
+    RPC_METHOD_LANES = {'initialize_connection': 'control',
+                        'create_volume': 'data'}
+
+The amqp based drivers run each lane in its own bounded thread pool (see the
+rpc_thread_pool_lanes option), so that quick control plane calls do not queue
+behind long running data plane calls.  Methods without a lane, or assigned to
+a lane with no configured pool, run in the default pool.
 """
 
+import bisect
+
 from cinder.openstack.common.rpc import common as rpc_common
 
 
+class Histogram(object):
+    """A fixed bucket histogram of durations, in seconds."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        buckets = dict(('le_%s' % bound, count) for bound, count
+                       in zip(self.BUCKETS, self.counts))
+        buckets['le_inf'] = self.counts[-1]
+        return {'count': self.count,
+                'sum': self.total,
+                'max': self.max,
+                'buckets': buckets}
+
+
+class DispatchStats(object):
+    """Per method queue wait and run time histograms."""
+
+    def __init__(self):
+        self.methods = {}
+
+    def record(self, method, queue_wait, run_time):
+        """Record one dispatched call.
+
+        :param method: The name of the dispatched method.
+        :param queue_wait: Seconds between receiving the message and
+                           starting to run it.
+        :param run_time: Seconds spent running the method.
+        """
+        if method not in self.methods:
+            self.methods[method] = (Histogram(), Histogram())
+        wait_hist, run_hist = self.methods[method]
+        wait_hist.add(queue_wait)
+        run_hist.add(run_time)
+
+    def to_dict(self):
+        return dict((method, {'queue_wait': wait_hist.to_dict(),
+                              'run_time': run_hist.to_dict()})
+                    for method, (wait_hist, run_hist)
+                    in self.methods.iteritems())
+
+
 class RpcDispatcher(object):
     """Dispatch rpc messages according to the requested API version.
 
@@ -99,6 +169,7 @@ class RpcDispatcher(object):
                           object should have an RPC_API_VERSION attribute.
         """
         self.callbacks = callbacks
+        self.stats = DispatchStats()
         super(RpcDispatcher, self).__init__()
 
     @staticmethod
@@ -116,6 +187,18 @@ class RpcDispatcher(object):
             return False
         return True
 
+    def get_lane(self, method):
+        """Return the dispatch lane of a method, or None for the default.
+
+        :param method: The method requested to be called by an incoming
+                       message.
+        """
+        for proxyobj in self.callbacks:
+            lanes = getattr(proxyobj, 'RPC_METHOD_LANES', None)
+            if lanes and method in lanes:
+                return lanes[method]
+        return None
+
     def dispatch(self, ctxt, version, method, **kwargs):
         """Dispatch a message based on a requested version.
 
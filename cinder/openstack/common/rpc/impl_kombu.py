@@ -33,6 +33,7 @@ from cinder.openstack.common import cfg
 from cinder.openstack.common.gettextutils import _
 from cinder.openstack.common.rpc import amqp as rpc_amqp
 from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import serializer as rpc_serializer
 from cinder.openstack.common import network_utils
 
 kombu_opts = [
@@ -96,6 +97,8 @@ cfg.CONF.register_opts(kombu_opts)
 
 LOG = rpc_common.LOG
 
+rpc_serializer.register_kombu_serializer()
+
 
 def _get_queue_arguments(conf):
     """Construct the arguments for declaring a queue.
@@ -162,7 +165,13 @@ class ConsumerBase(object):
         def _callback(raw_message):
             message = self.channel.message_to_python(raw_message)
             try:
-                callback(message.payload)
+                payload = message.payload
+                if (message.content_type ==
+                        rpc_serializer.MSGPACK_CONTENT_TYPE and
+                        isinstance(payload, dict)):
+                    # Let the receiver reply in the same format.
+                    payload['_serializer'] = 'msgpack'
+                callback(payload)
                 message.ack()
             except Exception:
                 LOG.exception(_("Failed to process message... skipping it."))
@@ -300,9 +309,9 @@ class Publisher(object):
                                                  channel=channel,
                                                  routing_key=self.routing_key)
 
-    def send(self, msg):
+    def send(self, msg, serializer=None):
         """Send a message"""
-        self.producer.publish(msg)
+        self.producer.publish(msg, serializer=serializer)
 
 
 class DirectPublisher(Publisher):
@@ -385,6 +394,7 @@ class Connection(object):
 
     def __init__(self, conf, server_params=None):
         self.consumers = []
+        self.publishers = {}
         self.consumer_thread = None
         self.conf = conf
         self.max_retries = self.conf.rabbit_max_retries
@@ -485,6 +495,7 @@ class Connection(object):
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
+        self.publishers = {}
         for consumer in self.consumers:
             consumer.reconnect(self.channel)
         LOG.info(_('Connected to AMQP server on %(hostname)s:%(port)d') %
@@ -584,6 +595,7 @@ class Connection(object):
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
         self.consumers = []
+        self.publishers = {}
 
     def declare_consumer(self, consumer_cls, topic, callback):
         """Create a Consumer using the class that was passed in and
@@ -643,8 +655,14 @@ class Connection(object):
                 pass
             self.consumer_thread = None
 
-    def publisher_send(self, cls, topic, msg, **kwargs):
-        """Send to a publisher based on the publisher class"""
+    def publisher_send(self, cls, topic, msg, cache=False, serializer=None,
+                       **kwargs):
+        """Send to a publisher based on the publisher class
+
+        If cache is True, the publisher is kept for later sends to the same
+        topic until the channel is reset or reconnected.  serializer names
+        the wire format, JSON by default.
+        """
 
         def _error_callback(exc):
             log_info = {'topic': topic, 'err_str': str(exc)}
@@ -652,8 +670,12 @@ class Connection(object):
                           "'%(topic)s': %(err_str)s") % log_info)
 
         def _publish():
-            publisher = cls(self.conf, self.channel, topic, **kwargs)
-            publisher.send(msg)
+            publisher = self.publishers.get((cls, topic)) if cache else None
+            if publisher is None:
+                publisher = cls(self.conf, self.channel, topic, **kwargs)
+                if cache:
+                    self.publishers[(cls, topic)] = publisher
+            publisher.send(msg, serializer)
 
         self.ensure(_error_callback, _publish)
 
@@ -677,21 +699,27 @@ class Connection(object):
         """Create a 'fanout' consumer"""
         self.declare_consumer(FanoutConsumer, topic, callback)
 
-    def direct_send(self, msg_id, msg):
+    def direct_send(self, msg_id, msg, serializer=None):
         """Send a 'direct' message"""
-        self.publisher_send(DirectPublisher, msg_id, msg)
+        self.publisher_send(DirectPublisher, msg_id, msg,
+                            serializer=serializer)
 
     def topic_send(self, topic, msg):
         """Send a 'topic' message"""
-        self.publisher_send(TopicPublisher, topic, msg)
+        self.publisher_send(TopicPublisher, topic, msg,
+                            serializer=rpc_serializer.get_serializer().name)
 
     def fanout_send(self, topic, msg):
         """Send a 'fanout' message"""
-        self.publisher_send(FanoutPublisher, topic, msg)
+        self.publisher_send(FanoutPublisher, topic, msg,
+                            serializer=rpc_serializer.get_serializer().name)
 
     def notify_send(self, topic, msg, **kwargs):
         """Send a notify message on a topic"""
-        self.publisher_send(NotifyPublisher, topic, msg, **kwargs)
+        # Declaring the notification queue is a broker round trip, so reuse
+        # the publisher unless it is customized.
+        self.publisher_send(NotifyPublisher, topic, msg, cache=not kwargs,
+                            **kwargs)
 
     def consume(self, limit=None):
         """Consume from all queues/consumers"""
@@ -788,5 +816,12 @@ def notify(conf, context, topic, msg):
         rpc_amqp.get_connection_pool(conf, Connection))
 
 
+def notify_many(conf, notifications):
+    """Sends a batch of notification events."""
+    return rpc_amqp.notify_many(
+        conf, notifications,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
 def cleanup():
     return rpc_amqp.cleanup(Connection.pool)
@@ -291,6 +291,7 @@ class Connection(object):
     def __init__(self, conf, server_params=None):
         self.session = None
         self.consumers = {}
+        self.publishers = {}
         self.consumer_thread = None
         self.conf = conf
 
@@ -364,6 +365,7 @@ class Connection(object):
         LOG.info(_('Connected to AMQP server on %s'), self.broker)
 
         self.session = self.connection.session()
+        self.publishers = {}
 
         for consumer in self.consumers.itervalues():
             consumer.reconnect(self.session)
@@ -393,6 +395,7 @@ class Connection(object):
         self.session.close()
         self.session = self.connection.session()
         self.consumers = {}
+        self.publishers = {}
 
     def declare_consumer(self, consumer_cls, topic, callback):
         """Create a Consumer using the class that was passed in and
@@ -444,8 +447,12 @@ class Connection(object):
                 pass
             self.consumer_thread = None
 
-    def publisher_send(self, cls, topic, msg):
-        """Send to a publisher based on the publisher class"""
+    def publisher_send(self, cls, topic, msg, cache=False):
+        """Send to a publisher based on the publisher class
+
+        If cache is True, the publisher is kept for later sends to the same
+        topic until the session is reset or reconnected.
+        """
 
         def _connect_error(exc):
             log_info = {'topic': topic, 'err_str': str(exc)}
@@ -453,7 +460,11 @@ class Connection(object):
                           "'%(topic)s': %(err_str)s") % log_info)
 
         def _publisher_send():
-            publisher = cls(self.conf, self.session, topic)
+            publisher = self.publishers.get((cls, topic)) if cache else None
+            if publisher is None:
+                publisher = cls(self.conf, self.session, topic)
+                if cache:
+                    self.publishers[(cls, topic)] = publisher
             publisher.send(msg)
 
         return self.ensure(_connect_error, _publisher_send)
@@ -478,8 +489,11 @@ class Connection(object):
         """Create a 'fanout' consumer"""
         self.declare_consumer(FanoutConsumer, topic, callback)
 
-    def direct_send(self, msg_id, msg):
-        """Send a 'direct' message"""
+    def direct_send(self, msg_id, msg, serializer=None):
+        """Send a 'direct' message
+
+        qpid encodes messages itself, so serializer is ignored.
+        """
         self.publisher_send(DirectPublisher, msg_id, msg)
 
     def topic_send(self, topic, msg):
@@ -492,7 +506,7 @@ class Connection(object):
 
     def notify_send(self, topic, msg, **kwargs):
         """Send a notify message on a topic"""
-        self.publisher_send(NotifyPublisher, topic, msg)
+        self.publisher_send(NotifyPublisher, topic, msg, cache=True)
 
     def consume(self, limit=None):
         """Consume from all queues/consumers"""
@@ -598,5 +612,12 @@ def notify(conf, context, topic, msg):
                            rpc_amqp.get_connection_pool(conf, Connection))
 
 
+def notify_many(conf, notifications):
+    """Sends a batch of notification events."""
+    return rpc_amqp.notify_many(
+        conf, notifications,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
 def cleanup():
     return rpc_amqp.cleanup(Connection.pool)
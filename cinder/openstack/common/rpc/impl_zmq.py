@@ -28,8 +28,8 @@ import greenlet
 from cinder.openstack.common import cfg
 from cinder.openstack.common.gettextutils import _
 from cinder.openstack.common import importutils
-from cinder.openstack.common import jsonutils
 from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import serializer as rpc_serializer
 
 
 # for convenience, are not modified.
@@ -80,16 +80,16 @@ ZMQ_CTX = None  # ZeroMQ Context, must be global.
 matchmaker = None  # memoized matchmaker object
 
 
-def _serialize(data):
+def _serialize(data, serializer=None):
     """
     Serialization wrapper
-    We prefer using JSON, but it cannot encode all types.
+    Uses the rpc_serializer format unless serializer names another one.
     Error if a developer passes us bad data.
     """
     try:
-        return str(jsonutils.dumps(data, ensure_ascii=True))
+        return rpc_serializer.encode(data, serializer)
     except TypeError:
-        LOG.error(_("JSON serialization failed."))
+        LOG.error(_("Serialization failed."))
         raise
 
 
@@ -97,8 +97,15 @@ def _deserialize(data):
     """
     Deserialization wrapper
     """
-    LOG.debug(_("Deserializing: %s"), data)
-    return jsonutils.loads(data)
+    return _deserialize_with_format(data)[0]
+
+
+def _deserialize_with_format(data):
+    """
+    Deserialization wrapper, also returning the name of the wire format
+    """
+    LOG.debug(_("Deserializing: %r"), data)
+    return rpc_serializer.decode(data)
 
 
 class ZmqSocket(object):
@@ -110,7 +117,7 @@ class ZmqSocket(object):
     """
 
     def __init__(self, addr, zmq_type, bind=True, subscribe=None):
-        self.sock = ZMQ_CTX.socket(zmq_type)
+        self.sock = _get_ctx().socket(zmq_type)
         self.addr = addr
         self.type = zmq_type
         self.subscriptions = []
@@ -208,9 +215,9 @@ class ZmqClient(object):
     def __init__(self, addr, socket_type=zmq.PUSH, bind=False):
         self.outq = ZmqSocket(addr, socket_type, bind=bind)
 
-    def cast(self, msg_id, topic, data):
+    def cast(self, msg_id, topic, data, serializer=None):
         self.outq.send([str(topic), str(msg_id), str('cast'),
-                        _serialize(data)])
+                        _serialize(data, serializer)])
 
     def close(self):
         self.outq.close()
@@ -234,8 +241,10 @@ class RpcContext(rpc_common.CommonRpcContext):
 
     @classmethod
     def marshal(self, ctx):
+        # The marshalled context is nested as a string inside messages of
+        # either wire format, so it is always JSON.
         ctx_data = ctx.to_dict()
-        return _serialize(ctx_data)
+        return _serialize(ctx_data, 'json')
 
     @classmethod
     def unmarshal(self, data):
@@ -277,13 +286,14 @@ class InternalContext(object):
             ctx.replies)
 
         LOG.debug(_("Sending reply"))
+        # Reply in the wire format the request came in.
         cast(CONF, ctx, topic, {
             'method': '-process_reply',
             'args': {
                 'msg_id': msg_id,
                 'response': response
             }
-        })
+        }, serializer=getattr(ctx, 'serializer', None))
 
 
 class ConsumerBase(object):
@@ -442,11 +452,11 @@ class ZmqProxy(ZmqBaseReactor):
             topic = 'fanout~'
         elif topic.startswith('zmq_replies'):
             sock_type = zmq.PUB
-            inside = _deserialize(in_msg)
+            inside, serializer = _deserialize_with_format(in_msg)
             msg_id = inside[-1]['args']['msg_id']
             response = inside[-1]['args']['response']
             LOG.debug(_("->response->%s"), response)
-            data = [str(msg_id), _serialize(response)]
+            data = [str(msg_id), _serialize(response, serializer)]
         else:
             sock_type = zmq.PUSH
 
@@ -498,8 +508,9 @@ class ZmqReactor(ZmqBaseReactor):
 
         topic, msg_id, style, in_msg = data
 
-        ctx, request = _deserialize(in_msg)
+        (ctx, request), serializer = _deserialize_with_format(in_msg)
         ctx = RpcContext.unmarshal(ctx)
+        ctx.serializer = serializer
 
         proxy = self.proxies[sock]
 
@@ -514,7 +525,8 @@ class Connection(rpc_common.Connection):
         self.reactor = ZmqReactor(conf)
 
     def _consume_fanout(self, reactor, topic, proxy, bind=False):
-        for topic, host in matchmaker.queues("publishers~%s" % (topic, )):
+        queues = _get_matchmaker().queues("publishers~%s" % (topic, ))
+        for topic, host in queues:
             inaddr = "tcp://%s:%s" % (host, CONF.rpc_zmq_port)
             reactor.register(proxy, inaddr, zmq.SUB, in_bind=bind)
 
@@ -527,7 +539,8 @@ class Connection(rpc_common.Connection):
         # Only consume on the base topic name.
         topic = topic.split('.', 1)[0]
 
-        if CONF.rpc_zmq_host in matchmaker.queues("fanout~%s" % (topic, )):
+        queues = _get_matchmaker().queues("fanout~%s" % (topic, ))
+        if CONF.rpc_zmq_host in queues:
             return
 
         reactor = CallbackReactor(CONF, callback)
@@ -543,7 +556,7 @@ class Connection(rpc_common.Connection):
         # Consume direct-push fanout messages (relay to local consumers)
         if fanout:
             # If we're not in here, we can't receive direct fanout messages
-            if CONF.rpc_zmq_host in matchmaker.queues(topic):
+            if CONF.rpc_zmq_host in _get_matchmaker().queues(topic):
                 # Consume from all remote publishers.
                 self._consume_fanout(self.reactor, topic, proxy)
             else:
@@ -582,7 +595,7 @@ class Connection(rpc_common.Connection):
         self.reactor.consume_in_thread()
 
 
-def _cast(addr, context, msg_id, topic, msg, timeout=None):
+def _cast(addr, context, msg_id, topic, msg, timeout=None, serializer=None):
     timeout_cast = timeout or CONF.rpc_cast_timeout
     payload = [RpcContext.marshal(context), msg]
 
@@ -591,7 +604,7 @@ def _cast(addr, context, msg_id, topic, msg, timeout=None):
             conn = ZmqClient(addr)
 
             # assumes cast can't return an exception
-            conn.cast(msg_id, topic, payload)
+            conn.cast(msg_id, topic, payload, serializer)
         except zmq.ZMQError:
             raise RPCException("Cast failed. ZMQ Socket Exception")
         finally:
@@ -599,7 +612,7 @@ def _cast(addr, context, msg_id, topic, msg, timeout=None):
                 conn.close()
 
 
-def _call(addr, context, msg_id, topic, msg, timeout=None):
+def _call(addr, context, msg_id, topic, msg, timeout=None, serializer=None):
     # timeout_response is how long we wait for a response
     timeout = timeout or CONF.rpc_response_timeout
 
@@ -634,7 +647,8 @@ def _call(addr, context, msg_id, topic, msg, timeout=None):
             )
 
             LOG.debug(_("Sending cast"))
-            _cast(addr, context, msg_id, topic, payload)
+            _cast(addr, context, msg_id, topic, payload,
+                  serializer=serializer)
 
             LOG.debug(_("Cast sent; Waiting reply"))
             # Blocks until receives reply
@@ -660,7 +674,7 @@ def _call(addr, context, msg_id, topic, msg, timeout=None):
     return responses[-1]
 
 
-def _multi_send(method, context, topic, msg, timeout=None):
+def _multi_send(method, context, topic, msg, timeout=None, serializer=None):
     """
     Wraps the sending of messages,
     dispatches to the matchmaker and sends
@@ -669,7 +683,7 @@ def _multi_send(method, context, topic, msg, timeout=None):
     conf = CONF
     LOG.debug(_("%(msg)s") % {'msg': ' '.join(map(pformat, (topic, msg)))})
 
-    queues = matchmaker.queues(topic)
+    queues = _get_matchmaker().queues(topic)
     LOG.debug(_("Sending message(s) to: %s"), queues)
 
     # Don't stack if we have no matchmaker results
@@ -686,9 +700,10 @@ def _multi_send(method, context, topic, msg, timeout=None):
 
         if method.__name__ == '_cast':
             eventlet.spawn_n(method, _addr, context,
-                             _topic, _topic, msg, timeout)
+                             _topic, _topic, msg, timeout, serializer)
             return
-        return method(_addr, context, _topic, _topic, msg, timeout)
+        return method(_addr, context, _topic, _topic, msg, timeout,
+                      serializer)
 
 
 def create_connection(conf, new=True):
@@ -735,10 +750,27 @@ def cleanup():
     global ZMQ_CTX
     global matchmaker
     matchmaker = None
-    ZMQ_CTX.term()
+    # Called before each fork of a multi-process service, whether or not
+    # the context was created or already terminated
+    if ZMQ_CTX:
+        ZMQ_CTX.term()
     ZMQ_CTX = None
 
 
+def _get_ctx():
+    """Return the ZeroMQ context, created again after a cleanup."""
+    if not ZMQ_CTX:
+        register_opts(CONF)
+    return ZMQ_CTX
+
+
+def _get_matchmaker():
+    """Return the matchmaker, created again after a cleanup."""
+    if not matchmaker:
+        register_opts(CONF)
+    return matchmaker
+
+
 def register_opts(conf):
     """Registration of options for this driver."""
     #NOTE(ewindisch): ZMQ_CTX and matchmaker
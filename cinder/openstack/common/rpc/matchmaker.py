@@ -18,10 +18,14 @@ The MatchMaker classes should except a Topic or Fanout exchange key and
 return keys for direct exchanges, per (approximate) AMQP parlance.
 """
 
+import bisect
 import contextlib
+import hashlib
 import itertools
 import json
 import logging
+import os
+import time
 
 from cinder.openstack.common import cfg
 from cinder.openstack.common.gettextutils import _
@@ -32,6 +36,13 @@ matchmaker_opts = [
     cfg.StrOpt('matchmaker_ringfile',
                default='/etc/nova/matchmaker_ring.json',
                help='Matchmaker ring file (JSON)'),
+    cfg.IntOpt('matchmaker_ring_check_interval',
+               default=5,
+               help='Seconds between checks of the matchmaker ring file '
+                    'for changes, 0 to never reload it'),
+    cfg.IntOpt('matchmaker_ring_vnodes',
+               default=100,
+               help='Virtual nodes per host in the consistent hash ring'),
 ]
 
 CONF = cfg.CONF
@@ -152,23 +163,57 @@ class RingExchange(Exchange):
     a hashmap (JSON formatted).
 
     __init__ takes optional ring dictionary argument, otherwise
-    loads the ringfile from CONF.mathcmaker_ringfile.
+    loads the ringfile from CONF.mathcmaker_ringfile. A ring loaded
+    from the ringfile is reloaded when the file changes, checking at
+    most every CONF.matchmaker_ring_check_interval seconds.
     """
     def __init__(self, ring=None):
         super(RingExchange, self).__init__()
 
+        self.ringfile = None
+        self.mtime = None
+        self.last_check = time.time()
+
         if ring:
-            self.ring = ring
+            self._set_ring(ring)
         else:
-            fh = open(CONF.matchmaker_ringfile, 'r')
-            self.ring = json.load(fh)
-            fh.close()
+            self.ringfile = CONF.matchmaker_ringfile
+            self._load_ringfile()
 
+    def _set_ring(self, ring):
+        self.ring = ring
         self.ring0 = {}
         for k in self.ring.keys():
             self.ring0[k] = itertools.cycle(self.ring[k])
 
+    def _load_ringfile(self):
+        mtime = os.path.getmtime(self.ringfile)
+        with open(self.ringfile, 'r') as fh:
+            ring = json.load(fh)
+        self._set_ring(ring)
+        self.mtime = mtime
+
+    def _check_reload(self):
+        interval = CONF.matchmaker_ring_check_interval
+        if not self.ringfile or interval <= 0:
+            return
+        now = time.time()
+        if now - self.last_check < interval:
+            return
+        self.last_check = now
+
+        try:
+            if os.path.getmtime(self.ringfile) == self.mtime:
+                return
+            self._load_ringfile()
+        except (IOError, OSError, ValueError):
+            LOG.exception(_("Failed to reload ringfile %s, keeping the "
+                            "current ring") % self.ringfile)
+            return
+        LOG.info(_("Reloaded ringfile %s") % self.ringfile)
+
     def _ring_has(self, key):
+        self._check_reload()
         if key in self.ring0:
             return True
         return False
@@ -190,6 +235,62 @@ class RoundRobinRingExchange(RingExchange):
         return [(key + '.' + host, host)]
 
 
+def _hash(key):
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+class HashRing(object):
+    """
+    A consistent hash ring of hosts.
+
+    Each host is placed on the ring at vnodes points, and a key maps to
+    the host at the first point after the hash of the key. Adding or
+    removing a host only moves the keys next to its points, about 1/N of
+    them, instead of remapping every key.
+    """
+    def __init__(self, hosts, vnodes=None):
+        if vnodes is None:
+            vnodes = CONF.matchmaker_ring_vnodes
+        points = []
+        for host in set(hosts):
+            for i in xrange(vnodes):
+                points.append((_hash('%s-%d' % (host, i)), host))
+        points.sort()
+        self.hashes = [point for point, _host in points]
+        self.hosts = [host for _point, host in points]
+
+    def get_host(self, key):
+        """Return the host key maps to, or None if the ring is empty."""
+        if not self.hashes:
+            return None
+        index = bisect.bisect(self.hashes, _hash(key))
+        return self.hosts[index % len(self.hosts)]
+
+
+class ConsistentHashRingExchange(RingExchange):
+    """A Topic Exchange mapping each key to a host by consistent hashing."""
+    def __init__(self, ring=None):
+        super(ConsistentHashRingExchange, self).__init__(ring)
+
+    def _set_ring(self, ring):
+        super(ConsistentHashRingExchange, self)._set_ring(ring)
+        self.hash_rings = dict((k, HashRing(v)) for k, v in ring.items())
+
+    def run(self, key):
+        if not self._ring_has(key):
+            LOG.warn(
+                _("No key defining hosts for topic '%s', "
+                  "see ringfile") % (key, )
+            )
+            return []
+        host = self.hash_rings[key].get_host(key)
+        if host is None:
+            return []
+        return [(key + '.' + host, host)]
+
+
 class PublisherRingExchange(RingExchange):
     """Fanout Exchange based on a hashmap."""
     def __init__(self, ring=None):
@@ -259,6 +360,19 @@ class MatchMakerRing(MatchMakerBase):
         self.add_binding(TopicBinding(), RoundRobinRingExchange(ring))
 
 
+class MatchMakerConsistentHash(MatchMakerBase):
+    """
+    Match Maker where hosts are loaded from a hashmap and topics are
+    mapped to hosts by consistent hashing.
+    """
+    def __init__(self, ring=None):
+        super(MatchMakerConsistentHash, self).__init__()
+        self.add_binding(PublisherBinding(), PublisherRingExchange(ring))
+        self.add_binding(FanoutBinding(), FanoutRingExchange(ring))
+        self.add_binding(DirectBinding(), DirectExchange())
+        self.add_binding(TopicBinding(), ConsistentHashRingExchange(ring))
+
+
 class MatchMakerLocalhost(MatchMakerBase):
     """
     Match Maker where all bare topics resolve to localhost.
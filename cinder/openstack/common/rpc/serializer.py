@@ -0,0 +1,151 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pluggable wire formats for rpc messages.
+
+JSON is the default.  With rpc_serializer=msgpack, requests are encoded with
+msgpack instead, which is cheaper to encode and decode and more compact for
+large payloads such as capability reports.  Only objects msgpack can not
+encode natively go through jsonutils.to_primitive().
+
+Receivers decode both formats whatever their own setting is, and always
+reply in the format of the request, so the format is negotiated per
+message.  In a mixed version deployment, keep json until every node runs a
+version that can decode msgpack.
+
+Framed messages (see encode() and decode()) start with a marker byte that
+can not start a JSON document, followed by a format version byte.
+"""
+
+from cinder.openstack.common import cfg
+from cinder.openstack.common.gettextutils import _
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common.rpc import common as rpc_common
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+serializer_opts = [
+    cfg.StrOpt('rpc_serializer',
+               default='json',
+               help='Wire format of rpc requests, json or msgpack. Replies '
+                    'always use the format of the request'),
+]
+
+cfg.CONF.register_opts(serializer_opts)
+
+LOG = rpc_common.LOG
+
+MSGPACK_MARKER = '\xc1'
+MSGPACK_VERSION = 1
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+
+class JsonSerializer(object):
+    name = 'json'
+    content_type = 'application/json'
+
+    def dumps(self, data):
+        return str(jsonutils.dumps(data, ensure_ascii=True))
+
+    def loads(self, data):
+        return jsonutils.loads(data)
+
+
+def _msgpack_default(value):
+    return jsonutils.to_primitive(value)
+
+
+class MsgpackSerializer(object):
+    name = 'msgpack'
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def dumps(self, data):
+        return msgpack.packb(data, default=_msgpack_default)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, encoding='utf-8')
+
+
+_SERIALIZERS = {'json': JsonSerializer(),
+                'msgpack': MsgpackSerializer()}
+
+_warned_no_msgpack = False
+
+
+def get_serializer(name=None):
+    """Return the serializer called name, or the configured one.
+
+    Falls back to JSON when msgpack is requested but not installed.
+    """
+    global _warned_no_msgpack
+    name = name or cfg.CONF.rpc_serializer
+    if name == 'msgpack' and msgpack is None:
+        if not _warned_no_msgpack:
+            LOG.warn(_('rpc_serializer is msgpack but msgpack is not '
+                       'installed, using json'))
+            _warned_no_msgpack = True
+        name = 'json'
+    try:
+        return _SERIALIZERS[name]
+    except KeyError:
+        raise rpc_common.RPCException(_('Unknown rpc serializer %s') % name)
+
+
+def encode(data, serializer=None):
+    """Encode data into a framed message.
+
+    :param serializer: Name of the format to use, defaults to rpc_serializer.
+    """
+    serializer = get_serializer(serializer)
+    if serializer.name == 'json':
+        return serializer.dumps(data)
+    return MSGPACK_MARKER + chr(MSGPACK_VERSION) + serializer.dumps(data)
+
+
+def decode(data):
+    """Decode a framed message.
+
+    :returns: A (data, serializer name) tuple.
+    """
+    if not data.startswith(MSGPACK_MARKER):
+        return _SERIALIZERS['json'].loads(data), 'json'
+    version = ord(data[1])
+    if version > MSGPACK_VERSION:
+        raise rpc_common.RPCException(
+            _('Unsupported msgpack message version %d') % version)
+    if msgpack is None:
+        raise rpc_common.RPCException(
+            _('Received a msgpack message but msgpack is not installed'))
+    return _SERIALIZERS['msgpack'].loads(data[2:]), 'msgpack'
+
+
+def register_kombu_serializer():
+    """Make the msgpack format available to kombu publishers."""
+    if msgpack is None:
+        return
+    from kombu import serialization
+    msgpack_serializer = _SERIALIZERS['msgpack']
+    serialization.registry.register('msgpack',
+                                    msgpack_serializer.dumps,
+                                    msgpack_serializer.loads,
+                                    content_type=MSGPACK_CONTENT_TYPE,
+                                    content_encoding='binary')
@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Greenthread local accounting of where the time of a request goes.
+
+A RequestTimer is started for a request and is always in exactly one
+phase.  Code moves it to another phase for a while with phase(), so the
+time of each phase excludes the phases run within it, and the phase
+times add up to the wall time of the request.  Outside of a timed
+request, phase() does nothing.
+"""
+
+import contextlib
+import time
+
+from eventlet import corolocal
+
+
+_local = corolocal.local()
+
+
+class RequestTimer(object):
+    """Wall time spent in each phase of a request, and entries to them."""
+
+    def __init__(self, phase):
+        self.times = {}
+        self.counts = {}
+        self.started_at = time.time()
+        self._phase = None
+        self._phase_started_at = self.started_at
+        self.switch(phase)
+
+    @property
+    def phase(self):
+        return self._phase
+
+    def switch(self, phase):
+        """Move to phase and return the phase the timer was in."""
+        now = time.time()
+        previous = self._phase
+        if previous is not None:
+            self.times[previous] = (self.times.get(previous, 0.0) +
+                                    now - self._phase_started_at)
+        if phase is not None and phase != previous:
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+        self._phase = phase
+        self._phase_started_at = now
+        return previous
+
+    def stop(self):
+        """Stop timing and return the total time."""
+        self.switch(None)
+        return self.total()
+
+    def total(self):
+        return sum(self.times.values())
+
+
+def start(phase):
+    """Start timing the current request in phase."""
+    timer = RequestTimer(phase)
+    _local.timer = timer
+    return timer
+
+
+def stop():
+    """Stop timing the current request and return its timer."""
+    timer = current()
+    if timer is not None:
+        timer.stop()
+        del _local.timer
+    return timer
+
+
+def current():
+    """Return the timer of the current request, or None."""
+    return getattr(_local, 'timer', None)
+
+
+def switch(phase):
+    """Move the current timer to phase, returning the previous phase."""
+    timer = current()
+    if timer is None:
+        return None
+    return timer.switch(phase)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Account the time of the block to phase name."""
+    timer = current()
+    if timer is None:
+        yield
+        return
+    previous = timer.switch(name)
+    try:
+        yield
+    finally:
+        timer.switch(previous)
@@ -17,6 +17,8 @@
 
 """Policy Engine For Cinder"""
 
+import time
+
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import cfg
@@ -31,6 +33,10 @@ policy_opts = [
     cfg.StrOpt('policy_default_rule',
                default='default',
                help=_('Rule checked when requested rule is not found')),
+    cfg.IntOpt('policy_check_interval',
+               default=5,
+               help=_('Seconds between checks of the policy file for '
+                      'changes, 0 to check on every request')),
     ]
 
 FLAGS = flags.FLAGS
@@ -39,6 +45,9 @@ FLAGS.register_opts(policy_opts)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
 
+# Decisions memoized per context are dropped past this many.
+_MAX_CONTEXT_DECISIONS = 1000
+
 
 def reset():
     global _POLICY_PATH
@@ -53,8 +62,14 @@ def init():
     global _POLICY_CACHE
     if not _POLICY_PATH:
         _POLICY_PATH = utils.find_config(FLAGS.policy_file)
+    now = time.time()
+    checked_at = _POLICY_CACHE.get('checked_at')
+    if (checked_at is not None and
+            0 <= now - checked_at < FLAGS.policy_check_interval):
+        return
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
                            reload_func=_set_brain)
+    _POLICY_CACHE['checked_at'] = now
 
 
 def _set_brain(data):
@@ -78,14 +93,21 @@ def enforce(context, action, target):
 
        :raises cinder.exception.PolicyNotAuthorized: if verification fails.
 
+    Decisions are memoized in the context, so checking the same action on
+    the same target again during a request is cheap.
+
     """
     init()
 
     match_list = ('rule:%s' % action,)
     credentials = context.to_dict()
 
-    policy.enforce(match_list, target, credentials,
-                   exception.PolicyNotAuthorized, action=action)
+    decisions = getattr(context, 'policy_decisions', None)
+    if decisions is not None and len(decisions) > _MAX_CONTEXT_DECISIONS:
+        decisions.clear()
+
+    if not policy.check(match_list, target, credentials, cache=decisions):
+        raise exception.PolicyNotAuthorized(action=action)
 
 
 def check_is_admin(roles):
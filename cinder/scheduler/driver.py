@@ -91,10 +91,12 @@ class Scheduler(object):
         """
         return self.host_manager.get_service_capabilities()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    sequence=None, full=True, removed=None):
         """Process a capability update from a service node."""
         self.host_manager.update_service_capabilities(service_name,
-                host, capabilities)
+                host, capabilities, sequence=sequence, full=full,
+                removed=removed)
 
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
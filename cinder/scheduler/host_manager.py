@@ -17,6 +17,12 @@
 Manage hosts in the current zone.
 """
 
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
+
+
+LOG = logging.getLogger(__name__)
+
 # FIXME(ja): this code was written only for compute. re-implement for volumes
 
 
@@ -26,11 +32,47 @@ class HostState(object):
 
 class HostManager(object):
 
+    def __init__(self):
+        # Capabilities, the sequence number of their last update and when
+        # it was received, by service name, by host
+        self.service_states = {}
+
     def get_host_list(self, *args):
         pass
 
-    def update_service_capabilities(self, *args):
-        pass
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    sequence=None, full=True, removed=None):
+        """Merge a capability update from a service into its state.
+
+        An update that is not full only carries the changed capabilities
+        and the names of the removed ones. It is ignored unless it follows
+        the last update received from the service, until the next full
+        update.
+        """
+        services = self.service_states.setdefault(host, {})
+        state = services.get(service_name)
+        if full or sequence is None:
+            state = services[service_name] = {
+                'capabilities': dict(capabilities)}
+        elif (state is None or state['sequence'] is None or
+              sequence != state['sequence'] + 1):
+            LOG.debug(_('Ignoring capability update %(sequence)s from '
+                        '%(service_name)s on %(host)s until the next full '
+                        'update'), locals())
+            return
+        else:
+            state['capabilities'].update(capabilities)
+            for key in removed or []:
+                state['capabilities'].pop(key, None)
+        state['sequence'] = sequence
+        state['updated_at'] = timeutils.utcnow()
 
     def get_service_capabilities(self, *args):
-        pass
+        """Return the capabilities of the services, by service name, by
+        host."""
+        result = {}
+        for host, services in self.service_states.iteritems():
+            result[host] = dict((service_name, state['capabilities'])
+                                for service_name, state
+                                in services.iteritems())
+        return result
@@ -45,7 +45,7 @@ FLAGS.register_opt(scheduler_driver_opt)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes"""
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         if not scheduler_driver:
@@ -69,12 +69,13 @@ class SchedulerManager(manager.Manager):
         return self.driver.get_service_capabilities()
 
     def update_service_capabilities(self, context, service_name=None,
-            host=None, capabilities=None, **kwargs):
+            host=None, capabilities=None, sequence=None, full=True,
+            removed=None, **kwargs):
         """Process a capability update from a service node."""
         if capabilities is None:
             capabilities = {}
         self.driver.update_service_capabilities(service_name, host,
-                capabilities)
+                capabilities, sequence=sequence, full=full, removed=removed)
 
     def _schedule(self, method, context, topic, *args, **kwargs):
         """Tries to call schedule_* method on the driver to retrieve host.
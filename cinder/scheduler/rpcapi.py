@@ -31,16 +31,18 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
     API version history:
 
         1.0 - Initial version.
+        1.1 - Add sequence, full and removed to update_service_capabilities
     '''
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def __init__(self):
         super(SchedulerAPI, self).__init__(topic=FLAGS.scheduler_topic,
                 default_version=self.RPC_API_VERSION)
 
     def update_service_capabilities(self, ctxt, service_name, host,
-            capabilities):
+            capabilities, sequence=None, full=True, removed=None):
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                 service_name=service_name, host=host,
-                capabilities=capabilities))
+                capabilities=capabilities, sequence=sequence, full=full,
+                removed=removed))
@@ -19,12 +19,16 @@
 
 """Generic Node base class for all workers that run on hosts."""
 
+import errno
 import inspect
 import os
 import random
 import signal
+import sys
+import time
 
 import eventlet
+import eventlet.greenio
 import greenlet
 
 from cinder import context
@@ -60,6 +64,14 @@ service_opts = [
     cfg.IntOpt('osapi_volume_listen_port',
                default=8776,
                help='port for os volume api to listen'),
+    cfg.IntOpt('osapi_volume_workers',
+               default=0,
+               help='Number of worker processes for the OpenStack Volume '
+                    'API. 0 serves it from the main process'),
+    cfg.IntOpt('graceful_shutdown_timeout',
+               default=60,
+               help='Seconds a stopping API worker process waits for the '
+                    'requests it is serving to finish'),
     ]
 
 FLAGS = flags.FLAGS
@@ -129,6 +141,219 @@ class Launcher(object):
                 pass
 
 
+class ProcessLauncher(object):
+    """Launch a WSGI service in a number of forked worker processes.
+
+    The parent binds the listening socket once and forks the workers, which
+    all accept connections on it, and respawns the workers that die.  On
+    SIGHUP it reloads the configuration and the application, forks a new
+    set of workers and stops the old ones.  On SIGTERM or SIGINT it stops
+    the workers and exits.  A worker that is stopped finishes the requests
+    it is serving first, for up to FLAGS.graceful_shutdown_timeout seconds.
+    """
+
+    def __init__(self):
+        """Initialize the process launcher.
+
+        :returns: None
+
+        """
+        self.children = {}
+        self.retiring = set()
+        self.forktimes = []
+        self.sigcaught = None
+        self.server = None
+        self.workers = 0
+        rfd, self.writepipe = os.pipe()
+        self.readpipe = eventlet.greenio.GreenPipe(rfd, 'r')
+
+    def _handle_signal(self, signo, frame):
+        self.sigcaught = signo
+
+    def _set_signal_handlers(self, handler):
+        for signo in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signo, handler)
+
+    def _pipe_watcher(self):
+        # This blocks until the write end of the pipe is closed, which
+        # only happens when the parent dies.
+        self.readpipe.read()
+        LOG.info(_('Parent process has died unexpectedly, exiting'))
+        os._exit(1)
+
+    def _child_process(self, server):
+        """Serve in a freshly forked worker until it is told to stop.
+
+        :returns: The exit status of the worker.
+
+        """
+        # Get a hub of our own rather than the copy of the parent's, and
+        # keep the parent's signal handlers and random state out of the
+        # worker.
+        eventlet.hubs.use_hub()
+        os.close(self.writepipe)
+        eventlet.spawn_n(self._pipe_watcher)
+        self._set_signal_handlers(
+            lambda signo, frame: eventlet.spawn_n(self._child_stop, server,
+                                                  signo))
+        random.seed()
+
+        try:
+            server.start()
+            server.wait()
+            server.drain(FLAGS.graceful_shutdown_timeout)
+        except Exception:
+            LOG.exception(_('Unhandled exception in worker %d') % os.getpid())
+            return 2
+        return 0
+
+    def _child_stop(self, server, signo):
+        LOG.info(_('Worker %(pid)d caught signal %(signo)d, finishing '
+                   'requests in flight') %
+                 {'pid': os.getpid(), 'signo': signo})
+        server.stop()
+
+    def _start_child(self, server):
+        """Fork a worker serving server.
+
+        :returns: The pid of the worker.
+
+        """
+        if len(self.forktimes) > self.workers:
+            # Fork at most once a second per worker, so a worker that dies
+            # on startup does not make us fork in a tight loop.
+            if time.time() - self.forktimes[0] < self.workers:
+                LOG.info(_('Forking too fast, sleeping'))
+                time.sleep(1)
+            self.forktimes.pop(0)
+        self.forktimes.append(time.time())
+
+        # Close our database and rpc connections so the worker opens its
+        # own engine and connection pool instead of sharing our sockets.
+        db.dispose_engine()
+        rpc.cleanup()
+
+        pid = os.fork()
+        if pid == 0:
+            status = self._child_process(server)
+            os._exit(status)
+
+        LOG.info(_('Started worker %d') % pid)
+        self.children[pid] = server
+        return pid
+
+    def _wait_child(self):
+        """Reap a worker that exited, if any.
+
+        :returns: The server of the worker if it still had to be running,
+                  None otherwise.
+
+        """
+        try:
+            pid, status = os.waitpid(0, os.WNOHANG)
+        except OSError, exc:
+            if exc.errno == errno.ECHILD:
+                # Nothing left to wait for, our workers are all gone.
+                self.children = {}
+                self.retiring = set()
+            elif exc.errno != errno.EINTR:
+                raise
+            return None
+        if not pid:
+            return None
+
+        if os.WIFSIGNALED(status):
+            LOG.info(_('Worker %(pid)d killed by signal %(signo)d') %
+                     {'pid': pid, 'signo': os.WTERMSIG(status)})
+        else:
+            LOG.info(_('Worker %(pid)d exited with status %(status)d') %
+                     {'pid': pid, 'status': os.WEXITSTATUS(status)})
+        self.retiring.discard(pid)
+        return self.children.pop(pid, None)
+
+    def _respawn_children(self):
+        while self.sigcaught is None:
+            server = self._wait_child()
+            if server is None:
+                eventlet.greenthread.sleep(.1)
+                continue
+            self._start_child(server)
+
+    def launch_server(self, server, workers=1):
+        """Bind the server's socket and fork workers serving it.
+
+        :param server: The WSGIService to serve.
+        :param workers: Number of worker processes.
+        :returns: None
+
+        """
+        self.server = server
+        self.workers = workers
+        server.listen()
+        for _i in xrange(workers):
+            self._start_child(server)
+
+    def reload(self):
+        """Reload the configuration and application and replace the workers.
+
+        :returns: None
+
+        """
+        LOG.info(_('Reloading configuration'))
+        FLAGS.clear()
+        flags.parse_args(sys.argv)
+        self.server.reload()
+
+        old = self.children
+        self.children = {}
+        for _i in xrange(self.workers):
+            self._start_child(self.server)
+        self._signal_children(old)
+        self.retiring.update(old)
+
+    def _signal_children(self, pids, signo=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, signo)
+            except OSError, exc:
+                if exc.errno != errno.ESRCH:
+                    raise
+
+    def stop(self):
+        """Stop the workers and wait for them to exit.
+
+        :returns: None
+
+        """
+        self._set_signal_handlers(signal.SIG_DFL)
+        pids = set(self.children) | self.retiring
+        self._signal_children(pids)
+        if pids:
+            LOG.info(_('Waiting on %d workers to exit') % len(pids))
+        self.retiring.update(self.children)
+        self.children = {}
+        while self.retiring:
+            self._wait_child()
+            eventlet.greenthread.sleep(.1)
+
+    def wait(self):
+        """Supervise the workers until a signal stops the launcher.
+
+        :returns: None
+
+        """
+        self._set_signal_handlers(self._handle_signal)
+        while True:
+            self._respawn_children()
+            signo, self.sigcaught = self.sigcaught, None
+            if signo != signal.SIGHUP:
+                LOG.info(_('Caught signal %d, stopping workers') % signo)
+                break
+            self.reload()
+        self.stop()
+        rpc.cleanup()
+
+
 class Service(object):
     """Service object for binaries running on hosts.
 
@@ -336,6 +561,7 @@ class WSGIService(object):
         self.app = self.loader.load_app(name)
         self.host = getattr(FLAGS, '%s_listen' % name, "0.0.0.0")
         self.port = getattr(FLAGS, '%s_listen_port' % name, 0)
+        self.workers = getattr(FLAGS, '%s_workers' % name, 0)
         self.server = wsgi.Server(name,
                                   self.app,
                                   host=self.host,
@@ -376,6 +602,33 @@ class WSGIService(object):
         self.server.start()
         self.port = self.server.port
 
+    def listen(self):
+        """Bind the listening socket, so forked workers can share it.
+
+        :returns: None
+
+        """
+        self.server.listen()
+        self.port = self.server.port
+
+    def reload(self):
+        """Load the application again, e.g. after a configuration change.
+
+        :returns: None
+
+        """
+        self.app = self.loader.load_app(self.name)
+        self.server.app = self.app
+
+    def drain(self, timeout=None):
+        """Stop accepting requests and wait for the ones being served.
+
+        :param timeout: Seconds to wait, or None to wait until they finish.
+        :returns: None
+
+        """
+        self.server.drain(timeout)
+
     def stop(self):
         """Stop serving this API.
 
@@ -120,6 +120,20 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_stream(self):
+        input_dict = dict(before=1, servers=[dict(id=i) for i in range(25)],
+                          after=dict(a=(2, 3)))
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.stream(input_dict, 'servers', 10))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(''.join(chunks), serializer.serialize(input_dict))
+
+    def test_stream_empty(self):
+        input_dict = dict(servers=[])
+        serializer = wsgi.JSONDictSerializer()
+        self.assertEqual(''.join(serializer.stream(input_dict, 'servers', 10)),
+                         serializer.serialize(input_dict))
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -193,6 +207,17 @@ class ResourceTest(test.TestCase):
         self.assertEqual(response.body, 'off')
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_response_headers(self):
+        class Controller(object):
+            def index(self, req):
+                req.environ['cinder.response_headers'] = {'ETag': '"abc"'}
+                return {'foo': 'bar'}
+
+        req = webob.Request.blank('/tests')
+        app = fakes.TestRouter(Controller())
+        response = req.get_response(app)
+        self.assertEqual(response.headers['ETag'], '"abc"')
+
     def test_resource_not_authorized(self):
         class Controller(object):
             def index(self, req):
@@ -829,6 +854,63 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streams_collections(self):
+        self.flags(osapi_stream_chunk_size=10)
+        obj = {'servers': [{'id': i} for i in range(25)]}
+        robj = wsgi.ResponseObject(obj)
+        request = wsgi.Request.blank('/tests')
+
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(response.content_length, None)
+        self.assertEqual(len(list(response.app_iter)), 5)
+
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(response.body,
+                         wsgi.JSONDictSerializer().serialize(obj))
+
+        self.flags(osapi_stream_chunk_size=25)
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(response.content_length, len(response.body))
+
+    def test_cached_serialize(self):
+        built = []
+
+        def builder():
+            built.append(1)
+            return {'a': 'b'}
+
+        cache = {}
+        for i in range(2):
+            for content_type in ('application/json', 'application/xml'):
+                robj = wsgi.CachedResponseObject(cache, 'key', builder,
+                                                 code=203)
+                robj['X-header1'] = 'header1'
+                request = wsgi.Request.blank('/tests/123')
+                response = robj.serialize(request, content_type,
+                                          {'json': wsgi.JSONDictSerializer,
+                                           'xml': wsgi.XMLDictSerializer})
+                self.assertEqual(response.status_int, 203)
+                self.assertEqual(response.headers['Content-Type'],
+                                 content_type)
+                self.assertEqual(response.headers['X-header1'], 'header1')
+                self.assertEqual(response.body,
+                                 cache[('key', content_type)])
+        self.assertEqual(len(built), 2)
+        self.assertEqual(cache[('key', 'application/json')],
+                         '{"a": "b"}')
+
+    def test_cached_serialize_bounded(self):
+        self.stubs.Set(wsgi, 'MAX_CACHED_BODIES', 2)
+        cache = {}
+        for key in range(3):
+            robj = wsgi.CachedResponseObject(cache, key, dict)
+            robj.serialize(wsgi.Request.blank('/tests'), 'application/json',
+                           {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(cache.keys(), [(2, 'application/json')])
+
 
 class ValidBodyTest(test.TestCase):
 
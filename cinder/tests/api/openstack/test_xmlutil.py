@@ -652,6 +652,96 @@ class TemplateTest(test.TestCase):
                          str(obj['test']['image']['id']))
         self.assertEqual(result[idx].text, obj['test']['image']['name'])
 
+    def test_compiled_matches_serialize(self):
+        obj = {'test': {'name': 'foobar', 'values': [1, 2, None],
+                        'attrs': {'a': 1, 'b': 2},
+                        'image': {'name': 'image_foobar', 'id': 42},
+                        'meta': {'k': 'v'}}}
+
+        root = xmlutil.TemplateElement('test', selector='test',
+                                       name='name', missing='missing')
+        value = xmlutil.SubTemplateElement(root, 'value', selector='values')
+        value.text = xmlutil.Selector()
+        attrs = xmlutil.SubTemplateElement(root, 'attrs', selector='attrs')
+        xmlutil.SubTemplateElement(attrs, 'attr', selector=xmlutil.get_items,
+                                   key=0, value=1)
+        root.append(xmlutil.make_flat_dict('meta'))
+        master = xmlutil.MasterTemplate(root, 1, nsmap=dict(f='foo'))
+
+        root_slave = xmlutil.TemplateElement('test', selector='test')
+        image = xmlutil.SubTemplateElement(root_slave, 'image',
+                                           selector='image', id='id')
+        image.text = xmlutil.Selector('name')
+        xmlutil.SubTemplateElement(root_slave, 'value', selector='values',
+                                   slave=xmlutil.ConstantSelector('s'))
+        master.attach(xmlutil.SlaveTemplate(root_slave, 1,
+                                            nsmap=dict(b='bar')))
+
+        expected = master._serialize(None, obj, master._siblings(),
+                                     master._nsmap())
+        self.assertEqual(etree.tostring(master.make_tree(obj)),
+                         etree.tostring(expected))
+
+    def test_compiled_is_cached(self):
+        root = xmlutil.TemplateElement('test', selector='test', name='name')
+        master = xmlutil.MasterTemplate(root, 1)
+        compiled = master.compile()
+        self.assertTrue(master.copy().compile() is compiled)
+
+        slave = xmlutil.SlaveTemplate(xmlutil.TemplateElement('test'), 1)
+        copy = master.copy()
+        copy.attach(slave)
+        self.assertFalse(copy.compile() is compiled)
+        self.assertTrue(master.compile() is compiled)
+
+    def test_compiled_template_changed(self):
+        obj = {'test': {'name': 'foobar', 'id': 1}}
+        root = xmlutil.TemplateElement('test', selector='test', name='name')
+        master = xmlutil.MasterTemplate(root, 1)
+        self.assertEqual(master.make_tree(obj).get('id'), None)
+
+        root.set('id')
+        self.assertEqual(master.make_tree(obj).get('id'), '1')
+
+    def _make_collection_template(self):
+        root = xmlutil.TemplateElement('items')
+        item = xmlutil.SubTemplateElement(root, 'item', selector='items')
+        item.set('id')
+        xmlutil.make_links(item, 'links')
+        master = xmlutil.MasterTemplate(root, 1, nsmap={
+            None: 'http://example.com/items', 'atom': xmlutil.XMLNS_ATOM})
+
+        root_slave = xmlutil.TemplateElement('items')
+        item_slave = xmlutil.SubTemplateElement(root_slave, 'item',
+                                                selector='items')
+        item_slave.set('size')
+        master.attach(xmlutil.SlaveTemplate(root_slave, 1))
+        return master
+
+    def test_stream(self):
+        obj = {'items': [{'id': i, 'size': i * 2,
+                          'links': [{'rel': 'self', 'href': 'x/%d' % i}]}
+                         for i in range(25)]}
+        tmpl = self._make_collection_template()
+
+        chunks = list(tmpl.stream(obj, 'items', 10))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(''.join(chunks), tmpl.serialize(obj))
+
+    def test_stream_empty(self):
+        tmpl = self._make_collection_template()
+        self.assertEqual(''.join(tmpl.stream({'items': []}, 'items', 10)),
+                         etree.tostring(tmpl.make_tree({'items': []}),
+                                        encoding='UTF-8',
+                                        xml_declaration=True))
+
+    def test_stream_other_keys(self):
+        obj = {'items': [{'id': i} for i in range(25)], 'other': 1}
+        tmpl = self._make_collection_template()
+
+        chunks = list(tmpl.stream(obj, 'items', 10))
+        self.assertEqual(chunks, [tmpl.serialize(obj)])
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
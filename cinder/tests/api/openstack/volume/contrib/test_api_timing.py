@@ -0,0 +1,76 @@
+#   Copyright 2012 OpenStack, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+from lxml import etree
+import webob
+
+from cinder.api import instrumentation
+from cinder import context
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import timing
+from cinder import test
+from cinder.tests.api.openstack import fakes
+
+
+def app():
+    # no auth, just let environ['cinder.context'] pass through
+    api = fakes.volume.APIRouter()
+    mapper = fakes.urlmap.URLMap()
+    mapper['/v1'] = api
+    return mapper
+
+
+class ApiTimingTest(test.TestCase):
+
+    def setUp(self):
+        super(ApiTimingTest, self).setUp()
+        instrumentation.reset_stats()
+        self.addCleanup(instrumentation.reset_stats)
+        timer = timing.RequestTimer('auth')
+        timer.times = {'auth': 0.001, 'db': 0.02, 'controller': 0.003}
+        timer.counts = {'db': 2}
+        instrumentation.record('GET /{project_id}/volumes', timer)
+
+    def _get(self, ctxt, accept='application/json'):
+        req = webob.Request.blank('/v1/fake/os-api-timing')
+        req.accept = accept
+        req.environ['cinder.context'] = ctxt
+        return req.get_response(app())
+
+    def test_index_as_admin(self):
+        resp = self._get(context.RequestContext('admin', 'fake', True))
+        self.assertEqual(resp.status_int, 200)
+        stats = jsonutils.loads(resp.body)['api_timing']
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['route'], 'GET /{project_id}/volumes')
+        self.assertEqual(stats[0]['count'], 1)
+        buckets = dict((b['le'], b['count']) for b in stats[0]['buckets'])
+        self.assertEqual(buckets[25], 1)
+        self.assertEqual(stats[0]['phases'][2],
+                         {'name': 'db', 'time': 0.02, 'count': 2})
+
+    def test_index_xml(self):
+        resp = self._get(context.RequestContext('admin', 'fake', True),
+                         'application/xml')
+        self.assertEqual(resp.status_int, 200)
+        root = etree.XML(resp.body)
+        self.assertEqual(root.tag, 'api_timing')
+        route = root.find('route')
+        self.assertEqual(route.get('route'), 'GET /{project_id}/volumes')
+        self.assertEqual(len(route.findall('bucket')), 12)
+        self.assertEqual(len(route.findall('phase')), 3)
+
+    def test_index_as_non_admin(self):
+        resp = self._get(context.RequestContext('fake', 'fake'))
+        self.assertEqual(resp.status_int, 403)
@@ -0,0 +1,165 @@
+#   Copyright 2012 OpenStack, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import webob
+
+from cinder import context
+from cinder import db
+from cinder import flags
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import rpc
+from cinder import test
+from cinder.tests.api.openstack import fakes
+
+FLAGS = flags.FLAGS
+
+
+def app():
+    # no auth, just let environ['cinder.context'] pass through
+    api = fakes.volume.APIRouter()
+    mapper = fakes.urlmap.URLMap()
+    mapper['/v1'] = api
+    return mapper
+
+
+class VolumeBulkActionsTest(test.TestCase):
+
+    def setUp(self):
+        super(VolumeBulkActionsTest, self).setUp()
+        self.ctxt = context.RequestContext('fake', 'fake')
+        self.admin_ctxt = context.RequestContext('admin', 'fake', True)
+        self.casts = []
+        self.stubs.Set(rpc, 'cast', self._fake_cast)
+
+    def _fake_cast(self, ctxt, topic, msg):
+        self.casts.append((topic, msg))
+
+    def _create_volume(self, **values):
+        volume = {'project_id': 'fake', 'status': 'available',
+                  'host': 'host1', 'size': 1}
+        volume.update(values)
+        return db.volume_create(self.admin_ctxt, volume)['id']
+
+    def _action(self, ctxt, action, body):
+        req = webob.Request.blank('/v1/fake/os-volume-bulk-actions/action')
+        req.method = 'POST'
+        req.headers['content-type'] = 'application/json'
+        req.body = jsonutils.dumps({action: body})
+        req.environ['cinder.context'] = ctxt
+        return req.get_response(app())
+
+    def _results(self, resp):
+        self.assertEqual(resp.status_int, 200)
+        results = jsonutils.loads(resp.body)['results']
+        return dict((r['id'], r['code']) for r in results)
+
+    def test_delete(self):
+        host1 = [self._create_volume(), self._create_volume()]
+        host2 = self._create_volume(host='host2', status='error')
+        in_use = self._create_volume(status='in-use')
+        with_snapshot = self._create_volume()
+        db.snapshot_create(self.admin_ctxt, {'volume_id': with_snapshot,
+                                             'project_id': 'fake'})
+        other = self._create_volume(project_id='other')
+
+        resp = self._action(self.ctxt, 'os-delete',
+                            {'volume_ids': host1 + [host2, in_use,
+                                                    with_snapshot, other,
+                                                    'missing']})
+        results = self._results(resp)
+        self.assertEqual(results, {host1[0]: 202, host1[1]: 202,
+                                   host2: 202, in_use: 400,
+                                   with_snapshot: 400, other: 404,
+                                   'missing': 404})
+
+        casts = dict((topic, msg) for topic, msg in self.casts)
+        self.assertEqual(len(self.casts), 2)
+        host1_msg = casts['%s.host1' % FLAGS.volume_topic]
+        self.assertEqual(host1_msg['method'], 'delete_volumes')
+        self.assertEqual(sorted(host1_msg['args']['volume_ids']),
+                         sorted(host1))
+        host2_msg = casts['%s.host2' % FLAGS.volume_topic]
+        self.assertEqual(host2_msg['args']['volume_ids'], [host2])
+        for volume_id in host1 + [host2]:
+            volume = db.volume_get(self.admin_ctxt, volume_id)
+            self.assertEqual(volume['status'], 'deleting')
+        volume = db.volume_get(self.admin_ctxt, in_use)
+        self.assertEqual(volume['status'], 'in-use')
+
+    def test_delete_unscheduled(self):
+        volume_id = self._create_volume(host=None, status='error')
+        resp = self._action(self.admin_ctxt, 'os-delete',
+                            {'volume_ids': [volume_id]})
+        self.assertEqual(self._results(resp), {volume_id: 202})
+        self.assertEqual(self.casts, [])
+        self.assertRaises(Exception, db.volume_get, self.admin_ctxt,
+                          volume_id)
+
+    def test_force_delete_as_non_admin(self):
+        volume_id = self._create_volume(status='in-use')
+        resp = self._action(self.ctxt, 'os-delete',
+                            {'volume_ids': [volume_id], 'force': True})
+        self.assertEqual(resp.status_int, 403)
+        self.assertEqual(self.casts, [])
+
+    def test_too_many_volumes(self):
+        self.flags(osapi_bulk_max_items=1)
+        resp = self._action(self.ctxt, 'os-delete',
+                            {'volume_ids': ['a', 'b']})
+        self.assertEqual(resp.status_int, 400)
+
+    def test_volume_ids_not_strings(self):
+        resp = self._action(self.ctxt, 'os-delete', {'volume_ids': [{}]})
+        self.assertEqual(resp.status_int, 400)
+        self.assertEqual(self.casts, [])
+
+    def test_set_metadata(self):
+        volume_ids = [self._create_volume(), self._create_volume()]
+        other = self._create_volume(project_id='other')
+        resp = self._action(self.ctxt, 'os-set_metadata',
+                            {'volume_ids': volume_ids + [other],
+                             'metadata': {'team': 'storage'}})
+        self.assertEqual(self._results(resp), {volume_ids[0]: 202,
+                                               volume_ids[1]: 202,
+                                               other: 404})
+        for volume_id in volume_ids:
+            self.assertEqual(db.volume_metadata_get(self.ctxt, volume_id),
+                             {'team': 'storage'})
+        self.assertEqual(db.volume_metadata_get(self.admin_ctxt, other), {})
+
+    def test_reset_status(self):
+        volume_ids = [self._create_volume(), self._create_volume()]
+        resp = self._action(self.admin_ctxt, 'os-reset_status',
+                            {'volume_ids': volume_ids + ['missing'],
+                             'status': 'error'})
+        self.assertEqual(self._results(resp), {volume_ids[0]: 202,
+                                               volume_ids[1]: 202,
+                                               'missing': 404})
+        for volume_id in volume_ids:
+            volume = db.volume_get(self.admin_ctxt, volume_id)
+            self.assertEqual(volume['status'], 'error')
+
+    def test_reset_status_as_non_admin(self):
+        volume_id = self._create_volume()
+        resp = self._action(self.ctxt, 'os-reset_status',
+                            {'volume_ids': [volume_id], 'status': 'error'})
+        self.assertEqual(resp.status_int, 403)
+        volume = db.volume_get(self.admin_ctxt, volume_id)
+        self.assertEqual(volume['status'], 'available')
+
+    def test_reset_status_invalid(self):
+        volume_id = self._create_volume()
+        resp = self._action(self.admin_ctxt, 'os-reset_status',
+                            {'volume_ids': [volume_id], 'status': 'bogus'})
+        self.assertEqual(resp.status_int, 400)
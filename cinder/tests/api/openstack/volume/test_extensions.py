@@ -21,6 +21,7 @@ import webob
 from lxml import etree
 import iso8601
 
+from cinder.api.openstack import extensions
 from cinder.api.openstack import volume
 from cinder.api.openstack import xmlutil
 from cinder import flags
@@ -89,6 +90,29 @@ class ExtensionControllerTest(ExtensionTestCase):
             output = jsonutils.loads(response.body)
             self.assertEqual(output['extension']['alias'], ext['alias'])
 
+    def test_list_extensions_cached(self):
+        translated = []
+        translate = extensions.ExtensionsResource._translate
+
+        def fake_translate(resource, ext):
+            translated.append(ext.alias)
+            return translate(resource, ext)
+
+        self.stubs.Set(extensions.ExtensionsResource, '_translate',
+                       fake_translate)
+        app = volume.APIRouter()
+        bodies = []
+        for accept in ('application/json', 'application/xml',
+                       'application/json'):
+            request = webob.Request.blank("/fake/extensions")
+            request.accept = accept
+            response = request.get_response(app)
+            self.assertEqual(200, response.status_int)
+            bodies.append(response.body)
+        self.assertEqual(bodies[0], bodies[2])
+        self.assertNotEqual(bodies[0], bodies[1])
+        self.assertEqual(translated.count('FOXNSOX'), 2)
+
     def test_get_extension_json(self):
         app = volume.APIRouter()
         request = webob.Request.blank("/fake/extensions/FOXNSOX")
@@ -18,7 +18,9 @@ Tests dealing with HTTP rate-limiting.
 """
 
 import httplib
+import os
 import StringIO
+import time
 from xml.dom import minidom
 
 from lxml import etree
@@ -520,6 +522,40 @@ class LimiterTest(BaseLimitTestSuite):
         """
         self.assertEqual(self.limiter.levels['user3'], [])
 
+    def test_only_limits_for_verb_are_matched(self):
+        """
+        Ensure a request is only matched against the limits for its verb.
+        """
+        matched = []
+        orig_match = limits.Limit.match
+
+        def fake_match(limit, url):
+            matched.append(limit.verb)
+            return orig_match(limit, url)
+
+        self.stubs.Set(limits.Limit, 'match', fake_match)
+        self.limiter.check_for_delay("PUT", "/volumes")
+        self.assertEqual(matched, ["PUT", "PUT"])
+
+    def test_least_recently_used_forgotten(self):
+        """
+        Ensure only a bounded number of buckets is kept.
+        """
+        self.flags(rate_limit_buckets=2)
+        self.limiter = limits.Limiter(TEST_LIMITS)
+
+        expected = [None] * 10 + [6.0]
+        results = list(self._check(11, "PUT", "/anything", "user1"))
+        self.assertEqual(expected, results)
+
+        list(self._check(1, "PUT", "/anything", "user2"))
+        list(self._check(1, "PUT", "/anything", "user3"))
+
+        # user1 has been forgotten, so its budget starts over.
+        self.assertEqual(len(self.limiter.store._buckets), 2)
+        results = list(self._check(1, "PUT", "/anything", "user1"))
+        self.assertEqual([None], results)
+
     def test_multiple_users(self):
         """
         Tests involving multiple users.
@@ -554,6 +590,54 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class SharedMemoryLimiterTest(LimiterTest):
+    """
+    Tests for `limits.Limiter` keeping its state in a
+    `limits.SharedMemoryLimitStore`.
+    """
+
+    def setUp(self):
+        self.flags(rate_limit_store='cinder.api.openstack.volume.limits.'
+                                    'SharedMemoryLimitStore')
+        super(SharedMemoryLimiterTest, self).setUp()
+
+    def test_least_recently_used_forgotten(self):
+        """
+        Ensure a full table reuses the least recently used slot.
+        """
+        self.flags(rate_limit_buckets=2)
+        self.limiter = limits.Limiter(TEST_LIMITS)
+
+        expected = [None] * 10 + [6.0]
+        results = list(self._check(11, "PUT", "/anything", "user1"))
+        self.assertEqual(expected, results)
+
+        self.time += 1.0
+        list(self._check(1, "PUT", "/anything", "user2"))
+        self.time += 1.0
+        list(self._check(1, "PUT", "/anything", "user3"))
+
+        self.assertEqual(self.limiter.store.get(("user1", 3)), None)
+        self.assertNotEqual(self.limiter.store.get(("user3", 3)), None)
+
+    def test_shared_with_forked_process(self):
+        """
+        Ensure requests made by a forked worker count for everyone.
+        """
+        pid = os.fork()
+        if pid == 0:
+            try:
+                list(self._check(10, "PUT", "/anything"))
+            finally:
+                os._exit(0)
+        while os.waitpid(pid, os.WNOHANG)[0] != pid:
+            time.sleep(0.01)
+
+        expected = [6.0]
+        results = list(self._check(1, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
@@ -644,6 +728,8 @@ class FakeHttplibConnection(object):
     Fake `httplib.HTTPConnection`.
     """
 
+    http_version = "HTTP/1.0"
+
     def __init__(self, app, host):
         """
         Initialize `FakeHttplibConnection`.
@@ -667,7 +753,7 @@ class FakeHttplibConnection(object):
         req.body = body
 
         resp = str(req.get_response(self.app))
-        resp = "HTTP/1.0 %s" % resp
+        resp = "%s %s" % (self.http_version, resp)
         sock = FakeHttplibSocket(resp)
         self.http_response = httplib.HTTPResponse(sock)
         self.http_response.begin()
@@ -676,6 +762,9 @@ class FakeHttplibConnection(object):
         """Return our generated response from the request."""
         return self.http_response
 
+    def close(self):
+        pass
+
 
 def wire_HTTPConnection_to_WSGI(host, app):
     """Monkeypatches HTTPConnection so that if you try to connect to host, you
@@ -748,9 +837,39 @@ class WsgiLimiterProxyTest(BaseLimitTestSuite):
 
         self.assertEqual((delay, error), expected)
 
+    def test_connection_reused(self):
+        """Connections are kept open between requests."""
+        connections = []
+
+        class KeepAliveConnection(FakeHttplibConnection):
+            http_version = "HTTP/1.1"
+
+        def fake_connection(host):
+            connections.append(KeepAliveConnection(self.app, host))
+            return connections[-1]
+
+        self.stubs.Set(httplib, 'HTTPConnection', fake_connection)
+        for _i in xrange(3):
+            delay = self.proxy.check_for_delay("GET", "/anything")
+            self.assertEqual(delay, (None, None))
+        self.assertEqual(len(connections), 1)
+
+    def test_stale_connection_replaced(self):
+        """A pooled connection the limiter has closed is replaced."""
+        class StaleConnection(FakeHttplibConnection):
+            def request(self, *args, **kwargs):
+                raise httplib.BadStatusLine('')
+
+        self.proxy._connections.append(StaleConnection(self.app, "stale"))
+        delay = self.proxy.check_for_delay("GET", "/anything")
+        self.assertEqual(delay, (None, None))
+
     def tearDown(self):
-        # restore original HTTPConnection object
-        httplib.HTTPConnection = self.oldHTTPConnection
+        old_http_connection = self.oldHTTPConnection
+        super(WsgiLimiterProxyTest, self).tearDown()
+        # restore original HTTPConnection object, after the stubs the
+        # tests set on top of the wired one are unset
+        httplib.HTTPConnection = old_http_connection
 
 
 class LimitsViewBuilderTest(test.TestCase):
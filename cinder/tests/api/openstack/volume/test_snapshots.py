@@ -198,6 +198,29 @@ class SnapshotApiTest(test.TestCase):
         self.assertTrue('snapshot' in resp_dict)
         self.assertEqual(resp_dict['snapshot']['id'], UUID)
 
+    def test_snapshot_show_not_modified(self):
+        self.stubs.Set(volume.api.API, "get_snapshot", stub_snapshot_get)
+        req = fakes.HTTPRequest.blank('/v1/snapshots/%s' % UUID)
+        self.controller.show(req, UUID)
+        etag = req.environ['cinder.response_headers']['ETag']
+
+        req = fakes.HTTPRequest.blank('/v1/snapshots/%s' % UUID,
+                                      headers={'If-None-Match': etag})
+        self.assertEqual(self.controller.show(req, UUID).status_int, 304)
+
+    def test_snapshot_detail_not_modified(self):
+        self.stubs.Set(volume.api.API, "get_all_snapshots",
+            stub_snapshot_get_all)
+        self.stubs.Set(volume.api.API, "get_snapshot_changes",
+                       lambda *args: (3, datetime.datetime(2012, 1, 1)))
+        req = fakes.HTTPRequest.blank('/v1/snapshots/detail')
+        self.controller.detail(req)
+        etag = req.environ['cinder.response_headers']['ETag']
+
+        req = fakes.HTTPRequest.blank('/v1/snapshots/detail',
+                                      headers={'If-None-Match': etag})
+        self.assertEqual(self.controller.detail(req).status_int, 304)
+
     def test_snapshot_show_invalid_id(self):
         snapshot_id = INVALID_UUID
         req = fakes.HTTPRequest.blank('/v1/snapshots/%s' % snapshot_id)
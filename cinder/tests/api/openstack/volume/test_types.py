@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 from lxml import etree
 import webob
 
@@ -97,6 +99,35 @@ class VolumeTypesApiTest(test.TestCase):
         self.assertEqual('1', res_dict['volume_type']['id'])
         self.assertEqual('vol_type_1', res_dict['volume_type']['name'])
 
+    def test_volume_types_index_not_modified(self):
+        self.flags(osapi_cache_max_age=60)
+        self.stubs.Set(volume_types, 'get_all_types',
+                       return_volume_types_get_all_types)
+        changed_at = datetime.datetime(2012, 1, 1, 10, 0, 0, 500)
+        self.stubs.Set(volume_types, 'get_all_types_changes',
+                       lambda context: (3, changed_at))
+
+        req = fakes.HTTPRequest.blank('/v1/fake/types')
+        self.controller.index(req)
+        headers = req.environ['cinder.response_headers']
+        self.assertEqual(headers['Cache-Control'], 'private, max-age=60')
+        self.assertEqual(headers['Last-Modified'],
+                         'Sun, 01 Jan 2012 10:00:00 GMT')
+
+        req = fakes.HTTPRequest.blank(
+            '/v1/fake/types', headers={'If-None-Match': headers['ETag']})
+        self.assertEqual(self.controller.index(req).status_int, 304)
+
+        req = fakes.HTTPRequest.blank(
+            '/v1/fake/types', headers={'If-Modified-Since':
+                                       headers['Last-Modified']})
+        self.assertEqual(self.controller.index(req).status_int, 304)
+
+        req = fakes.HTTPRequest.blank(
+            '/v1/fake/types', headers={'If-Modified-Since':
+                                       'Sun, 01 Jan 2012 09:59:59 GMT'})
+        self.assertEqual(len(self.controller.index(req)['volume_types']), 3)
+
     def test_volume_types_show_not_found(self):
         self.stubs.Set(volume_types, 'get_volume_type',
                        return_volume_types_get_volume_type)
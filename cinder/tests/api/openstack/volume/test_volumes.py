@@ -23,6 +23,7 @@ from cinder import db
 from cinder.api.openstack.volume import extensions
 from cinder import exception
 from cinder import flags
+from cinder.openstack.common import timeutils
 from cinder import test
 from cinder.tests.api.openstack import fakes
 from cinder.tests.image import fake as fake_image
@@ -277,6 +278,42 @@ class VolumeApiTest(test.TestCase):
                                  'size': 1}]}
         self.assertEqual(res_dict, expected)
 
+    def test_volume_list_detail_not_modified(self):
+        changes = [(1, datetime.datetime(2012, 1, 1))]
+        self.stubs.Set(volume_api.API, 'get_changes',
+                       lambda *args: changes[0])
+        self.stubs.Set(volume_api.API, 'get_all',
+                       fakes.stub_volume_get_all_by_project)
+
+        req = fakes.HTTPRequest.blank('/v1/volumes/detail')
+        self.controller.detail(req)
+        etag = req.environ['cinder.response_headers']['ETag']
+
+        req = fakes.HTTPRequest.blank('/v1/volumes/detail',
+                                      headers={'If-None-Match': etag})
+        self.assertEqual(self.controller.detail(req).status_int, 304)
+
+        # The tag depends on the query
+        req = fakes.HTTPRequest.blank('/v1/volumes/detail?status=available',
+                                      headers={'If-None-Match': etag})
+        self.assertTrue('volumes' in self.controller.detail(req))
+
+        changes[0] = (2, datetime.datetime(2012, 1, 1))
+        req = fakes.HTTPRequest.blank('/v1/volumes/detail',
+                                      headers={'If-None-Match': etag})
+        self.assertTrue('volumes' in self.controller.detail(req))
+
+    def test_volume_list_recently_changed_no_etag(self):
+        self.stubs.Set(volume_api.API, 'get_changes',
+                       lambda *args: (1, timeutils.utcnow()))
+        self.stubs.Set(volume_api.API, 'get_all',
+                       fakes.stub_volume_get_all_by_project)
+
+        req = fakes.HTTPRequest.blank('/v1/volumes',
+                                      headers={'If-None-Match': '*'})
+        self.assertTrue('volumes' in self.controller.index(req))
+        self.assertFalse('ETag' in req.environ['cinder.response_headers'])
+
     def test_volume_list_by_name(self):
         def stub_volume_get_all_by_project(context, project_id):
             return [
@@ -358,6 +395,24 @@ class VolumeApiTest(test.TestCase):
                                'size': 1}}
         self.assertEqual(res_dict, expected)
 
+    def test_volume_show_not_modified(self):
+        req = fakes.HTTPRequest.blank('/v1/volumes/1')
+        self.controller.show(req, '1')
+        etag = req.environ['cinder.response_headers']['ETag']
+
+        req = fakes.HTTPRequest.blank('/v1/volumes/1',
+                                      headers={'If-None-Match': etag})
+        res = self.controller.show(req, '1')
+        self.assertEqual(res.status_int, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+
+        def stub_volume_get(self, context, volume_id):
+            return fakes.stub_volume(volume_id, status='in-use')
+        self.stubs.Set(volume_api.API, 'get', stub_volume_get)
+
+        res = self.controller.show(req, '1')
+        self.assertEqual(res['volume']['status'], 'in-use')
+
     def test_volume_show_no_attachments(self):
         def stub_volume_get(self, context, volume_id):
             return fakes.stub_volume(volume_id, attach_status='detached')
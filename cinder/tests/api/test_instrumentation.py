@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob
+
+from cinder.api import instrumentation
+from cinder import context
+from cinder import db
+from cinder.db.sqlalchemy import session as sql_session
+from cinder.openstack.common import timing
+from cinder import test
+from cinder.tests.api.openstack import fakes
+
+
+class RequestTimerTest(test.TestCase):
+
+    def setUp(self):
+        super(RequestTimerTest, self).setUp()
+        self.now = 100.0
+        self.stubs.Set(timing.time, 'time', lambda: self.now)
+        self.addCleanup(timing.stop)
+
+    def test_phases_exclude_nested_phases(self):
+        timer = timing.start('auth')
+        self.now += 1
+        with timing.phase('controller'):
+            self.now += 2
+            with timing.phase('db'):
+                self.now += 4
+            with timing.phase('db'):
+                self.now += 8
+            self.now += 16
+        self.now += 32
+        self.assertEqual(timing.stop(), timer)
+        self.assertEqual(timer.times, {'auth': 33, 'controller': 18,
+                                       'db': 12})
+        self.assertEqual(timer.counts['db'], 2)
+        self.assertEqual(timer.total(), 63)
+        self.assertEqual(timing.current(), None)
+
+    def test_phase_without_timer(self):
+        with timing.phase('db'):
+            self.assertEqual(timing.current(), None)
+
+
+class RequestTimingMiddlewareTest(test.TestCase):
+
+    def setUp(self):
+        super(RequestTimingMiddlewareTest, self).setUp()
+        instrumentation.reset_stats()
+        self.addCleanup(instrumentation.reset_stats)
+        self.ctxt = context.RequestContext('fake', 'fake')
+        self.volume = db.volume_create(self.ctxt, {'size': 1,
+                                                   'project_id': 'fake'})
+        self.app = instrumentation.RequestTimingMiddleware(
+            fakes.volume.APIRouter())
+
+    def _get(self, path):
+        req = webob.Request.blank(path)
+        req.environ['cinder.context'] = self.ctxt
+        return req.get_response(self.app)
+
+    def test_records_route_stats(self):
+        self._get('/fake/volumes/%s' % self.volume['id'])
+        self._get('/fake/volumes/%s' % self.volume['id'])
+        self._get('/fake/nonexistent')
+
+        stats = instrumentation.get_stats()
+        self.assertEqual([s['route'] for s in stats],
+                         ['GET (unrouted)', 'GET /{project_id}/volumes/:(id)'])
+        volume_stats = stats[1]
+        self.assertEqual(volume_stats['count'], 2)
+        self.assertEqual(sum(b['count'] for b in volume_stats['buckets']), 2)
+        phases = dict((p['name'], p) for p in volume_stats['phases'])
+        self.assertTrue(phases['db']['count'] >= 2)
+        for phase in ('auth', 'controller', 'serialize'):
+            self.assertTrue(phase in phases)
+        self.assertEqual(phases['controller']['count'], None)
+
+    def test_timing_header_in_debug(self):
+        path = '/fake/volumes/%s' % self.volume['id']
+        resp = self._get(path)
+        self.assertEqual(resp.status_int, 200)
+        self.assertFalse('X-Cinder-Timing' in resp.headers)
+
+        self.flags(debug=True)
+        resp = self._get(path)
+        header = resp.headers['X-Cinder-Timing']
+        self.assertTrue(header.startswith('total='))
+        self.assertTrue(' controller=' in header)
+        self.assertTrue(' db=' in header)
+
+    def test_format_timer(self):
+        timer = timing.RequestTimer('auth')
+        timer.times = {'auth': 0.001, 'db': 0.0025, 'controller': 0.004}
+        timer.counts = {'auth': 2, 'db': 3, 'controller': 1}
+        self.assertEqual(instrumentation.format_timer(timer),
+                         'total=7.50ms auth=1.00ms controller=4.00ms '
+                         'db=2.50ms/3')
+
+
+class EngineListenerTest(test.TestCase):
+
+    def setUp(self):
+        super(EngineListenerTest, self).setUp()
+        self.events = []
+
+        def fake_listen(target, name, fn):
+            self.events.append(name)
+
+        self.stubs.Set(sql_session, '_ENGINE', None)
+        self.stubs.Set(sql_session.sqlalchemy.event, 'listen', fake_listen)
+
+    def test_listens_to_dbapi_error(self):
+        class FakeEvents(object):
+            def dbapi_error(self, *args):
+                pass
+
+        self.stubs.Set(sql_session.sqlalchemy.events, 'ConnectionEvents',
+                       FakeEvents)
+        sql_session.get_engine()
+        self.assertTrue('dbapi_error' in self.events)
+
+    def test_skips_dbapi_error_before_sqlalchemy_0_7_7(self):
+        self.stubs.Set(sql_session.sqlalchemy.events, 'ConnectionEvents',
+                       object)
+        sql_session.get_engine()
+        self.assertTrue('after_cursor_execute' in self.events)
+        self.assertFalse('dbapi_error' in self.events)
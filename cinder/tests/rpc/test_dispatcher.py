@@ -0,0 +1,153 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for rpc.dispatcher and the amqp dispatch lanes
+"""
+
+from cinder import context
+from cinder import flags
+from cinder.openstack.common import cfg
+from cinder.openstack.common.rpc import amqp as rpc_amqp
+from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import dispatcher
+from cinder import test
+
+
+FLAGS = flags.FLAGS
+
+
+class FakeManager(object):
+    RPC_API_VERSION = '1.1'
+    RPC_METHOD_LANES = {'fast': 'control', 'slow': 'data'}
+
+    def __init__(self):
+        self.calls = []
+
+    def fast(self, ctxt, value):
+        self.calls.append(('fast', value))
+        return value
+
+    def slow(self, ctxt, value):
+        self.calls.append(('slow', value))
+        return value
+
+    def other(self, ctxt):
+        self.calls.append(('other', None))
+
+
+class RpcDispatcherTestCase(test.TestCase):
+    def setUp(self):
+        super(RpcDispatcherTestCase, self).setUp()
+        self.ctxt = context.RequestContext('fake_user', 'fake_project')
+        self.manager = FakeManager()
+        self.dispatcher = dispatcher.RpcDispatcher([self.manager])
+
+    def test_dispatch(self):
+        self.assertEqual(self.dispatcher.dispatch(self.ctxt, '1.1', 'fast',
+                                                  value=3), 3)
+        self.assertEqual(self.manager.calls, [('fast', 3)])
+
+    def test_dispatch_unsupported_version(self):
+        self.assertRaises(rpc_common.UnsupportedRpcVersion,
+                          self.dispatcher.dispatch, self.ctxt, '2.0', 'fast',
+                          value=3)
+
+    def test_dispatch_no_such_method(self):
+        self.assertRaises(AttributeError, self.dispatcher.dispatch,
+                          self.ctxt, '1.0', 'missing')
+
+    def test_get_lane(self):
+        self.assertEqual(self.dispatcher.get_lane('fast'), 'control')
+        self.assertEqual(self.dispatcher.get_lane('slow'), 'data')
+        self.assertEqual(self.dispatcher.get_lane('other'), None)
+
+    def test_stats(self):
+        self.dispatcher.stats.record('fast', 0.0005, 0.02)
+        self.dispatcher.stats.record('fast', 2, 400)
+        stats = self.dispatcher.stats.to_dict()
+        self.assertEqual(stats.keys(), ['fast'])
+        wait = stats['fast']['queue_wait']
+        self.assertEqual(wait['count'], 2)
+        self.assertEqual(wait['sum'], 2.0005)
+        self.assertEqual(wait['buckets']['le_0.001'], 1)
+        self.assertEqual(wait['buckets']['le_5'], 1)
+        run = stats['fast']['run_time']
+        self.assertEqual(run['max'], 400)
+        self.assertEqual(run['buckets']['le_0.05'], 1)
+        self.assertEqual(run['buckets']['le_inf'], 1)
+
+
+class ProxyCallbackLanesTestCase(test.TestCase):
+    def setUp(self):
+        super(ProxyCallbackLanesTestCase, self).setUp()
+        self.manager = FakeManager()
+        self.dispatcher = dispatcher.RpcDispatcher([self.manager])
+        self.replies = []
+        self.stubs.Set(rpc_amqp.RpcContext, 'reply',
+                       lambda ctxt, *args, **kwargs:
+                       self.replies.append(args))
+
+    def _callback(self):
+        return rpc_amqp.ProxyCallback(FLAGS, self.dispatcher, None)
+
+    def test_default_pool_without_lanes(self):
+        callback = self._callback()
+        self.assertEqual(callback.lane_pools, {})
+        self.assertTrue(callback._get_pool('fast') is callback.pool)
+
+    def test_lane_pools(self):
+        self.flags(rpc_thread_pool_lanes=['control:2', 'data:1'])
+        callback = self._callback()
+        self.assertEqual(callback.lane_pools['control'].size, 2)
+        self.assertEqual(callback.lane_pools['data'].size, 1)
+        self.assertTrue(callback._get_pool('fast') is
+                        callback.lane_pools['control'])
+        self.assertTrue(callback._get_pool('slow') is
+                        callback.lane_pools['data'])
+        self.assertTrue(callback._get_pool('other') is callback.pool)
+
+    def test_method_lane_override(self):
+        self.flags(rpc_thread_pool_lanes=['control:2', 'bogus', 'data:1'],
+                   rpc_method_lanes=['slow:control'])
+        callback = self._callback()
+        self.assertEqual(sorted(callback.lane_pools.keys()),
+                         ['control', 'data'])
+        self.assertTrue(callback._get_pool('slow') is
+                        callback.lane_pools['control'])
+
+    def test_invalid_lane_size(self):
+        for size in ('lots', '0', '-2'):
+            self.flags(rpc_thread_pool_lanes=['control:%s' % size])
+            try:
+                self._callback()
+            except cfg.ConfigFileValueError, e:
+                self.assertTrue('rpc_thread_pool_lanes' in str(e))
+                self.assertTrue('control:%s' % size in str(e))
+            else:
+                self.fail('lane size %s was accepted' % size)
+
+    def test_call_records_stats(self):
+        self.flags(rpc_thread_pool_lanes=['control:2'])
+        callback = self._callback()
+        callback({'method': 'fast', 'args': {'value': 42},
+                  '_context_user_id': 'fake_user'})
+        callback.lane_pools['control'].waitall()
+        self.assertEqual(self.manager.calls, [('fast', 42)])
+        self.assertEqual(self.replies[0], (42, None))
+        stats = self.dispatcher.stats.to_dict()
+        self.assertEqual(stats['fast']['run_time']['count'], 1)
+        self.assertEqual(stats['fast']['queue_wait']['count'], 1)
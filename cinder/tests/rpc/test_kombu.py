@@ -0,0 +1,140 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for rpc.impl_kombu, using the in-memory kombu transport
+"""
+
+from cinder import context
+from cinder import flags
+from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import dispatcher
+from cinder.openstack.common.rpc import serializer as rpc_serializer
+from cinder import test
+
+try:
+    from cinder.openstack.common.rpc import impl_kombu
+except ImportError:
+    impl_kombu = None
+
+
+FLAGS = flags.FLAGS
+
+
+class EchoManager(object):
+    def echo(self, ctxt, value):
+        return value
+
+    def echo_many(self, ctxt, values):
+        for value in values:
+            yield value
+
+    def fail(self, ctxt):
+        raise test.TestingException('failed')
+
+
+class KombuCallTestCase(test.TestCase):
+    @test.skip_if(impl_kombu is None, "kombu is not available")
+    def setUp(self):
+        super(KombuCallTestCase, self).setUp()
+        self.flags(fake_rabbit=True,
+                   allowed_rpc_exception_modules=['cinder.test'])
+        self.ctxt = context.get_admin_context()
+        self.conn = impl_kombu.create_connection(FLAGS, new=True)
+        self.conn.create_consumer('test_kombu',
+                                  dispatcher.RpcDispatcher([EchoManager()]))
+        self.conn.consume_in_thread()
+
+    def tearDown(self):
+        self.conn.close()
+        impl_kombu.cleanup()
+        super(KombuCallTestCase, self).tearDown()
+
+    def _call(self, method, **kwargs):
+        return impl_kombu.call(FLAGS, self.ctxt, 'test_kombu',
+                               {'method': method, 'args': kwargs},
+                               timeout=5)
+
+    def _test_calls(self):
+        self.assertEqual(self._call('echo', value=42), 42)
+        self.assertEqual(self._call('echo', value='x'), 'x')
+        result = impl_kombu.multicall(FLAGS, self.ctxt, 'test_kombu',
+                                      {'method': 'echo_many',
+                                       'args': {'values': [1, 2, 3]}},
+                                      timeout=5)
+        self.assertEqual(list(result), [1, 2, 3])
+        self.assertRaises(test.TestingException, self._call, 'fail')
+
+    def test_call(self):
+        self._test_calls()
+        self.assertEqual(impl_kombu.Connection.pool.reply_proxy, None)
+
+    def test_call_single_reply_queue(self):
+        self.flags(amqp_rpc_single_reply_queue=True)
+        self._test_calls()
+        reply_proxy = impl_kombu.Connection.pool.reply_proxy
+        self.assertNotEqual(reply_proxy, None)
+        # Finished calls must not leave waiters behind
+        self.assertEqual(reply_proxy._call_waiters, {})
+
+    def test_call_single_reply_queue_timeout(self):
+        self.flags(amqp_rpc_single_reply_queue=True)
+        self.assertRaises(rpc_common.Timeout, impl_kombu.call, FLAGS,
+                          self.ctxt, 'test_kombu_nobody',
+                          {'method': 'echo', 'args': {'value': 1}},
+                          timeout=0.1)
+        reply_proxy = impl_kombu.Connection.pool.reply_proxy
+        self.assertEqual(reply_proxy._call_waiters, {})
+
+    def test_notify_many_reuses_publisher(self):
+        created = []
+        orig_init = impl_kombu.NotifyPublisher.__init__
+
+        def fake_init(publisher, *args, **kwargs):
+            created.append(args[2])
+            orig_init(publisher, *args, **kwargs)
+
+        self.stubs.Set(impl_kombu.NotifyPublisher, '__init__', fake_init)
+        received = []
+        listener = impl_kombu.create_connection(FLAGS, new=True)
+        self.addCleanup(listener.close)
+        listener.declare_topic_consumer('notifications.info',
+                                        received.append)
+        for i in range(2):
+            impl_kombu.notify_many(FLAGS, [(self.ctxt, 'notifications.info',
+                                            {'event_type': 'e%d' % i})])
+        self.assertEqual(created, ['notifications.info'])
+        notify_connection = impl_kombu.Connection.pool.notify_connection
+        self.assertNotEqual(notify_connection, None)
+        listener.consume(limit=2)
+        self.assertEqual([msg['event_type'] for msg in received],
+                         ['e0', 'e1'])
+
+    @test.skip_if(rpc_serializer.msgpack is None, "msgpack is not available")
+    def test_call_msgpack(self):
+        self.flags(rpc_serializer='msgpack')
+        sent = []
+        orig_publish = impl_kombu.kombu.messaging.Producer.publish
+
+        def fake_publish(producer, body, *args, **kwargs):
+            sent.append(kwargs.get('serializer'))
+            return orig_publish(producer, body, *args, **kwargs)
+
+        self.stubs.Set(impl_kombu.kombu.messaging.Producer, 'publish',
+                       fake_publish)
+        self._test_calls()
+        # Requests and the replies to them are all sent as msgpack.
+        self.assertEqual(set(sent), set(['msgpack']))
@@ -0,0 +1,117 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for rpc.matchmaker
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+from cinder.openstack.common.rpc import matchmaker
+from cinder import test
+
+
+HOSTS = ['host%d' % i for i in xrange(10)]
+
+
+class HashRingTestCase(test.TestCase):
+    def test_stable(self):
+        ring = matchmaker.HashRing(HOSTS)
+        again = matchmaker.HashRing(list(reversed(HOSTS)))
+        for i in xrange(100):
+            key = 'key%d' % i
+            self.assertTrue(ring.get_host(key) in HOSTS)
+            self.assertEqual(ring.get_host(key), again.get_host(key))
+
+    def test_spread(self):
+        ring = matchmaker.HashRing(HOSTS)
+        counts = dict((host, 0) for host in HOSTS)
+        for i in xrange(10000):
+            counts[ring.get_host('key%d' % i)] += 1
+        # Every host gets a share, and no host gets twice its share.
+        self.assertTrue(min(counts.values()) > 0)
+        self.assertTrue(max(counts.values()) < 2000)
+
+    def test_remove_host_moves_only_its_keys(self):
+        ring = matchmaker.HashRing(HOSTS)
+        smaller = matchmaker.HashRing(HOSTS[1:])
+        for i in xrange(1000):
+            key = 'key%d' % i
+            if ring.get_host(key) != HOSTS[0]:
+                self.assertEqual(ring.get_host(key), smaller.get_host(key))
+
+    def test_empty(self):
+        self.assertEqual(matchmaker.HashRing([]).get_host('key'), None)
+
+
+class MatchMakerConsistentHashTestCase(test.TestCase):
+    def setUp(self):
+        super(MatchMakerConsistentHashTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.ringfile = os.path.join(self.tmpdir, 'ring.json')
+        self._write_ring({'volume': HOSTS})
+        self.flags(matchmaker_ringfile=self.ringfile,
+                   matchmaker_ring_check_interval=5)
+        self.now = 1000.0
+        self.stubs.Set(matchmaker.time, 'time', lambda: self.now)
+
+    def _write_ring(self, ring, mtime=None):
+        with open(self.ringfile, 'w') as fh:
+            json.dump(ring, fh)
+        if mtime is not None:
+            os.utime(self.ringfile, (mtime, mtime))
+
+    def test_queues(self):
+        mm = matchmaker.MatchMakerConsistentHash()
+        queues = mm.queues('volume')
+        self.assertEqual(len(queues), 1)
+        key, host = queues[0]
+        self.assertEqual(key, 'volume.' + host)
+        self.assertEqual(mm.queues('volume'), queues)
+        self.assertEqual(mm.queues('volume.host1'), [('volume', 'host1')])
+        self.assertEqual(len(mm.queues('fanout~volume')), len(HOSTS) + 1)
+        self.assertEqual(mm.queues('unknown'), [])
+
+    def test_reload(self):
+        exchange = matchmaker.ConsistentHashRingExchange()
+        self._write_ring({'volume': ['newhost']}, mtime=self.now + 10)
+
+        # Not reloaded until the check interval has passed.
+        self.assertNotEqual(exchange.run('volume'),
+                            [('volume.newhost', 'newhost')])
+        self.now += 5
+        self.assertEqual(exchange.run('volume'),
+                         [('volume.newhost', 'newhost')])
+
+    def test_reload_disabled(self):
+        self.flags(matchmaker_ring_check_interval=0)
+        exchange = matchmaker.ConsistentHashRingExchange()
+        self._write_ring({'other': HOSTS}, mtime=self.now + 10)
+        self.now += 60
+        self.assertEqual(len(exchange.run('volume')), 1)
+
+    def test_reload_invalid_keeps_ring(self):
+        exchange = matchmaker.RoundRobinRingExchange()
+        with open(self.ringfile, 'w') as fh:
+            fh.write('{not json')
+        os.utime(self.ringfile, (self.now + 10, self.now + 10))
+        self.now += 5
+        self.assertEqual(len(exchange.run('volume')), 1)
+        self.assertEqual(exchange.ring, {'volume': HOSTS})
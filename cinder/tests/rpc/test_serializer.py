@@ -0,0 +1,96 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for rpc.serializer
+"""
+
+import datetime
+
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import serializer
+from cinder import test
+
+
+MESSAGE = {'method': 'create_volume',
+           'args': {'volume_id': 'e4a1c2f8', 'snapshot_id': None,
+                    'size': 10, 'metadata': {u'k\xe9y': u'v\xe4lue'},
+                    'ratio': 1.5, 'hosts': ['a', 'b']},
+           'version': '1.2'}
+
+
+class SerializerTestCase(test.TestCase):
+    def test_json_roundtrip(self):
+        data = serializer.encode(MESSAGE, 'json')
+        self.assertEqual(data, jsonutils.dumps(MESSAGE, ensure_ascii=True))
+        self.assertEqual(serializer.decode(data), (MESSAGE, 'json'))
+
+    def test_default_is_json(self):
+        self.assertEqual(serializer.get_serializer().name, 'json')
+        self.assertEqual(serializer.decode(serializer.encode(MESSAGE))[1],
+                         'json')
+
+    def test_unknown_serializer(self):
+        self.assertRaises(rpc_common.RPCException, serializer.encode,
+                          MESSAGE, 'bogus')
+
+    @test.skip_if(serializer.msgpack is None, "msgpack is not available")
+    def test_msgpack_roundtrip(self):
+        self.flags(rpc_serializer='msgpack')
+        data = serializer.encode(MESSAGE)
+        self.assertEqual(data[:2], serializer.MSGPACK_MARKER + '\x01')
+        self.assertEqual(serializer.decode(data), (MESSAGE, 'msgpack'))
+
+    @test.skip_if(serializer.msgpack is None, "msgpack is not available")
+    def test_msgpack_converts_objects(self):
+        now = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        data = serializer.encode({'created_at': now}, 'msgpack')
+        self.assertEqual(serializer.decode(data)[0],
+                         {'created_at': jsonutils.to_primitive(now)})
+
+    def test_msgpack_unsupported_version(self):
+        data = serializer.MSGPACK_MARKER + '\x02' + 'whatever'
+        self.assertRaises(rpc_common.RPCException, serializer.decode, data)
+
+    def test_msgpack_not_installed(self):
+        self.stubs.Set(serializer, 'msgpack', None)
+        self.stubs.Set(serializer, '_warned_no_msgpack', False)
+        warnings = []
+        self.stubs.Set(serializer.LOG, 'warn',
+                       lambda *args: warnings.append(args))
+        self.flags(rpc_serializer='msgpack')
+        self.assertEqual(serializer.get_serializer().name, 'json')
+        self.assertEqual(serializer.get_serializer().name, 'json')
+        self.assertEqual(len(warnings), 1)
+        data = serializer.MSGPACK_MARKER + '\x01' + 'whatever'
+        self.assertRaises(rpc_common.RPCException, serializer.decode, data)
+
+
+class IsPrimitiveTestCase(test.TestCase):
+    def test_primitive(self):
+        self.assertTrue(jsonutils.is_primitive(MESSAGE))
+        self.assertTrue(jsonutils.is_primitive([1, (2, 'x'), None]))
+
+    def test_not_primitive(self):
+        now = datetime.datetime(2012, 10, 1)
+        self.assertFalse(jsonutils.is_primitive({'a': [now]}))
+        self.assertFalse(jsonutils.is_primitive({('a', 'b'): 1}))
+        self.assertFalse(jsonutils.is_primitive(set([1])))
+
+    def test_to_primitive_scalars(self):
+        self.assertEqual(jsonutils.to_primitive(MESSAGE), MESSAGE)
+        self.assertEqual(jsonutils.to_primitive(u'x'), u'x')
@@ -0,0 +1,41 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for the resources of the zmq rpc implementation
+"""
+
+from cinder import test
+
+try:
+    from cinder.openstack.common.rpc import impl_zmq
+except ImportError:
+    impl_zmq = None
+
+
+class ZmqCleanupTestCase(test.TestCase):
+
+    @test.skip_if(impl_zmq is None, "zmq is not available")
+    def test_cleanup_twice(self):
+        impl_zmq.cleanup()
+        impl_zmq.cleanup()
+        self.assertEqual(impl_zmq.ZMQ_CTX, None)
+
+    @test.skip_if(impl_zmq is None, "zmq is not available")
+    def test_recreated_after_cleanup(self):
+        impl_zmq.cleanup()
+        self.assertNotEqual(impl_zmq._get_ctx(), None)
+        self.assertNotEqual(impl_zmq._get_matchmaker(), None)
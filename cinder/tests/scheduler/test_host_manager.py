@@ -0,0 +1,71 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For HostManager
+"""
+
+from cinder.scheduler import host_manager
+from cinder import test
+
+
+class HostManagerTestCase(test.TestCase):
+    """Test case for HostManager class"""
+
+    def setUp(self):
+        super(HostManagerTestCase, self).setUp()
+        self.host_manager = host_manager.HostManager()
+
+    def _update(self, capabilities, sequence=None, full=True, removed=None):
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                capabilities, sequence=sequence, full=full, removed=removed)
+
+    def _get_capabilities(self):
+        return self.host_manager.get_service_capabilities()['host1']['volume']
+
+    def test_full_update(self):
+        self._update({'free': 10, 'name': 'lvm'}, sequence=1)
+        self._update({'free': 5}, sequence=2)
+        self.assertEqual(self._get_capabilities(), {'free': 5})
+
+    def test_delta_merged(self):
+        self._update({'free': 10, 'total': 20, 'name': 'lvm'}, sequence=1)
+        self._update({'free': 5}, sequence=2, full=False, removed=['name'])
+        self.assertEqual(self._get_capabilities(), {'free': 5, 'total': 20})
+        self.assertEqual(
+            self.host_manager.service_states['host1']['volume']['sequence'],
+            2)
+
+    def test_delta_after_missed_update_ignored(self):
+        self._update({'free': 10}, sequence=1)
+        self._update({'free': 5}, sequence=3, full=False)
+        self._update({'free': 1}, sequence=4, full=False)
+        self.assertEqual(self._get_capabilities(), {'free': 10})
+
+        self._update({'free': 2}, sequence=5)
+        self._update({'free': 3}, sequence=6, full=False)
+        self.assertEqual(self._get_capabilities(), {'free': 3})
+
+    def test_delta_without_full_update_ignored(self):
+        self._update({'free': 5}, sequence=2, full=False)
+        self.assertEqual(self.host_manager.get_service_capabilities(),
+                         {'host1': {}})
+
+    def test_update_without_sequence(self):
+        self._update({'free': 10})
+        self.assertEqual(self._get_capabilities(), {'free': 10})
+        self._update({'free': 5}, sequence=1, full=False)
+        self.assertEqual(self._get_capabilities(), {'free': 10})
@@ -64,4 +64,5 @@ class SchedulerRpcAPITestCase(test.TestCase):
     def test_update_service_capabilities(self):
         self._test_scheduler_api('update_service_capabilities',
                 rpc_method='fanout_cast', service_name='fake_name',
-                host='fake_host', capabilities='fake_capabilities')
+                host='fake_host', capabilities='fake_capabilities',
+                sequence=2, full=False, removed=['fake_removed'])
@@ -88,7 +88,7 @@ class SchedulerManagerTestCase(test.TestCase):
 
         # Test no capabilities passes empty dictionary
         self.manager.driver.update_service_capabilities(service_name,
-                host, {})
+                host, {}, sequence=None, full=True, removed=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(self.context,
                 service_name=service_name, host=host)
@@ -98,11 +98,13 @@ class SchedulerManagerTestCase(test.TestCase):
         # Test capabilities passes correctly
         capabilities = {'fake_capability': 'fake_value'}
         self.manager.driver.update_service_capabilities(
-                service_name, host, capabilities)
+                service_name, host, capabilities, sequence=1, full=False,
+                removed=['old_capability'])
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(self.context,
                 service_name=service_name, host=host,
-                capabilities=capabilities)
+                capabilities=capabilities, sequence=1, full=False,
+                removed=['old_capability'])
 
     def test_existing_method(self):
         def stub_method(self, *args, **kwargs):
@@ -181,7 +183,8 @@ class SchedulerTestCase(test.TestCase):
 
         capabilities = {'fake_capability': 'fake_value'}
         self.driver.host_manager.update_service_capabilities(
-                service_name, host, capabilities)
+                service_name, host, capabilities, sequence=None, full=True,
+                removed=None)
         self.mox.ReplayAll()
         result = self.driver.update_service_capabilities(service_name,
                 host, capabilities)
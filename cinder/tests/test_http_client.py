@@ -0,0 +1,167 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the keep-alive HTTP client of the appliance drivers.
+"""
+
+import errno
+import httplib
+import socket
+
+import eventlet
+import webob
+import webob.dec
+
+from cinder import test
+from cinder.volume import http_client
+from cinder import wsgi
+
+
+class HTTPConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(HTTPConnectionPoolTestCase, self).setUp()
+        self.requests = []
+        self.server = wsgi.Server('test_http_client', self._app,
+                                  host='127.0.0.1')
+        self.server.start()
+        self.pool = http_client.HTTPConnectionPool('127.0.0.1',
+                                                   self.server.port)
+
+        self.connections = []
+        connection_class = httplib.HTTPConnection
+        connections = self.connections
+
+        class CountingConnection(connection_class):
+            def __init__(self, *args, **kwargs):
+                connections.append(self)
+                connection_class.__init__(self, *args, **kwargs)
+
+        self.stubs.Set(httplib, 'HTTPConnection', CountingConnection)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+        self.server.wait()
+        super(HTTPConnectionPoolTestCase, self).tearDown()
+
+    @webob.dec.wsgify
+    def _app(self, req):
+        if 'sleep' in req.GET:
+            eventlet.sleep(float(req.GET['sleep']))
+        self.requests.append((req.method, req.path_qs, req.body))
+        if 'cut' in req.GET:
+            # Drop the connection in the middle of the body
+            def cut_body():
+                yield 'x' * 8192
+                raise socket.error(errno.ECONNRESET, 'cut')
+            return webob.Response(app_iter=cut_body(), content_length=16384)
+        response = webob.Response(body='reply to %s' % req.path_qs)
+        if 'close' in req.GET:
+            response.headers['Connection'] = 'close'
+        return response
+
+    def test_request(self):
+        response = self.pool.request('POST', '/api/volumes', 'size=1',
+                                     {'Content-Type': 'text/plain'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, 'reply to /api/volumes')
+        self.assertEqual(response.getheader('Content-Length'), '21')
+        self.assertEqual(self.requests, [('POST', '/api/volumes', 'size=1')])
+
+    def test_connection_reused(self):
+        for i in range(3):
+            self.pool.request('GET', '/api/volumes')
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_connection_closed_by_server_not_reused(self):
+        self.pool.request('GET', '/api/volumes?close=1')
+        self.pool.request('GET', '/api/volumes')
+        self.assertEqual(len(self.connections), 2)
+
+    def test_stale_connection_reconnects(self):
+        self.pool.request('GET', '/api/volumes')
+        # The appliance dropped the idle connection
+        self.pool._idle[0].sock.shutdown(socket.SHUT_RDWR)
+        response = self.pool.request('GET', '/api/servers')
+        self.assertEqual(response.data, 'reply to /api/servers')
+        self.assertEqual(len(self.connections), 2)
+
+    def test_stale_connection_resends_post(self):
+        self.pool.request('POST', '/api/volumes', 'name=a')
+        self.pool._idle[0].sock.shutdown(socket.SHUT_RDWR)
+        self.pool.request('POST', '/api/volumes', 'name=b')
+        self.assertEqual(self.requests[1:],
+                         [('POST', '/api/volumes', 'name=b')])
+        self.assertEqual(len(self.connections), 2)
+
+    def test_post_cut_mid_response_not_resent(self):
+        self.pool.request('POST', '/api/volumes', 'name=a')
+        self.assertRaises(httplib.IncompleteRead, self.pool.request,
+                          'POST', '/api/volumes?cut=1', 'name=b')
+        self.assertEqual(self.requests[1:],
+                         [('POST', '/api/volumes?cut=1', 'name=b')])
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.pool.get_stats()['POST']['errors'], 1)
+
+    def test_get_cut_mid_response_resent(self):
+        self.pool.request('GET', '/api/volumes')
+        self.assertRaises(httplib.IncompleteRead, self.pool.request,
+                          'GET', '/api/volumes?cut=1')
+        self.assertEqual([r[1] for r in self.requests[1:]],
+                         ['/api/volumes?cut=1', '/api/volumes?cut=1'])
+        self.assertEqual(len(self.connections), 2)
+
+    def test_new_connection_failure_raises(self):
+        listener = eventlet.listen(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        pool = http_client.HTTPConnectionPool('127.0.0.1', port)
+        self.assertRaises(socket.error, pool.request, 'GET', '/api/volumes')
+        self.assertEqual(pool.get_stats()['GET']['errors'], 1)
+
+    def test_idle_connections_bounded(self):
+        self.pool.maxsize = 2
+        requests = [dict(method='GET', url='/api/volumes?sleep=0.05')] * 4
+        self.pool.request_many(requests)
+        self.assertEqual(len(self.pool._idle), 2)
+
+    def test_request_many(self):
+        requests = [dict(method='GET', url='/api/volumes?sleep=0.1',
+                         name='list_volumes'),
+                    dict(method='GET', url='/api/servers',
+                         name='list_servers')]
+        responses = self.pool.request_many(requests)
+        self.assertEqual([r.data for r in responses],
+                         ['reply to /api/volumes?sleep=0.1',
+                          'reply to /api/servers'])
+        # The quick request was served while the slow one was running
+        self.assertEqual([r[1] for r in self.requests],
+                         ['/api/servers', '/api/volumes?sleep=0.1'])
+        self.assertEqual(len(self.connections), 2)
+
+    def test_stats(self):
+        self.pool.request('GET', '/api/volumes', name='list_volumes')
+        self.pool.request('GET', '/api/volumes', name='list_volumes')
+        self.pool.request('POST', '/api/volumes')
+        stats = self.pool.get_stats()
+        self.assertEqual(sorted(stats.keys()), ['POST', 'list_volumes'])
+        self.assertEqual(stats['list_volumes']['count'], 2)
+        self.assertEqual(stats['list_volumes']['errors'], 0)
+        self.assertTrue(stats['list_volumes']['time'] > 0)
+        self.assertEqual(stats['POST']['count'], 1)
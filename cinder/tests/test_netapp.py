@@ -988,6 +988,37 @@ class NetAppDriverTestCase(test.TestCase):
         self.driver.terminate_connection(volume, connector)
         self.driver._remove_destroy(self.VOLUME_NAME, self.PROJECT_ID)
 
+    def test_luns_indexed(self):
+        self.driver._discover_luns()
+        key = (self.PROJECT_ID, self.VOLUME_NAME)
+        self.assertEqual(self.driver.lun_table.keys(), [key])
+        lun = self.driver._lookup_lun_for_volume(self.VOLUME_NAME,
+                                                 self.PROJECT_ID)
+        self.assertTrue(lun is self.driver.lun_table[key])
+        self.assertRaises(netapp.exception.VolumeBackendAPIException,
+                          self.driver._lookup_lun_for_volume,
+                          self.VOLUME_NAME, 'otherproj')
+
+        self.driver._remove_destroy(self.VOLUME_NAME, self.PROJECT_ID)
+        self.assertEqual(self.driver.lun_table, {})
+
+    def test_lookup_discovers_new_lun(self):
+        self.driver._discover_luns()
+        self.driver.lun_table.clear()
+        lun = self.driver._lookup_lun_for_volume(self.VOLUME_NAME,
+                                                 self.PROJECT_ID)
+        self.assertEqual(lun.name, self.VOLUME_NAME)
+        self.assertEqual(self.driver.lun_table.keys(),
+                         [(self.PROJECT_ID, self.VOLUME_NAME)])
+
+    def test_poll_backs_off(self):
+        sleeps = []
+        self.stubs.Set(netapp.time, 'sleep', sleeps.append)
+        self.flags(netapp_poll_interval=0.5)
+        results = [None, None, None, None, 'done']
+        self.assertEqual(netapp._poll(lambda: results.pop(0), 1.5), 'done')
+        self.assertEqual(sleeps, [0.5, 1.0, 1.5, 1.5])
+
 
 WSDL_HEADER_CMODE = """<?xml version="1.0" encoding="UTF-8"?>
 <definitions xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
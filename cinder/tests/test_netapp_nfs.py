@@ -16,6 +16,10 @@
 #    under the License.
 """Unit tests for the NetApp-specific NFS driver module (netapp_nfs)"""
 
+import os
+import shutil
+import tempfile
+
 from cinder import context
 from cinder import test
 from cinder import exception
@@ -56,25 +60,55 @@ class FakeSnapshot(object):
 
 
 class FakeResponce(object):
-    def __init__(self, status):
+    def __init__(self, status, results=None):
         """
         :param status: Either 'failed' or 'passed'
         """
         self.Status = status
+        self.Results = results
 
         if status == 'failed':
             self.Reason = 'Sample error'
 
 
+def clone_id(clone_op_id):
+    return [{'clone-id-info': [{'clone-op-id': [str(clone_op_id)],
+                                'volume-uuid': ['uuid']}]}]
+
+
+class FakeDb(object):
+    def __init__(self):
+        self.volumes = {}
+        self.snapshots = {}
+
+    def volume_get(self, context, volume_id):
+        return self.volumes.get(volume_id, {'status': 'creating'})
+
+    def volume_update(self, context, volume_id, values):
+        self.volumes[volume_id] = values
+
+    def snapshot_get(self, context, snapshot_id):
+        return self.snapshots.get(snapshot_id, {'status': 'creating'})
+
+    def snapshot_update(self, context, snapshot_id, values):
+        self.snapshots[snapshot_id] = values
+
+
 class NetappNfsDriverTestCase(test.TestCase):
     """Test case for NetApp specific NFS clone driver"""
 
     def setUp(self):
+        super(NetappNfsDriverTestCase, self).setUp()
+        self._tempdir = tempfile.mkdtemp()
+        self.flags(netapp_clone_state_file=os.path.join(self._tempdir,
+                                                        'clones.json'))
         self._driver = netapp_nfs.NetAppNFSDriver()
         self._mox = mox.Mox()
 
     def tearDown(self):
         self._mox.UnsetStubs()
+        shutil.rmtree(self._tempdir)
+        super(NetappNfsDriverTestCase, self).tearDown()
 
     def test_check_for_setup_error(self):
         mox = self._mox
@@ -217,13 +251,17 @@ class NetappNfsDriverTestCase(test.TestCase):
 
         # ApiProxy() method is generated by ServiceSelector at runtime from the
         # XML, so mocking is impossible.
+        results = {'clone-id': clone_id(5)}
         setattr(drv._client.service,
                 'ApiProxy',
-                types.MethodType(lambda *args, **kwargs: FakeResponce(status),
+                types.MethodType(lambda *args, **kwargs: FakeResponce(status,
+                                                                      results),
                                  suds.client.ServiceSelector))
+        mox.StubOutWithMock(drv, '_get_provider_location')
         mox.StubOutWithMock(drv, '_get_host_id')
         mox.StubOutWithMock(drv, '_get_full_export_path')
 
+        drv._get_provider_location(IgnoreArg()).AndReturn('127.0.0.1:/nfs')
         drv._get_host_id(IgnoreArg()).AndReturn('10')
         drv._get_full_export_path(IgnoreArg(), IgnoreArg()).AndReturn('/nfs')
 
@@ -239,8 +277,37 @@ class NetappNfsDriverTestCase(test.TestCase):
         clone_name = 'clone_name'
         volume_id = volume_name + str(hash(volume_name))
 
-        drv._clone_volume(volume_name, clone_name, volume_id)
+        clone = drv._clone_volume(volume_name, clone_name, volume_id)
+
+        self.assertEqual(clone, ('10', 5))
+        mox.VerifyAll()
+
+    def test_clone_target_memoized(self):
+        drv = self._driver
+        mox = self._prepare_clone_mock('passed')
+        drv._get_provider_location(IgnoreArg()).AndReturn('127.0.0.1:/nfs')
+
+        mox.ReplayAll()
+
+        drv._clone_volume('volume_name', 'clone1', 'volume_id')
+        drv._clone_volume('volume_name', 'clone2', 'volume_id')
+
+        mox.VerifyAll()
+
+    def test_synchronous_clone_volume(self):
+        drv = self._driver
+        mox = self._prepare_clone_mock('passed')
+        self.flags(synchronous_snapshot_create=1)
+        mox.StubOutWithMock(drv, '_get_clone_states')
+        drv._get_clone_states('10').AndReturn({5: 'running'})
+        drv._get_clone_states('10').AndReturn({5: 'completed'})
+        self.flags(netapp_poll_interval=0)
+
+        mox.ReplayAll()
+
+        clone = drv._clone_volume('volume_name', 'clone_name', 'volume_id')
 
+        self.assertEqual(clone, None)
         mox.VerifyAll()
 
     def test_failed_clone_volume(self):
@@ -258,3 +325,102 @@ class NetappNfsDriverTestCase(test.TestCase):
                           volume_name, clone_name, volume_id)
 
         mox.VerifyAll()
+
+    def test_create_snapshot_tracks_clone(self):
+        mox = self._mox
+        drv = self._driver
+        snapshot = FakeSnapshot()
+        snapshot.id = 'snapshot_id'
+
+        mox.StubOutWithMock(drv, '_clone_volume')
+        mox.StubOutWithMock(netapp_nfs.eventlet, 'spawn')
+        drv._clone_volume(IgnoreArg(), IgnoreArg(),
+                          IgnoreArg()).AndReturn(('10', 5))
+        netapp_nfs.eventlet.spawn(drv._run_clone_tracker)
+        mox.ReplayAll()
+
+        model_update = drv.create_snapshot(snapshot)
+
+        self.assertEqual(model_update['status'], 'creating')
+        self.assertEqual(drv._clones, {('10', 5): ('snapshot', 'snapshot_id')})
+        mox.VerifyAll()
+
+    def test_get_clone_states(self):
+        drv = self._driver
+        drv._client = MockObject(suds.client.Client)
+        drv._client.factory = MockObject(suds.client.Factory)
+        drv._client.service = MockObject(suds.client.ServiceSelector)
+        ops_info = [{'clone-id': clone_id(5), 'clone-state': ['running']},
+                    {'clone-id': clone_id(6), 'clone-state': ['completed']}]
+        results = {'status': [{'ops-info': ops_info}]}
+        setattr(drv._client.service,
+                'ApiProxy',
+                types.MethodType(lambda *args, **kwargs: FakeResponce('passed',
+                                                                      results),
+                                 suds.client.ServiceSelector))
+
+        self.assertEqual(drv._get_clone_states('10'),
+                         {5: 'running', 6: 'completed'})
+
+    def test_check_clones(self):
+        mox = self._mox
+        drv = self._driver
+        drv.db = FakeDb()
+        drv._clones = {('10', 1): ('volume', 'volume1'),
+                       ('10', 2): ('volume', 'volume2'),
+                       ('10', 3): ('snapshot', 'snapshot3'),
+                       ('11', 1): ('snapshot', 'snapshot1')}
+
+        # One call per host
+        mox.StubOutWithMock(drv, '_get_clone_states')
+        drv._get_clone_states('10').InAnyOrder().AndReturn({1: 'completed',
+                                                            2: 'running',
+                                                            3: 'failed'})
+        drv._get_clone_states('11').InAnyOrder().AndReturn({})
+        mox.ReplayAll()
+
+        drv._check_clones()
+
+        self.assertEqual(drv._clones, {('10', 2): ('volume', 'volume2')})
+        self.assertEqual(drv.db.volumes['volume1']['status'], 'available')
+        self.assertEqual(drv.db.snapshots,
+                         {'snapshot3': {'status': 'error'},
+                          'snapshot1': {'status': 'available',
+                                        'progress': '100%'}})
+        mox.VerifyAll()
+
+    def test_check_clones_of_failed_create(self):
+        mox = self._mox
+        drv = self._driver
+        drv.db = FakeDb()
+        drv.db.volumes['volume1'] = {'status': 'error'}
+        drv._clones = {('10', 1): ('volume', 'volume1')}
+
+        mox.StubOutWithMock(drv, '_get_clone_states')
+        drv._get_clone_states('10').AndReturn({1: 'completed'})
+        mox.ReplayAll()
+
+        drv._check_clones()
+
+        self.assertEqual(drv._clones, {})
+        self.assertEqual(drv.db.volumes['volume1'], {'status': 'error'})
+        mox.VerifyAll()
+
+    def test_clones_tracked_after_restart(self):
+        mox = self._mox
+        drv = self._driver
+        mox.StubOutWithMock(netapp_nfs.eventlet, 'spawn')
+        netapp_nfs.eventlet.spawn(IgnoreArg()).AndReturn('tracker')
+        netapp_nfs.eventlet.spawn(IgnoreArg()).AndReturn('tracker')
+        mox.ReplayAll()
+
+        drv._track_clone(('10', 5), 'snapshot', 'snapshot_id')
+        drv._track_clone(('11', 6), 'volume', 'volume_id')
+
+        restarted = netapp_nfs.NetAppNFSDriver()
+        restarted._load_clones()
+
+        self.assertEqual(restarted._clones,
+                         {('10', 5): ('snapshot', 'snapshot_id'),
+                          ('11', 6): ('volume', 'volume_id')})
+        mox.VerifyAll()
@@ -20,10 +20,16 @@ Unit tests for OpenStack Cinder volume driver
 """
 
 import base64
-import urllib2
+import httplib
+
+import webob
+import webob.dec
 
 import cinder.flags
+from cinder.openstack.common import jsonutils
 import cinder.test
+import cinder.wsgi
+from cinder.volume import http_client
 from cinder.volume import nexenta
 from cinder.volume.nexenta import volume
 from cinder.volume.nexenta import jsonrpc
@@ -201,81 +207,110 @@ class TestNexentaDriver(cinder.test.TestCase):
 
 
 class TestNexentaJSONRPC(cinder.test.TestCase):
-    URL = 'http://example.com/'
-    URL_S = 'https://example.com/'
     USER = 'user'
     PASSWORD = 'password'
-    HEADERS = {'Authorization': 'Basic %s' % (base64.b64encode(
-                                                ':'.join((USER, PASSWORD))),),
-               'Content-Type': 'application/json'}
-    REQUEST = 'the request'
+    AUTH = 'Basic %s' % (base64.b64encode(':'.join((USER, PASSWORD))),)
 
     def setUp(self):
         super(TestNexentaJSONRPC, self).setUp()
+        self.requests = []
+        self.reply = {'error': None, 'result': 'the result'}
+        self.server = cinder.wsgi.Server('test_nexenta', self._app,
+                                         host='127.0.0.1')
+        self.server.start()
+        self.url = 'http://127.0.0.1:%d/rest/nms/' % self.server.port
         self.proxy = jsonrpc.NexentaJSONProxy(
-            self.URL, self.USER, self.PASSWORD, auto=True)
-        self.mox.StubOutWithMock(urllib2, 'Request', True)
-        self.mox.StubOutWithMock(urllib2, 'urlopen')
-        self.resp_mock = self.mox.CreateMockAnything()
-        self.resp_info_mock = self.mox.CreateMockAnything()
-        self.resp_mock.info().AndReturn(self.resp_info_mock)
-        urllib2.urlopen(self.REQUEST).AndReturn(self.resp_mock)
+            self.url, self.USER, self.PASSWORD, auto=True)
+
+    def tearDown(self):
+        self.server.stop()
+        self.server.wait()
+        super(TestNexentaJSONRPC, self).tearDown()
+
+    @webob.dec.wsgify
+    def _app(self, req):
+        self.requests.append({'path': req.path,
+                              'auth': req.headers.get('Authorization'),
+                              'type': req.content_type,
+                              'body': jsonutils.loads(req.body)})
+        return webob.Response(body=jsonutils.dumps(self.reply),
+                              content_type='application/json')
 
     def test_call(self):
-        urllib2.Request(self.URL,
-                '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-                self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-                '{"error": null, "result": "the result"}')
-        self.mox.ReplayAll()
         result = self.proxy('arg1', 'arg2')
         self.assertEquals("the result", result)
+        self.assertEqual(self.requests,
+                         [{'path': '/rest/nms/',
+                           'auth': self.AUTH,
+                           'type': 'application/json',
+                           'body': {'object': None,
+                                    'method': None,
+                                    'params': ['arg1', 'arg2']}}])
 
     def test_call_deep(self):
-        urllib2.Request(self.URL,
-              '{"object": "obj1.subobj", "params": ["arg1", "arg2"],'
-                                                          ' "method": "meth"}',
-              self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-            '{"error": null, "result": "the result"}')
-        self.mox.ReplayAll()
         result = self.proxy.obj1.subobj.meth('arg1', 'arg2')
         self.assertEquals("the result", result)
+        self.assertEqual(self.requests[0]['body'],
+                         {'object': 'obj1.subobj',
+                          'method': 'meth',
+                          'params': ['arg1', 'arg2']})
+
+    def test_proxies_reused(self):
+        self.assertTrue(self.proxy.volume.create is self.proxy.volume.create)
+
+    def test_connection_kept_alive(self):
+        connections = []
+        connection_class = httplib.HTTPConnection
+
+        class CountingConnection(connection_class):
+            def __init__(self, *args, **kwargs):
+                connections.append(self)
+                connection_class.__init__(self, *args, **kwargs)
+
+        self.stubs.Set(httplib, 'HTTPConnection', CountingConnection)
+        self.proxy.volume.object_exists('vol1')
+        self.proxy.volume.object_exists('vol2')
+        self.proxy.lu.create_lu('vol1', {})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(len(connections), 1)
+        stats = self.proxy.client.pool.get_stats()
+        self.assertEqual(stats['volume.object_exists']['count'], 2)
+        self.assertEqual(stats['lu.create_lu']['count'], 1)
+
+    def test_call_error(self):
+        self.reply = {'error': {'message': 'the error'},
+                      'result': 'the result'}
+        self.assertRaises(jsonrpc.NexentaJSONException,
+                          self.proxy, 'arg1', 'arg2')
+
+    def _stub_https_only(self):
+        urls = []
+
+        def fake_request(pool, method, url, body=None, headers=None,
+                         name=None):
+            urls.append(pool.use_ssl)
+            if not pool.use_ssl:
+                raise httplib.BadStatusLine('')
+            return http_client.HTTPResponse(
+                200, 'OK', {}, '{"error": null, "result": "the result"}')
+
+        self.stubs.Set(http_client.HTTPConnectionPool, 'request',
+                       fake_request)
+        return urls
 
     def test_call_auto(self):
-        urllib2.Request(self.URL,
-                '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-                self.HEADERS).AndReturn(self.REQUEST)
-        urllib2.Request(self.URL_S,
-                '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-                self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = 'EOF in headers'
-        self.resp_mock.read().AndReturn(
-            '{"error": null, "result": "the result"}')
-        urllib2.urlopen(self.REQUEST).AndReturn(self.resp_mock)
-        self.mox.ReplayAll()
+        urls = self._stub_https_only()
         result = self.proxy('arg1', 'arg2')
         self.assertEquals("the result", result)
+        self.assertEqual(urls, [False, True])
+        self.assertTrue(self.proxy.client.url.startswith('https://'))
 
-    def test_call_error(self):
-        urllib2.Request(self.URL,
-                '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-                self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-            '{"error": {"message": "the error"}, "result": "the result"}')
-        self.mox.ReplayAll()
-        self.assertRaises(jsonrpc.NexentaJSONException,
-                          self.proxy, 'arg1', 'arg2')
+        # The other proxies of the NMS use HTTPS from now on
+        self.proxy.volume.object_exists('vol1')
+        self.assertEqual(urls, [False, True, True])
 
     def test_call_fail(self):
-        urllib2.Request(self.URL,
-                '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-                self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = 'EOF in headers'
-        self.proxy.auto = False
-        self.mox.ReplayAll()
+        self._stub_https_only()
+        self.proxy.client.auto = False
         self.assertRaises(jsonrpc.NexentaJSONException,
                           self.proxy, 'arg1', 'arg2')
@@ -30,6 +30,7 @@ from cinder import exception
 from cinder import test
 from cinder.exception import ProcessExecutionError
 
+from cinder.volume import driver
 from cinder.volume import nfs
 
 
@@ -254,6 +255,26 @@ class NfsDriverTestCase(test.TestCase):
 
         delattr(nfs.FLAGS, 'nfs_disk_util')
 
+    def test_get_volume_stats(self):
+        """get_volume_stats should sum the capacity of the shares"""
+        mox = self._mox
+        drv = self._driver
+        drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
+
+        mox.StubOutWithMock(drv, '_get_capacity_info')
+        drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
+            AndReturn((3 * driver.GB, 2 * driver.GB))
+        drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
+            AndReturn((5 * driver.GB, driver.GB))
+
+        mox.ReplayAll()
+
+        self.assertEquals({'total_capacity_gb': 8.0,
+                           'free_capacity_gb': 3.0},
+                          drv.get_volume_stats())
+
+        mox.VerifyAll()
+
     def test_get_available_capacity_with_du(self):
         """_get_available_capacity should calculate correct value"""
         mox = self._mox
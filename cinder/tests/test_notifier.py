@@ -0,0 +1,136 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Tests for the asynchronous notification pipeline."""
+
+import os
+import shutil
+import tempfile
+
+import eventlet
+
+from cinder import context
+from cinder.openstack.common.notifier import api as notifier_api
+from cinder.openstack.common.notifier import rabbit_notifier
+from cinder.openstack.common.notifier import test_notifier
+from cinder.openstack.common import rpc
+from cinder import test
+
+
+class FakeBatchDriver(object):
+    def __init__(self):
+        self.batches = []
+
+    def notify_batch(self, notifications):
+        self.batches.append([msg['event_type']
+                             for _ctxt, msg in notifications])
+
+
+class NotificationPipelineTestCase(test.TestCase):
+    def setUp(self):
+        super(NotificationPipelineTestCase, self).setUp()
+        self.flags(notification_driver=[test_notifier.__name__],
+                   notification_async=True,
+                   notification_queue_size=3)
+        self.context = context.get_admin_context()
+        test_notifier.NOTIFICATIONS = []
+        notifier_api._reset_drivers()
+        notifier_api._reset_pipeline()
+
+    def tearDown(self):
+        notifier_api._reset_drivers()
+        notifier_api._reset_pipeline()
+        super(NotificationPipelineTestCase, self).tearDown()
+
+    def _notify(self, event_type):
+        notifier_api.notify(self.context, 'volume.fake', event_type,
+                            notifier_api.INFO, {'volume_id': 1})
+
+    def _event_types(self):
+        return [msg['event_type'] for msg in test_notifier.NOTIFICATIONS]
+
+    def _drain(self):
+        pipeline = notifier_api._get_pipeline()
+        while pipeline.queue.qsize():
+            eventlet.sleep(0)
+        eventlet.sleep(0)
+
+    def test_notify_is_queued(self):
+        self._notify('a')
+        self.assertEqual(test_notifier.NOTIFICATIONS, [])
+        self.assertEqual(notifier_api.get_pipeline_stats()['queued'], 1)
+        self._drain()
+        self.assertEqual(self._event_types(), ['a'])
+        stats = notifier_api.get_pipeline_stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['sent'], 1)
+
+    def test_notify_sync(self):
+        self.flags(notification_async=False)
+        self._notify('a')
+        self.assertEqual(self._event_types(), ['a'])
+        self.assertEqual(notifier_api.get_pipeline_stats()['sent'], 0)
+
+    def test_batches(self):
+        driver = FakeBatchDriver()
+        self.flags(notification_driver=[], notification_batch_size=2)
+        notifier_api.add_driver(driver)
+        for event_type in ('a', 'b', 'c'):
+            self._notify(event_type)
+        self._drain()
+        self.assertEqual(driver.batches, [['a', 'b'], ['c']])
+
+    def test_overflow_drop_oldest(self):
+        self.flags(notification_overflow_policy='drop_oldest')
+        for event_type in ('a', 'b', 'c', 'd', 'e'):
+            self._notify(event_type)
+        self.assertEqual(notifier_api.get_pipeline_stats()['dropped'], 2)
+        self._drain()
+        self.assertEqual(self._event_types(), ['c', 'd', 'e'])
+
+    def test_overflow_spill(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        spill_file = os.path.join(tmpdir, 'spill')
+        self.flags(notification_overflow_policy='spill',
+                   notification_spill_file=spill_file)
+        for event_type in ('a', 'b', 'c', 'd', 'e'):
+            self._notify(event_type)
+        stats = notifier_api.get_pipeline_stats()
+        self.assertEqual(stats['spilled'], 2)
+        self.assertEqual(stats['dropped'], 0)
+        self.assertTrue(os.path.exists(spill_file))
+        self._drain()
+        self.assertEqual(self._event_types(), ['a', 'b', 'c', 'd', 'e'])
+        self.assertFalse(os.path.exists(spill_file))
+        self.assertEqual(os.listdir(tmpdir), [])
+
+    def test_overflow_spill_without_file_drops(self):
+        self.flags(notification_overflow_policy='spill')
+        for event_type in ('a', 'b', 'c', 'd'):
+            self._notify(event_type)
+        self.assertEqual(notifier_api.get_pipeline_stats()['dropped'], 1)
+        self._drain()
+        self.assertEqual(self._event_types(), ['a', 'b', 'c'])
+
+    def test_rabbit_notify_batch(self):
+        sent = []
+        self.stubs.Set(rpc, 'notify_many', sent.extend)
+        self.flags(notification_topics=['notifications', 'audit'])
+        message = {'event_type': 'a', 'priority': 'WARN'}
+        rabbit_notifier.notify_batch([(self.context, message)])
+        self.assertEqual([topic for _ctxt, topic, _msg in sent],
+                         ['notifications.warn', 'audit.warn'])
@@ -62,6 +62,27 @@ class PolicyFileTestCase(test.TestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    def test_policy_file_check_throttled(self):
+        with utils.tempdir() as tmpdir:
+            tmpfilename = os.path.join(tmpdir, 'policy')
+            self.flags(policy_file=tmpfilename, policy_check_interval=3600)
+
+            action = "example:test"
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write("""{"example:test": []}""")
+            policy.enforce(self.context, action, self.target)
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write("""{"example:test": ["false:false"]}""")
+            mtime = os.path.getmtime(tmpfilename)
+            os.utime(tmpfilename, (mtime + 1, mtime + 1))
+
+            ctxt = context.RequestContext('fake', 'fake')
+            policy.enforce(ctxt, action, self.target)
+
+            self.flags(policy_check_interval=0)
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              ctxt, action, self.target)
+
 
 class PolicyTestCase(test.TestCase):
     def setUp(self):
@@ -152,6 +173,121 @@ class PolicyTestCase(test.TestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_enforce_caches_decision(self):
+        action = "example:my_file"
+        target_mine = {'project_id': 'fake', 'size': 1}
+        policy.enforce(self.context, action, target_mine)
+        self.assertEqual(len(self.context.policy_decisions), 1)
+
+        # Entries the rule does not look at don't matter.
+        policy.enforce(self.context, action, {'project_id': 'fake'})
+        self.assertEqual(len(self.context.policy_decisions), 1)
+
+        # The cached decision is used.
+        for key in self.context.policy_decisions:
+            self.context.policy_decisions[key] = False
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, target_mine)
+
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, {'project_id': 'another'})
+        self.assertEqual(len(self.context.policy_decisions), 2)
+
+    def test_cached_decision_depends_on_credentials(self):
+        action = "example:my_file"
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, {'project_id': 'another'})
+        self.context.roles.append('compute_admin')
+        policy.enforce(self.context, action, {'project_id': 'another'})
+
+    def test_cached_decision_dropped_with_brain(self):
+        action = "example:allowed"
+        policy.enforce(self.context, action, self.target)
+        common_policy.set_brain(common_policy.Brain({action: [["false:f"]]}))
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+    def test_http_decision_not_cached(self):
+        responses = ["True", "False"]
+
+        def fakeurlopen(url, post_data):
+            return StringIO.StringIO(responses.pop(0))
+        self.stubs.Set(urllib2, 'urlopen', fakeurlopen)
+        action = "example:get_http"
+        policy.enforce(self.context, action, self.target)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+
+class CompiledBrainTestCase(test.TestCase):
+
+    rules = {
+        "default": [["rule:admin_or_owner"]],
+        "admin_or_owner": [["role:admin"], ["project_id:%(project_id)s"]],
+        "owner_member": [["project_id:%(project_id)s", "role:Member"]],
+        "literal": [["user_id:fake"]],
+        "nothing": [],
+        "never": [["rule:missing", "role:admin"]],
+        "loop": [["rule:loop"]],
+    }
+
+    creds = [
+        {'roles': [], 'project_id': 'fake', 'user_id': 'fake'},
+        {'roles': ['member'], 'project_id': 'other', 'user_id': 'other'},
+        {'roles': ['ADMIN'], 'project_id': 'other', 'user_id': 'fake'},
+        {'roles': ['admin']},
+    ]
+
+    targets = [{'project_id': 'fake'}, {'project_id': 'other'}]
+
+    def _uncompiled_check(self, brain, match_list, target, cred):
+        for and_list in match_list:
+            if isinstance(and_list, basestring):
+                and_list = (and_list,)
+            if all([brain._check(item, target, cred) for item in and_list]):
+                return True
+        return not match_list
+
+    def test_compiled_matches_uncompiled(self):
+        brain = common_policy.Brain(self.rules, 'default')
+        for rule in self.rules.keys() + ['missing']:
+            if rule == 'loop':
+                continue
+            match_list = ('rule:%s' % rule,)
+            for target in self.targets:
+                for cred in self.creds:
+                    self.assertEqual(
+                        brain.check(match_list, target, cred),
+                        self._uncompiled_check(brain, match_list, target,
+                                               cred))
+
+    def test_compile_dependencies(self):
+        brain = common_policy.Brain(self.rules, 'default')
+        compiled = brain.compile(('rule:admin_or_owner',))
+        self.assertEqual(compiled.target_keys, ('project_id',))
+        self.assertEqual(compiled.cred_keys, ('project_id', 'roles'))
+        compiled = brain.compile(('rule:literal',))
+        self.assertEqual(compiled.target_keys, ())
+        compiled = brain.compile(('rule:loop',))
+        self.assertEqual(compiled.target_keys, None)
+
+    def test_compiled_is_cached(self):
+        brain = common_policy.Brain(self.rules, 'default')
+        self.assertTrue(brain.compile([['rule:literal']]) is
+                        brain.compile((('rule:literal',),)))
+
+    def test_add_rule_recompiles(self):
+        brain = common_policy.Brain(self.rules, 'default')
+        cred = {'roles': [], 'user_id': 'fake'}
+        self.assertTrue(brain.check(('rule:literal',), {}, cred))
+        brain.add_rule('literal', [['user_id:other']])
+        self.assertFalse(brain.check(('rule:literal',), {}, cred))
+
+    def test_missing_target_key_raises(self):
+        brain = common_policy.Brain(self.rules, 'default')
+        self.assertRaises(KeyError, brain.check, ('rule:owner_member',),
+                          {}, self.creds[0])
+
 
 class DefaultPolicyTestCase(test.TestCase):
 
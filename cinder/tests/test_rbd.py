@@ -22,6 +22,7 @@ from cinder.openstack.common import timeutils
 from cinder import test
 from cinder.tests.image import fake as fake_image
 from cinder.tests.test_volume import DriverTestCase
+from cinder.volume import driver
 from cinder.volume.driver import RBDDriver
 
 LOG = logging.getLogger(__name__)
@@ -77,6 +78,283 @@ class RBDTestCase(test.TestCase):
         location = 'rbd://abc/pool/image/snap'
         self.assertFalse(self.driver._is_cloneable(location))
 
+    def test_layering_detected_once(self):
+        calls = []
+
+        def fake_execute(*args):
+            calls.append(args)
+            return 'usage: rbd clone', ''
+
+        self.driver.set_execute(fake_execute)
+        self.driver.do_setup(None)
+        self.driver.create_volume({'name': 'vol1', 'size': 1})
+        self.driver.create_volume({'name': 'vol2', 'size': 1})
+        self.assertEqual(calls.count(('rbd', '--help')), 1)
+        self.assertTrue('--new-format' in calls[-1])
+
+    def test_fsid_fetched_once(self):
+        fsids = []
+
+        def fake_get_fsid():
+            fsids.append('abc')
+            return 'abc'
+
+        self.stubs.Set(self.driver, '_get_fsid', fake_get_fsid)
+        self.driver.set_execute(lambda *args: ('', ''))
+        self.driver.do_setup(None)
+        self.assertTrue(self.driver._is_cloneable('rbd://abc/pool/img/snap'))
+        self.assertTrue(self.driver._is_cloneable('rbd://abc/pool/img2/snap'))
+        self.assertEqual(len(fsids), 1)
+
+    def test_cloneable_cached(self):
+        calls = []
+
+        def fake_execute(*args):
+            calls.append(args)
+
+        self.flags(rbd_cloneable_cache_ttl=60)
+        self.stubs.Set(self.driver, '_get_fsid', lambda: 'abc')
+        self.driver.set_execute(fake_execute)
+        location = 'rbd://abc/pool/image/snap'
+        timeutils.set_time_override()
+        try:
+            self.assertTrue(self.driver._is_cloneable(location))
+            self.assertTrue(self.driver._is_cloneable(location))
+            self.assertEqual(len(calls), 1)
+
+            timeutils.advance_time_seconds(61)
+            self.assertTrue(self.driver._is_cloneable(location))
+            self.assertEqual(len(calls), 2)
+        finally:
+            timeutils.clear_time_override()
+
+    def test_cloneable_not_cached(self):
+        calls = []
+
+        def fake_execute(*args):
+            calls.append(args)
+
+        self.flags(rbd_cloneable_cache_ttl=0)
+        self.stubs.Set(self.driver, '_get_fsid', lambda: 'abc')
+        self.driver.set_execute(fake_execute)
+        location = 'rbd://abc/pool/image/snap'
+        self.assertTrue(self.driver._is_cloneable(location))
+        self.assertTrue(self.driver._is_cloneable(location))
+        self.assertEqual(len(calls), 2)
+
+    def test_cloneable_cache_bounded(self):
+        self.stubs.Set(self.driver, '_get_fsid', lambda: 'abc')
+        self.stubs.Set(self.driver, 'MAX_CLONEABLE_CACHE', 2)
+        for image in ('a', 'b', 'c'):
+            self.driver._is_cloneable('rbd://abc/pool/%s/snap' % image)
+        self.assertEqual(self.driver._cloneable.keys(),
+                         ['rbd://abc/pool/c/snap'])
+
+    def test_failed_clone_invalidates_cache(self):
+        def fake_clone(*args):
+            raise exception.ProcessExecutionError()
+
+        self.stubs.Set(self.driver, '_get_fsid', lambda: 'abc')
+        self.stubs.Set(self.driver, '_clone', fake_clone)
+        location = 'rbd://abc/pool/image/snap'
+        self.assertRaises(exception.ProcessExecutionError,
+                          self.driver.clone_image,
+                          {'name': 'vol1', 'size': 1}, location)
+        self.assertFalse(location in self.driver._cloneable)
+
+
+class FakeRadosError(Exception):
+    pass
+
+
+class FakeImageBusy(FakeRadosError):
+    pass
+
+
+class FakeIoctx(object):
+    def __init__(self, cluster, pool):
+        self.cluster = cluster
+        self.pool = pool
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRados(object):
+    """Stands in for the rados module."""
+
+    Error = FakeRadosError
+
+    class Rados(object):
+        def __init__(self, rados_id=None, conffile=None):
+            self.rados_id = rados_id
+            self.connected = False
+            self.pools = {'rbd': {}, 'images': {}}
+
+        def connect(self):
+            self.connected = True
+
+        def list_pools(self):
+            return self.pools.keys()
+
+        def open_ioctx(self, pool):
+            if pool not in self.pools:
+                raise FakeRadosError(pool)
+            return FakeIoctx(self, pool)
+
+        def get_fsid(self):
+            return 'abc'
+
+
+class FakeRBDImage(object):
+    def __init__(self, ioctx, name, snapshot=None, read_only=False):
+        self.images = ioctx.cluster.pools[ioctx.pool]
+        if name not in self.images:
+            raise FakeRadosError(name)
+        self.data = self.images[name]
+        if snapshot is not None and snapshot not in self.data['snaps']:
+            raise FakeRadosError(snapshot)
+
+    def stat(self):
+        return {'obj_size': 8, 'size': self.data['size']}
+
+    def write(self, data, offset):
+        self.data['writes'].append((offset, data))
+        return len(data)
+
+    def resize(self, size):
+        self.data['size'] = size
+
+    def list_snaps(self):
+        return iter([{'name': name} for name in self.data['snaps']])
+
+    def create_snap(self, name):
+        self.data['snaps'][name] = False
+
+    def protect_snap(self, name):
+        self.data['snaps'][name] = True
+
+    def unprotect_snap(self, name):
+        if self.data.get('children'):
+            raise FakeImageBusy(name)
+        self.data['snaps'][name] = False
+
+    def remove_snap(self, name):
+        del self.data['snaps'][name]
+
+    def close(self):
+        pass
+
+
+class FakeRBD(object):
+    """Stands in for the rbd module."""
+
+    Error = FakeRadosError
+    ImageBusy = FakeImageBusy
+    Image = FakeRBDImage
+    RBD_FEATURE_LAYERING = 1
+
+    class RBD(object):
+        def create(self, ioctx, name, size, old_format=True, features=0):
+            ioctx.cluster.pools[ioctx.pool][name] = {
+                'size': size, 'snaps': {}, 'writes': [],
+                'features': features}
+
+        def clone(self, p_ioctx, p_name, p_snapshot, c_ioctx, c_name,
+                  features=0):
+            parent = p_ioctx.cluster.pools[p_ioctx.pool][p_name]
+            parent['children'] = True
+            c_ioctx.cluster.pools[c_ioctx.pool][c_name] = {
+                'size': parent['size'], 'snaps': {}, 'writes': [],
+                'parent': (p_ioctx.pool, p_name, p_snapshot)}
+
+        def remove(self, ioctx, name):
+            del ioctx.cluster.pools[ioctx.pool][name]
+
+
+class LibRBDTestCase(test.TestCase):
+
+    def setUp(self):
+        super(LibRBDTestCase, self).setUp()
+        self.stubs.Set(driver, 'rados', FakeRados)
+        self.stubs.Set(driver, 'rbd', FakeRBD)
+        self.driver = driver.LibRBDDriver()
+        self.driver.do_setup(None)
+        self.driver.check_for_setup_error()
+        self.pools = self.driver._cluster.pools
+
+    def test_setup_without_modules(self):
+        self.stubs.Set(driver, 'rbd', None)
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          driver.LibRBDDriver().do_setup, None)
+
+    def test_setup_keeps_one_connection(self):
+        cluster = self.driver._cluster
+        self.assertTrue(cluster.connected)
+        self.driver.create_volume({'name': 'vol1', 'size': 1})
+        self.driver.create_volume({'name': 'vol2', 'size': 1})
+        self.assertTrue(self.driver._cluster is cluster)
+
+    def test_missing_pool(self):
+        self.flags(rbd_pool='volumes')
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          self.driver.check_for_setup_error)
+
+    def test_create_volume(self):
+        self.driver.create_volume({'name': 'vol1', 'size': 2})
+        volume = self.pools['rbd']['vol1']
+        self.assertEqual(volume['size'], 2 * 1024 * 1024 * 1024)
+        self.assertEqual(volume['features'], FakeRBD.RBD_FEATURE_LAYERING)
+
+    def test_snapshots(self):
+        self.driver.create_volume({'name': 'vol1', 'size': 1})
+        snapshot = {'name': 'snap1', 'volume_name': 'vol1'}
+        self.driver.create_snapshot(snapshot)
+        self.assertEqual(self.pools['rbd']['vol1']['snaps'], {'snap1': True})
+        self.assertRaises(exception.VolumeIsBusy,
+                          self.driver.delete_volume, {'name': 'vol1'})
+
+        self.driver.create_volume_from_snapshot(
+            {'name': 'vol2', 'size': 2}, snapshot)
+        self.assertEqual(self.pools['rbd']['vol2']['parent'],
+                         ('rbd', 'vol1', 'snap1'))
+        self.assertEqual(self.pools['rbd']['vol2']['size'],
+                         2 * 1024 * 1024 * 1024)
+        self.assertRaises(exception.SnapshotIsBusy,
+                          self.driver.delete_snapshot, snapshot)
+
+        self.driver.delete_volume({'name': 'vol2'})
+        del self.pools['rbd']['vol1']['children']
+        self.driver.delete_snapshot(snapshot)
+        self.driver.delete_volume({'name': 'vol1'})
+        self.assertEqual(self.pools['rbd'], {})
+
+    def test_cloneable(self):
+        FakeRBD.RBD().create(FakeIoctx(self.driver._cluster, 'images'),
+                             'image', 1)
+        self.pools['images']['image']['snaps']['snap'] = True
+        self.assertTrue(
+            self.driver._is_cloneable('rbd://abc/images/image/snap'))
+        self.assertFalse(
+            self.driver._is_cloneable('rbd://abc/images/image/other'))
+        self.assertFalse(
+            self.driver._is_cloneable('rbd://abc/missing/image/snap'))
+        self.assertFalse(
+            self.driver._is_cloneable('rbd://def/images/image/snap'))
+
+    def test_copy_image_to_volume_streams_aligned_writes(self):
+        class FakeImageService(object):
+            def download(self, context, image_id, data):
+                for chunk in ('abc', 'defgh', 'ijklmnopqrs', 'tu'):
+                    data.write(chunk)
+
+        self.driver.create_volume({'name': 'vol1', 'size': 1})
+        self.driver.copy_image_to_volume(None, {'name': 'vol1'},
+                                         FakeImageService(), 'image')
+        self.assertEqual(self.pools['rbd']['vol1']['writes'],
+                         [(0, 'abcdefgh'), (8, 'ijklmnop'), (16, 'qrstu')])
+
 
 class FakeRBDDriver(RBDDriver):
 
@@ -0,0 +1,162 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the result cache of the volume drivers.
+"""
+
+from cinder.openstack.common import timeutils
+from cinder import test
+from cinder.volume import result_cache
+
+
+class FakeDriver(object):
+
+    def __init__(self):
+        self.calls = []
+        self.volumes = {'vol1': {'size': 1}}
+
+    @result_cache.cached()
+    def get_volume(self, name):
+        self.calls.append(('get_volume', name))
+        return self.volumes.get(name)
+
+    @result_cache.cached(negative=True)
+    def host_defined(self, host, wwpn=None):
+        self.calls.append(('host_defined', host, wwpn))
+        return False
+
+    @result_cache.cached(scope=result_cache.OPERATION)
+    def get_mappings(self, host):
+        self.calls.append(('get_mappings', host))
+        return [host]
+
+    @result_cache.operation
+    def attach(self, host):
+        self.get_mappings(host)
+        self.detach(host)
+        return self.get_mappings(host)
+
+    @result_cache.operation
+    def detach(self, host):
+        return self.get_mappings(host)
+
+
+class ResultCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ResultCacheTestCase, self).setUp()
+        self.driver = FakeDriver()
+        timeutils.set_time_override()
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(ResultCacheTestCase, self).tearDown()
+
+    def test_cached(self):
+        self.assertEqual(self.driver.get_volume('vol1'), {'size': 1})
+        self.assertEqual(self.driver.get_volume('vol1'), {'size': 1})
+        self.assertEqual(self.driver.calls, [('get_volume', 'vol1')])
+
+    def test_ttl(self):
+        self.flags(driver_cache_ttl=10)
+        self.driver.get_volume('vol1')
+        timeutils.advance_time_seconds(9)
+        self.driver.get_volume('vol1')
+        self.assertEqual(len(self.driver.calls), 1)
+        timeutils.advance_time_seconds(1)
+        self.driver.get_volume('vol1')
+        self.assertEqual(len(self.driver.calls), 2)
+
+    def test_disabled(self):
+        self.flags(driver_cache_ttl=0)
+        self.driver.get_volume('vol1')
+        self.driver.get_volume('vol1')
+        self.assertEqual(len(self.driver.calls), 2)
+
+    def test_negative_not_cached(self):
+        self.driver.get_volume('vol2')
+        self.driver.get_volume('vol2')
+        self.assertEqual(len(self.driver.calls), 2)
+
+    def test_negative_cached(self):
+        self.assertFalse(self.driver.host_defined('host1'))
+        self.assertFalse(self.driver.host_defined('host1'))
+        self.assertEqual(len(self.driver.calls), 1)
+
+    def test_keyed_by_arguments(self):
+        self.driver.host_defined('host1')
+        self.driver.host_defined('host1', wwpn='1234')
+        self.driver.host_defined('host2')
+        self.driver.host_defined('host1', wwpn='1234')
+        self.assertEqual(self.driver.calls,
+                         [('host_defined', 'host1', None),
+                          ('host_defined', 'host1', '1234'),
+                          ('host_defined', 'host2', None)])
+
+    def test_unhashable_arguments_not_cached(self):
+        self.driver.host_defined(['host1'])
+        self.driver.host_defined(['host1'])
+        self.assertEqual(len(self.driver.calls), 2)
+
+    def test_invalidate(self):
+        self.driver.host_defined('host1')
+        self.driver.host_defined('host1', wwpn='1234')
+        self.driver.host_defined('host2')
+        result_cache.invalidate(self.driver, 'host_defined', 'host1')
+        self.driver.host_defined('host1')
+        self.driver.host_defined('host1', wwpn='1234')
+        self.driver.host_defined('host2')
+        self.assertEqual(len(self.driver.calls), 5)
+
+        result_cache.invalidate(self.driver, 'host_defined')
+        self.driver.host_defined('host2')
+        self.assertEqual(len(self.driver.calls), 6)
+
+    def test_maxsize(self):
+        cache = result_cache.ResultCache(ttl=10, maxsize=2)
+        cache.put('a', 1)
+        timeutils.advance_time_seconds(1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get('a') is result_cache._MISSING)
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_operation_scope(self):
+        self.assertEqual(self.driver.attach('host1'), ['host1'])
+        # Cached for the nested entry point too
+        self.assertEqual(self.driver.calls, [('get_mappings', 'host1')])
+
+        # Not kept after the operation
+        self.driver.detach('host1')
+        self.assertEqual(len(self.driver.calls), 2)
+
+        # Not cached outside of an operation
+        self.driver.get_mappings('host1')
+        self.driver.get_mappings('host1')
+        self.assertEqual(len(self.driver.calls), 4)
+        self.assertEqual(self.driver._result_caches.operations, {})
+
+    def test_stats(self):
+        self.driver.get_volume('vol1')
+        self.driver.get_volume('vol1')
+        self.driver.get_volume('vol2')
+        result_cache.invalidate(self.driver, 'get_volume')
+        self.assertEqual(result_cache.get_stats(self.driver),
+                         {'get_volume': {'hits': 1, 'misses': 2,
+                                         'evictions': 1, 'size': 0}})
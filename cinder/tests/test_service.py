@@ -20,6 +20,10 @@
 Unit Tests for remote procedure calls using queue
 """
 
+import os
+import signal
+
+import eventlet
 import mox
 
 from cinder import context
@@ -27,6 +31,8 @@ from cinder import db
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import cfg
+from cinder.openstack.common import rpc
+from cinder.openstack.common import timeutils
 from cinder import test
 from cinder import service
 from cinder import manager
@@ -78,6 +84,107 @@ class ServiceManagerTestCase(test.TestCase):
         serv.start()
         self.assertEqual(serv.test_method(), 'service')
 
+    def test_service_rpc_stats(self):
+        serv = service.Service('test',
+                               'test',
+                               'test',
+                               'cinder.tests.test_service.FakeManager')
+        self.assertEqual(serv.manager.service_rpc_stats(None), {})
+        serv.start()
+        serv.manager._rpc_dispatcher.stats.record('test_method', 0.1, 0.2)
+        stats = serv.manager.service_rpc_stats(None)
+        self.assertEqual(stats['test_method']['run_time']['count'], 1)
+
+
+class SchedulerDependentManagerTestCase(test.TestCase):
+    """Test cases for publishing capabilities to the schedulers"""
+
+    def setUp(self):
+        super(SchedulerDependentManagerTestCase, self).setUp()
+        self.flags(capabilities_full_update_interval=600,
+                   capabilities_publish_jitter=0)
+        timeutils.set_time_override()
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='volume')
+        self.updates = []
+
+        def fake_update(context, service_name, host, capabilities,
+                        **kwargs):
+            kwargs['capabilities'] = capabilities
+            self.updates.append(kwargs)
+        self.stubs.Set(self.manager.scheduler_rpcapi,
+                       'update_service_capabilities', fake_update)
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(SchedulerDependentManagerTestCase, self).tearDown()
+
+    def _publish(self, capabilities):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(None)
+
+    def test_only_changes_published(self):
+        self.manager._publish_service_capabilities(None)
+        self.assertEqual(self.updates, [])
+
+        self._publish({'free': 10, 'total': 20, 'name': 'lvm'})
+        self._publish({'free': 10, 'total': 20, 'name': 'lvm'})
+        self._publish({'free': 5, 'total': 20})
+        self.assertEqual(self.updates,
+                         [{'capabilities': {'free': 10, 'total': 20,
+                                            'name': 'lvm'},
+                           'sequence': 1, 'full': True, 'removed': []},
+                          {'capabilities': {'free': 5},
+                           'sequence': 2, 'full': False,
+                           'removed': ['name']}])
+
+    def test_full_update_interval(self):
+        self._publish({'free': 10})
+        timeutils.advance_time_seconds(600)
+        self._publish({'free': 10})
+        self.assertEqual(len(self.updates), 2)
+        self.assertTrue(self.updates[1]['full'])
+
+        self.flags(capabilities_full_update_interval=0)
+        self._publish({'free': 5})
+        self.assertEqual(self.updates[2],
+                         {'capabilities': {'free': 5}, 'sequence': 3,
+                          'full': True, 'removed': []})
+
+    def test_jittered_updates_coalesced(self):
+        self.flags(capabilities_publish_jitter=10)
+        calls = []
+        self.stubs.Set(eventlet, 'spawn_after',
+                       lambda *args: calls.append(args))
+
+        self._publish({'free': 10})
+        self._publish({'free': 5})
+        self.assertEqual(len(calls), 1)
+        delay, function, context = calls[0]
+        self.assertTrue(0 <= delay <= 10)
+        self.assertEqual(self.updates, [])
+
+        function(context)
+        self.assertEqual(self.updates[0]['capabilities'], {'free': 5})
+        self._publish({'free': 1})
+        self.assertEqual(len(calls), 2)
+
+    def test_update_during_cast_published_next(self):
+        fake_update = self.manager.scheduler_rpcapi.update_service_capabilities
+
+        def update_during_cast(*args, **kwargs):
+            fake_update(*args, **kwargs)
+            if len(self.updates) == 1:
+                self.manager.update_service_capabilities({'free': 5})
+        self.stubs.Set(self.manager.scheduler_rpcapi,
+                       'update_service_capabilities', update_during_cast)
+
+        self._publish({'free': 10})
+        self.manager._publish_service_capabilities(None)
+        self.assertEqual(self.updates[1],
+                         {'capabilities': {'free': 5}, 'sequence': 2,
+                          'full': False, 'removed': []})
+
 
 class ServiceFlagsTestCase(test.TestCase):
     def test_service_enabled_on_create_based_on_flag(self):
@@ -219,3 +326,72 @@ class TestLauncher(test.TestCase):
         launcher.launch_server(self.service)
         self.assertEquals(0, self.service.port)
         launcher.stop()
+
+
+class TestProcessLauncher(test.TestCase):
+
+    def setUp(self):
+        super(TestProcessLauncher, self).setUp()
+        self.stubs.Set(wsgi.Loader, "load_app", mox.MockAnything())
+        self.service = service.WSGIService("test_service")
+        self.launcher = service.ProcessLauncher()
+        self.pids = iter(xrange(100, 200))
+        self.cleanups = []
+        self.killed = []
+        self.exited = []
+
+        def fake_fork():
+            self.cleanups.append('fork')
+            return self.pids.next()
+
+        def fake_waitpid(pid, options):
+            if self.exited:
+                return self.exited.pop(0), 0
+            self.launcher.sigcaught = signal.SIGTERM
+            return 0, 0
+
+        self.stubs.Set(os, 'fork', fake_fork)
+        self.stubs.Set(os, 'waitpid', fake_waitpid)
+        self.stubs.Set(os, 'kill',
+                       lambda pid, signo: self.killed.append(pid))
+        self.stubs.Set(db, 'dispose_engine',
+                       lambda: self.cleanups.append('db'))
+        self.stubs.Set(rpc, 'cleanup', lambda: self.cleanups.append('rpc'))
+        self.stubs.Set(service.eventlet.greenthread, 'sleep',
+                       lambda seconds: None)
+        self.stubs.Set(service.time, 'sleep', lambda seconds: None)
+
+    def test_launch_server(self):
+        self.launcher.launch_server(self.service, workers=2)
+        self.assertNotEqual(0, self.service.port)
+        self.assertEqual(sorted(self.launcher.children), [100, 101])
+        # Connections are closed before every fork.
+        self.assertEqual(self.cleanups, ['db', 'rpc', 'fork'] * 2)
+
+    def test_respawn(self):
+        self.launcher.launch_server(self.service, workers=2)
+        self.exited = [100]
+        self.launcher._respawn_children()
+        self.assertEqual(sorted(self.launcher.children), [101, 102])
+
+    def test_reload(self):
+        self.stubs.Set(service.FLAGS, 'clear', lambda: None)
+        self.stubs.Set(flags, 'parse_args', lambda argv: argv)
+        self.launcher.launch_server(self.service, workers=2)
+        self.launcher.reload()
+        self.assertEqual(sorted(self.launcher.children), [102, 103])
+        self.assertEqual(sorted(self.killed), [100, 101])
+
+        # Retired workers are not respawned when they exit.
+        self.exited = [100, 101]
+        self.launcher._respawn_children()
+        self.assertEqual(sorted(self.launcher.children), [102, 103])
+        self.assertEqual(self.launcher.retiring, set())
+
+    def test_stop(self):
+        self.launcher.launch_server(self.service, workers=2)
+        self.exited = [100, 101]
+        self.launcher.stop()
+        self.assertEqual(sorted(self.killed), [100, 101])
+        self.assertEqual(self.launcher.children, {})
+        self.assertEqual(self.launcher.retiring, set())
@@ -0,0 +1,143 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the shared SOAP clients of the volume drivers.
+"""
+
+import os
+import shutil
+import tempfile
+
+from suds import client as suds_client
+
+from cinder import test
+from cinder.volume import soap
+
+
+WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="http://example.com/test"
+    targetNamespace="http://example.com/test" name="Test">
+  <types>
+    <xsd:schema targetNamespace="http://example.com/test"
+        elementFormDefault="qualified">
+      <xsd:element name="Ping"><xsd:complexType/></xsd:element>
+      <xsd:element name="PingResult"><xsd:complexType/></xsd:element>
+    </xsd:schema>
+  </types>
+  <message name="PingRequest">
+    <part name="parameters" element="tns:Ping"/>
+  </message>
+  <message name="PingResponse">
+    <part name="results" element="tns:PingResult"/>
+  </message>
+  <portType name="TestInterface">
+    <operation name="%s">
+      <input message="tns:PingRequest"/>
+      <output message="tns:PingResponse"/>
+    </operation>
+  </portType>
+  <binding name="TestBinding" type="tns:TestInterface">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="%s">
+      <soap:operation soapAction="urn:Ping"/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+  </binding>
+  <service name="TestService">
+    <port name="TestPort" binding="tns:TestBinding">
+      <soap:address location="http://localhost/soap"/>
+    </port>
+  </service>
+</definitions>"""
+
+
+class SoapClientTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SoapClientTestCase, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tempdir, 'cache')
+        self.flags(wsdl_cache_dir=self.cache_dir)
+        self.wsdl_path = os.path.join(self.tempdir, 'test.wsdl')
+        self.wsdl_url = 'file://' + self.wsdl_path
+        self._write_wsdl('Ping')
+        self.stubs.Set(soap, '_CLIENTS', {})
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        super(SoapClientTestCase, self).tearDown()
+
+    def _write_wsdl(self, operation):
+        with open(self.wsdl_path, 'w') as f:
+            f.write(WSDL % (operation, operation))
+
+    def _stub_parse_fails(self):
+        def fake_definitions(*args, **kwargs):
+            raise AssertionError('WSDL parsed')
+        self.stubs.Set(suds_client, 'Definitions', fake_definitions)
+
+    def test_get_client(self):
+        client = soap.get_client(self.wsdl_url, 'user', 'password',
+                                 location='http://filer/soap')
+        self.assertTrue(hasattr(client.service, 'Ping'))
+        self.assertEqual(client.options.location, 'http://filer/soap')
+        self.assertEqual(client.options.username, 'user')
+
+    def test_wsdl_shared(self):
+        client1 = soap.get_client(self.wsdl_url, 'user1', 'password')
+        client2 = soap.get_client(self.wsdl_url, 'user2', 'password',
+                                  location='http://filer/soap')
+        self.assertTrue(client1.wsdl is client2.wsdl)
+        self.assertEqual(client1.options.username, 'user1')
+        self.assertEqual(client2.options.username, 'user2')
+        self.assertNotEqual(client1.options.location, 'http://filer/soap')
+
+    def test_wsdl_not_shared_without_cache(self):
+        client1 = soap.get_client(self.wsdl_url, 'user', 'password',
+                                  cache=False)
+        client2 = soap.get_client(self.wsdl_url, 'user', 'password',
+                                  cache=False)
+        self.assertFalse(client1.wsdl is client2.wsdl)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_parsed_wsdl_kept_on_disk(self):
+        soap.get_client(self.wsdl_url, 'user', 'password')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # As after a restart
+        self.stubs.Set(soap, '_CLIENTS', {})
+        self._stub_parse_fails()
+        client = soap.get_client(self.wsdl_url, 'user', 'password')
+        self.assertTrue(hasattr(client.service, 'Ping'))
+
+    def test_changed_wsdl_parsed_again(self):
+        soap.get_client(self.wsdl_url, 'user', 'password')
+        self._write_wsdl('Pong')
+        self.stubs.Set(soap, '_CLIENTS', {})
+        client = soap.get_client(self.wsdl_url, 'user', 'password')
+        self.assertTrue(hasattr(client.service, 'Pong'))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_disk_cache_disabled(self):
+        self.flags(wsdl_cache_dir='')
+        soap.get_client(self.wsdl_url, 'user', 'password')
+        self.assertFalse(os.path.exists(self.cache_dir))
@@ -36,6 +36,7 @@ from cinder.openstack.common import importutils
 from cinder.openstack.common.notifier import api as notifier_api
 from cinder.openstack.common.notifier import test_notifier
 from cinder.openstack.common import rpc
+from cinder.openstack.common import timeutils
 import cinder.policy
 from cinder import quota
 from cinder import test
@@ -119,6 +120,48 @@ class VolumeTestCase(test.TestCase):
                           self.context,
                           volume_id)
 
+    def test_get_changes(self):
+        """Test the change summary follows volume writes in a project."""
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        volume_api = cinder.volume.api.API()
+        user_ctxt = context.RequestContext('fake', 'fake')
+
+        def changes():
+            timeutils.advance_time_seconds(1)
+            return volume_api.get_changes(user_ctxt)
+
+        empty = changes()
+        self.assertEqual(empty, (0, None))
+        volume = self._create_volume()
+        created = changes()
+        self.assertEqual(created[0], 1)
+        db.volume_metadata_update(self.context, volume['id'],
+                                  {'key': 'value'}, False)
+        updated = changes()
+        self.assertNotEqual(updated, created)
+        other = db.volume_create(self.context, {'project_id': 'other'})
+        self.assertEqual(changes(), updated)
+        self.assertNotEqual(volume_api.get_changes(self.context,
+                                                   {'all_tenants': 1}),
+                            updated)
+        db.volume_destroy(self.context, volume['id'])
+        self.assertNotEqual(changes(), updated)
+        db.volume_destroy(self.context, other['id'])
+
+    def test_delete_volumes(self):
+        """Test a failed delete does not stop the other deletes."""
+        deleted = []
+
+        def fake_delete_volume(context, volume_id):
+            if volume_id == 'bad':
+                raise exception.VolumeAttached(volume_id=volume_id)
+            deleted.append(volume_id)
+
+        self.stubs.Set(self.volume, 'delete_volume', fake_delete_volume)
+        self.volume.delete_volumes(self.context, ['a', 'bad', 'b'])
+        self.assertEqual(deleted, ['a', 'b'])
+
     def test_create_delete_volume_with_metadata(self):
         """Test volume can be created with metadata and deleted."""
         test_meta = {'fake_key': 'fake_value'}
@@ -269,6 +312,108 @@ class VolumeTestCase(test.TestCase):
                           snapshot_id)
         self.volume.delete_volume(self.context, volume['id'])
 
+    def test_create_snapshot_finished_by_driver(self):
+        """Test a snapshot the driver is still copying stays creating."""
+        def fake_create_snapshot(snapshot):
+            return {'status': 'creating', 'progress': '0%'}
+
+        self.stubs.Set(self.volume.driver, 'create_snapshot',
+                       fake_create_snapshot)
+        volume = self._create_volume()
+        self.volume.create_volume(self.context, volume['id'])
+        snapshot_id = self._create_snapshot(volume['id'])['id']
+        self.volume.create_snapshot(self.context, volume['id'], snapshot_id)
+        snapshot = db.snapshot_get(context.get_admin_context(), snapshot_id)
+        self.assertEqual(snapshot['status'], 'creating')
+        self.assertEqual(snapshot['progress'], '0%')
+
+        self.volume.delete_snapshot(self.context, snapshot_id)
+        self.volume.delete_volume(self.context, volume['id'])
+
+    def test_stats_change_threshold(self):
+        """Test small changes of the capacity are not reported."""
+        self.flags(volume_stats_change_threshold=0.1)
+        old = {'volume_backend_name': 'lvm', 'free_capacity_gb': 100.0,
+               'driver_cache': {'hits': 10}}
+        new = dict(old, free_capacity_gb=95.0)
+        self.assertFalse(self.volume._volume_stats_changed(old, new))
+        new = dict(old, free_capacity_gb=85.0)
+        self.assertTrue(self.volume._volume_stats_changed(old, new))
+        new = dict(old, volume_backend_name='lvm2')
+        self.assertTrue(self.volume._volume_stats_changed(old, new))
+        new = dict(old, driver_cache={'hits': 20})
+        self.assertTrue(self.volume._volume_stats_changed(old, new))
+        new = dict(old, reserved_percentage=0)
+        self.assertTrue(self.volume._volume_stats_changed(old, new))
+
+        self.flags(volume_force_update_capabilities=True)
+        self.assertTrue(self.volume._volume_stats_changed(old, old))
+
+    def test_stats_refreshed_after_create(self):
+        """Test the stats are queried again after a volume is created."""
+        queries = []
+
+        def fake_query_volume_stats():
+            queries.append(1)
+            return {'total_capacity_gb': 4.0, 'free_capacity_gb': 2.0}
+
+        self.stubs.Set(self.volume.driver, '_query_volume_stats',
+                       fake_query_volume_stats)
+        self.volume._report_driver_status(self.context)
+        self.volume._report_driver_status(self.context)
+        self.assertEqual(len(queries), 1)
+
+        volume = self._create_volume()
+        self.volume.create_volume(self.context, volume['id'])
+        self.volume._report_driver_status(self.context)
+        self.assertEqual(len(queries), 2)
+        self.volume.delete_volume(self.context, volume['id'])
+
+    def test_full_capabilities_sent_while_stats_stable(self):
+        """Test the full update is sent even if the stats did not change."""
+        self.flags(capabilities_full_update_interval=600,
+                   capabilities_publish_jitter=0)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        updates = []
+
+        def fake_update(context, service_name, host, capabilities,
+                        **kwargs):
+            updates.append((capabilities, kwargs['full']))
+
+        self.stubs.Set(self.volume.scheduler_rpcapi,
+                       'update_service_capabilities', fake_update)
+        stats = {'volume_backend_name': 'lvm', 'free_capacity_gb': 2.0}
+        self.stubs.Set(self.volume.driver, 'get_volume_stats',
+                       lambda refresh: stats)
+
+        self.volume._report_driver_status(self.context)
+        self.volume._publish_service_capabilities(self.context)
+        timeutils.advance_time_seconds(300)
+        self.volume._report_driver_status(self.context)
+        self.volume._publish_service_capabilities(self.context)
+        self.assertEqual(updates, [(stats, True)])
+
+        timeutils.advance_time_seconds(300)
+        self.volume._report_driver_status(self.context)
+        self.volume._publish_service_capabilities(self.context)
+        self.assertEqual(updates, [(stats, True), (stats, True)])
+
+    def test_provisioned_stats_added(self):
+        """Test the capacity provisioned to volumes is reported."""
+        volume = self._create_volume(size=2)
+        self.volume.create_volume(self.context, volume['id'])
+        stats = {'total_capacity_gb': 4.0, 'free_capacity_gb': 2.0}
+        self.stubs.Set(self.volume.driver, 'get_volume_stats',
+                       lambda refresh: stats)
+        self.volume._report_driver_status(self.context)
+        self.assertEqual(self.volume._last_volume_stats,
+                         {'total_capacity_gb': 4.0, 'free_capacity_gb': 2.0,
+                          'provisioned_capacity_gb': 2,
+                          'thin_provisioning_ratio': 0.5})
+        self.assertFalse('provisioned_capacity_gb' in stats)
+        self.volume.delete_volume(self.context, volume['id'])
+
     def test_cant_delete_volume_in_use(self):
         """Test volume can't be deleted in invalid stats."""
         # create a volume and assign to host
@@ -629,6 +774,45 @@ class VolumeTestCase(test.TestCase):
                           self.context, 2,
                           'name', 'description', image_id=1)
 
+    def test_create_volume_async(self):
+        """Test the volume is scheduled after create returns."""
+        self.flags(volume_create_async=True)
+        casts = []
+        self.stubs.Set(rpc, 'cast',
+                       lambda context, topic, msg: casts.append(msg))
+
+        volume_api = cinder.volume.api.API()
+        volume = volume_api.create(self.context, 1, 'name', 'description')
+        self.assertEqual(volume['status'], 'creating')
+        self.assertEqual(casts, [])
+
+        cinder.volume.api.get_create_queue().waitall()
+        self.assertEqual(len(casts), 1)
+        self.assertEqual(casts[0]['args']['volume_id'], volume['id'])
+        db.volume_destroy(self.context, volume['id'])
+
+    def test_create_volume_async_from_oversized_image(self):
+        """Test an accepted volume with a too big image goes to error."""
+        class _FakeImageService:
+            def show(self, context, image_id):
+                return {'size': 2 * 1024 * 1024 * 1024 + 1}
+
+        self.flags(volume_create_async=True)
+        casts = []
+        self.stubs.Set(rpc, 'cast',
+                       lambda context, topic, msg: casts.append(msg))
+
+        volume_api = cinder.volume.api.API(image_service=_FakeImageService())
+        volume = volume_api.create(self.context, 2, 'name', 'description',
+                                   image_id=1)
+        self.assertEqual(volume['status'], 'creating')
+
+        cinder.volume.api.get_create_queue().waitall()
+        self.assertEqual(casts, [])
+        volume = db.volume_get(self.context, volume['id'])
+        self.assertEqual(volume['status'], 'error')
+        db.volume_destroy(self.context, volume['id'])
+
     def _do_test_create_volume_with_size(self, size):
         def fake_reserve(context, expire=None, **deltas):
             return ["RESERVATION"]
@@ -803,6 +987,11 @@ class VolumeDriverTestCase(DriverTestCase):
         self.output = 'x'
         self.volume.driver.delete_volume({'name': 'test1', 'size': 1024})
 
+    def test_volume_stats_not_reported(self):
+        """Test a driver reports no stats unless it queries them."""
+        self.assertEqual(self.volume.driver.get_volume_stats(refresh=True),
+                         None)
+
 
 class ISCSITestCase(DriverTestCase):
     """Test Case for ISCSIDriver"""
@@ -827,6 +1016,29 @@ class ISCSITestCase(DriverTestCase):
 
         return volume_id_list
 
+    def test_volume_stats(self):
+        """Test the stats are queried at most every interval."""
+        self.flags(volume_stats_min_interval=60)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.output = '  10737418240 5368709120\n'
+        stats = self.volume.driver.get_volume_stats()
+        self.assertEqual(stats, {'total_capacity_gb': 10.0,
+                                 'free_capacity_gb': 5.0})
+
+        self.output = '  10737418240 0\n'
+        timeutils.advance_time_seconds(30)
+        stats = self.volume.driver.get_volume_stats(refresh=True)
+        self.assertEqual(stats['free_capacity_gb'], 5.0)
+        timeutils.advance_time_seconds(30)
+        stats = self.volume.driver.get_volume_stats(refresh=True)
+        self.assertEqual(stats['free_capacity_gb'], 0.0)
+
+        self.output = '  10737418240 1073741824\n'
+        self.volume.driver.clear_volume_stats()
+        stats = self.volume.driver.get_volume_stats(refresh=True)
+        self.assertEqual(stats['free_capacity_gb'], 1.0)
+
 
 class VolumePolicyTestCase(test.TestCase):
 
@@ -22,6 +22,7 @@ from cinder import context
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
 from cinder import test
 from cinder.volume import volume_types
 from cinder.db.sqlalchemy import session as sql_session
@@ -80,6 +81,23 @@ class VolumeTypeTestCase(test.TestCase):
         vol_types = volume_types.get_all_types(self.ctxt)
         self.assertEqual(total_volume_types, len(vol_types))
 
+    def test_get_all_types_changes(self):
+        """Ensures the change summary follows volume type writes"""
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        before = volume_types.get_all_types_changes(self.ctxt)
+        timeutils.advance_time_seconds(1)
+        volume_types.create(self.ctxt,
+                            self.vol_type1_name,
+                            self.vol_type1_specs)
+        created = volume_types.get_all_types_changes(self.ctxt)
+        self.assertEqual(created[0], before[0] + 1 + 5)
+        self.assertNotEqual(created[1], before[1])
+        timeutils.advance_time_seconds(1)
+        volume_types.destroy(self.ctxt, self.vol_type1_name)
+        destroyed = volume_types.get_all_types_changes(self.ctxt)
+        self.assertNotEqual(destroyed, created)
+
     def test_non_existent_vol_type_shouldnt_delete(self):
         """Ensures that volume type creation fails with invalid args"""
         self.assertRaises(exception.VolumeTypeNotFoundByName,
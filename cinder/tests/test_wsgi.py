@@ -22,6 +22,8 @@ import os.path
 import tempfile
 
 import unittest
+
+import eventlet
 import webob.dec
 
 from cinder.api import openstack as openstack_api
@@ -94,6 +96,32 @@ class TestWSGIServer(unittest.TestCase):
         server.stop()
         server.wait()
 
+    def test_listen_then_start(self):
+        server = cinder.wsgi.Server("test_listen", None, host="127.0.0.1")
+        server.listen()
+        port = server.port
+        self.assertNotEqual(0, port)
+        server.start()
+        self.assertEqual(port, server.port)
+        server.stop()
+        server.wait()
+
+    def test_drain_finishes_requests(self):
+        def app(environ, start_response):
+            eventlet.sleep(0.1)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return ['done']
+
+        server = cinder.wsgi.Server("test_drain", app, host="127.0.0.1")
+        server.start()
+        sock = eventlet.connect(("127.0.0.1", server.port))
+        sock.sendall('GET / HTTP/1.0\r\n\r\n')
+        eventlet.sleep(0.01)
+        server.drain(timeout=5)
+        response = sock.makefile().read()
+        self.assertTrue(response.startswith('HTTP/1.1 200'))
+        self.assertTrue(response.endswith('done'))
+
 
 class ExceptionTest(test.TestCase):
 
@@ -0,0 +1,167 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the Xen storage manager volume driver.
+"""
+
+import sys
+import types
+
+from cinder import context
+from cinder import exception
+from cinder import flags
+from cinder.openstack.common import cfg
+from cinder import test
+
+FLAGS = flags.FLAGS
+GB = 1024 * 1024 * 1024
+
+
+class FakeXenAPISession(object):
+    """Stands in for the XenAPI session, with the size and utilisation of
+    the SRs by uuid."""
+
+    def __init__(self, url, username, password):
+        self.srs = {}
+
+    def call_xenapi(self, method, *args):
+        if method == 'SR.get_by_uuid':
+            return 'ref-%s' % args[0]
+        if method == 'SR.get_record':
+            size, used = self.srs[args[0][len('ref-'):]]
+            return {'physical_size': str(size),
+                    'physical_utilisation': str(used)}
+        raise AssertionError('unexpected call %s' % method)
+
+
+class FakeVolumeOps(object):
+    def __init__(self, session):
+        self.introduced = []
+
+    def introduce_sr(self, sr_uuid, label, params):
+        self.introduced.append(sr_uuid)
+
+
+def _import_xensm():
+    """Import the driver with stand-ins for cinder.virt, which is not
+    part of this tree."""
+    connection = types.ModuleType('cinder.virt.xenapi.connection')
+    connection.XenAPISession = FakeXenAPISession
+    volumeops = types.ModuleType('cinder.virt.xenapi.volumeops')
+    volumeops.VolumeOps = FakeVolumeOps
+    xenapi = types.ModuleType('cinder.virt.xenapi')
+    xenapi.connection = connection
+    xenapi.volumeops = volumeops
+    virt = types.ModuleType('cinder.virt')
+    virt.xenapi = xenapi
+    fakes = {'cinder.virt': virt,
+             'cinder.virt.xenapi': xenapi,
+             'cinder.virt.xenapi.connection': connection,
+             'cinder.virt.xenapi.volumeops': volumeops}
+    for name, module in fakes.items():
+        sys.modules.setdefault(name, module)
+    try:
+        from cinder.volume import xensm
+    finally:
+        for name, module in fakes.items():
+            if sys.modules.get(name) is module:
+                del sys.modules[name]
+    return xensm
+
+xensm = _import_xensm()
+
+FLAGS.register_opts([cfg.StrOpt('xenapi_connection_url'),
+                     cfg.StrOpt('xenapi_connection_username'),
+                     cfg.StrOpt('xenapi_connection_password')])
+
+
+class FakeDb(object):
+    def __init__(self, backends):
+        self.backends = backends
+
+    def sm_backend_conf_get_all(self, context):
+        return self.backends
+
+
+def _backend(backend_id):
+    return {'id': backend_id, 'flavor_id': 1, 'sr_type': 'nfs',
+            'sr_uuid': 'sr%d' % backend_id,
+            'config_params': 'server=nfs%d serverpath=/sr' % backend_id}
+
+
+class XenSMDriverTestCase(test.TestCase):
+
+    def setUp(self):
+        super(XenSMDriverTestCase, self).setUp()
+        self.flags(connection_type='xenapi')
+        self.driver = xensm.XenSMDriver()
+        self.driver.db = FakeDb([_backend(1), _backend(2), _backend(3),
+                                 _backend(4)])
+        # Backend 3 has no known capacity
+        self.driver._session.srs = {'sr1': (20 * GB, 10 * GB),
+                                    'sr2': (20 * GB, 17 * GB),
+                                    'sr4': (10 * GB, 5 * GB)}
+        self.driver.do_setup(context.get_admin_context())
+
+    def test_select_backends(self):
+        backends = self.driver._select_backends(self.driver.ctxt, 4 * GB)
+        self.assertEqual([b['conf']['id'] for b in backends], [4, 1, 3])
+
+    def test_call_with_sr_plugs_again_after_failure(self):
+        backend = self.driver._get_backend(self.driver.ctxt, 1)
+        calls = []
+
+        def method(sr_uuid):
+            calls.append(sr_uuid)
+            if len(calls) == 1:
+                raise exception.CinderException('SR forgotten')
+            return 'vdi'
+
+        introduced = self.driver._volumeops.introduced
+        del introduced[:]
+        self.assertEqual(self.driver._call_with_sr(backend, method), 'vdi')
+        self.assertEqual(calls, ['sr1', 'sr1'])
+        self.assertEqual(introduced, ['sr1'])
+
+    def test_call_with_sr_not_plugged_again_after_plugging(self):
+        backend = self.driver._get_backend(self.driver.ctxt, 1)
+        backend['plugged'] = False
+
+        def method(sr_uuid):
+            raise exception.CinderException('failed')
+
+        introduced = self.driver._volumeops.introduced
+        del introduced[:]
+        self.assertRaises(exception.CinderException,
+                          self.driver._call_with_sr, backend, method)
+        self.assertEqual(introduced, ['sr1'])
+
+    def test_call_with_sr_plugged(self):
+        backend = self.driver._get_backend(self.driver.ctxt, 1)
+        introduced = self.driver._volumeops.introduced
+        del introduced[:]
+        self.assertEqual(self.driver._call_with_sr(backend, lambda s: s),
+                         'sr1')
+        self.assertEqual(introduced, [])
+
+    def test_get_volume_stats(self):
+        stats = self.driver.get_volume_stats()
+        self.assertEqual(stats['total_capacity_gb'], 50)
+        self.assertEqual(stats['free_capacity_gb'], 18)
+        self.assertEqual([(b['backend_id'], b['free_capacity_gb'])
+                          for b in stats['backends']],
+                         [(1, 10), (2, 3), (3, 'unknown'), (4, 5)])
@@ -88,12 +88,19 @@ RUNTIME_VARS = None
 
 
 class FakeRequest(object):
+    reason = ''
+    version = 11
+    will_close = False
+
     def __init__(self, method, url, body):
         self.method = method
         self.url = url
         self.body = body
         self.status = RUNTIME_VARS['status']
 
+    def getheaders(self):
+        return []
+
     def read(self):
         ops = {'POST': [('/api/users/login.xml', self._login),
                         ('/api/volumes.xml', self._create_volume),
@@ -333,7 +340,7 @@ class FakeHTTPConnection(object):
         self.use_ssl = use_ssl
         self.req = None
 
-    def request(self, method, url, body):
+    def request(self, method, url, body, headers=None):
         LOG.debug('Enter: request')
         self.req = FakeRequest(method, url, body)
 
@@ -379,6 +386,27 @@ class ZadaraVPSADriverTestCase(test.TestCase):
         self.driver.create_volume(volume)
         self.driver.delete_volume(volume)
 
+    def test_connection_reused(self):
+        """Commands share keep-alive connections."""
+        connections = []
+
+        class CountingConnection(FakeHTTPConnection):
+            def __init__(self, *args, **kwargs):
+                connections.append(self)
+                super(CountingConnection, self).__init__(*args, **kwargs)
+
+        self.stubs.Set(httplib, 'HTTPConnection', CountingConnection)
+        self.driver.do_setup(None)
+        volume = {'name': 'test_volume_01', 'size': 1, 'id': 101}
+        connector = dict(initiator='test_iqn.1')
+        self.driver.create_volume(volume)
+        self.driver.initialize_connection(volume, connector)
+        self.driver.terminate_connection(volume, connector)
+        self.driver.delete_volume(volume)
+        self.assertEqual(len(connections), 1)
+        stats = self.driver.vpsa.pool.get_stats()
+        self.assertEqual(stats['list_controllers']['count'], 1)
+
     def test_create_destroy_multiple(self):
         """Create/Delete multiple volumes."""
         self.flags(zadara_vpsa_allow_nonexistent_delete=False)
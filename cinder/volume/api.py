@@ -20,12 +20,16 @@
 Handles all requests relating to volumes.
 """
 
+import collections
 import functools
 
+from eventlet import greenpool
+
 from cinder.db import base
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import cfg
+from cinder.openstack.common import excutils
 from cinder.image import glance
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import rpc
@@ -38,8 +42,21 @@ volume_host_opt = cfg.BoolOpt('snapshot_same_host',
         default=True,
         help='Create volume from snapshot at the host where snapshot resides')
 
+volume_create_opts = [
+    cfg.BoolOpt('volume_create_async',
+                default=False,
+                help='Return from volume create once the volume is recorded, '
+                     'and check its image and schedule it in the '
+                     'background. Image errors then put the volume in '
+                     'error instead of failing the request'),
+    cfg.IntOpt('volume_create_async_workers',
+               default=8,
+               help='Greenthreads that finish accepted volume creates'),
+]
+
 FLAGS = flags.FLAGS
 FLAGS.register_opt(volume_host_opt)
+FLAGS.register_opts(volume_create_opts)
 flags.DECLARE('storage_availability_zone', 'cinder.volume.manager')
 
 LOG = logging.getLogger(__name__)
@@ -71,6 +88,46 @@ def check_policy(context, action, target_obj=None):
     cinder.policy.enforce(context, _action, target)
 
 
+class CreateQueue(object):
+    """Runs the rest of accepted volume creates in the background.
+
+    Work is queued without blocking the caller and run, in order, by at
+    most size greenthreads.  Queued work does not survive a restart of
+    the process.
+    """
+
+    def __init__(self, size):
+        self._pool = greenpool.GreenPool(size)
+        self._queue = collections.deque()
+
+    def put(self, func, *args):
+        self._queue.append((func, args))
+        if self._pool.free():
+            self._pool.spawn_n(self._run)
+
+    def _run(self):
+        while self._queue:
+            func, args = self._queue.popleft()
+            try:
+                func(*args)
+            except Exception:
+                LOG.exception(_("Failed to finish an accepted volume "
+                                "create"))
+
+    def waitall(self):
+        self._pool.waitall()
+
+
+_CREATE_QUEUE = None
+
+
+def get_create_queue():
+    global _CREATE_QUEUE
+    if _CREATE_QUEUE is None:
+        _CREATE_QUEUE = CreateQueue(FLAGS.volume_create_async_workers)
+    return _CREATE_QUEUE
+
+
 class API(base.Base):
     """API for interacting with the volume manager."""
 
@@ -132,14 +189,8 @@ class API(base.Base):
                            % locals())
                 raise exception.VolumeLimitExceeded(allowed=quotas['volumes'])
 
-        if image_id:
-            # check image existence
-            image_meta = self.image_service.show(context, image_id)
-            image_size_in_gb = (int(image_meta['size']) + GB - 1) / GB
-            #check image size is not larger than volume size.
-            if image_size_in_gb > size:
-                msg = _('Size of specified image is larger than volume size.')
-                raise exception.InvalidInput(reason=msg)
+        if image_id and not FLAGS.volume_create_async:
+            self._check_image(context, image_id, size)
 
         if availability_zone is None:
             availability_zone = FLAGS.storage_availability_zone
@@ -167,10 +218,35 @@ class API(base.Base):
 
         QUOTAS.commit(context, reservations)
 
-        self._cast_create_volume(context, volume['id'], snapshot_id,
-                                 image_id)
+        if FLAGS.volume_create_async:
+            get_create_queue().put(self._finish_create, context,
+                                   volume['id'], size, snapshot_id, image_id)
+        else:
+            self._cast_create_volume(context, volume['id'], snapshot_id,
+                                     image_id)
         return volume
 
+    def _check_image(self, context, image_id, size):
+        # check image existence
+        image_meta = self.image_service.show(context, image_id)
+        image_size_in_gb = (int(image_meta['size']) + GB - 1) / GB
+        #check image size is not larger than volume size.
+        if image_size_in_gb > size:
+            msg = _('Size of specified image is larger than volume size.')
+            raise exception.InvalidInput(reason=msg)
+
+    def _finish_create(self, context, volume_id, size, snapshot_id,
+                       image_id):
+        """Check the image of an accepted volume and schedule it."""
+        try:
+            if image_id:
+                self._check_image(context, image_id, size)
+            self._cast_create_volume(context, volume_id, snapshot_id,
+                                     image_id)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self.db.volume_update(context, volume_id, {'status': 'error'})
+
     def _cast_create_volume(self, context, volume_id, snapshot_id,
                             image_id):
 
@@ -237,6 +313,79 @@ class API(base.Base):
                  {"method": "delete_volume",
                   "args": {"volume_id": volume_id}})
 
+    def _get_all_by_ids(self, context, volume_ids, action):
+        """Fetch volumes in one query and check action on each.
+
+        Returns the volumes that passed as a list of dicts, and a dict of
+        volume id to the exception raised for every other id.
+        """
+        errors = {}
+        volumes = []
+        rows = self.db.volume_get_all_by_ids(context, volume_ids)
+        found = set()
+        for row in rows:
+            volume = dict(row.iteritems())
+            found.add(volume['id'])
+            try:
+                check_policy(context, action, volume)
+            except exception.NotAuthorized as e:
+                errors[volume['id']] = e
+                continue
+            volumes.append(volume)
+        for volume_id in volume_ids:
+            if volume_id not in found:
+                errors[volume_id] = exception.VolumeNotFound(
+                    volume_id=volume_id)
+        return volumes, errors
+
+    def delete_all(self, context, volume_ids, force=False):
+        """Delete many volumes at once.
+
+        The volumes are checked with one query, and each volume host is
+        sent a single message for all of its volumes.  Returns a dict of
+        volume id to None for the volumes being deleted, or to the
+        exception that kept the volume from being deleted.
+        """
+        volumes, results = self._get_all_by_ids(context, volume_ids,
+                                                'delete')
+        snapshot_counts = self.db.snapshot_count_by_volumes(
+            context, [volume['id'] for volume in volumes])
+
+        by_host = {}
+        for volume in volumes:
+            volume_id = volume['id']
+            if snapshot_counts.get(volume_id):
+                msg = (_("Volume still has %d dependent snapshots") %
+                       snapshot_counts[volume_id])
+                results[volume_id] = exception.InvalidVolume(reason=msg)
+            elif not volume['host']:
+                # Never scheduled, so there is no host to tell
+                try:
+                    self.delete(context, volume, force=force)
+                    results[volume_id] = None
+                except exception.CinderException as e:
+                    results[volume_id] = e
+            elif (not force and
+                  volume['status'] not in ["available", "error"]):
+                msg = _("Volume status must be available or error")
+                results[volume_id] = exception.InvalidVolume(reason=msg)
+            else:
+                by_host.setdefault(volume['host'], []).append(volume_id)
+                results[volume_id] = None
+
+        deleting = [volume_id for volume_ids in by_host.values()
+                    for volume_id in volume_ids]
+        now = timeutils.utcnow()
+        self.db.volume_update_all(context, deleting,
+                                  {'status': 'deleting',
+                                   'terminated_at': now})
+        for host, host_volume_ids in by_host.items():
+            rpc.cast(context,
+                     rpc.queue_get_for(context, FLAGS.volume_topic, host),
+                     {"method": "delete_volumes",
+                      "args": {"volume_ids": host_volume_ids}})
+        return results
+
     @wrap_check_policy
     def update(self, context, volume, fields):
         self.db.volume_update(context, volume['id'], fields)
@@ -294,6 +443,17 @@ class API(base.Base):
             volumes = result
         return volumes
 
+    def get_changes(self, context, search_opts=None):
+        """Returns (row_count, changed_at) for the volumes of get_all().
+
+        Either value changes whenever the result of get_all() may have.
+        """
+        check_policy(context, 'get_all')
+
+        if context.is_admin and 'all_tenants' in (search_opts or {}):
+            return self.db.volume_get_changes(context)
+        return self.db.volume_get_changes(context, context.project_id)
+
     def get_snapshot(self, context, snapshot_id):
         check_policy(context, 'get_snapshot')
         rv = self.db.snapshot_get(context, snapshot_id)
@@ -326,6 +486,14 @@ class API(base.Base):
             snapshots = results
         return snapshots
 
+    def get_snapshot_changes(self, context, search_opts=None):
+        """Returns (row_count, changed_at) for get_all_snapshots()."""
+        check_policy(context, 'get_all_snapshots')
+
+        if context.is_admin and 'all_tenants' in (search_opts or {}):
+            return self.db.snapshot_get_changes(context)
+        return self.db.snapshot_get_changes(context, context.project_id)
+
     @wrap_check_policy
     def check_attach(self, context, volume):
         # TODO(vish): abstract status checking?
@@ -487,6 +655,20 @@ class API(base.Base):
         self.db.volume_metadata_update(context, volume['id'], _metadata, True)
         return _metadata
 
+    def update_volume_metadata_all(self, context, volume_ids, metadata):
+        """Add or update metadata items on many volumes.
+
+        Returns a dict of volume id to None for the volumes updated, or to
+        the exception that kept the volume from being updated.
+        """
+        volumes, results = self._get_all_by_ids(context, volume_ids,
+                                                'update_volume_metadata')
+        for volume in volumes:
+            self.db.volume_metadata_update(context, volume['id'], metadata,
+                                           False)
+            results[volume['id']] = None
+        return results
+
     def get_volume_metadata_value(self, volume, key):
         """Get value of particular metadata key."""
         metadata = volume.get('volume_metadata')
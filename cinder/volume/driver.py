@@ -29,9 +29,17 @@ from cinder import exception
 from cinder import flags
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import cfg
+from cinder.openstack.common import timeutils
 from cinder import utils
 from cinder.volume import iscsi
 
+try:
+    import rados
+    import rbd
+except ImportError:
+    rados = None
+    rbd = None
+
 
 LOG = logging.getLogger(__name__)
 
@@ -67,18 +75,52 @@ volume_opts = [
                default=None,
                help='the libvirt uuid of the secret for the rbd_user'
                     'volumes'),
+    cfg.IntOpt('rbd_cloneable_cache_ttl',
+               default=300,
+               help='seconds an image location found cloneable by the rbd '
+                    'drivers is trusted without checking it again, 0 to '
+                    'check every time'),
+    cfg.StrOpt('rbd_ceph_conf',
+               default='',
+               help='path to the ceph configuration file used by '
+                    'LibRBDDriver, empty for the librados default'),
     cfg.StrOpt('volume_tmp_dir',
                default=None,
                help='where to store temporary image files if the volume '
                     'driver does not write them directly to the volume'),
+    cfg.IntOpt('volume_stats_min_interval',
+               default=30,
+               help='Seconds the capacity reported by a volume driver is '
+                    'kept before the storage is queried again. Keep it '
+                    'below periodic_interval'),
     ]
 
 FLAGS = flags.FLAGS
 FLAGS.register_opts(volume_opts)
 
+GB = 1024 * 1024 * 1024
+
+
+def capacity_stats(total, free, provisioned=None):
+    """Return the capacity stats of a backend from sizes in bytes.
+
+    :param provisioned: Size of the volumes on the backend, if the backend
+                        reports it.
+    """
+    stats = {'total_capacity_gb': round(float(total) / GB, 2),
+             'free_capacity_gb': round(float(free) / GB, 2)}
+    if provisioned is not None:
+        stats['provisioned_capacity_gb'] = round(float(provisioned) / GB, 2)
+    return stats
+
 
 class VolumeDriver(object):
     """Executes commands relating to Volumes."""
+
+    # Stats reported, and when they were queried
+    _stats = None
+    _stats_updated = None
+
     def __init__(self, execute=utils.execute, *args, **kwargs):
         # NOTE(vish): db is set by Manager
         self.db = None
@@ -256,9 +298,24 @@ class VolumeDriver(object):
 
     def get_volume_stats(self, refresh=False):
         """Return the current state of the volume service. If 'refresh' is
-           True, run the update first."""
+           True, run the update first, unless it ran less than
+           volume_stats_min_interval seconds ago."""
+        now = timeutils.utcnow_ts()
+        if (self._stats_updated is None or
+            (refresh and
+             now - self._stats_updated >= FLAGS.volume_stats_min_interval)):
+            self._stats = self._query_volume_stats()
+            self._stats_updated = now
+        return self._stats
+
+    def _query_volume_stats(self):
+        """Query the storage for the stats get_volume_stats returns."""
         return None
 
+    def clear_volume_stats(self):
+        """Make the next get_volume_stats query the storage again."""
+        self._stats_updated = None
+
     def do_setup(self, context):
         """Any initialization the volume driver does while starting"""
         pass
@@ -307,6 +364,14 @@ class ISCSIDriver(VolumeDriver):
         super(ISCSIDriver, self).set_execute(execute)
         self.tgtadm.set_execute(execute)
 
+    def _query_volume_stats(self):
+        """Return the capacity of the volume group."""
+        out, _err = self._execute('vgs', '--noheadings', '--nosuffix',
+                                  '--units', 'b', '-o', 'vg_size,vg_free',
+                                  FLAGS.volume_group, run_as_root=True)
+        total, free = out.split()
+        return capacity_stats(int(total), int(free))
+
     def ensure_export(self, context, volume):
         """Synchronously recreates an export for a logical volume."""
         # NOTE(jdg): tgtadm doesn't use the iscsi_targets table
@@ -568,6 +633,10 @@ class FakeISCSIDriver(ISCSIDriver):
     def terminate_connection(self, volume, connector):
         pass
 
+    def _query_volume_stats(self):
+        """There is no volume group in fake mode."""
+        return None
+
     @staticmethod
     def fake_execute(cmd, *_args, **_kwargs):
         """Execute that simply logs the command."""
@@ -578,6 +647,21 @@ class FakeISCSIDriver(ISCSIDriver):
 class RBDDriver(VolumeDriver):
     """Implements RADOS block device (RBD) volume commands"""
 
+    # Bound on the number of cloneable image locations remembered
+    MAX_CLONEABLE_CACHE = 1024
+
+    def __init__(self, *args, **kwargs):
+        super(RBDDriver, self).__init__(*args, **kwargs)
+        self._layering = None
+        self._fsid = None
+        # Image locations found cloneable, mapped to when that expires
+        self._cloneable = {}
+
+    def do_setup(self, context):
+        """Detect the capabilities and identity of the cluster once."""
+        self._supports_layering()
+        self._get_cluster_fsid()
+
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met"""
         (stdout, stderr) = self._execute('rados', 'lspools')
@@ -588,6 +672,11 @@ class RBDDriver(VolumeDriver):
             raise exception.VolumeBackendAPIException(data=exception_message)
 
     def _supports_layering(self):
+        if self._layering is None:
+            self._layering = self._detect_layering()
+        return self._layering
+
+    def _detect_layering(self):
         stdout, _ = self._execute('rbd', '--help')
         return 'clone' in stdout
 
@@ -698,6 +787,17 @@ class RBDDriver(VolumeDriver):
     def terminate_connection(self, volume, connector):
         pass
 
+    def _query_volume_stats(self):
+        """Return the capacity of the cluster, from rados df."""
+        out, _err = self._execute('rados', 'df')
+        totals = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) >= 3 and fields[0] == 'total':
+                # In KB
+                totals[fields[1]] = int(fields[2]) * 1024
+        return capacity_stats(totals['space'], totals['avail'])
+
     def _parse_location(self, location):
         prefix = 'rbd://'
         if not location.startswith(prefix):
@@ -716,42 +816,75 @@ class RBDDriver(VolumeDriver):
         stdout, _ = self._execute('ceph', 'fsid')
         return stdout.rstrip('\n')
 
+    def _get_cluster_fsid(self):
+        """Return the fsid of the cluster, which is looked up once."""
+        if self._fsid is None:
+            self._fsid = self._get_fsid()
+        return self._fsid
+
+    def _is_readable(self, pool, image, snapshot):
+        try:
+            self._execute('rbd', 'info',
+                          '--pool', pool,
+                          '--image', image,
+                          '--snap', snapshot)
+        except exception.ProcessExecutionError:
+            return False
+        return True
+
     def _is_cloneable(self, image_location):
         try:
             fsid, pool, image, snapshot = self._parse_location(image_location)
         except exception.ImageUnacceptable:
             return False
 
-        if self._get_fsid() != fsid:
+        now = timeutils.utcnow_ts()
+        if self._cloneable.get(image_location, 0) > now:
+            return True
+
+        if self._get_cluster_fsid() != fsid:
             reason = _('%s is in a different ceph cluster') % image_location
             LOG.debug(reason)
             return False
 
         # check that we can read the image
-        try:
-            self._execute('rbd', 'info',
-                          '--pool', pool,
-                          '--image', image,
-                          '--snap', snapshot)
-        except exception.ProcessExecutionError:
+        if not self._is_readable(pool, image, snapshot):
             LOG.debug(_('Unable to read image %s') % image_location)
+            self._cloneable.pop(image_location, None)
             return False
 
+        if FLAGS.rbd_cloneable_cache_ttl > 0:
+            if len(self._cloneable) >= self.MAX_CLONEABLE_CACHE:
+                self._prune_cloneable(now)
+            self._cloneable[image_location] = (now +
+                                               FLAGS.rbd_cloneable_cache_ttl)
         return True
 
+    def _prune_cloneable(self, now):
+        for location, expires in self._cloneable.items():
+            if expires <= now:
+                del self._cloneable[location]
+        if len(self._cloneable) >= self.MAX_CLONEABLE_CACHE:
+            self._cloneable.clear()
+
     def clone_image(self, volume, image_location):
         if image_location is None or not self._is_cloneable(image_location):
             return False
         _, pool, image, snapshot = self._parse_location(image_location)
-        self._clone(volume, pool, image, snapshot)
-        self._resize(volume)
+        try:
+            self._clone(volume, pool, image, snapshot)
+            self._resize(volume)
+        except Exception:
+            # The image may be gone, check it again next time
+            self._cloneable.pop(image_location, None)
+            raise
         return True
 
     def copy_image_to_volume(self, context, volume, image_service, image_id):
         # TODO(jdurgin): replace with librbd
         # this is a temporary hack, since rewriting this driver
         # to use librbd would take too long
-        if FLAGS.volume_tmp_dir and not os.exists(FLAGS.volume_tmp_dir):
+        if FLAGS.volume_tmp_dir and not os.path.exists(FLAGS.volume_tmp_dir):
             os.makedirs(FLAGS.volume_tmp_dir)
 
         with tempfile.NamedTemporaryFile(dir=FLAGS.volume_tmp_dir) as tmp:
@@ -765,6 +898,184 @@ class RBDDriver(VolumeDriver):
                               tmp.name, volume['name'])
 
 
+class RBDImageWriter(object):
+    """File-like object writing sequentially into an open rbd.Image.
+
+    Data is buffered and written in whole multiples of write_size, which
+    should be the object size of the image, so each write fills whole
+    objects.  flush() writes what is left.
+    """
+
+    def __init__(self, image, write_size):
+        self.image = image
+        self.write_size = write_size
+        self.offset = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.write_size:
+            data = ''.join(self._buffer)
+            aligned = len(data) - len(data) % self.write_size
+            self._write(data[:aligned])
+            self._buffer = [data[aligned:]]
+            self._buffered = len(data) - aligned
+
+    def flush(self):
+        if self._buffered:
+            self._write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def _write(self, data):
+        self.image.write(data, self.offset)
+        self.offset += len(data)
+
+
+class LibRBDDriver(RBDDriver):
+    """Implements RBD volume commands with the python rados and rbd modules
+
+    One connection to the cluster is opened at setup and kept, instead
+    of running the rbd and rados tools for each command, and images are
+    streamed from glance straight into their volumes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LibRBDDriver, self).__init__(*args, **kwargs)
+        self._cluster = None
+        self._ioctx = None
+
+    def do_setup(self, context):
+        if rados is None or rbd is None:
+            msg = _('LibRBDDriver needs the python rados and rbd modules')
+            raise exception.VolumeBackendAPIException(data=msg)
+        self._get_cluster()
+        super(LibRBDDriver, self).do_setup(context)
+
+    def _get_cluster(self):
+        if self._cluster is None:
+            cluster = rados.Rados(rados_id=FLAGS.rbd_user,
+                                  conffile=FLAGS.rbd_ceph_conf)
+            cluster.connect()
+            self._cluster = cluster
+        return self._cluster
+
+    def _get_ioctx(self):
+        if self._ioctx is None:
+            self._ioctx = self._get_cluster().open_ioctx(str(FLAGS.rbd_pool))
+        return self._ioctx
+
+    def _open_image(self, name, ioctx=None, snapshot=None, read_only=False):
+        if snapshot is not None:
+            snapshot = str(snapshot)
+        return rbd.Image(ioctx or self._get_ioctx(), str(name),
+                         snapshot=snapshot, read_only=read_only)
+
+    def check_for_setup_error(self):
+        """Returns an error if prerequisites aren't met"""
+        if FLAGS.rbd_pool not in self._get_cluster().list_pools():
+            exception_message = (_("rbd has no pool %s") %
+                                    FLAGS.rbd_pool)
+            raise exception.VolumeBackendAPIException(data=exception_message)
+
+    def _detect_layering(self):
+        return hasattr(rbd, 'RBD_FEATURE_LAYERING')
+
+    def create_volume(self, volume):
+        """Creates a logical volume."""
+        if int(volume['size']) == 0:
+            size = 100 * 1024 * 1024
+        else:
+            size = int(volume['size']) * 1024 * 1024 * 1024
+        kwargs = {}
+        if self._supports_layering():
+            kwargs = {'old_format': False,
+                      'features': rbd.RBD_FEATURE_LAYERING}
+        rbd.RBD().create(self._get_ioctx(), str(volume['name']), size,
+                         **kwargs)
+
+    def _clone(self, volume, src_pool, src_image, src_snap):
+        src_ioctx = self._get_cluster().open_ioctx(str(src_pool))
+        try:
+            rbd.RBD().clone(src_ioctx, str(src_image), str(src_snap),
+                            self._get_ioctx(), str(volume['name']),
+                            features=rbd.RBD_FEATURE_LAYERING)
+        finally:
+            src_ioctx.close()
+
+    def _resize(self, volume):
+        image = self._open_image(volume['name'])
+        try:
+            image.resize(int(volume['size']) * 1024 * 1024 * 1024)
+        finally:
+            image.close()
+
+    def delete_volume(self, volume):
+        """Deletes a logical volume."""
+        image = self._open_image(volume['name'])
+        try:
+            has_snapshots = bool(list(image.list_snaps()))
+        finally:
+            image.close()
+        if has_snapshots:
+            raise exception.VolumeIsBusy(volume_name=volume['name'])
+        rbd.RBD().remove(self._get_ioctx(), str(volume['name']))
+
+    def create_snapshot(self, snapshot):
+        """Creates an rbd snapshot"""
+        image = self._open_image(snapshot['volume_name'])
+        try:
+            image.create_snap(str(snapshot['name']))
+            if self._supports_layering():
+                image.protect_snap(str(snapshot['name']))
+        finally:
+            image.close()
+
+    def delete_snapshot(self, snapshot):
+        """Deletes an rbd snapshot"""
+        image = self._open_image(snapshot['volume_name'])
+        try:
+            if self._supports_layering():
+                try:
+                    image.unprotect_snap(str(snapshot['name']))
+                except rbd.ImageBusy:
+                    raise exception.SnapshotIsBusy(
+                        snapshot_name=snapshot['name'])
+            image.remove_snap(str(snapshot['name']))
+        finally:
+            image.close()
+
+    def _get_fsid(self):
+        return self._get_cluster().get_fsid()
+
+    def _query_volume_stats(self):
+        stats = self._get_cluster().get_cluster_stats()
+        return capacity_stats(stats['kb'] * 1024, stats['kb_avail'] * 1024)
+
+    def _is_readable(self, pool, image, snapshot):
+        try:
+            ioctx = self._get_cluster().open_ioctx(str(pool))
+            try:
+                self._open_image(image, ioctx=ioctx, snapshot=snapshot,
+                                 read_only=True).close()
+            finally:
+                ioctx.close()
+        except (rados.Error, rbd.Error):
+            return False
+        return True
+
+    def copy_image_to_volume(self, context, volume, image_service, image_id):
+        image = self._open_image(volume['name'])
+        try:
+            writer = RBDImageWriter(image, image.stat()['obj_size'])
+            image_service.download(context, image_id, writer)
+            writer.flush()
+        finally:
+            image.close()
+
+
 class SheepdogDriver(VolumeDriver):
     """Executes commands relating to Sheepdog Volumes"""
 
@@ -811,6 +1122,17 @@ class SheepdogDriver(VolumeDriver):
         self._try_execute('collie', 'vdi', 'delete', snapshot['volume_name'],
                           '-s', snapshot['name'])
 
+    def _query_volume_stats(self):
+        """Return the capacity of the cluster, from collie node info."""
+        out, _err = self._execute('collie', 'node', 'info', '-r')
+        for line in out.splitlines():
+            fields = line.split()
+            if fields and fields[0] == 'Total':
+                total, used = int(fields[1]), int(fields[2])
+                return capacity_stats(total, total - used)
+        msg = _("Cannot parse collie node info output: %s") % out
+        raise exception.VolumeBackendAPIException(data=msg)
+
     def local_path(self, volume):
         return "sheepdog:%s" % volume['name']
 
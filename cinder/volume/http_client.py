@@ -0,0 +1,204 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Keep-alive HTTP client for the management APIs of storage appliances.
+
+An HTTPConnectionPool keeps the connections to one appliance open between
+requests, so a driver making a series of calls pays for the TCP and SSL
+handshakes once.  A pooled connection that the appliance closed while it
+was idle fails on its next use; the request is then sent again on a new
+connection, if the appliance can not have processed it the first time or
+its method is idempotent.
+
+Independent requests, such as the list calls a driver makes before an
+attach, can be sent concurrently with request_many().  httplib can not
+pipeline requests on one socket, so each of them gets its own pooled
+connection.
+"""
+
+import httplib
+import socket
+import time
+
+import eventlet
+
+from cinder.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Methods that can be sent again after the appliance may have processed
+# them, see RFC 2616 section 9.1.2
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE')
+
+
+def _can_resend(method, error):
+    """Whether a request that failed on a reused connection can be sent
+    again."""
+    if getattr(error, 'request_unsent', False):
+        return True
+    # The appliance closed the connection without replying.  Depending
+    # on the Python release the empty status line is reported as '', "''"
+    # or a message.
+    if isinstance(error, httplib.BadStatusLine):
+        line = error.line
+        if (not line or line == "''" or
+            line.startswith('No status line received')):
+            return True
+    return method.upper() in IDEMPOTENT_METHODS
+
+
+class HTTPResponse(object):
+    """Status, headers and body of a completed request."""
+
+    def __init__(self, status, reason, headers, data, version=11):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+        self.version = version
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+
+class HTTPConnectionPool(object):
+    """Pool of keep-alive connections to one host.
+
+    :param maxsize: Number of idle connections kept open, and of requests
+                    request_many() sends at once.
+    :param timeout: Socket timeout in seconds, None for the default.
+    """
+
+    def __init__(self, host, port=None, use_ssl=False, maxsize=4,
+                 timeout=None):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = []
+        self.stats = {}
+
+    def _new_connection(self):
+        if self.use_ssl:
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        if self.timeout is None:
+            return connection_class(self.host, self.port)
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _get_connection(self):
+        """Return a connection and whether it was used before."""
+        if self._idle:
+            return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _put_connection(self, connection):
+        if len(self._idle) < self.maxsize:
+            self._idle.append(connection)
+        else:
+            connection.close()
+
+    def _send(self, connection, method, url, body, headers):
+        try:
+            connection.request(method, url, body, headers)
+        except Exception, e:
+            # The appliance did not get the whole request
+            e.request_unsent = True
+            raise
+        response = connection.getresponse()
+        # The body must be read before the connection can be used again
+        return response, response.read()
+
+    def _record(self, name, elapsed, error=False):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = {'count': 0, 'errors': 0, 'time': 0.0}
+        stats['count'] += 1
+        stats['time'] += elapsed
+        if error:
+            stats['errors'] += 1
+
+    def get_stats(self):
+        """Return the number, errors and total time of requests by name."""
+        result = {}
+        for name, stats in self.stats.items():
+            result[name] = dict(stats)
+        return result
+
+    def request(self, method, url, body=None, headers=None, name=None):
+        """Send a request and return its HTTPResponse.
+
+        :param name: Name the latency of the request is counted under,
+                     defaults to the method.
+        """
+        name = name or method
+        headers = headers or {}
+        start = time.time()
+        connection, reused = self._get_connection()
+        try:
+            try:
+                response, data = self._send(connection, method, url, body,
+                                            headers)
+            except socket.timeout:
+                raise
+            except (socket.error, httplib.HTTPException), e:
+                # The appliance may have closed the idle connection
+                connection.close()
+                if not reused or not _can_resend(method, e):
+                    raise
+                LOG.debug(_('Connection to %(host)s:%(port)s was closed, '
+                            'reconnecting'),
+                          {'host': self.host, 'port': self.port})
+                connection = self._new_connection()
+                response, data = self._send(connection, method, url, body,
+                                            headers)
+        except Exception:
+            connection.close()
+            self._record(name, time.time() - start, error=True)
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._put_connection(connection)
+
+        elapsed = time.time() - start
+        self._record(name, elapsed)
+        LOG.debug(_('%(method)s %(url)s returned %(status)s in %(time).3fs'),
+                  {'method': method, 'url': url, 'status': response.status,
+                   'time': elapsed})
+        return HTTPResponse(response.status, response.reason,
+                            dict(response.getheaders()), data,
+                            response.version)
+
+    def request_many(self, requests):
+        """Send independent requests concurrently.
+
+        :param requests: List of dicts of request() keyword arguments.
+        :returns: The HTTPResponses, in the order of requests.
+        """
+        pool = eventlet.GreenPool(self.maxsize)
+        return list(pool.imap(lambda kwargs: self.request(**kwargs),
+                              requests))
+
+    def close(self):
+        """Close the idle connections."""
+        while self._idle:
+            self._idle.pop().close()
@@ -66,14 +66,59 @@ volume_manager_opts = [
     cfg.BoolOpt('volume_force_update_capabilities',
                 default=False,
                 help='if True will force update capabilities on each check'),
+    cfg.FloatOpt('volume_stats_change_threshold',
+                 default=0.05,
+                 help='Fraction by which a numeric capability, such as the '
+                      'free capacity, must change to be sent to the '
+                      'schedulers again'),
     ]
 
 FLAGS = flags.FLAGS
 FLAGS.register_opts(volume_manager_opts)
 
 
+def _is_number(value):
+    return (isinstance(value, (int, long, float)) and
+            not isinstance(value, bool))
+
+
+def _stats_changed(old, new):
+    """Return whether the stats changed by more than the threshold."""
+    if len(old) != len(new):
+        return True
+    for key, old_value in old.iteritems():
+        if key not in new:
+            return True
+        new_value = new[key]
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            if _stats_changed(old_value, new_value):
+                return True
+        elif _is_number(old_value) and _is_number(new_value):
+            change = abs(new_value - old_value)
+            if change > (FLAGS.volume_stats_change_threshold *
+                         max(abs(old_value), abs(new_value))):
+                return True
+        elif old_value != new_value:
+            return True
+    return False
+
+
 class VolumeManager(manager.SchedulerDependentManager):
     """Manages attachable block storage devices."""
+
+    # Attach/detach calls are on the instance boot path and only touch the
+    # export, so keep them out of the way of copies and creates.
+    RPC_METHOD_LANES = {'attach_volume': 'control',
+                        'detach_volume': 'control',
+                        'initialize_connection': 'control',
+                        'terminate_connection': 'control',
+                        'create_volume': 'data',
+                        'delete_volume': 'data',
+                        'delete_volumes': 'data',
+                        'create_snapshot': 'data',
+                        'delete_snapshot': 'data',
+                        'copy_volume_to_image': 'data'}
+
     def __init__(self, volume_driver=None, *args, **kwargs):
         """Load the driver from the one specified in args, or from flags."""
         if not volume_driver:
@@ -150,6 +195,9 @@ class VolumeManager(manager.SchedulerDependentManager):
                     status = 'downloading'
 
             if model_update:
+                # A driver still copying data in the background returns
+                # the creating status, and makes the volume available itself
+                status = model_update.pop('status', status)
                 self.db.volume_update(context, volume_ref['id'], model_update)
 
             LOG.debug(_("volume %s: creating export"), volume_ref['name'])
@@ -223,17 +271,30 @@ class VolumeManager(manager.SchedulerDependentManager):
 
         return True
 
+    def delete_volumes(self, context, volume_ids):
+        """Deletes and unexports many volumes.
+
+        A volume that fails to delete does not stop the others.
+        """
+        for volume_id in volume_ids:
+            try:
+                self.delete_volume(context, volume_id)
+            except Exception:
+                LOG.exception(_("volume %s: failed to delete"), volume_id)
+
     def create_snapshot(self, context, volume_id, snapshot_id):
         """Creates and exports the snapshot."""
         context = context.elevated()
         snapshot_ref = self.db.snapshot_get(context, snapshot_id)
         LOG.info(_("snapshot %s: creating"), snapshot_ref['name'])
 
+        status = 'available'
         try:
             snap_name = snapshot_ref['name']
             LOG.debug(_("snapshot %(snap_name)s: creating") % locals())
             model_update = self.driver.create_snapshot(snapshot_ref)
             if model_update:
+                status = model_update.get('status', status)
                 self.db.snapshot_update(context, snapshot_ref['id'],
                                         model_update)
 
@@ -243,9 +304,10 @@ class VolumeManager(manager.SchedulerDependentManager):
                                         snapshot_ref['id'],
                                         {'status': 'error'})
 
-        self.db.snapshot_update(context,
-                                snapshot_ref['id'], {'status': 'available',
-                                                     'progress': '100%'})
+        if status == 'available':
+            self.db.snapshot_update(context,
+                                    snapshot_ref['id'], {'status': 'available',
+                                                         'progress': '100%'})
         LOG.debug(_("snapshot %s: created successfully"), snapshot_ref['name'])
         return snapshot_id
 
@@ -402,17 +464,30 @@ class VolumeManager(manager.SchedulerDependentManager):
     def _volume_stats_changed(self, stat1, stat2):
         if FLAGS.volume_force_update_capabilities:
             return True
-        if len(stat1) != len(stat2):
-            return True
-        for (k, v) in stat1.iteritems():
-            if (k, v) not in stat2.iteritems():
-                return True
-        return False
+        return _stats_changed(stat1, stat2)
+
+    def _add_provisioned_stats(self, context, volume_stats):
+        """Add the capacity provisioned to volumes, if the driver does not
+        report it, and its ratio to the total capacity."""
+        total = volume_stats.get('total_capacity_gb')
+        if not _is_number(total):
+            return volume_stats
+        volume_stats = dict(volume_stats)
+        provisioned = volume_stats.get('provisioned_capacity_gb')
+        if provisioned is None:
+            _count, provisioned = self.db.volume_data_get_for_host(context,
+                                                                   self.host)
+            volume_stats['provisioned_capacity_gb'] = provisioned
+        if total:
+            volume_stats['thin_provisioning_ratio'] = round(
+                float(provisioned) / total, 2)
+        return volume_stats
 
     @manager.periodic_task
     def _report_driver_status(self, context):
         volume_stats = self.driver.get_volume_stats(refresh=True)
         if volume_stats:
+            volume_stats = self._add_provisioned_stats(context, volume_stats)
             LOG.info(_("Checking volume capabilities"))
 
             if self._volume_stats_changed(self._last_volume_stats,
@@ -430,6 +505,7 @@ class VolumeManager(manager.SchedulerDependentManager):
     def _reset_stats(self):
         LOG.info(_("Clear capabilities"))
         self._last_volume_stats = []
+        self.driver.clear_volume_stats()
 
     def notification(self, context, event):
         LOG.info(_("Notification {%s} received"), event)
@@ -25,8 +25,8 @@ ONTAP 7-mode storage systems with installed iSCSI licenses.
 
 import time
 
+import eventlet
 import suds
-from suds import client
 from suds.sax import text
 
 from cinder import exception
@@ -34,6 +34,7 @@ from cinder import flags
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import cfg
 from cinder.volume import driver
+from cinder.volume import soap
 from cinder.volume import volume_types
 
 LOG = logging.getLogger("cinder.volume.driver")
@@ -65,6 +66,14 @@ netapp_opts = [
     cfg.StrOpt('netapp_vfiler',
                default=None,
                help='Vfiler to use for provisioning'),
+    cfg.IntOpt('netapp_discovery_concurrency',
+               default=4,
+               help='Number of datasets whose LUNs are discovered at once'),
+    cfg.FloatOpt('netapp_poll_interval',
+                 default=0.5,
+                 help='Seconds to wait before checking again on a DFM job '
+                      'or clone operation. The wait doubles after each '
+                      'check, up to a limit'),
     ]
 
 FLAGS = flags.FLAGS
@@ -85,6 +94,45 @@ class DfmLun(object):
         self.lunpath = lunpath
         self.id = id
 
+    @property
+    def name(self):
+        """The last component of the LUN path, the name of the volume."""
+        return self.lunpath[self.lunpath.rfind('/') + 1:]
+
+
+def _poll(check, max_interval):
+    """Call check until it returns a true value, and return that value.
+
+    The wait between calls starts at netapp_poll_interval seconds and
+    doubles after each call, up to max_interval seconds.
+    """
+    interval = FLAGS.netapp_poll_interval
+    while True:
+        result = check()
+        if result:
+            return result
+        time.sleep(interval)
+        interval = min(interval * 2, max_interval)
+
+
+def _api_elem_is_empty(elem):
+    """Return true if the API element should be considered empty.
+
+    Helper routine to figure out if a list returned from a proxy API
+    is empty. This is necessary because the API proxy produces nasty
+    looking XML.
+    """
+    if not type(elem) is list:
+        return True
+    if 0 == len(elem):
+        return True
+    child = elem[0]
+    if isinstance(child, text.Text):
+        return True
+    if type(child) is str:
+        return True
+    return False
+
 
 class NetAppISCSIDriver(driver.ISCSIDriver):
     """NetApp iSCSI volume driver."""
@@ -96,8 +144,9 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
 
     def __init__(self, *args, **kwargs):
         super(NetAppISCSIDriver, self).__init__(*args, **kwargs)
-        self.discovered_luns = []
-        self.discovered_datasets = []
+        # Datasets by name
+        self.discovered_datasets = {}
+        # LUNs by project and volume name
         self.lun_table = {}
 
     def _check_fail(self, request, response):
@@ -112,22 +161,17 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         """Instantiate a web services client.
 
         This method creates a "suds" client to make web services calls to the
-        DFM server. Note that the WSDL file is quite large and may take
-        a few seconds to parse.
+        DFM server. The WSDL file is quite large, so with cache set its
+        parsed form is shared (see cinder.volume.soap).
         """
         wsdl_url = kwargs['wsdl_url']
         LOG.debug(_('Using WSDL: %s') % wsdl_url)
-        if kwargs['cache']:
-            self.client = client.Client(wsdl_url, username=kwargs['login'],
-                                        password=kwargs['password'])
-        else:
-            self.client = client.Client(wsdl_url, username=kwargs['login'],
-                                        password=kwargs['password'],
-                                        cache=None)
         soap_url = 'http://%s:%s/apis/soap/v1' % (kwargs['hostname'],
                                                   kwargs['port'])
         LOG.debug(_('Using DFM server: %s') % soap_url)
-        self.client.set_options(location=soap_url)
+        self.client = soap.get_client(wsdl_url, kwargs['login'],
+                                      kwargs['password'], location=soap_url,
+                                      cache=kwargs['cache'])
 
     def _set_storage_service(self, storage_service):
         """Set the storage service to use for provisioning."""
@@ -174,6 +218,10 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         self._set_storage_service_prefix(FLAGS.netapp_storage_service_prefix)
         self._set_vfiler(FLAGS.netapp_vfiler)
 
+    def _query_volume_stats(self):
+        """The capacity of the filers is not queried through DFM."""
+        return None
+
     def check_for_setup_error(self):
         """Check that the driver is working and can communicate.
 
@@ -200,8 +248,8 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
             server.DatasetListInfoIterEnd(Tag=tag)
         return datasets
 
-    def _discover_dataset_luns(self, dataset, volume):
-        """Discover all of the LUNs in a dataset."""
+    def _get_dataset_luns(self, dataset, volume):
+        """Return the LUNs of a dataset, or only the one of volume."""
         server = self.client.service
         res = server.DatasetMemberListInfoIterStart(
                 DatasetNameOrId=dataset.id,
@@ -212,6 +260,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         suffix = None
         if volume:
             suffix = '/' + volume
+        luns = []
         try:
             while True:
                 res = server.DatasetMemberListInfoIterNext(Tag=tag,
@@ -224,20 +273,31 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                         continue
                     # MemberName is the full LUN path in this format:
                     # host:/volume/qtree/lun
-                    lun = DfmLun(dataset, member.MemberName, member.MemberId)
-                    self.discovered_luns.append(lun)
+                    luns.append(DfmLun(dataset, member.MemberName,
+                                       member.MemberId))
         finally:
             server.DatasetMemberListInfoIterEnd(Tag=tag)
+        return luns
+
+    def _add_lun(self, lun):
+        self.lun_table[(lun.dataset.project, lun.name)] = lun
+
+    def _discover_dataset_luns(self, dataset, volume):
+        """Discover all of the LUNs in a dataset, or only the one of volume.
+        """
+        for lun in self._get_dataset_luns(dataset, volume):
+            self._add_lun(lun)
 
     def _discover_luns(self):
         """Discover the LUNs from DFM.
 
         Discover all of the OpenStack-created datasets and LUNs in the DFM
-        database.
+        database.  The members of up to netapp_discovery_concurrency datasets
+        are listed at once.
         """
         datasets = self._get_datasets()
-        self.discovered_datasets = []
-        self.discovered_luns = []
+        self.discovered_datasets = {}
+        self.lun_table = {}
         for dataset in datasets:
             if not dataset.DatasetName.startswith(self.DATASET_PREFIX):
                 continue
@@ -255,13 +315,17 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                 continue
             ds = DfmDataset(dataset.DatasetId, dataset.DatasetName,
                             project, type)
-            self.discovered_datasets.append(ds)
-            self._discover_dataset_luns(ds, None)
+            self.discovered_datasets[ds.name] = ds
+
+        pool = eventlet.GreenPool(FLAGS.netapp_discovery_concurrency)
+        get_luns = lambda ds: self._get_dataset_luns(ds, None)
+        for luns in pool.imap(get_luns, self.discovered_datasets.values()):
+            for lun in luns:
+                self._add_lun(lun)
         dataset_count = len(self.discovered_datasets)
-        lun_count = len(self.discovered_luns)
+        lun_count = len(self.lun_table)
         msg = _("Discovered %(dataset_count)s datasets and %(lun_count)s LUNs")
         LOG.debug(msg % locals())
-        self.lun_table = {}
 
     def _get_job_progress(self, job_id):
         """Get progress of one running DFM job.
@@ -290,7 +354,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         Poll the job until it completes or an error is detected. Return the
         final list of progress events if it completes successfully.
         """
-        while True:
+        def check_job():
             events = self._get_job_progress(job_id)
             for event in events:
                 if event.EventStatus == 'error':
@@ -298,7 +362,9 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                     raise exception.VolumeBackendAPIException(data=msg)
                 if event.EventType == 'job-end':
                     return events
-            time.sleep(5)
+            return None
+
+        return _poll(check_job, 5)
 
     def _dataset_name(self, project, ss_type):
         """Return the dataset name for a given project and volume type."""
@@ -310,11 +376,8 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         return dataset_name + '_' + _type
 
     def _get_dataset(self, dataset_name):
-        """Lookup a dataset by name in the list of discovered datasets."""
-        for dataset in self.discovered_datasets:
-            if dataset.name == dataset_name:
-                return dataset
-        return None
+        """Lookup a dataset by name in the discovered datasets."""
+        return self.discovered_datasets.get(dataset_name)
 
     def _create_dataset(self, dataset_name, project, ss_type):
         """Create a new dataset using the storage service.
@@ -365,7 +428,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                 DatasetMetadata=metadata)
 
         ds = DfmDataset(res.DatasetId, dataset_name, project, ss_type)
-        self.discovered_datasets.append(ds)
+        self.discovered_datasets[dataset_name] = ds
         return ds
 
     def _provision(self, name, description, project, ss_type, size):
@@ -414,9 +477,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
             msg = _('No LUN was created by the provision job')
             raise exception.VolumeBackendAPIException(data=msg)
 
-        lun = DfmLun(dataset, lunpath, lun_id)
-        self.discovered_luns.append(lun)
-        self.lun_table[name] = lun
+        self._add_lun(DfmLun(dataset, lunpath, lun_id))
 
     def _get_ss_type(self, volume):
         """Get the storage service type for a volume."""
@@ -451,6 +512,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
             server.DatasetEditRollback(EditLockId=lock_id)
             msg = _('Failed to remove and delete dataset member')
             raise exception.VolumeBackendAPIException(data=msg)
+        self.lun_table.pop((project, name), None)
 
     def create_volume(self, volume):
         """Driver entry point for creating a new volume."""
@@ -478,18 +540,19 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
     def _lookup_lun_for_volume(self, name, project):
         """Lookup the LUN that corresponds to the give volume.
 
-        Initial lookups involve a table scan of all of the discovered LUNs,
-        but later lookups are done instantly from the hashtable.
+        LUNs that were not discovered at setup, such as ones created since
+        by another driver instance, are looked for in the datasets of the
+        project.
         """
-        if name in self.lun_table:
-            return self.lun_table[name]
-        lunpath_suffix = '/' + name
-        for lun in self.discovered_luns:
-            if lun.dataset.project != project:
-                continue
-            if lun.lunpath.endswith(lunpath_suffix):
-                self.lun_table[name] = lun
-                return lun
+        lun = self.lun_table.get((project, name))
+        if lun is not None:
+            return lun
+        for dataset in self.discovered_datasets.values():
+            if dataset.project == project:
+                self._discover_dataset_luns(dataset, name)
+        lun = self.lun_table.get((project, name))
+        if lun is not None:
+            return lun
         msg = _("No entry in LUN table for volume %s") % (name)
         raise exception.VolumeBackendAPIException(data=msg)
 
@@ -539,24 +602,6 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         self._check_fail(request, response)
         return response.Results['node-name'][0]
 
-    def _api_elem_is_empty(self, elem):
-        """Return true if the API element should be considered empty.
-
-        Helper routine to figure out if a list returned from a proxy API
-        is empty. This is necessary because the API proxy produces nasty
-        looking XML.
-        """
-        if not type(elem) is list:
-            return True
-        if 0 == len(elem):
-            return True
-        child = elem[0]
-        if isinstance(child, text.Text):
-            return True
-        if type(child) is str:
-            return True
-        return False
-
     def _get_target_portal_for_host(self, host_id, host_address):
         """Get iSCSI target portal for a storage system.
 
@@ -570,7 +615,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         self._check_fail(request, response)
         portal = {}
         portals = response.Results['iscsi-portal-list-entries']
-        if self._api_elem_is_empty(portals):
+        if _api_elem_is_empty(portals):
             return portal
         portal_infos = portals[0]['iscsi-portal-list-entry-info']
         for portal_info in portal_infos:
@@ -622,7 +667,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                                                 Request=request)
         self._check_fail(request, response)
         igroups = response.Results['initiator-groups']
-        if self._api_elem_is_empty(igroups):
+        if _api_elem_is_empty(igroups):
             return None
         igroup_infos = igroups[0]['initiator-group-info']
         for igroup_info in igroup_infos:
@@ -681,7 +726,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                                                  Request=request)
         self._check_fail(request, response)
         igroups = response.Results['initiator-groups']
-        if self._api_elem_is_empty(igroups):
+        if _api_elem_is_empty(igroups):
             return {'mapped': False}
         igroup_infos = igroups[0]['initiator-group-info']
         for igroup_info in igroup_infos:
@@ -835,7 +880,7 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
                                                 Request=request)
         self._check_fail(request, response)
         status = response.Results['status']
-        if self._api_elem_is_empty(status):
+        if _api_elem_is_empty(status):
             return False
         ops_info = status[0]['ops-info'][0]
         state = ops_info['clone-state'][0]
@@ -864,21 +909,32 @@ class NetAppISCSIDriver(driver.ISCSIDriver):
         clone_id_info = clone_id['clone-id-info'][0]
         clone_op_id = clone_id_info['clone-op-id'][0]
         volume_uuid = clone_id_info['volume-uuid'][0]
-        while not self._is_clone_done(host_id, clone_op_id, volume_uuid):
-            time.sleep(5)
+        _poll(lambda: self._is_clone_done(host_id, clone_op_id, volume_uuid),
+              5)
+
+    def _get_lun_monitor_timestamp(self, host_id):
+        """Return when DFM last listed the LUNs of one filer."""
+        server = self.client.service
+        res = server.DfmMonitorTimestampList(HostNameOrId=host_id)
+        for timestamp in res.DfmMonitoringTimestamp:
+            if 'lun' == timestamp.MonitorName:
+                return timestamp.LastMonitoringTimestamp
+        return None
 
     def _refresh_dfm_luns(self, host_id):
-        """Refresh the LUN list for one filer in DFM."""
+        """Refresh the LUN list for one filer in DFM.
+
+        Returns once DFM has listed the LUNs again since the refresh.
+        """
+        before = self._get_lun_monitor_timestamp(host_id)
         server = self.client.service
         server.DfmObjectRefresh(ObjectNameOrId=host_id, ChildType='lun_path')
-        while True:
-            time.sleep(15)
-            res = server.DfmMonitorTimestampList(HostNameOrId=host_id)
-            for timestamp in res.DfmMonitoringTimestamp:
-                if 'lun' != timestamp.MonitorName:
-                    continue
-                if timestamp.LastMonitoringTimestamp:
-                    return
+
+        def check_refreshed():
+            timestamp = self._get_lun_monitor_timestamp(host_id)
+            return timestamp and timestamp != before
+
+        _poll(check_refreshed, 15)
 
     def _destroy_lun(self, host_id, lun_path):
         """Destroy a LUN on the filer."""
@@ -1023,18 +1079,14 @@ class NetAppCmodeISCSIDriver(driver.ISCSIDriver):
         """Instantiate a web services client.
 
         This method creates a "suds" client to make web services calls to the
-        DFM server. Note that the WSDL file is quite large and may take
-        a few seconds to parse.
+        DFM server. The WSDL file is quite large, so with cache set its
+        parsed form is shared (see cinder.volume.soap).
         """
         wsdl_url = kwargs['wsdl_url']
         LOG.debug(_('Using WSDL: %s') % wsdl_url)
-        if kwargs['cache']:
-            self.client = client.Client(wsdl_url, username=kwargs['login'],
-                                        password=kwargs['password'])
-        else:
-            self.client = client.Client(wsdl_url, username=kwargs['login'],
-                                        password=kwargs['password'],
-                                        cache=None)
+        self.client = soap.get_client(wsdl_url, kwargs['login'],
+                                      kwargs['password'],
+                                      cache=kwargs['cache'])
 
     def _check_flags(self):
         """Ensure that the flags we care about are set."""
@@ -1058,6 +1110,10 @@ class NetAppCmodeISCSIDriver(driver.ISCSIDriver):
             hostname=FLAGS.netapp_server_hostname,
             port=FLAGS.netapp_server_port, cache=True)
 
+    def _query_volume_stats(self):
+        """The capacity of the cluster is not queried."""
+        return None
+
     def check_for_setup_error(self):
         """Check that the driver is working and can communicate.
 
@@ -16,26 +16,49 @@
 #    under the License.
 """
 Volume driver for NetApp NFS storage.
+
+Volumes and snapshots are created as file clones on the filer.  Unless
+synchronous_snapshot_create is set, they are left in the creating state
+while the filer copies the data; a greenthread then lists the clone
+operations of each filer with one call per netapp_clone_poll_interval and
+makes the volumes and snapshots whose clones finished available.
+
+The clones being tracked are kept in netapp_clone_state_file, so their
+tracking resumes when the service restarts.
 """
 
+import errno
 import os
 import time
-import suds
+
+import eventlet
 from suds.sax import text
 
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import cfg
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
-from cinder.volume import nfs
+from cinder.openstack.common import timeutils
+from cinder.volume import netapp
 from cinder.volume.netapp import netapp_opts
+from cinder.volume import nfs
+from cinder.volume import soap
 
 LOG = logging.getLogger("cinder.volume.driver")
 
 netapp_nfs_opts = [
     cfg.IntOpt('synchronous_snapshot_create',
                default=0,
-               help='Does snapshot creation call returns immediately')
+               help='Does snapshot creation call returns immediately'),
+    cfg.FloatOpt('netapp_clone_poll_interval',
+                 default=2.0,
+                 help='Seconds between checks on the clone operations of '
+                      'volumes and snapshots being created'),
+    cfg.StrOpt('netapp_clone_state_file',
+               default='$state_path/netapp_nfs_clones.json',
+               help='File where the clone operations of the volumes and '
+                    'snapshots being created are kept across restarts'),
     ]
 
 FLAGS = flags.FLAGS
@@ -50,6 +73,11 @@ class NetAppNFSDriver(nfs.NfsDriver):
         self._execute = None
         self._context = None
         super(NetAppNFSDriver, self).__init__(*args, **kwargs)
+        # Host id and full export path, by share
+        self._share_targets = {}
+        # Volume or snapshot being created, by host id and clone op id
+        self._clones = {}
+        self._clone_tracker = None
 
     def set_execute(self, execute):
         self._execute = execute
@@ -58,6 +86,7 @@ class NetAppNFSDriver(nfs.NfsDriver):
         self._context = context
         self.check_for_setup_error()
         self._client = NetAppNFSDriver._get_client()
+        self._load_clones()
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met"""
@@ -74,16 +103,24 @@ class NetAppNFSDriver(nfs.NfsDriver):
                 'snapshot of size %(snap_size)s')
             raise exception.CinderException(msg % locals())
 
-        self._clone_volume(snapshot.name, volume.name, snapshot.volume_id)
+        clone = self._clone_volume(snapshot.name, volume.name,
+                                   snapshot.volume_id)
         share = self._get_volume_location(snapshot.volume_id)
 
-        return {'provider_location': share}
+        model_update = {'provider_location': share}
+        if clone:
+            self._track_clone(clone, 'volume', volume.id)
+            model_update['status'] = 'creating'
+        return model_update
 
     def create_snapshot(self, snapshot):
         """Creates a snapshot."""
-        self._clone_volume(snapshot['volume_name'],
-                           snapshot['name'],
-                           snapshot['volume_id'])
+        clone = self._clone_volume(snapshot['volume_name'],
+                                   snapshot['name'],
+                                   snapshot['volume_id'])
+        if clone:
+            self._track_clone(clone, 'snapshot', snapshot['id'])
+            return {'status': 'creating', 'progress': '0%'}
 
     def delete_snapshot(self, snapshot):
         """Deletes a snapshot."""
@@ -111,15 +148,13 @@ class NetAppNFSDriver(nfs.NfsDriver):
     @staticmethod
     def _get_client():
         """Creates SOAP _client for ONTAP-7 DataFabric Service."""
-        client = suds.client.Client(FLAGS.netapp_wsdl_url,
-                                    username=FLAGS.netapp_login,
-                                    password=FLAGS.netapp_password)
         soap_url = 'http://%s:%s/apis/soap/v1' % (
                                           FLAGS.netapp_server_hostname,
                                           FLAGS.netapp_server_port)
-        client.set_options(location=soap_url)
-
-        return client
+        return soap.get_client(FLAGS.netapp_wsdl_url,
+                               FLAGS.netapp_login,
+                               FLAGS.netapp_password,
+                               location=soap_url)
 
     def _get_volume_location(self, volume_id):
         """Returns NFS mount address as <nfs_ip_address>:<nfs_mount_dir>"""
@@ -127,10 +162,23 @@ class NetAppNFSDriver(nfs.NfsDriver):
         export_path = self._get_export_path(volume_id)
         return (nfs_server_ip + ':' + export_path)
 
+    def _get_clone_target(self, volume_id):
+        """Returns the host id and full export path of the volume's share"""
+        share = self._get_provider_location(volume_id)
+        target = self._share_targets.get(share)
+        if target is None:
+            host_id = self._get_host_id(volume_id)
+            export_path = self._get_full_export_path(volume_id, host_id)
+            target = self._share_targets[share] = (host_id, export_path)
+        return target
+
     def _clone_volume(self, volume_name, clone_name, volume_id):
-        """Clones mounted volume with OnCommand proxy API"""
-        host_id = self._get_host_id(volume_id)
-        export_path = self._get_full_export_path(volume_id, host_id)
+        """Clones mounted volume with OnCommand proxy API
+
+        :returns: The host id and clone operation id of a clone that is
+                  still running, None if it finished.
+        """
+        host_id, export_path = self._get_clone_target(volume_id)
 
         request = self._client.factory.create('Request')
         request.Name = 'clone-start'
@@ -146,37 +194,151 @@ class NetAppNFSDriver(nfs.NfsDriver):
         resp = self._client.service.ApiProxy(Target=host_id,
                                             Request=request)
 
-        if resp.Status == 'passed' and FLAGS.synchronous_snapshot_create:
-            clone_id = resp.Results['clone-id'][0]
-            clone_id_info = clone_id['clone-id-info'][0]
-            clone_operation_id = int(clone_id_info['clone-op-id'][0])
+        if resp.Status == 'failed':
+            raise exception.CinderException(resp.Reason)
+
+        clone_id = resp.Results['clone-id'][0]
+        clone_id_info = clone_id['clone-id-info'][0]
+        clone_operation_id = int(clone_id_info['clone-op-id'][0])
 
+        if FLAGS.synchronous_snapshot_create:
             self._wait_for_clone_finished(clone_operation_id, host_id)
-        elif resp.Status == 'failed':
+            return None
+        return host_id, clone_operation_id
+
+    def _get_clone_states(self, host_id):
+        """
+        Lists the clone operations of an ONTAP7 host.
+        :returns: Dict of the state of the operations, by clone operation id
+        """
+        request = self._client.factory.create('Request')
+        request.Name = 'clone-list-status'
+        # Without a clone-id, the status of every clone operation is listed
+        request.Args = text.Raw('')
+
+        resp = self._client.service.ApiProxy(Target=host_id, Request=request)
+        if resp.Status == 'failed':
             raise exception.CinderException(resp.Reason)
 
+        states = {}
+        status = resp.Results['status']
+        if netapp._api_elem_is_empty(status):
+            return states
+        ops_info = status[0]['ops-info']
+        if netapp._api_elem_is_empty(ops_info):
+            return states
+        for op in ops_info:
+            clone_id_info = op['clone-id'][0]['clone-id-info'][0]
+            clone_operation_id = int(clone_id_info['clone-op-id'][0])
+            states[clone_operation_id] = op['clone-state'][0]
+        return states
+
     def _wait_for_clone_finished(self, clone_operation_id, host_id):
         """
         Polls ONTAP7 for clone status. Returns once clone is finished.
         :param clone_operation_id: Identifier of ONTAP clone operation
         """
-        clone_list_options = ('<clone-id>'
-                                '<clone-id-info>'
-                                  '<clone-op-id>%d</clone-op-id>'
-                                  '<volume-uuid></volume-uuid>'
-                                '</clone-id>'
-                              '</clone-id-info>')
+        def check():
+            states = self._get_clone_states(host_id)
+            state = states.get(clone_operation_id, 'completed')
+            if state == 'failed':
+                raise exception.CinderException(
+                    _('Clone operation %s failed') % clone_operation_id)
+            return state == 'completed'
 
-        request = self._client.factory.create('Request')
-        request.Name = 'clone-list-status'
-        request.Args = text.Raw(clone_list_options % clone_operation_id)
+        netapp._poll(check, 5)
 
-        resp = self._client.service.ApiProxy(Target=host_id, Request=request)
+    def _track_clone(self, clone, kind, object_id):
+        """
+        Makes the volume or snapshot available once its clone finished.
+        :param clone: Host id and clone operation id of the clone
+        :param kind: Either 'volume' or 'snapshot'
+        """
+        self._clones[clone] = (kind, object_id)
+        self._save_clones()
+        if self._clone_tracker is None:
+            self._clone_tracker = eventlet.spawn(self._run_clone_tracker)
+
+    def _save_clones(self):
+        """Writes the clones being tracked to netapp_clone_state_file"""
+        path = FLAGS.netapp_clone_state_file
+        clones = [[host_id, clone_operation_id, kind, object_id]
+                  for (host_id, clone_operation_id), (kind, object_id)
+                  in self._clones.iteritems()]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(jsonutils.dumps(clones))
+        os.rename(tmp_path, path)
+
+    def _load_clones(self):
+        """Resumes tracking the clones of a previous run of the service"""
+        try:
+            with open(FLAGS.netapp_clone_state_file) as f:
+                clones = jsonutils.loads(f.read())
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        for host_id, clone_operation_id, kind, object_id in clones:
+            LOG.info(_('Resuming tracking of the clone of %(kind)s %(id)s'),
+                     {'kind': kind, 'id': object_id})
+            self._track_clone((host_id, clone_operation_id), kind, object_id)
+
+    def _run_clone_tracker(self):
+        try:
+            while self._clones:
+                time.sleep(FLAGS.netapp_clone_poll_interval)
+                try:
+                    self._check_clones()
+                except Exception:
+                    LOG.exception(_('Failed to check on clone operations'))
+        finally:
+            self._clone_tracker = None
+
+    def _check_clones(self):
+        """Finishes the volumes and snapshots whose clone finished"""
+        hosts = {}
+        for host_id, clone_operation_id in self._clones.keys():
+            hosts.setdefault(host_id, []).append(clone_operation_id)
+
+        for host_id, clone_operation_ids in hosts.items():
+            states = self._get_clone_states(host_id)
+            for clone_operation_id in clone_operation_ids:
+                # Finished operations are dropped from the list after a while
+                state = states.get(clone_operation_id, 'completed')
+                if state not in ('completed', 'failed'):
+                    continue
+                kind, object_id = self._clones.pop((host_id,
+                                                    clone_operation_id))
+                self._save_clones()
+                if state == 'failed':
+                    LOG.error(_('Clone of %(kind)s %(id)s failed'),
+                              {'kind': kind, 'id': object_id})
+                self._finish_clone(kind, object_id, state == 'completed')
+
+    def _finish_clone(self, kind, object_id, succeeded):
+        if kind == 'volume':
+            get, update = self.db.volume_get, self.db.volume_update
+            values = {'status': 'available',
+                      'launched_at': timeutils.utcnow()}
+        else:
+            get, update = self.db.snapshot_get, self.db.snapshot_update
+            values = {'status': 'available', 'progress': '100%'}
+        if not succeeded:
+            values = {'status': 'error'}
 
-        while resp.Status != 'passed':
-            time.sleep(1)
-            resp = self._client.service.ApiProxy(Target=host_id,
-                                                Request=request)
+        try:
+            # Creating the volume or snapshot may have failed after the
+            # clone started, e.g. while exporting it
+            status = get(self._context, object_id)['status']
+            if status != 'creating':
+                LOG.debug(_('%(kind)s %(id)s is no longer being created'),
+                          {'kind': kind, 'id': object_id})
+                return
+            update(self._context, object_id, values)
+        except exception.NotFound:
+            LOG.debug(_('%(kind)s %(id)s was deleted while being cloned'),
+                      {'kind': kind, 'id': object_id})
 
     def _get_provider_location(self, volume_id):
         """
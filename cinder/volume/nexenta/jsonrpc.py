@@ -22,11 +22,13 @@
 .. moduleauthor:: Yuriy Taraday <yorik.sar@gmail.com>
 """
 
-import urllib2
+import httplib
+import urlparse
 
 from cinder.openstack.common import jsonutils
-from cinder.volume import nexenta
 from cinder.openstack.common import log as logging
+from cinder.volume import http_client
+from cinder.volume import nexenta
 
 LOG = logging.getLogger("cinder.volume.nexenta.jsonrpc")
 
@@ -35,50 +37,92 @@ class NexentaJSONException(nexenta.NexentaException):
     pass
 
 
-class NexentaJSONProxy(object):
-    def __init__(self, url, user, password, auto=False, obj=None, method=None):
-        self.url = url
+class NexentaJSONClient(object):
+    """Sends the calls of all the proxies of one NMS.
+
+    The calls share a pool of keep-alive connections.
+    """
+
+    def __init__(self, url, user, password, auto=False):
         self.user = user
         self.password = password
         self.auto = auto
-        self.obj = obj
-        self.method = method
+        auth = ('%s:%s' % (user, password)).encode('base64')[:-1]
+        self.headers = {'Content-Type': 'application/json',
+                        'Authorization': 'Basic %s' % (auth,)}
+        self._set_url(url)
 
-    def __getattr__(self, name):
-        if not self.obj:
-            obj, method = name, None
-        elif not self.method:
-            obj, method = self.obj, name
-        else:
-            obj, method = '%s.%s' % (self.obj, self.method), name
-        return NexentaJSONProxy(self.url, self.user, self.password, self.auto,
-                                obj, method)
+    def _set_url(self, url):
+        self.url = url
+        parsed = urlparse.urlparse(url)
+        self.path = parsed.path or '/'
+        self.pool = http_client.HTTPConnectionPool(
+            parsed.hostname, parsed.port, use_ssl=(parsed.scheme == 'https'))
 
-    def __call__(self, *args):
-        data = jsonutils.dumps({'object': self.obj,
-                           'method': self.method,
-                           'params': args})
-        auth = ('%s:%s' % (self.user, self.password)).encode('base64')[:-1]
-        headers = {'Content-Type': 'application/json',
-                   'Authorization': 'Basic %s' % (auth,)}
+    def _post(self, data, name):
+        """Return the body of the reply, or None if it had no headers."""
+        try:
+            response = self.pool.request('POST', self.path, data,
+                                         self.headers, name=name)
+        except httplib.BadStatusLine:
+            return None
+        if response.version == 9:
+            # Not an HTTP reply, as when talking HTTP to an HTTPS port
+            return None
+        return response.data
+
+    def call(self, obj, method, args):
+        data = jsonutils.dumps({'object': obj,
+                                'method': method,
+                                'params': args})
+        name = '.'.join([part for part in (obj, method) if part])
         LOG.debug(_('Sending JSON data: %s'), data)
-        request = urllib2.Request(self.url, data, headers)
-        response_obj = urllib2.urlopen(request)
-        if response_obj.info().status == 'EOF in headers':
+        response_data = self._post(data, name)
+        if response_data is None:
             if self.auto and self.url.startswith('http://'):
                 LOG.info(_('Auto switching to HTTPS connection to %s'),
                                                                       self.url)
-                self.url = 'https' + self.url[4:]
-                request = urllib2.Request(self.url, data, headers)
-                response_obj = urllib2.urlopen(request)
-            else:
+                self._set_url('https' + self.url[4:])
+                response_data = self._post(data, name)
+            if response_data is None:
                 LOG.error(_('No headers in server response'))
                 raise NexentaJSONException(_('Bad response from server'))
 
-        response_data = response_obj.read()
         LOG.debug(_('Got response: %s'), response_data)
         response = jsonutils.loads(response_data)
         if response.get('error') is not None:
             raise NexentaJSONException(response['error'].get('message', ''))
         else:
             return response.get('result')
+
+
+class NexentaJSONProxy(object):
+    def __init__(self, url, user, password, auto=False, obj=None, method=None,
+                 client=None):
+        if client is None:
+            client = NexentaJSONClient(url, user, password, auto)
+        self.client = client
+        self.obj = obj
+        self.method = method
+        self._children = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        proxy = self._children.get(name)
+        if proxy is not None:
+            return proxy
+        if not self.obj:
+            obj, method = name, None
+        elif not self.method:
+            obj, method = self.obj, name
+        else:
+            obj, method = '%s.%s' % (self.obj, self.method), name
+        client = self.client
+        proxy = NexentaJSONProxy(client.url, client.user, client.password,
+                                 client.auto, obj, method, client=client)
+        self._children[name] = proxy
+        return proxy
+
+    def __call__(self, *args):
+        return self.client.call(self.obj, self.method, args)
@@ -71,6 +71,17 @@ nexenta_opts = [
 FLAGS.register_opts(nexenta_opts)
 
 
+_SIZE_UNITS = 'BKMGTPE'
+
+
+def _str2bytes(size):
+    """Convert an NMS size such as 1.5G to bytes."""
+    size = size.strip().upper()
+    if size[-1] in _SIZE_UNITS:
+        return int(float(size[:-1]) * 1024 ** _SIZE_UNITS.index(size[-1]))
+    return int(size)
+
+
 class NexentaDriver(driver.ISCSIDriver):  # pylint: disable=R0921
     """Executes volume driver commands on Nexenta Appliance."""
 
@@ -181,6 +192,13 @@ class NexentaDriver(driver.ISCSIDriver):  # pylint: disable=R0921
                         " Verify that use_local_volumes flag is turned off."))
         raise NotImplementedError
 
+    def _query_volume_stats(self):
+        """Return the size and free space of the volume of the zvols."""
+        props = self.nms.volume.get_child_props(FLAGS.nexenta_volume,
+                                                'size|available')
+        return driver.capacity_stats(_str2bytes(props['size']),
+                                     _str2bytes(props['available']))
+
     def _do_export(self, _ctx, volume, ensure=False):
         """Do all steps to get zvol exported as LUN 0 at separate target.
 
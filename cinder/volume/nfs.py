@@ -240,25 +240,40 @@ class NfsDriver(driver.VolumeDriver):
         """Calculate available space on the NFS share
         :param nfs_share: example 172.18.194.100:/var/nfs
         """
+        return self._get_capacity_info(nfs_share)[1]
+
+    def _get_capacity_info(self, nfs_share):
+        """Calculate size and available space on the NFS share
+        :param nfs_share: example 172.18.194.100:/var/nfs
+        """
         mount_point = self._get_mount_point_for_share(nfs_share)
 
         out, _ = self._execute('df', '-P', '-B', '1', mount_point,
                                run_as_root=True)
         out = out.splitlines()[1]
 
+        size = int(out.split()[1])
         available = 0
 
         if FLAGS.nfs_disk_util == 'df':
             available = int(out.split()[3])
         else:
-            size = int(out.split()[1])
             out, _ = self._execute('du', '-sb', '--apparent-size',
                                    '--exclude', '*snapshot*', mount_point,
                                    run_as_root=True)
             used = int(out.split()[0])
             available = size - used
 
-        return available
+        return size, available
+
+    def _query_volume_stats(self):
+        """Return the capacity of the mounted shares."""
+        total = free = 0
+        for nfs_share in self._mounted_shares:
+            size, available = self._get_capacity_info(nfs_share)
+            total += size
+            free += available
+        return driver.capacity_stats(total, free)
 
     def _mount_nfs(self, nfs_share, mount_path, ensure=False):
         """Mount NFS share to mount path"""
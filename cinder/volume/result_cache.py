@@ -0,0 +1,265 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Result cache for the queries volume drivers make to their storage.
+
+A driver method decorated with cached() keeps its results by arguments::
+
+    @result_cache.cached(negative=True)
+    def _get_volume_attributes(self, volume_name):
+        ...
+
+    def _delete_volume(self, volume):
+        ...
+        result_cache.invalidate(self, '_get_volume_attributes',
+                                volume['name'])
+
+The results of a method with the PROCESS scope are kept for ttl seconds,
+driver_cache_ttl by default, by every operation of the driver.  The
+results of a method with the OPERATION scope are kept until the driver
+entry point decorated with operation() that the current greenthread runs
+returns; outside of such an entry point they are not cached.
+
+Results such as None, False or an empty list are only cached if the method
+is decorated with negative=True.  Cached results are shared, so callers
+must not modify them.
+"""
+
+import functools
+
+import eventlet
+
+from cinder import flags
+from cinder.openstack.common import cfg
+from cinder.openstack.common import timeutils
+
+
+result_cache_opts = [
+    cfg.IntOpt('driver_cache_ttl',
+               default=60,
+               help='Seconds volume drivers keep the results of queries to '
+                    'their storage, unless the driver sets its own. '
+                    '0 disables the caching across operations'),
+]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(result_cache_opts)
+
+PROCESS = 'process'
+OPERATION = 'operation'
+
+_MISSING = object()
+
+
+class ResultCache(object):
+    """Results of one method, by arguments.
+
+    :param ttl: Seconds the results are kept, None to keep them until they
+                are invalidated.
+    :param maxsize: Number of results kept. Expired results, then the
+                    oldest ones, are evicted to make room.
+    :param stats: Dict the hits, misses and evictions are counted in.
+    """
+
+    def __init__(self, ttl=None, maxsize=256, stats=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        if stats is None:
+            stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.stats = stats
+        # Expiry time and result, by key
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the result for key, or _MISSING."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires is None or expires > timeutils.utcnow_ts():
+                self.stats['hits'] += 1
+                return value
+            del self._entries[key]
+            self.stats['evictions'] += 1
+        self.stats['misses'] += 1
+        return _MISSING
+
+    def put(self, key, value):
+        if key not in self._entries and len(self._entries) >= self.maxsize:
+            self._make_room()
+        expires = None
+        if self.ttl is not None:
+            expires = timeutils.utcnow_ts() + self.ttl
+        self._entries[key] = (expires, value)
+
+    def _make_room(self):
+        now = timeutils.utcnow_ts()
+        expired = [key for key, (expires, value) in self._entries.items()
+                   if expires is not None and expires <= now]
+        if not expired:
+            oldest = min(self._entries.items(), key=lambda item: item[1][0])
+            expired = [oldest[0]]
+        for key in expired:
+            del self._entries[key]
+        self.stats['evictions'] += len(expired)
+
+    def invalidate(self, args=None):
+        """Evict the results for calls whose arguments start with args,
+        or every result if args is None."""
+        if args is None:
+            keys = self._entries.keys()
+        else:
+            keys = [key for key in self._entries
+                    if key[0][:len(args)] == args]
+        for key in keys:
+            del self._entries[key]
+        self.stats['evictions'] += len(keys)
+
+
+class _DriverCaches(object):
+    """Caches of the decorated methods of one driver."""
+
+    def __init__(self):
+        # Hits, misses and evictions, by method name
+        self.stats = {}
+        # ResultCache, by method name
+        self.process = {}
+        # Depth of nested entry points and ResultCaches by method name, by
+        # greenthread
+        self.operations = {}
+
+    def _get_stats(self, name):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = {'hits': 0, 'misses': 0,
+                                        'evictions': 0}
+        return stats
+
+    def get_cache(self, name, scope, ttl, maxsize):
+        """Return the ResultCache of a method, or None if its results can
+        not be cached now."""
+        if scope == OPERATION:
+            operation = self.operations.get(eventlet.getcurrent())
+            if operation is None:
+                return None
+            caches = operation['caches']
+        else:
+            if ttl is None:
+                ttl = FLAGS.driver_cache_ttl
+            if ttl <= 0:
+                return None
+            caches = self.process
+
+        cache = caches.get(name)
+        if cache is None:
+            if scope == OPERATION:
+                ttl = None
+            cache = caches[name] = ResultCache(ttl, maxsize,
+                                               self._get_stats(name))
+        return cache
+
+    def get_caches(self, name):
+        """Return every ResultCache of a method."""
+        caches = [operation['caches'].get(name)
+                  for operation in self.operations.values()]
+        caches.append(self.process.get(name))
+        return [cache for cache in caches if cache is not None]
+
+
+def _get_caches(obj):
+    caches = obj.__dict__.get('_result_caches')
+    if caches is None:
+        caches = obj._result_caches = _DriverCaches()
+    return caches
+
+
+def cached(ttl=None, negative=False, scope=PROCESS, maxsize=256):
+    """Decorator caching the results of a driver method by arguments.
+
+    :param ttl: Seconds results are kept for with the PROCESS scope,
+                driver_cache_ttl if None.
+    :param negative: Whether results such as None, False or an empty list
+                     are cached too.
+    :param scope: PROCESS or OPERATION.
+    :param maxsize: Number of results kept.
+    """
+    def decorator(f):
+        name = f.__name__
+
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            cache = _get_caches(self).get_cache(name, scope, ttl, maxsize)
+            if cache is None:
+                return f(self, *args, **kwargs)
+
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                value = cache.get(key)
+            except TypeError:
+                # Unhashable arguments
+                return f(self, *args, **kwargs)
+            if value is _MISSING:
+                value = f(self, *args, **kwargs)
+                if value or negative:
+                    cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def operation(f):
+    """Decorator for the driver entry points during which the results of
+    the methods with the OPERATION scope are cached."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        operations = _get_caches(self).operations
+        current = eventlet.getcurrent()
+        operation = operations.get(current)
+        if operation is None:
+            operation = operations[current] = {'depth': 0, 'caches': {}}
+        operation['depth'] += 1
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            operation['depth'] -= 1
+            if not operation['depth']:
+                del operations[current]
+    return wrapper
+
+
+def invalidate(obj, name, *args):
+    """Evict the cached results of method name of obj.
+
+    Only the results for calls whose arguments start with args are evicted,
+    in every scope, if args are given.
+    """
+    for cache in _get_caches(obj).get_caches(name):
+        cache.invalidate(args or None)
+
+
+def get_stats(obj):
+    """Return the hits, misses, evictions and number of results kept across
+    operations, by decorated method of obj."""
+    caches = _get_caches(obj)
+    result = {}
+    for name, stats in caches.stats.items():
+        result[name] = dict(stats)
+        cache = caches.process.get(name)
+        result[name]['size'] = cache is not None and len(cache) or 0
+    return result
@@ -273,6 +273,15 @@ class SolarisISCSIDriver(SanISCSIDriver):
     def _iscsi_target_exists(self, iscsi_target_name):
         return iscsi_target_name in self._get_iscsi_targets()
 
+    def _query_volume_stats(self):
+        """Return the capacity of the pool the zvols are created in."""
+        pool = FLAGS.san_zfs_volume_base.rstrip('/')
+        (out, _err) = self._execute('/usr/sbin/zfs', 'list', '-Hp',
+                                    '-o', 'used,avail', pool)
+        used, available = [int(value) for value in out.split()]
+        return cinder.volume.driver.capacity_stats(used + available,
+                                                   available)
+
     def _build_zfs_poolname(self, volume):
         zfs_poolname = '%s%s' % (FLAGS.san_zfs_volume_base, volume['name'])
         return zfs_poolname
@@ -504,6 +513,14 @@ class HpSanISCSIDriver(SanISCSIDriver):
                locals())
         raise exception.VolumeBackendAPIException(data=msg)
 
+    def _query_volume_stats(self):
+        """Return the capacity of the cluster."""
+        cluster_xml = self._cliq_get_cluster_info(FLAGS.san_clustername)
+        cluster = cluster_xml.find("response/cluster")
+        total = int(cluster.attrib.get('spaceTotal'))
+        free = int(cluster.attrib.get('unprovisionedSpace'))
+        return cinder.volume.driver.capacity_stats(total, free, total - free)
+
     def _cliq_get_volume_info(self, volume_name):
         """Gets the volume info, including IQN"""
         cliq_args = {}
@@ -0,0 +1,115 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Shared SOAP clients for the volume drivers of SOAP managed storage.
+
+Parsing a large WSDL, such as the one of a NetApp DFM server, takes
+seconds.  The WSDL of each URL is parsed once per process, and drivers get
+clones of one suds client that share it.
+
+The parsed WSDL is also pickled under wsdl_cache_dir, in a directory named
+after the SHA-1 of the WSDL document, so a restarted service loads it
+instead of parsing it, and a changed WSDL is parsed again.
+"""
+
+import gc
+import hashlib
+import os
+import time
+
+from suds import cache as suds_cache
+from suds import client as suds_client
+from suds import transport
+from suds.transport import https
+
+from cinder import flags
+from cinder.openstack.common import cfg
+from cinder.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+soap_opts = [
+    cfg.StrOpt('wsdl_cache_dir',
+               default='$state_path/wsdl',
+               help='Directory where parsed WSDL documents are kept between '
+                    'restarts, empty to parse them at every start'),
+]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(soap_opts)
+
+# Client whose WSDL is shared, by WSDL URL
+_CLIENTS = {}
+
+
+def _wsdl_digest(wsdl_url, username, password):
+    """Return the SHA-1 of the WSDL document."""
+    http = https.HttpAuthenticated(username=username, password=password)
+    fp = http.open(transport.Request(wsdl_url))
+    try:
+        return hashlib.sha1(fp.read()).hexdigest()
+    finally:
+        fp.close()
+
+
+def _load_client(wsdl_url, username, password):
+    kwargs = {'username': username, 'password': password}
+    if FLAGS.wsdl_cache_dir:
+        digest = _wsdl_digest(wsdl_url, username, password)
+        location = os.path.join(FLAGS.wsdl_cache_dir, digest)
+        # Pickle the parsed WSDL, not only the documents
+        kwargs['cache'] = suds_cache.ObjectCache(location=location)
+        kwargs['cachingpolicy'] = 1
+    else:
+        kwargs['cache'] = None
+
+    # A parsed WSDL is a large graph of small objects, which takes about
+    # twice as long to build or unpickle with the garbage collector running
+    start = time.time()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        client = suds_client.Client(wsdl_url, **kwargs)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    LOG.debug(_('Loaded WSDL %(url)s in %(time).2fs'),
+              {'url': wsdl_url, 'time': time.time() - start})
+    return client
+
+
+def get_client(wsdl_url, username, password, location=None, cache=True):
+    """Return a suds client for the WSDL at wsdl_url.
+
+    :param location: URL of the SOAP service, if not the one in the WSDL.
+    :param cache: Whether the parsed WSDL can be shared and kept. If not,
+                  it is parsed for this client only.
+    """
+    if not cache:
+        client = suds_client.Client(wsdl_url, username=username,
+                                    password=password, cache=None)
+    else:
+        shared = _CLIENTS.get(wsdl_url)
+        if shared is None:
+            shared = _CLIENTS[wsdl_url] = _load_client(wsdl_url, username,
+                                                       password)
+        client = shared.clone()
+        client.set_options(username=username, password=password)
+    if location:
+        client.set_options(location=location)
+    return client
@@ -33,6 +33,8 @@ from cinder import exception
 from cinder import flags
 from cinder.openstack.common import cfg
 from cinder.openstack.common import log as logging
+from cinder.volume import driver
+from cinder.volume import result_cache
 from cinder.volume.san import SanISCSIDriver
 
 
@@ -145,12 +147,15 @@ class SolidFire(SanISCSIDriver):
         LOG.debug(_("Results of SolidFire API call: %s"), data)
         return data
 
+    @result_cache.cached(negative=True)
     def _get_volumes_by_sfaccount(self, account_id):
         params = {'accountID': account_id}
         data = self._issue_api_request('ListVolumesForAccount', params)
-        if 'result' in data:
-            return data['result']['volumes']
+        if 'result' not in data:
+            raise exception.SolidFireAPIDataException(data=data)
+        return data['result']['volumes']
 
+    @result_cache.cached()
     def _get_sfaccount_by_name(self, sf_account_name):
         sfaccount = None
         params = {'username': sf_account_name}
@@ -183,6 +188,7 @@ class SolidFire(SanISCSIDriver):
 
         return sfaccount
 
+    @result_cache.cached()
     def _get_cluster_info(self):
         params = {}
         data = self._issue_api_request('GetClusterInfo', params)
@@ -218,6 +224,8 @@ class SolidFire(SanISCSIDriver):
 
         params['accountID'] = sfaccount['accountID']
         data = self._issue_api_request('CreateVolume', params)
+        result_cache.invalidate(self, '_get_volumes_by_sfaccount',
+                                sfaccount['accountID'])
 
         if 'result' not in data or 'volumeID' not in data['result']:
             raise exception.SolidFireAPIDataException(data=data)
@@ -308,10 +316,7 @@ class SolidFire(SanISCSIDriver):
         if sfaccount is None:
             raise exception.SfAccountNotFound(account_name=sf_account_name)
 
-        params = {'accountID': sfaccount['accountID']}
-        data = self._issue_api_request('ListVolumesForAccount', params)
-        if 'result' not in data:
-            raise exception.SolidFireAPIDataException(data=data)
+        volumes = self._get_volumes_by_sfaccount(sfaccount['accountID'])
 
         if is_snapshot:
             seek = 'OS-SNAPID-%s' % (volume['id'])
@@ -321,7 +326,7 @@ class SolidFire(SanISCSIDriver):
 
         found_count = 0
         volid = -1
-        for v in data['result']['volumes']:
+        for v in volumes:
             if v['name'] == seek:
                 found_count += 1
                 volid = v['volumeID']
@@ -335,6 +340,8 @@ class SolidFire(SanISCSIDriver):
 
         params = {'volumeID': volid}
         data = self._issue_api_request('DeleteVolume', params)
+        result_cache.invalidate(self, '_get_volumes_by_sfaccount',
+                                sfaccount['accountID'])
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
 
@@ -356,14 +363,11 @@ class SolidFire(SanISCSIDriver):
         if sfaccount is None:
             raise exception.SfAccountNotFound(account_name=sf_account_name)
 
-        params = {'accountID': sfaccount['accountID']}
-        data = self._issue_api_request('ListVolumesForAccount', params)
-        if 'result' not in data:
-            raise exception.SolidFireAPIDataException(data=data)
+        volumes = self._get_volumes_by_sfaccount(sfaccount['accountID'])
 
         found_count = 0
         volid = -1
-        for v in data['result']['volumes']:
+        for v in volumes:
             if v['name'] == 'OS-VOLID-%s' % snapshot['volume_id']:
                 found_count += 1
                 volid = v['volumeID']
@@ -379,11 +383,28 @@ class SolidFire(SanISCSIDriver):
                   'attributes': {'OriginatingVolume': volid}}
 
         data = self._issue_api_request('CloneVolume', params)
+        result_cache.invalidate(self, '_get_volumes_by_sfaccount',
+                                sfaccount['accountID'])
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
 
         return (data, sfaccount)
 
+    def _query_volume_stats(self):
+        """Return the capacity of the cluster, and the hits and misses of
+        the cached API queries."""
+        data = self._issue_api_request('GetClusterCapacity', {})
+        if 'result' not in data:
+            raise exception.SolidFireAPIDataException(data=data)
+
+        capacity = data['result']['clusterCapacity']
+        stats = driver.capacity_stats(
+            capacity['maxUsedSpace'],
+            capacity['maxUsedSpace'] - capacity['usedSpace'],
+            capacity['provisionedSpace'])
+        stats['driver_cache'] = result_cache.get_stats(self)
+        return stats
+
     def delete_snapshot(self, snapshot):
         self.delete_volume(snapshot, True)
 
@@ -49,6 +49,8 @@ from cinder import flags
 from cinder.openstack.common import cfg
 from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
+from cinder.volume import driver
+from cinder.volume import result_cache
 from cinder.volume import san
 
 LOG = logging.getLogger(__name__)
@@ -441,8 +443,10 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
               'stdout: %(out)s\n stderr: %(err)s')
                 % {'name': name, 'out': str(out), 'err': str(err)})
 
+        result_cache.invalidate(self, '_get_volume_attributes', name)
         LOG.debug(_('leave: create_volume: volume %(name)s ') % {'name': name})
 
+    @result_cache.operation
     def delete_volume(self, volume):
         self._delete_volume(volume, False)
 
@@ -463,6 +467,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
             out, err = self._run_ssh('rmvdisk %(force)s %(name)s'
                                     % {'force': force_flag,
                                        'name': name})
+            result_cache.invalidate(self, '_get_volume_attributes', name)
             # No output should be returned from rmvdisk
             self._driver_assert(len(out.strip()) == 0,
                 _('delete volume %(name)s - non empty output from CLI.\n '
@@ -477,6 +482,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
 
         LOG.debug(_('leave: delete_volume: volume %(name)s ') % {'name': name})
 
+    @result_cache.operation
     def ensure_export(self, context, volume):
         """Check that the volume exists on the storage.
 
@@ -495,6 +501,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
     def remove_export(self, context, volume):
         pass
 
+    @result_cache.operation
     def initialize_connection(self, volume, connector):
         """Perform the necessary work so that an iSCSI connection can be made.
 
@@ -569,6 +576,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
 
         return {'driver_volume_type': 'iscsi', 'data': properties, }
 
+    @result_cache.operation
     def terminate_connection(self, volume, connector):
         """Cleanup after an iSCSI connection has been terminated.
 
@@ -762,6 +770,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
                     '%(source)s to %(target)s') % {'source': source,
                     'target': target})
 
+    @result_cache.operation
     def create_volume_from_snapshot(self, volume, snapshot):
         """Create a new snapshot from volume."""
 
@@ -812,6 +821,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
             _('leave: create_volume_from_snapshot: %s created successfully')
             % tgt_volume)
 
+    @result_cache.operation
     def create_snapshot(self, snapshot):
         """Create a new snapshot using FlashCopy."""
 
@@ -882,6 +892,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         LOG.debug(_('leave: create_snapshot: %s created successfully')
                   % tgt_volume)
 
+    @result_cache.operation
     def delete_snapshot(self, snapshot):
         self._delete_snapshot(snapshot, False)
 
@@ -898,6 +909,32 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
 
         LOG.debug(_('leave: delete_snapshot: snapshot %s') % snapshot)
 
+    def _query_volume_stats(self):
+        """Return the capacity of the pool, and the hits and misses of the
+        cached CLI queries."""
+        ssh_cmd = ('lsmdiskgrp -bytes -delim ! %s'
+                   % FLAGS.storwize_svc_volpool_name)
+        out, err = self._run_ssh(ssh_cmd)
+        attributes = {}
+        for attrib_line in out.split('\n'):
+            attrib_name, foo, attrib_value = attrib_line.partition('!')
+            attributes[attrib_name] = attrib_value
+        self._driver_assert('capacity' in attributes and
+                            'free_capacity' in attributes and
+                            'virtual_capacity' in attributes,
+            _('_query_volume_stats: Unexpected response from CLI output. '
+              'Command: %(cmd)s\n stdout: %(out)s\n stderr: %(err)s')
+                % {'cmd': ssh_cmd,
+                   'out': str(out),
+                   'err': str(err)})
+
+        stats = driver.capacity_stats(int(attributes['capacity']),
+                                      int(attributes['free_capacity']),
+                                      int(attributes['virtual_capacity']))
+        stats['driver_cache'] = result_cache.get_stats(self)
+        return stats
+
+    @result_cache.cached()
     def _get_host_from_iscsiname(self, iscsi_name):
         """List the hosts defined in the storage.
 
@@ -984,6 +1021,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         host_name = '%s_%s' % (host_name, random.randint(10000, 99999))
         out, err = self._run_ssh('mkhost -name "%s" -iscsiname "%s"'
                                  % (host_name, initiator_name))
+        result_cache.invalidate(self, '_is_host_defined', host_name)
         self._driver_assert(len(out.strip()) > 0 and
                             'successfully created' in out,
                 _('create host %(name)s with iSCSI initiator %(init)s - '
@@ -1010,6 +1048,8 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         if is_defined:
             # Delete host
             out, err = self._run_ssh('rmhost %s ' % host_name)
+            result_cache.invalidate(self, '_is_host_defined', host_name)
+            result_cache.invalidate(self, '_get_host_from_iscsiname')
         else:
             LOG.info(_('warning: tried to delete host %(name)s but '
                        'it does not exist.') % {'name': host_name})
@@ -1028,6 +1068,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         else:
             return True
 
+    @result_cache.cached(negative=True, scope=result_cache.OPERATION)
     def _is_host_defined(self, host_name):
         """Check if a host is defined on the storage."""
 
@@ -1185,6 +1226,7 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
 
         return attributes
 
+    @result_cache.cached(negative=True, scope=result_cache.OPERATION)
     def _get_volume_attributes(self, volume_name):
         """Return volume attributes, or None if volume does not exist
 
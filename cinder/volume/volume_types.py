@@ -90,6 +90,11 @@ def get_all_types(context, inactive=0, search_opts={}):
     return vol_types
 
 
+def get_all_types_changes(context):
+    """Get (row_count, changed_at) telling whether any type has changed."""
+    return db.volume_type_get_changes(context)
+
+
 def get_volume_type(ctxt, id):
     """Retrieves single volume type by id."""
     if id is None:
@@ -14,14 +14,27 @@
 
 from cinder import exception
 from cinder import flags
+from cinder.openstack.common import cfg
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
 from cinder import utils
 from cinder.virt.xenapi import connection as xenapi_conn
 from cinder.virt.xenapi import volumeops
 import cinder.volume.driver
 
 LOG = logging.getLogger(__name__)
+
+xensm_opts = [
+    cfg.IntOpt('xensm_backend_refresh_interval',
+               default=60,
+               help='Seconds the backend list, and the state and free space '
+                    'of their SRs, are kept before being read again'),
+]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(xensm_opts)
+
+GB = 1024 * 1024 * 1024
 
 
 class XenSMDriver(cinder.volume.driver.VolumeDriver):
@@ -39,7 +52,9 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
 
     def _create_storage_repo(self, context, backend_ref):
         """Either creates or introduces SR on host
-        depending on whether it exists in xapi db."""
+        depending on whether it exists in xapi db.
+
+        Returns the SR uuid, or None if introducing the SR failed."""
         params = self._convert_config_params(backend_ref['config_params'])
         if 'name_label' in params:
             label = params['name_label']
@@ -71,6 +86,7 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
                 LOG.exception(ex)
                 msg = _("Failed to update db")
                 raise exception.VolumeBackendAPIException(data=msg)
+            return sr_uuid
 
         else:
             # sr introduce, if not already done
@@ -81,16 +97,108 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
                 LOG.exception(ex)
                 LOG.debug(_("Failed to introduce sr %s...continuing")
                           % str(backend_ref['id']))
+                return None
+            return backend_ref['sr_uuid']
+
+    def _get_sr_capacity(self, sr_uuid):
+        """Return the size and free space of an SR, in bytes."""
+        sr_ref = self._session.call_xenapi('SR.get_by_uuid', sr_uuid)
+        sr_rec = self._session.call_xenapi('SR.get_record', sr_ref)
+        size = int(sr_rec['physical_size'])
+        return size, size - int(sr_rec['physical_utilisation'])
+
+    def _update_capacity(self, backend):
+        try:
+            backend['total'], backend['free'] = self._get_sr_capacity(
+                backend['conf']['sr_uuid'])
+        except Exception as ex:
+            LOG.exception(ex)
+            backend['total'] = backend['free'] = None
+
+    def _ensure_storage_repo(self, context, backend):
+        """Create or introduce the SR of a backend, unless it is known to
+        be plugged."""
+        if backend['plugged']:
+            return
+        sr_uuid = self._create_storage_repo(context, backend['conf'])
+        if sr_uuid is not None:
+            backend['conf']['sr_uuid'] = sr_uuid
+            backend['plugged'] = True
+            self._update_capacity(backend)
+
+    def _refresh_backends(self, context):
+        """Read the backends from the db, and the free space of their SRs."""
+        backends = {}
+        for backend_ref in self.db.sm_backend_conf_get_all(context):
+            conf = dict(backend_ref)
+            old = self._backends.get(conf['id'])
+            backend = {'conf': conf, 'plugged': False,
+                       'total': None, 'free': None}
+            if (old and old['plugged'] and
+                old['conf']['sr_uuid'] == conf['sr_uuid']):
+                backend['plugged'] = True
+                self._update_capacity(backend)
+            backends[conf['id']] = backend
+        self._backends = backends
+        self._backends_updated = timeutils.utcnow_ts()
+
+    def _get_backends(self, context):
+        """Return the backends, read again if they are too old."""
+        if (self._backends_updated is None or
+            timeutils.utcnow_ts() - self._backends_updated >=
+                FLAGS.xensm_backend_refresh_interval):
+            self._refresh_backends(context)
+        return [self._backends[backend_id]
+                for backend_id in sorted(self._backends)]
+
+    def _get_backend(self, context, backend_id):
+        backend = self._backends.get(backend_id)
+        if backend is None:
+            self._refresh_backends(context)
+            backend = self._backends[backend_id]
+        return backend
+
+    def _select_backends(self, context, size):
+        """Return the backends to try for a volume of size bytes.
+
+        The backends with room for the volume come first, the one with the
+        least free space first, then the ones whose free space is unknown.
+        """
+        backends = self._get_backends(context)
+        fits = [b for b in backends
+                if b['free'] is not None and b['free'] >= size]
+        fits.sort(key=lambda b: b['free'])
+        return fits + [b for b in backends if b['free'] is None]
+
+    def _call_with_sr(self, backend, method):
+        """Call method with the uuid of the SR of backend, once it is plugged.
+
+        If cinder compute runs on this host, it may have forgotten the SR
+        as a part of detach_volume since it was plugged. The SR is then
+        plugged again and the call repeated.
+        """
+        plugged = backend['plugged']
+        self._ensure_storage_repo(self.ctxt, backend)
+        try:
+            return method(backend['conf']['sr_uuid'])
+        except Exception as ex:
+            if not plugged:
+                raise
+            LOG.exception(ex)
+            LOG.debug(_('Plugging sr %s again') % str(backend['conf']['id']))
+            backend['plugged'] = False
+            self._ensure_storage_repo(self.ctxt, backend)
+            return method(backend['conf']['sr_uuid'])
 
     def _create_storage_repos(self, context):
         """Create/Introduce storage repositories at start."""
-        backends = self.db.sm_backend_conf_get_all(context)
-        for backend in backends:
+        self._refresh_backends(context)
+        for backend in self._get_backends(context):
             try:
-                self._create_storage_repo(context, backend)
+                self._ensure_storage_repo(context, backend)
             except Exception as ex:
                 LOG.exception(ex)
-                msg = _('Failed to reach backend %d') % backend['id']
+                msg = _('Failed to reach backend %d') % backend['conf']['id']
                 raise exception.VolumeBackendAPIException(data=msg)
 
     def __init__(self, *args, **kwargs):
@@ -107,6 +215,7 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
         password = FLAGS.xenapi_connection_password
         try:
             session = xenapi_conn.XenAPISession(url, username, password)
+            self._session = session
             self._volumeops = volumeops.VolumeOps(session)
         except Exception as ex:
             LOG.exception(ex)
@@ -116,6 +225,9 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
         super(XenSMDriver, self).__init__(execute=utils.execute,
                                           sync_exec=utils.execute,
                                           *args, **kwargs)
+        # Backend table, by backend id
+        self._backends = {}
+        self._backends_updated = None
 
     def do_setup(self, ctxt):
         """Setup includes creating or introducing storage repos
@@ -129,28 +241,25 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
         """Creates a logical volume. Can optionally return a Dictionary of
         changes to the volume object to be persisted."""
 
-        # For now the scheduling logic will be to try to fit the volume in
-        # the first available backend.
-        # TODO(renukaapte) better scheduling once APIs are in place
+        size = volume['size'] * GB
         sm_vol_rec = None
-        backends = self.db.sm_backend_conf_get_all(self.ctxt)
-        for backend in backends:
-            # Ensure that storage repo exists, if not create.
-            # This needs to be done because if cinder compute and
-            # volume are both running on this host, then, as a
-            # part of detach_volume, compute could potentially forget SR
-            self._create_storage_repo(self.ctxt, backend)
-            sm_vol_rec = self._volumeops.create_volume_for_sm(volume,
-                                                  backend['sr_uuid'])
+        for backend in self._select_backends(self.ctxt, size):
+            sm_vol_rec = self._call_with_sr(
+                backend,
+                lambda sr_uuid: self._volumeops.create_volume_for_sm(volume,
+                                                                     sr_uuid))
             if sm_vol_rec:
+                backend_id = backend['conf']['id']
                 LOG.debug(_('Volume will be created in backend - %d')
-                          % backend['id'])
+                          % backend_id)
+                if backend['free'] is not None:
+                    backend['free'] -= size
                 break
 
         if sm_vol_rec:
             # Update db
             sm_vol_rec['id'] = volume['id']
-            sm_vol_rec['backend_id'] = backend['id']
+            sm_vol_rec['backend_id'] = backend_id
             try:
                 self.db.sm_volume_create(self.ctxt, sm_vol_rec)
             except Exception as ex:
@@ -168,10 +277,13 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
 
         try:
             # If compute runs on this node, detach could have disconnected SR
-            backend_ref = self.db.sm_backend_conf_get(self.ctxt,
-                                                      vol_rec['backend_id'])
-            self._create_storage_repo(self.ctxt, backend_ref)
-            self._volumeops.delete_volume_for_sm(vol_rec['vdi_uuid'])
+            backend = self._get_backend(self.ctxt, vol_rec['backend_id'])
+            self._call_with_sr(
+                backend,
+                lambda sr_uuid: self._volumeops.delete_volume_for_sm(
+                    vol_rec['vdi_uuid']))
+            if backend['free'] is not None:
+                backend['free'] += volume['size'] * GB
         except Exception as ex:
             LOG.exception(ex)
             msg = _("Failed to delete vdi")
@@ -245,3 +357,29 @@ class XenSMDriver(cinder.volume.driver.VolumeDriver):
 
     def terminate_connection(self, volume, connector):
         pass
+
+    def get_volume_stats(self, refresh=False):
+        """Return the capacity of the backends, read again if refresh."""
+        if refresh:
+            self._refresh_backends(self.ctxt)
+
+        total = free = 0
+        backends = []
+        for backend in self._get_backends(self.ctxt):
+            conf = backend['conf']
+            stats = {'backend_id': conf['id'],
+                     'flavor_id': conf['flavor_id'],
+                     'sr_type': conf['sr_type'],
+                     'total_capacity_gb': 'unknown',
+                     'free_capacity_gb': 'unknown'}
+            if backend['free'] is not None:
+                stats['total_capacity_gb'] = backend['total'] / GB
+                stats['free_capacity_gb'] = backend['free'] / GB
+                total += backend['total']
+                free += backend['free']
+            backends.append(stats)
+
+        return {'storage_protocol': 'xensm',
+                'total_capacity_gb': total / GB,
+                'free_capacity_gb': free / GB,
+                'backends': backends}
@@ -21,15 +21,15 @@ Volume driver for Zadara Virtual Private Storage Array (VPSA).
 This driver requires VPSA with API ver.12.06 or higher.
 """
 
-import httplib
-
 from cinder import exception
 from cinder import flags
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import cfg
 from cinder import utils
 from cinder.volume import driver
+from cinder.volume import http_client
 from cinder.volume import iscsi
+from cinder.volume import result_cache
 
 from lxml import etree
 
@@ -94,6 +94,7 @@ class ZadaraVPSAConnection(object):
         self.user = user
         self.password = password
         self.access_key = None
+        self.pool = http_client.HTTPConnectionPool(host, port, use_ssl=ssl)
 
         self.ensure_connection()
 
@@ -221,18 +222,32 @@ class ZadaraVPSAConnection(object):
         LOG.debug(_('Sending %(method)s to %(url)s. Body "%(body)s"')
                         % locals())
 
-        if self.use_ssl:
-            connection = httplib.HTTPSConnection(self.host, self.port)
-        else:
-            connection = httplib.HTTPConnection(self.host, self.port)
-        connection.request(method, url, body)
-        response = connection.getresponse()
+        response = self.pool.request(method, url, body, name=cmd)
+        return self._parse_response(method, response)
+
+    def send_cmds(self, *cmds):
+        """Send independent commands without parameters concurrently.
+
+        Returns the XML trees of the replies, in the order of cmds.
+        """
+
+        self.ensure_connection()
 
+        requests = []
+        for cmd in cmds:
+            (method, url, body) = self._generate_vpsa_cmd(cmd)
+            requests.append(dict(method=method, url=url, body=body,
+                                 name=cmd))
+        LOG.debug(_('Sending %s') % ', '.join(cmds))
+
+        responses = self.pool.request_many(requests)
+        return [self._parse_response(request['method'], response)
+                for request, response in zip(requests, responses)]
+
+    def _parse_response(self, method, response):
         if response.status != 200:
-            connection.close()
             raise exception.BadHTTPResponseStatus(status=response.status)
-        data = response.read()
-        connection.close()
+        data = response.data
 
         xml_tree = etree.fromstring(data)
         status = xml_tree.findtext('status')
@@ -296,9 +311,10 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
                     result_list.append(object)
         return result_list if result_list else None
 
-    def _get_vpsa_volume_name(self, name):
+    def _get_vpsa_volume_name(self, name, xml_tree=None):
         """Return VPSA's name for the volume."""
-        xml_tree = self.vpsa.send_cmd('list_volumes')
+        if xml_tree is None:
+            xml_tree = self.vpsa.send_cmd('list_volumes')
         volume = self._xml_parse_helper(xml_tree, 'volumes',
                                         ('display-name', name))
         if volume is not None:
@@ -306,9 +322,10 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
 
         return None
 
-    def _get_active_controller_details(self):
+    def _get_active_controller_details(self, xml_tree=None):
         """Return details of VPSA's active controller."""
-        xml_tree = self.vpsa.send_cmd('list_controllers')
+        if xml_tree is None:
+            xml_tree = self.vpsa.send_cmd('list_controllers')
         ctrl = self._xml_parse_helper(xml_tree, 'vcontrollers',
                                         ('state', 'active'))
         if ctrl is not None:
@@ -318,18 +335,25 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
                         chap_passwd=ctrl.findtext('chap-target-secret'))
         return None
 
-    def _get_server_name(self, initiator):
+    def _get_server_name(self, initiator, xml_tree=None):
         """Return VPSA's name for server object with given IQN."""
-        xml_tree = self.vpsa.send_cmd('list_servers')
+        if xml_tree is None:
+            xml_tree = self.vpsa.send_cmd('list_servers')
         server = self._xml_parse_helper(xml_tree, 'servers',
                                         ('iqn', initiator))
         if server is not None:
             return server.findtext('name')
         return None
 
-    def _create_vpsa_server(self, initiator):
+    @result_cache.cached()
+    def _find_server_name(self, initiator):
+        """Return VPSA's name for server object with given IQN, as
+        _get_server_name, caching the names found."""
+        return self._get_server_name(initiator)
+
+    def _create_vpsa_server(self, initiator, xml_tree=None):
         """Create server object within VPSA (if doesn't exist)."""
-        vpsa_srv = self._get_server_name(initiator)
+        vpsa_srv = self._get_server_name(initiator, xml_tree)
         if not vpsa_srv:
             xml_tree = self.vpsa.send_cmd('create_server', initiator=initiator)
             vpsa_srv = xml_tree.findtext('server-name')
@@ -400,20 +424,25 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
         Connection data (target, LUN) is not stored in the DB.
         """
 
+        # The lists of servers, volumes and controllers are independent
+        servers, volumes, ctrls = self.vpsa.send_cmds('list_servers',
+                                                      'list_volumes',
+                                                      'list_controllers')
+
         # Get/Create server name for IQN
         initiator_name = connector['initiator']
-        vpsa_srv = self._create_vpsa_server(initiator_name)
+        vpsa_srv = self._create_vpsa_server(initiator_name, servers)
         if not vpsa_srv:
             raise exception.ZadaraServerCreateFailure(name=initiator_name)
 
         # Get volume name
         name = FLAGS.zadara_vol_name_template % volume['name']
-        vpsa_vol = self._get_vpsa_volume_name(name)
+        vpsa_vol = self._get_vpsa_volume_name(name, volumes)
         if not vpsa_vol:
             raise exception.VolumeNotFound(volume_id=name)
 
         # Get Active controller details
-        ctrl = self._get_active_controller_details()
+        ctrl = self._get_active_controller_details(ctrls)
         if not ctrl:
             raise exception.ZadaraVPSANoActiveController()
 
@@ -455,7 +484,7 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
         """
         # Get server name for IQN
         initiator_name = connector['initiator']
-        vpsa_srv = self._get_server_name(initiator_name)
+        vpsa_srv = self._find_server_name(initiator_name)
         if not vpsa_srv:
             raise exception.ZadaraServerNotFound(name=initiator_name)
 
@@ -469,6 +498,12 @@ class ZadaraVPSAISCSIDriver(driver.ISCSIDriver):
         self.vpsa.send_cmd('detach_volume',
                             vpsa_srv=vpsa_srv, vpsa_vol=vpsa_vol)
 
+    def _query_volume_stats(self):
+        """Return the hits and misses of the cached VPSA queries.
+
+        The VPSA commands this driver uses do not report capacity."""
+        return {'driver_cache': result_cache.get_stats(self)}
+
     def create_volume_from_snapshot(self, volume, snapshot):
         raise NotImplementedError()
 
@@ -79,8 +79,11 @@ class Server(object):
                              custom_pool=self._pool,
                              log=self._wsgi_logger)
 
-    def start(self, backlog=128):
-        """Start serving a WSGI application.
+    def listen(self, backlog=128):
+        """Bind the listening socket without serving on it yet.
+
+        Lets a parent process bind the socket once and share it with the
+        worker processes it forks, which then call start().
 
         :param backlog: Maximum number of queued connections.
         :returns: None
@@ -91,8 +94,21 @@ class Server(object):
             raise exception.InvalidInput(
                     reason='The backlog must be more than 1')
         self._socket = eventlet.listen((self.host, self.port), backlog=backlog)
-        self._server = eventlet.spawn(self._start)
         (self.host, self.port) = self._socket.getsockname()
+
+    def start(self, backlog=128):
+        """Start serving a WSGI application.
+
+        Binds the listening socket first, unless listen() already did.
+
+        :param backlog: Maximum number of queued connections.
+        :returns: None
+        :raises: cinder.exception.InvalidInput
+
+        """
+        if self._socket is None:
+            self.listen(backlog)
+        self._server = eventlet.spawn(self._start)
         LOG.info(_("Started %(name)s on %(host)s:%(port)s") % self.__dict__)
 
     def stop(self):
@@ -107,6 +123,19 @@ class Server(object):
         LOG.info(_("Stopping WSGI server."))
         self._server.kill()
 
+    def drain(self, timeout=None):
+        """Stop accepting connections and wait for the requests in flight.
+
+        :param timeout: Seconds to wait for the requests still running, or
+                        None to wait until they have all finished.
+        :returns: None
+
+        """
+        LOG.info(_("Draining WSGI server."))
+        self._server.kill()
+        with eventlet.Timeout(timeout, False):
+            self._pool.waitall()
+
     def wait(self):
         """Block, until the server has stopped.
 
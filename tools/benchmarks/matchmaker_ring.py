@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure zmq matchmaker ring lookups with many hosts.
+
+For each ring size, prints the time to build the consistent hash ring, the
+cost of a lookup with the consistent hash and round robin exchanges, and
+the fraction of keys that move to another host when one host is removed.
+
+    python tools/benchmarks/matchmaker_ring.py [--hosts 100,1000,5000]
+"""
+
+import gettext
+import optparse
+import os
+import sys
+import time
+import timeit
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+gettext.install('cinder', unicode=1)
+
+from cinder.openstack.common import cfg
+from cinder.openstack.common.rpc import matchmaker
+
+CONF = cfg.CONF
+KEYS = ['volume-%d' % i for i in xrange(10000)]
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--hosts', default='100,1000,5000')
+    parser.add_option('--iterations', type='int', default=20000)
+    options, _args = parser.parse_args()
+    CONF([])
+
+    print('%-8s %-7s %10s %16s %16s %8s'
+          % ('hosts', 'vnodes', 'build (ms)', 'hash lookup (us)',
+             'rr lookup (us)', 'moved'))
+    for count in [int(n) for n in options.hosts.split(',')]:
+        hosts = ['host%d' % i for i in xrange(count)]
+        ring = {'volume': hosts}
+
+        start = time.time()
+        exchange = matchmaker.ConsistentHashRingExchange(ring)
+        build = (time.time() - start) * 1000
+        round_robin = matchmaker.RoundRobinRingExchange(ring)
+
+        hash_lookup = timeit.timeit(lambda: exchange.run('volume'),
+                                    number=options.iterations)
+        rr_lookup = timeit.timeit(lambda: round_robin.run('volume'),
+                                  number=options.iterations)
+
+        full = exchange.hash_rings['volume']
+        smaller = matchmaker.HashRing(hosts[1:])
+        moved = sum(1 for key in KEYS
+                    if full.get_host(key) != smaller.get_host(key))
+
+        print('%-8d %-7d %10.1f %16.2f %16.2f %7.2f%%'
+              % (count, CONF.matchmaker_ring_vnodes, build,
+                 hash_lookup / options.iterations * 1e6,
+                 rr_lookup / options.iterations * 1e6,
+                 100.0 * moved / len(KEYS)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure policy checks against large policy files.
+
+The shipped etc/cinder/policy.json is extended with generated rules, in
+chains of ten rules each referencing the one before it.  For each size,
+prints the time to load the policy, the cost of checking volume:get_all and
+the last generated rule
+with the interpreted and compiled rules and with a per-request decision
+cache, and the cost of policy.enforce() with and without the throttled
+policy file check.
+
+    python tools/benchmarks/policy_enforce.py [--rules 0,1000,10000]
+"""
+
+import gettext
+import optparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+gettext.install('cinder', unicode=1)
+
+from cinder import context
+from cinder import flags
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import policy as common_policy
+from cinder import policy
+
+FLAGS = flags.FLAGS
+TARGET = {'project_id': 'fake', 'user_id': 'fake'}
+
+
+def interpreted_check(brain, match_list, target, cred):
+    """Brain.check() as it was before rules were compiled."""
+    if not match_list:
+        return True
+    for and_list in match_list:
+        if isinstance(and_list, basestring):
+            and_list = (and_list,)
+        if all([_interpreted_match(brain, item, target, cred)
+                for item in and_list]):
+            return True
+    return False
+
+
+def _interpreted_match(brain, match, target, cred):
+    kind, value = match.split(':', 1)
+    if kind == 'rule':
+        try:
+            match_list = brain.rules[value]
+        except KeyError:
+            match_list = ('rule:%s' % brain.default_rule,)
+        return interpreted_check(brain, match_list, target, cred)
+    return brain._check(match, target, cred)
+
+
+def generate_policy(count):
+    path = os.path.join(POSSIBLE_TOPDIR, 'etc', 'cinder', 'policy.json')
+    with open(path) as policy_file:
+        rules = jsonutils.loads(policy_file.read())
+    name = previous = 'admin_or_owner'
+    for i in xrange(count):
+        if i % 10 == 0:
+            previous = 'admin_or_owner'
+        name = 'bench:rule%d' % i
+        rules[name] = [['rule:%s' % previous, 'user_id:%(user_id)s'],
+                       ['role:bench%d' % i]]
+        previous = name
+    return rules, name
+
+
+def per_call(func, iterations):
+    return timeit.timeit(func, number=iterations) / iterations * 1e6
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rules', default='0,1000,10000')
+    parser.add_option('--iterations', type='int', default=2000)
+    options, _args = parser.parse_args()
+    flags.parse_args([])
+    iterations = options.iterations
+
+    ctxt = context.RequestContext('fake', 'fake', roles=['Member'])
+    cred = ctxt.to_dict()
+
+    print('%-7s %9s %-14s %12s %12s %12s %14s %14s'
+          % ('rules', 'load (ms)', 'action', 'interp. (us)',
+             'compiled (us)', 'cached (us)', 'enforce (us)',
+             'unthrottled'))
+    for count in [int(n) for n in options.rules.split(',')]:
+        rules, deepest = generate_policy(count)
+        data = jsonutils.dumps(rules)
+
+        start = time.time()
+        brain = common_policy.Brain.load_json(data, 'default')
+        load = (time.time() - start) * 1000
+
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        try:
+            FLAGS.set_override('policy_file', path)
+            policy.reset()
+            policy.init()
+            common_policy.set_brain(brain)
+
+            for action in ('volume:get_all', deepest):
+                match_list = ('rule:%s' % action,)
+                interp = per_call(
+                    lambda: interpreted_check(brain, match_list, TARGET,
+                                              cred), iterations)
+                compiled = per_call(
+                    lambda: brain.check(match_list, TARGET, cred),
+                    iterations)
+                cache = {}
+                cached = per_call(
+                    lambda: common_policy.check(match_list, TARGET, cred,
+                                                cache), iterations)
+
+                FLAGS.set_override('policy_check_interval', 5)
+                enforce = per_call(
+                    lambda: policy.enforce(ctxt, action, TARGET), iterations)
+                FLAGS.set_override('policy_check_interval', 0)
+                unthrottled = per_call(
+                    lambda: policy.enforce(ctxt, action, TARGET), iterations)
+                FLAGS.clear_override('policy_check_interval')
+
+                print('%-7d %9.1f %-14s %12.2f %12.2f %12.2f %14.2f %14.2f'
+                      % (count, load, action[:14], interp, compiled, cached,
+                         enforce, unthrottled))
+        finally:
+            FLAGS.clear_override('policy_file')
+            policy.reset()
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
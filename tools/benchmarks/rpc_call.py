@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare rpc.call throughput with and without a single reply queue.
+
+Runs an echo server and client in one process over the in-memory kombu
+transport (fake_rabbit), so the numbers only reflect the client and broker
+side overhead of each call, not network latency.
+
+    python tools/benchmarks/rpc_call.py [--calls N] [--concurrency N]
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import gettext
+import optparse
+import os
+import sys
+import time
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+gettext.install('cinder', unicode=1)
+
+from cinder import context
+from cinder import flags
+from cinder.openstack.common.rpc import dispatcher
+from cinder.openstack.common.rpc import impl_kombu
+
+FLAGS = flags.FLAGS
+TOPIC = 'benchmark_rpc_call'
+
+
+class EchoManager(object):
+    def echo(self, ctxt, value):
+        return value
+
+
+def run(calls, concurrency):
+    ctxt = context.get_admin_context()
+    msg = {'method': 'echo', 'args': {'value': 'x' * 64}}
+    pool = eventlet.GreenPool(concurrency)
+
+    def _call(_i):
+        impl_kombu.call(FLAGS, ctxt, TOPIC, dict(msg))
+
+    # Warm up the connection pool (and reply queue, if enabled).
+    _call(0)
+    start = time.time()
+    for _i in pool.imap(_call, xrange(calls)):
+        pass
+    return calls / (time.time() - start)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=1000)
+    parser.add_option('--concurrency', type='int', default=1)
+    options, _args = parser.parse_args()
+
+    FLAGS([])
+    FLAGS.set_override('fake_rabbit', True)
+    conn = impl_kombu.create_connection(FLAGS, new=True)
+    conn.create_consumer(TOPIC, dispatcher.RpcDispatcher([EchoManager()]))
+    conn.consume_in_thread()
+
+    for single_reply_queue in (False, True):
+        impl_kombu.cleanup()
+        FLAGS.set_override('amqp_rpc_single_reply_queue', single_reply_queue)
+        rate = run(options.calls, options.concurrency)
+        print('amqp_rpc_single_reply_queue=%-5s %8.1f calls/s'
+              % (single_reply_queue, rate))
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
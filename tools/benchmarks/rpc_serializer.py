@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the cost of the rpc wire formats on typical cinder messages.
+
+For each message, prints the encoded size and the time to encode and decode
+it with json and msgpack, and the cost of jsonutils.to_primitive() against
+the is_primitive() check that lets already primitive payloads skip it.
+
+    python tools/benchmarks/rpc_serializer.py [--iterations N]
+"""
+
+import datetime
+import gettext
+import optparse
+import os
+import sys
+import timeit
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+gettext.install('cinder', unicode=1)
+
+from cinder import context
+from cinder.db.sqlalchemy import models
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common.rpc import amqp
+from cinder.openstack.common.rpc import serializer
+
+
+def _create_volume_cast():
+    ctxt = context.RequestContext('fake_user', 'fake_project',
+                                  roles=['member'])
+    msg = {'method': 'create_volume',
+           'args': {'volume_id': '4ca2c8d2-8e4b-4a5d-9b4e-0a8d9d0b3c11',
+                    'snapshot_id': None,
+                    'image_id': '9a7e2f1b-3b4c-4d1e-8f6a-2c5d7e9f0a1b'},
+           'version': '1.0'}
+    amqp.pack_context(msg, ctxt)
+    return msg
+
+
+def _capabilities_report():
+    pools = dict(('pool-%d' % i,
+                  {'total_capacity_gb': 1024 * i,
+                   'free_capacity_gb': 512.5 * i,
+                   'reserved_percentage': 0,
+                   'QoS_support': False})
+                 for i in xrange(20))
+    return {'method': 'update_service_capabilities',
+            'args': {'service_name': 'volume',
+                     'host': 'cinder-volume-01',
+                     'capabilities': {'volume_backend_name': 'LVM_iSCSI',
+                                      'vendor_name': 'Open Source',
+                                      'driver_version': '1.0',
+                                      'storage_protocol': 'iSCSI',
+                                      'pools': pools}}}
+
+
+def _volume_ref():
+    now = datetime.datetime.utcnow()
+    volume = models.Volume(id='4ca2c8d2-8e4b-4a5d-9b4e-0a8d9d0b3c11',
+                           size=10, host='cinder-volume-01',
+                           user_id='fake_user', project_id='fake_project',
+                           status='available', attach_status='detached',
+                           display_name='vol', display_description='x' * 80,
+                           availability_zone='nova', created_at=now,
+                           updated_at=now, launched_at=now, deleted=False)
+    return {'method': 'volume_ref', 'args': {'volume': volume}}
+
+
+MESSAGES = [('create_volume cast', _create_volume_cast()),
+            ('capability report', _capabilities_report()),
+            ('volume ref', _volume_ref())]
+
+
+def _time(func, iterations):
+    return timeit.timeit(func, number=iterations) / iterations * 1e6
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--iterations', type='int', default=5000)
+    options, _args = parser.parse_args()
+    iterations = options.iterations
+
+    formats = ['json']
+    if serializer.msgpack is not None:
+        formats.append('msgpack')
+    else:
+        print('msgpack is not installed, only timing json')
+
+    print('%-20s %-8s %8s %12s %12s'
+          % ('message', 'format', 'bytes', 'encode (us)', 'decode (us)'))
+    for name, msg in MESSAGES:
+        for fmt in formats:
+            data = serializer.encode(msg, fmt)
+            encode = _time(lambda: serializer.encode(msg, fmt), iterations)
+            decode = _time(lambda: serializer.decode(data), iterations)
+            print('%-20s %-8s %8d %12.1f %12.1f'
+                  % (name, fmt, len(data), encode, decode))
+
+    print('')
+    print('%-20s %16s %16s' % ('message', 'to_primitive (us)',
+                               'is_primitive (us)'))
+    for name, msg in MESSAGES:
+        msg = jsonutils.to_primitive(msg)
+        print('%-20s %16.1f %16.1f'
+              % (name,
+                 _time(lambda: jsonutils.to_primitive(msg), iterations),
+                 _time(lambda: jsonutils.is_primitive(msg), iterations)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure XML serialization of volumes, snapshots and limits.
+
+For each response, prints the time to serialize it by walking the
+template elements (Template._serialize()) and with the compiled template
+(Template.serialize()).  Snapshots are serialized with the extended
+snapshot attributes slave template attached.
+
+    python tools/benchmarks/xml_templates.py [--items 1,100,1000]
+"""
+
+import gettext
+import optparse
+import os
+import sys
+import timeit
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+gettext.install('cinder', unicode=1)
+
+from lxml import etree
+
+from cinder.api.openstack.volume.contrib import extended_snapshot_attributes
+from cinder.api.openstack.volume import limits
+from cinder.api.openstack.volume import snapshots
+from cinder.api.openstack.volume.views import limits as limits_views
+from cinder.api.openstack.volume import volumes
+from cinder import context
+from cinder import flags
+from cinder.tests.api.openstack import fakes
+
+
+def walk_serialize(template, obj):
+    """Template.serialize() as it was before templates were compiled."""
+    elem = template._serialize(None, obj, template._siblings(),
+                               template._nsmap())
+    return etree.tostring(elem, **template.serialize_options)
+
+
+def make_volumes(count):
+    ctxt = context.get_admin_context()
+    vols = []
+    for i in xrange(count):
+        vol = fakes.stub_volume(i, volume_metadata=[
+            {'key': 'key%d' % j, 'value': 'value%d' % j} for j in xrange(3)])
+        vols.append(volumes._translate_volume_detail_view(ctxt, vol))
+    return volumes.VolumesTemplate(), {'volumes': vols}
+
+
+def make_snapshots(count):
+    ctxt = context.get_admin_context()
+    alias = extended_snapshot_attributes.Extended_snapshot_attributes.alias
+    snaps = []
+    for i in xrange(count):
+        snap = snapshots._translate_snapshot_detail_view(
+            ctxt, fakes.stub_snapshot(i))
+        snap['%s:project_id' % alias] = 'fake'
+        snap['%s:progress' % alias] = '100%'
+        snaps.append(snap)
+    template = snapshots.SnapshotsTemplate()
+    template.attach(
+        extended_snapshot_attributes.ExtendedSnapshotAttributesTemplate())
+    return template, {'snapshots': snaps}
+
+
+def make_limits(count):
+    rate_limits = [limit.display() for limit in limits.DEFAULT_LIMITS]
+    absolute = {'gigabytes': 1000, 'volumes': 10}
+    obj = limits_views.ViewBuilder().build(rate_limits, absolute)
+    return limits.LimitsTemplate(), obj
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--items', default='1,100,1000')
+    parser.add_option('--iterations', type='int', default=0,
+                      help='Defaults to about 20000 items per measurement')
+    options, _args = parser.parse_args()
+    flags.parse_args([])
+
+    print('%-10s %6s %12s %14s %8s'
+          % ('response', 'items', 'walk (ms)', 'compiled (ms)', 'speedup'))
+    for name, make in (('volumes', make_volumes),
+                       ('snapshots', make_snapshots),
+                       ('limits', make_limits)):
+        counts = [int(n) for n in options.items.split(',')]
+        if name == 'limits':
+            counts = [1]
+        for count in counts:
+            template, obj = make(count)
+            assert walk_serialize(template, obj) == template.serialize(obj)
+            iterations = options.iterations or max(1, 20000 / count)
+
+            walk = timeit.timeit(lambda: walk_serialize(template, obj),
+                                 number=iterations) / iterations
+            compiled = timeit.timeit(lambda: template.serialize(obj),
+                                     number=iterations) / iterations
+            print('%-10s %6d %12.3f %14.3f %7.2fx'
+                  % (name, count, walk * 1000, compiled * 1000,
+                     walk / compiled))
+
+
+if __name__ == '__main__':
+    main()